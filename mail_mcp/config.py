@@ -5,7 +5,8 @@ Configuration management for Mail MCP server
 import os
 import re
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from pathlib import Path
 from dotenv import load_dotenv
 
 from .errors import ConfigurationError
@@ -21,6 +22,21 @@ class IMAPConfig:
     username: str
     password: str
     use_ssl: bool = True
+    backend: str = "asyncio"
+    pool_size: int = 4
+    pool_idle_timeout: float = 300
+    pool_max_age: float = 3600
+    pool_acquire_timeout: float = 30
+    health_check_interval: float = 60
+    # IDLE监听的文件夹，空字符串表示不监听
+    idle_folder: str = "INBOX"
+    idle_interval: float = 1500
+    poll_interval: float = 60
+    # 服务器支持时启用COMPRESS=DEFLATE（asyncio后端）
+    compress: bool = True
+    # 跨文件夹搜索时同时搜索的文件夹数和整体超时（秒）
+    search_concurrency: int = 4
+    search_timeout: float = 30
 
     @classmethod
     def from_env(cls) -> 'IMAPConfig':
@@ -31,12 +47,24 @@ class IMAPConfig:
                 port=int(os.getenv('IMAP_PORT', '993')),
                 username=os.getenv('IMAP_USERNAME', ''),
                 password=os.getenv('IMAP_PASSWORD', ''),
-                use_ssl=os.getenv('IMAP_USE_SSL', 'true').lower() == 'true'
+                use_ssl=os.getenv('IMAP_USE_SSL', 'true').lower() == 'true',
+                backend=os.getenv('IMAP_BACKEND', 'asyncio').lower(),
+                pool_size=int(os.getenv('IMAP_POOL_SIZE', '4')),
+                pool_idle_timeout=float(os.getenv('IMAP_POOL_IDLE_TIMEOUT', '300')),
+                pool_max_age=float(os.getenv('IMAP_POOL_MAX_AGE', '3600')),
+                pool_acquire_timeout=float(os.getenv('IMAP_POOL_ACQUIRE_TIMEOUT', '30')),
+                health_check_interval=float(os.getenv('IMAP_HEALTH_CHECK_INTERVAL', '60')),
+                idle_folder=os.getenv('IMAP_IDLE_FOLDER', 'INBOX'),
+                idle_interval=float(os.getenv('IMAP_IDLE_INTERVAL', '1500')),
+                poll_interval=float(os.getenv('IMAP_POLL_INTERVAL', '60')),
+                compress=os.getenv('IMAP_COMPRESS', 'true').lower() == 'true',
+                search_concurrency=int(os.getenv('IMAP_SEARCH_CONCURRENCY', '4')),
+                search_timeout=float(os.getenv('IMAP_SEARCH_TIMEOUT', '30'))
             )
         except ValueError as e:
             raise ConfigurationError(
-                f"Invalid IMAP port value: {e}",
-                details={"env_var": "IMAP_PORT", "error": str(e)},
+                f"Invalid IMAP numeric value: {e}",
+                details={"env_var": "IMAP_PORT/IMAP_POOL_*", "error": str(e)},
                 original_exception=e
             )
 
@@ -58,6 +86,18 @@ class IMAPConfig:
         if not self._is_valid_port(self.port):
             errors.append(f"IMAP port {self.port} is invalid")
 
+        if self.backend not in ('asyncio', 'imaplib'):
+            errors.append(f"IMAP backend {self.backend} is invalid (expected asyncio or imaplib)")
+
+        if self.pool_size < 1:
+            errors.append(f"IMAP pool size {self.pool_size} is invalid")
+
+        if self.idle_interval <= 0 or self.poll_interval <= 0:
+            errors.append("IMAP IDLE/poll interval must be positive")
+
+        if self.search_concurrency < 1 or self.search_timeout <= 0:
+            errors.append("IMAP search concurrency and timeout must be positive")
+
         return errors
 
     def _is_valid_host(self, host: str) -> bool:
@@ -135,6 +175,9 @@ class Config:
     host: str = "localhost"
     port: int = 8000
     log_level: str = "INFO"
+    cache_dir: Optional[str] = None
+    memory_cache_bytes: int = 64 * 1024 * 1024
+    raw_store_bytes: int = 1024 * 1024 * 1024
     is_valid: bool = True
     errors: Dict[str, List[str]] = None
 
@@ -144,9 +187,20 @@ class Config:
         self.host = os.getenv('HOST', 'localhost')
         self.port = int(os.getenv('PORT', '8000'))
         self.log_level = os.getenv('LOG_LEVEL', 'INFO')
+        # 本地缓存目录，默认为~/.mail-mcp/cache，设置为空字符串时禁用缓存
+        self.cache_dir = os.path.expanduser(os.getenv('MAIL_MCP_CACHE_DIR', self._default_cache_dir()))
+        # 已获取邮件（原始字节和解析结果）的内存缓存总字节数，0表示禁用
+        self.memory_cache_bytes = int(os.getenv('MAIL_MCP_MEMORY_CACHE_BYTES', str(64 * 1024 * 1024)))
+        # 缓存目录下原始邮件存储的总字节数上限
+        self.raw_store_bytes = int(os.getenv('MAIL_MCP_RAW_STORE_BYTES', str(1024 * 1024 * 1024)))
         self.errors = {}
         self._validate_config()
 
+    @staticmethod
+    def _default_cache_dir() -> str:
+        # 与config_tool的配置目录放在一起，不随启动目录变化
+        return str(Path.home() / '.mail-mcp' / 'cache')
+
     def _validate_config(self):
         """Validate configuration"""
         self.errors = {}
@@ -0,0 +1,97 @@
+"""
+Opaque continuation tokens for paged list and search results for Mail MCP server
+"""
+
+import base64
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+# UID是32位无符号整数，这个值大于任何UID，表示没有上界
+UID_LIMIT = 2 ** 32
+
+
+def query_fingerprint(*parts: Any) -> str:
+    """查询条件的指纹，游标只能继续产生它的同一个查询"""
+    text = json.dumps(parts, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    """
+    翻页游标，下一页从比 last_uid 更旧的邮件开始
+
+    同一UIDVALIDITY下UID不会复用，翻页期间有新邮件到达或邮件被删除时，
+    下一页仍然正好接在上一页之后，不会重复或遗漏。对外以不透明的字符串传递。
+
+    按相关度排序的本地索引搜索没有UID顺序，游标改为记录已返回的结果数 rank
+    和产生游标时索引的 generation；索引变化后排序可能改变，游标随之失效。
+
+    Attributes:
+        folder: 文件夹名称
+        uidvalidity: 产生游标时文件夹的UIDVALIDITY，未知时为None
+        last_uid: 上一页最后（最旧）一封邮件的UID，按相关度翻页时为None
+        fingerprint: 查询条件的指纹
+        rank: 按相关度翻页时已返回的结果数
+        generation: 按相关度翻页时索引的generation
+    """
+    folder: str
+    uidvalidity: Optional[int]
+    last_uid: Optional[int]
+    fingerprint: str
+    rank: Optional[int] = None
+    generation: Optional[int] = None
+
+    def encode(self) -> str:
+        fields = [self.folder, self.uidvalidity, self.last_uid, self.fingerprint]
+        if self.rank is not None:
+            fields += [self.rank, self.generation]
+        payload = json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @classmethod
+    def decode(cls, token: str) -> 'PageCursor':
+        """解析游标字符串，格式不正确时抛出ValueError"""
+        text = str(token).strip()
+        try:
+            payload = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+            fields = json.loads(payload)
+            folder, uidvalidity, last_uid, fingerprint = fields[:4]
+            rank, generation = fields[4:] if len(fields) == 6 else (None, None)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {token!r}") from e
+        if len(fields) == 6:
+            position_valid = (
+                last_uid is None and isinstance(rank, int) and rank >= 0 and isinstance(generation, int)
+            )
+        else:
+            position_valid = len(fields) == 4 and isinstance(last_uid, int) and last_uid >= 1
+        if (
+            not isinstance(folder, str) or not isinstance(fingerprint, str) or not position_valid
+            or not (uidvalidity is None or isinstance(uidvalidity, int))
+        ):
+            raise ValueError(f"Invalid cursor: {token!r}")
+        return cls(folder, uidvalidity, last_uid, fingerprint, rank, generation)
+
+    def check(
+        self,
+        folder: str,
+        fingerprint: str,
+        uidvalidity: Optional[int] = None,
+        generation: Optional[int] = None
+    ):
+        """
+        确认游标属于本次查询
+
+        Raises:
+            ValueError: 游标来自其他文件夹或查询，或文件夹的UIDVALIDITY、索引的generation已变化
+        """
+        if self.folder != folder or self.fingerprint != fingerprint:
+            raise ValueError("Cursor belongs to a different folder or query")
+        if self.uidvalidity is not None and uidvalidity is not None and self.uidvalidity != uidvalidity:
+            raise ValueError(f"Cursor is stale: UIDVALIDITY of {folder} changed to {uidvalidity}")
+        if self.generation is not None and generation is not None and self.generation != generation:
+            raise ValueError(f"Cursor is stale: search index of {folder} changed")
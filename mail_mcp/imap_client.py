@@ -0,0 +1,585 @@
+"""
+Asyncio IMAP client for Mail MCP server
+"""
+
+import asyncio
+import imaplib
+import re
+import ssl
+import zlib
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+
+_LITERAL_MARKER = re.compile(rb'\{(\d+)\}$')
+_TAGGED_RESPONSE = re.compile(rb'(?P<tag>[A-Za-z0-9]+) (?P<type>[A-Z]+) ?(?P<data>.*)')
+_UNTAGGED_STATUS = re.compile(rb'\* (?P<data>\d+) (?P<type>[A-Z-]+)( (?P<data2>.*))?')
+_UNTAGGED_RESPONSE = re.compile(rb'\* (?P<type>[A-Z-]+)( (?P<data>.*))?')
+_RESPONSE_CODE = re.compile(rb'\[(?P<type>[A-Z-]+)( (?P<data>[^\]]*))?\]')
+
+# 单行响应的最大长度。大文件夹的 "* SEARCH" 等响应是一整行，
+# asyncio默认的64 KiB限制不够；超过这个长度时中止连接
+MAX_LINE_LENGTH = 64 * 1024 * 1024
+
+# 与imaplib相同的响应数据格式：普通行为bytes，带literal的行为 (行首, literal)
+ResponseData = List[Union[bytes, Tuple[bytes, bytes], None]]
+
+
+def _quote(value: str) -> str:
+    """按IMAP quoted string规则转义"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def new_transfer_stats() -> Dict[str, int]:
+    """
+    传输字节计数：bytes_* 为IMAP协议数据量，wire_bytes_* 为实际在连接上收发的字节数，
+    启用COMPRESS=DEFLATE后两者之差就是压缩节省的流量
+    """
+    return {'bytes_sent': 0, 'bytes_received': 0, 'wire_bytes_sent': 0, 'wire_bytes_received': 0}
+
+
+class _DeflateReader:
+    """从底层流读取raw DEFLATE数据并解压，提供客户端用到的 readline()/readexactly()"""
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self, reader: asyncio.StreamReader, stats: Dict[str, int]):
+        self._reader = reader
+        self._stats = stats
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._buffer = bytearray()
+        self._eof = False
+
+    async def _fill(self):
+        chunk = await self._reader.read(self.CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return
+        self._stats['wire_bytes_received'] += len(chunk)
+        try:
+            self._buffer += self._decompressor.decompress(chunk)
+        except zlib.error as e:
+            raise ConnectionError(f"invalid compressed data: {e}") from e
+
+    async def readline(self) -> bytes:
+        while True:
+            end = self._buffer.find(b'\n')
+            if end >= 0:
+                line = bytes(self._buffer[:end + 1])
+                del self._buffer[:end + 1]
+                return line
+            if len(self._buffer) > MAX_LINE_LENGTH:
+                raise ValueError(f"line exceeds {MAX_LINE_LENGTH} bytes")
+            if self._eof:
+                line = bytes(self._buffer)
+                self._buffer.clear()
+                return line
+            await self._fill()
+
+    async def readexactly(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            if self._eof:
+                partial = bytes(self._buffer)
+                self._buffer.clear()
+                raise asyncio.IncompleteReadError(partial, n)
+            await self._fill()
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+
+class _DeflateWriter:
+    """把写入的数据用raw DEFLATE压缩后交给底层流，每次写入都同步刷新以便服务器立即解压"""
+
+    def __init__(self, writer: asyncio.StreamWriter, stats: Dict[str, int]):
+        self._writer = writer
+        self._stats = stats
+        self._compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def write(self, data: bytes):
+        compressed = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._stats['wire_bytes_sent'] += len(compressed)
+        self._writer.write(compressed)
+
+    async def drain(self):
+        await self._writer.drain()
+
+    def is_closing(self) -> bool:
+        return self._writer.is_closing()
+
+    def close(self):
+        self._writer.close()
+
+    async def wait_closed(self):
+        await self._writer.wait_closed()
+
+
+class AsyncIMAPClient:
+    """
+    基于asyncio流的IMAP客户端
+
+    方法名和返回值 (typ, data) 与 imaplib.IMAP4 保持一致，可以直接作为
+    IMAPService 的连接对象使用；等待网络时不会阻塞事件循环。
+    同一连接上的命令按提交顺序依次执行；互不依赖的一组命令可以用 pipeline()
+    一次写入，只等待一次往返。
+    """
+
+    error = imaplib.IMAP4.error
+    abort = imaplib.IMAP4.abort
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 993,
+        use_ssl: bool = True,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        timeout: float = 30,
+        stats: Optional[Dict[str, int]] = None
+    ):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.state = 'LOGOUT'
+        self.capabilities: Tuple[str, ...] = ()
+        # 通过ENABLE启用的扩展（例如QRESYNC）
+        self.enabled: Set[str] = set()
+        self.untagged_responses: Dict[str, ResponseData] = {}
+        # 最近一条命令期间收到的未标记响应（去掉 "* "），保持到达顺序，
+        # 用于按顺序处理 EXPUNGE/EXISTS/FETCH 等会改变序列号的通知
+        self.untagged_log: List[bytes] = []
+        # 传输字节计数，可以传入同一个字典在多个连接间累计
+        self.stats = stats if stats is not None else new_transfer_stats()
+        # 通过COMPRESS启用的压缩算法
+        self.compression: Optional[str] = None
+        self._tag_counter = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """底层连接是否仍然可用"""
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        """建立连接并读取服务器问候"""
+        context = None
+        if self.use_ssl:
+            context = self.ssl_context or ssl.create_default_context()
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context, limit=MAX_LINE_LENGTH),
+            self.timeout
+        )
+
+        greeting = await self._read_response()
+        head = self._response_head(greeting)
+        if head.startswith(b'* PREAUTH'):
+            self.state = 'AUTH'
+        elif head.startswith(b'* OK'):
+            self.state = 'NONAUTH'
+        else:
+            await self._close_transport()
+            raise self.abort(f"unexpected greeting: {head!r}")
+        self._handle_untagged(greeting)
+
+        await self.capability()
+
+    async def starttls(self, ssl_context: Optional[ssl.SSLContext] = None) -> Tuple[str, ResponseData]:
+        if not hasattr(self.writer, 'start_tls'):
+            raise self.error("STARTTLS requires Python 3.11+ for asyncio streams")
+        typ, dat = await self._simple_command('STARTTLS')
+        if typ != 'OK':
+            raise self.error("Couldn't establish TLS session")
+        await self.writer.start_tls(ssl_context or ssl.create_default_context())
+        await self.capability()
+        return typ, dat
+
+    async def capability(self) -> Tuple[str, ResponseData]:
+        typ, dat = await self._simple_command('CAPABILITY')
+        data = self._untagged_data(typ, dat, 'CAPABILITY')
+        if typ == 'OK' and data[1] and data[1][-1]:
+            self.capabilities = tuple(data[1][-1].decode('ascii', 'replace').upper().split())
+        return data
+
+    async def compress(self) -> Tuple[str, ResponseData]:
+        """
+        启用 COMPRESS=DEFLATE（RFC 4978），之后双向数据都是raw DEFLATE流
+
+        命令本身和它的响应不压缩，服务器在发送OK后才开始压缩。
+        """
+        async with self._lock:
+            if self.compression is not None:
+                return 'NO', [b'compression already active']
+            typ, dat = await self._execute('COMPRESS', 'DEFLATE')
+            if typ == 'OK':
+                self.reader = _DeflateReader(self.reader, self.stats)
+                self.writer = _DeflateWriter(self.writer, self.stats)
+                self.compression = 'DEFLATE'
+            return typ, dat
+
+    async def login(self, user: str, password: str) -> Tuple[str, ResponseData]:
+        typ, dat = await self._simple_command('LOGIN', _quote(user), _quote(password))
+        if typ != 'OK':
+            raise self.error(dat[-1].decode('utf-8', 'replace') if dat and dat[-1] else 'LOGIN failed')
+        self.state = 'AUTH'
+        return typ, dat
+
+    async def enable(self, capability: str) -> Tuple[str, ResponseData]:
+        typ, dat = await self._simple_command('ENABLE', capability)
+        typ, dat = self._untagged_data(typ, dat, 'ENABLED')
+        if typ == 'OK':
+            for enabled in dat:
+                if enabled:
+                    self.enabled.update(enabled.decode('ascii', 'replace').upper().split())
+        return typ, dat
+
+    async def logout(self) -> Tuple[str, ResponseData]:
+        self.state = 'LOGOUT'
+        try:
+            typ, dat = await self._simple_command('LOGOUT')
+        except Exception:
+            typ, dat = 'NO', [None]
+        bye = self.untagged_responses.get('BYE')
+        await self._close_transport()
+        if bye:
+            return 'BYE', bye
+        return typ, dat
+
+    async def noop(self) -> Tuple[str, ResponseData]:
+        return await self._simple_command('NOOP')
+
+    async def list(self, directory: str = '""', pattern: str = '*') -> Tuple[str, ResponseData]:
+        typ, dat = await self._simple_command('LIST', directory, pattern)
+        return self._untagged_data(typ, dat, 'LIST')
+
+    async def select(self, mailbox: str = 'INBOX', readonly: bool = False) -> Tuple[str, ResponseData]:
+        name = 'EXAMINE' if readonly else 'SELECT'
+        typ, dat = await self._simple_command(name, mailbox)
+        if typ != 'OK':
+            self.state = 'AUTH'
+            return typ, dat
+        self.state = 'SELECTED'
+        return typ, self.untagged_responses.get('EXISTS', [None])
+
+    async def close(self) -> Tuple[str, ResponseData]:
+        try:
+            return await self._simple_command('CLOSE')
+        finally:
+            self.state = 'AUTH'
+
+    async def expunge(self) -> Tuple[str, ResponseData]:
+        typ, dat = await self._simple_command('EXPUNGE')
+        return self._untagged_data(typ, dat, 'EXPUNGE')
+
+    async def search(self, charset: Optional[str], *criteria: Any) -> Tuple[str, ResponseData]:
+        if charset:
+            typ, dat = await self._simple_command('SEARCH', 'CHARSET', charset, *criteria)
+        else:
+            typ, dat = await self._simple_command('SEARCH', *criteria)
+        return self._untagged_data(typ, dat, 'SEARCH')
+
+    async def fetch(self, message_set: str, message_parts: str) -> Tuple[str, ResponseData]:
+        typ, dat = await self._simple_command('FETCH', message_set, message_parts)
+        return self._untagged_data(typ, dat, 'FETCH')
+
+    async def store(self, message_set: str, command: str, flags: str) -> Tuple[str, ResponseData]:
+        if (flags[0], flags[-1]) != ('(', ')'):
+            flags = f'({flags})'
+        typ, dat = await self._simple_command('STORE', message_set, command, flags)
+        return self._untagged_data(typ, dat, 'FETCH')
+
+    async def copy(self, message_set: str, new_mailbox: str) -> Tuple[str, ResponseData]:
+        return await self._simple_command('COPY', message_set, new_mailbox)
+
+    async def status(self, mailbox: str, names: str) -> Tuple[str, ResponseData]:
+        typ, dat = await self._simple_command('STATUS', mailbox, names)
+        return self._untagged_data(typ, dat, 'STATUS')
+
+    async def uid(self, command: str, *args: Any) -> Tuple[str, ResponseData]:
+        command = command.upper()
+        name = command if command in ('SEARCH', 'SORT', 'THREAD') else 'FETCH'
+        typ, dat = await self._simple_command('UID', command, *args)
+        return self._untagged_data(typ, dat, name)
+
+    async def xatom(self, name: str, *args: Any) -> Tuple[str, ResponseData]:
+        return await self._simple_command(name, *args)
+
+    async def idle(self, timeout: float) -> Tuple[str, List[bytes]]:
+        """
+        发送IDLE等待服务器推送，收到第一条通知或等待超过timeout秒后发送DONE结束
+
+        Returns:
+            Tuple[str, List[bytes]]: IDLE的完成状态和按到达顺序排列的未标记响应
+        """
+        async with self._lock:
+            if not self.is_open:
+                raise self.abort("connection is closed")
+            self.untagged_responses = {}
+            self.untagged_log = []
+            try:
+                tag = await self._send_command('IDLE')
+                while True:
+                    response = await self._read_response()
+                    head = self._response_head(response)
+                    if head.startswith(b'+'):
+                        break
+                    if head.startswith(tag + b' '):
+                        # 服务器拒绝IDLE
+                        typ, _ = self._tagged_result(head, 'IDLE')
+                        return typ, self.untagged_log
+                    if head.startswith(b'* '):
+                        self._handle_untagged(response)
+
+                try:
+                    response = await self._read_response(first_line_timeout=timeout)
+                    if self._response_head(response).startswith(b'* '):
+                        self._handle_untagged(response)
+                except asyncio.TimeoutError:
+                    pass
+
+                self._write(b'DONE\r\n')
+                await asyncio.wait_for(self.writer.drain(), self.timeout)
+                typ, _ = await self._read_until_tagged(tag, 'IDLE')
+                return typ, self.untagged_log
+            except asyncio.CancelledError:
+                # 被取消时服务器仍处于IDLE状态，后续命令（包括LOGOUT）都无法得到响应
+                await self._close_transport()
+                raise
+            except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError) as e:
+                await self._close_transport()
+                raise self.abort(f"IDLE failed: {e!r}") from e
+
+    async def pipeline(self, commands: List[Tuple[Any, ...]]) -> List[Tuple[str, ResponseData]]:
+        """
+        一次写入多条互不依赖的命令，再按标签把响应对应回各条命令（RFC 3501 5.5）
+
+        整组命令只等待一次往返。服务器按顺序处理命令，两条标记响应之间的
+        未标记响应归入最早尚未完成的命令。
+
+        Args:
+            commands: 命令列表，每项为 (命令名, *参数)，例如 ('STATUS', '"INBOX"', '(MESSAGES)')
+                或 ('UID', 'STORE', '7', '+FLAGS.SILENT', '(\\Seen)')
+
+        Returns:
+            List[Tuple[str, ResponseData]]: 与commands顺序相同的 (typ, data)，
+            data的格式与单独调用对应方法（status()、uid()等）相同
+        """
+        if not commands:
+            return []
+        async with self._lock:
+            if not self.is_open:
+                raise self.abort("connection is closed")
+            self.untagged_log = []
+            untagged: List[Dict[str, ResponseData]] = [{} for _ in commands]
+            tagged: Dict[int, bytes] = {}
+
+            try:
+                tags = []
+                lines = []
+                for name, *args in commands:
+                    tag, line = self._format_command(name, *args)
+                    tags.append(tag)
+                    lines.append(line)
+                self._write(b''.join(lines))
+                await asyncio.wait_for(self.writer.drain(), self.timeout)
+
+                while len(tagged) < len(tags):
+                    response = await self._read_response()
+                    head = self._response_head(response)
+                    if head.startswith(b'* '):
+                        current = next(index for index in range(len(tags)) if index not in tagged)
+                        self.untagged_responses = untagged[current]
+                        self._handle_untagged(response)
+                        continue
+                    for index, tag in enumerate(tags):
+                        if index not in tagged and head.startswith(tag + b' '):
+                            tagged[index] = head
+                            break
+            except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError) as e:
+                await self._close_transport()
+                raise self.abort(f"pipeline failed: {e!r}") from e
+
+        results = []
+        errors = []
+        self.untagged_responses = {}
+        for index, (name, *args) in enumerate(commands):
+            typ, dat = self._parse_tagged(tagged[index])
+            if typ == 'BAD':
+                errors.append(f"{name} command error: BAD {dat[0].decode('utf-8', 'replace')}")
+            responses = untagged[index]
+            key = self._untagged_name(name, args)
+            if key is not None and typ != 'NO':
+                dat = responses.pop(key, [None])
+            results.append((typ, dat))
+            for key, values in responses.items():
+                self.untagged_responses.setdefault(key, []).extend(values)
+        if errors:
+            raise self.error('; '.join(errors))
+        return results
+
+    @staticmethod
+    def _untagged_name(name: str, args: List[Any]) -> Optional[str]:
+        """命令结果所在的未标记响应名称，与单独调用对应方法时返回的数据一致"""
+        name = name.upper()
+        if name == 'UID':
+            command = str(args[0]).upper() if args else ''
+            return command if command in ('SEARCH', 'SORT', 'THREAD') else 'FETCH'
+        if name == 'STORE':
+            return 'FETCH'
+        if name in ('STATUS', 'FETCH', 'SEARCH', 'LIST', 'EXPUNGE'):
+            return name
+        return None
+
+    # ---- 协议实现 ----
+
+    async def _simple_command(self, name: str, *args: Any) -> Tuple[str, ResponseData]:
+        async with self._lock:
+            return await self._execute(name, *args)
+
+    async def _execute(self, name: str, *args: Any) -> Tuple[str, ResponseData]:
+        if not self.is_open:
+            raise self.abort("connection is closed")
+
+        # 上一个命令的未标记响应不再需要
+        self.untagged_responses = {}
+        self.untagged_log = []
+
+        try:
+            tag = await self._send_command(name, *args)
+            return await self._read_until_tagged(tag, name)
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError) as e:
+            await self._close_transport()
+            raise self.abort(f"{name} failed: {e!r}") from e
+
+    async def _send_command(self, name: str, *args: Any) -> bytes:
+        """写入一条带新标签的命令，返回标签"""
+        tag, line = self._format_command(name, *args)
+        self._write(line)
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+        return tag
+
+    def _format_command(self, name: str, *args: Any) -> Tuple[bytes, bytes]:
+        """分配新标签并生成命令行，返回 (标签, 以CRLF结尾的命令行)"""
+        self._tag_counter += 1
+        tag = f'M{self._tag_counter:04d}'.encode('ascii')
+        line = tag + b' ' + name.encode('ascii')
+        for arg in args:
+            if arg is None:
+                continue
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            line += b' ' + arg
+        return tag, line + b'\r\n'
+
+    async def _read_until_tagged(self, tag: bytes, name: str) -> Tuple[str, ResponseData]:
+        """读取响应直到命令的标记响应，期间的未标记响应记入 untagged_responses"""
+        while True:
+            response = await self._read_response()
+            head = self._response_head(response)
+            if head.startswith(tag + b' '):
+                return self._tagged_result(head, name)
+            if head.startswith(b'* '):
+                self._handle_untagged(response)
+            # 本客户端不发送literal，'+' 继续请求直接忽略
+
+    def _tagged_result(self, head: bytes, name: str) -> Tuple[str, ResponseData]:
+        typ, dat = self._parse_tagged(head)
+        if typ == 'BAD':
+            raise self.error(f"{name} command error: BAD {dat[0].decode('utf-8', 'replace')}")
+        return typ, dat
+
+    def _parse_tagged(self, head: bytes) -> Tuple[str, ResponseData]:
+        match = _TAGGED_RESPONSE.match(head)
+        if not match:
+            raise self.abort(f"unexpected tagged response: {head!r}")
+        return match.group('type').decode('ascii'), [match.group('data')]
+
+    def _write(self, data: bytes):
+        self.stats['bytes_sent'] += len(data)
+        if self.compression is None:
+            self.stats['wire_bytes_sent'] += len(data)
+        self.writer.write(data)
+
+    def _count_received(self, size: int):
+        self.stats['bytes_received'] += size
+        if self.compression is None:
+            self.stats['wire_bytes_received'] += size
+
+    async def _read_line(self, timeout: Optional[float] = None) -> bytes:
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), timeout or self.timeout)
+        except (asyncio.LimitOverrunError, ValueError) as e:
+            # 超长的行已被部分消费，流无法再与响应对齐，只能按连接错误中止
+            raise ConnectionError(f"response line too long: {e}") from e
+        if not line:
+            raise ConnectionError("connection closed by server")
+        self._count_received(len(line))
+        return line.rstrip(b'\r\n')
+
+    async def _read_response(self, first_line_timeout: Optional[float] = None) -> ResponseData:
+        """读取一条完整响应，literal按imaplib的方式拆分为 (行首, literal)"""
+        pieces: ResponseData = []
+        line = await self._read_line(first_line_timeout)
+        while True:
+            match = _LITERAL_MARKER.search(line)
+            if not match:
+                pieces.append(line)
+                return pieces
+            literal = await asyncio.wait_for(
+                self.reader.readexactly(int(match.group(1))), self.timeout
+            )
+            self._count_received(len(literal))
+            pieces.append((line, literal))
+            line = await self._read_line()
+
+    @staticmethod
+    def _response_head(response: ResponseData) -> bytes:
+        first = response[0]
+        return first[0] if isinstance(first, tuple) else first
+
+    def _handle_untagged(self, response: ResponseData):
+        head = self._response_head(response)
+        self.untagged_log.append(head[2:])
+        match = _UNTAGGED_STATUS.match(head)
+        if match:
+            typ = match.group('type')
+            data = match.group('data')
+            if match.group('data2'):
+                data += b' ' + match.group('data2')
+        else:
+            match = _UNTAGGED_RESPONSE.match(head)
+            if not match:
+                return
+            typ = match.group('type')
+            data = match.group('data') or b''
+
+        first = response[0]
+        pieces = list(response)
+        pieces[0] = (data, first[1]) if isinstance(first, tuple) else data
+        key = typ.decode('ascii')
+        self.untagged_responses.setdefault(key, []).extend(pieces)
+
+        if key in ('OK', 'NO', 'BAD', 'BYE', 'PREAUTH'):
+            code = _RESPONSE_CODE.match(data)
+            if code:
+                self.untagged_responses.setdefault(code.group('type').decode('ascii'), []).append(
+                    code.group('data')
+                )
+
+    def _untagged_data(self, typ: str, dat: ResponseData, name: str) -> Tuple[str, ResponseData]:
+        if typ == 'NO':
+            return typ, dat
+        return typ, self.untagged_responses.pop(name, [None])
+
+    async def _close_transport(self):
+        writer, self.writer, self.reader = self.writer, None, None
+        self.state = 'LOGOUT'
+        self.compression = None
+        if writer is None:
+            return
+        try:
+            writer.close()
+            await asyncio.wait_for(writer.wait_closed(), self.timeout)
+        except Exception:
+            pass
@@ -0,0 +1,151 @@
+"""
+In-memory mailbox mirror kept current by IMAP IDLE for Mail MCP server
+"""
+
+import re
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set, Tuple
+
+from .imap_parser import parse_fetch_response, parse_sequence_set
+from .models import EmailSummary
+
+
+# RFC 2177：服务器可以断开IDLE超过30分钟的连接，客户端必须在29分钟内重新发送IDLE
+IDLE_REISSUE_LIMIT = 29 * 60
+
+_NOTIFICATION = re.compile(rb'^(?:(?P<number>\d+) )?(?P<kind>[A-Za-z]+)(?: (?P<rest>.*))?$', re.DOTALL)
+
+
+def parse_notification(head: bytes) -> Tuple[str, Optional[int], bytes]:
+    """
+    拆分一条未标记响应（不含 "* "）
+
+    例如 b'3 EXPUNGE' -> ('EXPUNGE', 3, b'')，b'VANISHED 7:9' -> ('VANISHED', None, b'7:9')
+    """
+    match = _NOTIFICATION.match(head)
+    if not match:
+        return '', None, b''
+    number = match.group('number')
+    return (
+        match.group('kind').decode('ascii').upper(),
+        int(number) if number is not None else None,
+        match.group('rest') or b''
+    )
+
+
+@dataclass
+class FolderMirror:
+    """
+    IDLE监听的文件夹在内存中的镜像
+
+    按序列号顺序保存全部UID（EXPUNGE通知只给出序列号）和未读UID集合，
+    未读邮件的摘要常驻内存，列出未读邮件时不需要访问服务器。
+    """
+    folder: str
+    uidvalidity: Optional[int] = None
+    uids: List[int] = field(default_factory=list)
+    unseen: Set[int] = field(default_factory=set)
+    summaries: Dict[int, EmailSummary] = field(default_factory=dict)
+    # 初始加载完成且监听连接正常时为True，否则未读查询回退到服务器搜索
+    ready: bool = False
+    updated_at: Optional[float] = None
+
+    def reset(self, uidvalidity: Optional[int], uids: List[int], unseen: List[int]):
+        """用 UID SEARCH ALL/UNSEEN 的结果重建镜像"""
+        self.uidvalidity = uidvalidity
+        self.uids = sorted(uids)
+        self.unseen = set(unseen) & set(self.uids)
+        self.summaries = {uid: summary for uid, summary in self.summaries.items() if uid in self.unseen}
+        self.updated_at = time.time()
+
+    @property
+    def next_uid(self) -> int:
+        return self.uids[-1] + 1 if self.uids else 1
+
+    def uid_at(self, seq: int) -> Optional[int]:
+        if 1 <= seq <= len(self.uids):
+            return self.uids[seq - 1]
+        return None
+
+    def append(self, uid: int, flags: List[str]):
+        """记录新到达的邮件，已知的UID忽略"""
+        if self.uids and uid <= self.uids[-1]:
+            return
+        self.uids.append(uid)
+        self.set_flags(uid, flags)
+
+    def set_flags(self, uid: int, flags: List[str]):
+        """更新邮件标志，已读的邮件不再保留摘要"""
+        if '\\Seen' in flags:
+            self.unseen.discard(uid)
+            self.summaries.pop(uid, None)
+            return
+        self.unseen.add(uid)
+        summary = self.summaries.get(uid)
+        if summary is not None:
+            self.summaries[uid] = replace(summary, flags=list(flags), is_read=False)
+
+    def mark_seen(self, uid: int):
+        self.unseen.discard(uid)
+        self.summaries.pop(uid, None)
+
+    def remove(self, uids: List[int]) -> List[int]:
+        """删除一组UID，返回镜像中确实存在的UID"""
+        gone = set(uids) & set(self.uids)
+        if gone:
+            self.uids = [uid for uid in self.uids if uid not in gone]
+            for uid in gone:
+                self.mark_seen(uid)
+        return sorted(gone)
+
+    def apply(self, notifications: List[bytes]) -> Tuple[Dict[int, List[str]], List[int], bool]:
+        """
+        按到达顺序应用 EXISTS/EXPUNGE/VANISHED/FETCH FLAGS 通知
+
+        Returns:
+            Tuple: (UID -> 新标志, 被删除的UID, 是否有需要获取的新邮件)
+        """
+        flag_changes: Dict[int, List[str]] = {}
+        removed: List[int] = []
+        new_messages = False
+        for head in notifications:
+            kind, number, rest = parse_notification(head)
+            if kind == 'EXISTS' and number is not None:
+                new_messages = new_messages or number > len(self.uids)
+            elif kind == 'EXPUNGE' and number is not None:
+                uid = self.uid_at(number)
+                if uid is not None:
+                    removed.extend(self.remove([uid]))
+            elif kind == 'VANISHED':
+                removed.extend(self.remove(parse_sequence_set(rest)))
+            elif kind == 'FETCH' and number is not None:
+                for _, attributes in parse_fetch_response([head]):
+                    if 'FLAGS' not in attributes:
+                        continue
+                    uid = attributes.get('UID') or self.uid_at(number)
+                    if uid is None:
+                        continue
+                    flags = [str(flag) for flag in attributes['FLAGS']]
+                    self.set_flags(uid, flags)
+                    flag_changes[uid] = flags
+        if notifications:
+            self.updated_at = time.time()
+        return flag_changes, removed, new_messages
+
+    def missing_summaries(self, limit: int) -> List[int]:
+        """最新的limit封未读邮件中还没有摘要的UID"""
+        newest = sorted(self.unseen)[-limit:] if limit > 0 else []
+        return [uid for uid in newest if uid not in self.summaries]
+
+    def unread(self, limit: int) -> Optional[List[EmailSummary]]:
+        """
+        最新优先的未读邮件摘要
+
+        Returns:
+            Optional[List[EmailSummary]]: 需要的摘要不全在内存中时返回None
+        """
+        uids = sorted(self.unseen, reverse=True)[:limit]
+        if any(uid not in self.summaries for uid in uids):
+            return None
+        return [self.summaries[uid] for uid in uids]
@@ -0,0 +1,679 @@
+"""
+IMAP response parsing helpers for Mail MCP server
+"""
+
+import base64
+import binascii
+import quopri
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from email.message import Message
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import unquote
+
+from .utils import decode_email_header
+
+
+_LITERAL_MARKER = re.compile(rb'\{(\d+)\+?\}$')
+
+_LIST_RESPONSE = re.compile(r'^\((?P<flags>[^)]*)\) (?:"(?:[^"\\]|\\.)*"|NIL) (?P<name>.+)$', re.IGNORECASE)
+
+_STATUS_RESPONSE = re.compile(r'^(?P<name>"(?:[^"\\]|\\.)*"|\S+)\s+\((?P<items>[^)]*)\)$')
+
+_PARTIAL_RESULT = re.compile(r'PARTIAL \(\s*\S+\s+(?P<set>[^)\s]+)\s*\)', re.IGNORECASE)
+
+
+class _Literal(bytes):
+    """imaplib已经读出的literal内容，分词时原样返回"""
+
+
+def _flatten_fetch_data(data: List[Any]) -> List[Union[bytes, _Literal]]:
+    """
+    将imaplib返回的FETCH数据展开为片段序列
+
+    imaplib把带literal的响应拆成 (前缀行, literal内容) 元组，
+    其余部分为普通bytes。这里去掉前缀末尾的 {n} 标记，并把literal内容按顺序插入。
+    """
+    chunks: List[Union[bytes, _Literal]] = []
+    for item in data or []:
+        if isinstance(item, tuple):
+            head = item[0] or b''
+            literal = item[1] if len(item) > 1 else b''
+            chunks.append(_LITERAL_MARKER.sub(b'', head.rstrip()))
+            chunks.append(_Literal(literal or b''))
+        elif isinstance(item, (bytes, bytearray)):
+            chunks.append(bytes(item))
+        elif isinstance(item, str):
+            chunks.append(item.encode('utf-8'))
+    return chunks
+
+
+def _tokenize(chunks: List[Union[bytes, _Literal]]) -> Iterator[Any]:
+    """
+    IMAP响应分词器
+
+    产出 '(' / ')' 字符串标记、None（NIL）、str（原子或引用字符串）以及bytes（literal）
+    """
+    for chunk in chunks:
+        if isinstance(chunk, _Literal):
+            yield bytes(chunk)
+            continue
+
+        pos = 0
+        length = len(chunk)
+        while pos < length:
+            char = chunk[pos:pos + 1]
+            if char in (b' ', b'\r', b'\n'):
+                pos += 1
+            elif char in (b'(', b')'):
+                yield char.decode()
+                pos += 1
+            elif char == b'"':
+                pos += 1
+                buf = bytearray()
+                while pos < length:
+                    current = chunk[pos:pos + 1]
+                    if current == b'\\' and pos + 1 < length:
+                        buf += chunk[pos + 1:pos + 2]
+                        pos += 2
+                        continue
+                    if current == b'"':
+                        pos += 1
+                        break
+                    buf += current
+                    pos += 1
+                yield buf.decode('utf-8', errors='replace')
+            else:
+                start = pos
+                depth = 0
+                while pos < length:
+                    current = chunk[pos:pos + 1]
+                    if current == b'[':
+                        depth += 1
+                    elif current == b']':
+                        depth -= 1
+                    elif depth <= 0 and current in (b' ', b'(', b')', b'\r', b'\n', b'"'):
+                        break
+                    pos += 1
+                atom = chunk[start:pos].decode('utf-8', errors='replace')
+                yield None if atom.upper() == 'NIL' else atom
+
+
+def _build_tree(tokens: Iterator[Any]) -> List[Any]:
+    """把分词结果组装为嵌套列表"""
+    stack: List[List[Any]] = [[]]
+    for token in tokens:
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            if len(stack) > 1:
+                finished = stack.pop()
+                stack[-1].append(finished)
+        else:
+            stack[-1].append(token)
+    while len(stack) > 1:
+        finished = stack.pop()
+        stack[-1].append(finished)
+    return stack[0]
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_fetch_response(data: List[Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    解析一条批量FETCH命令的返回数据
+
+    Args:
+        data: imaplib ``fetch``/``uid('FETCH', ...)`` 返回的数据列表
+
+    Returns:
+        List[Tuple[str, Dict]]: (序列号, {数据项名称: 值}) 列表，顺序与服务器返回一致。
+        数据项名称统一为大写，例如 ``UID``、``FLAGS``、``BODYSTRUCTURE``。
+    """
+    tree = _build_tree(_tokenize(_flatten_fetch_data(data)))
+
+    results: List[Tuple[str, Dict[str, Any]]] = []
+    index = 0
+    while index < len(tree):
+        token = tree[index]
+        # 期望格式: <seq> FETCH? (<item> <value> ...)
+        if isinstance(token, str) and token.isdigit():
+            index += 1
+            if index < len(tree) and isinstance(tree[index], str) and tree[index].upper() == 'FETCH':
+                index += 1
+            if index < len(tree) and isinstance(tree[index], list):
+                results.append((token, _pairs_to_dict(tree[index])))
+                index += 1
+            continue
+        index += 1
+    return results
+
+
+def _pairs_to_dict(items: List[Any]) -> Dict[str, Any]:
+    attributes: Dict[str, Any] = {}
+    for position in range(0, len(items) - 1, 2):
+        name = items[position]
+        if not isinstance(name, str):
+            continue
+        key = name.upper()
+        value = items[position + 1]
+        if key in ('UID', 'RFC822.SIZE', 'MODSEQ'):
+            if isinstance(value, list):
+                value = value[0] if value else None
+            value = _to_int(value)
+        attributes[key] = value
+    return attributes
+
+
+def parse_sequence_set(value: Any) -> List[int]:
+    """
+    解析 "41,43:116" 形式的序列集合（例如 VANISHED 响应中的UID集合）
+
+    Returns:
+        List[int]: 升序排列的编号列表，无法解析的部分被忽略
+    """
+    numbers = set()
+    for item in _as_text(value).replace('(EARLIER)', '').strip().split(','):
+        first, _, last = item.strip().partition(':')
+        start, end = _to_int(first), _to_int(last) if last else _to_int(first)
+        if start is None or end is None:
+            continue
+        if start > end:
+            start, end = end, start
+        numbers.update(range(start, end + 1))
+    return sorted(numbers)
+
+
+def format_sequence_set(numbers: Iterable[int]) -> str:
+    """把编号压缩为 "1:40,52,60:99" 形式的序列集合，是 parse_sequence_set 的逆操作"""
+    return ','.join(_sequence_ranges(numbers))
+
+
+def split_sequence_set(numbers: Iterable[int], max_length: int) -> List[str]:
+    """
+    压缩编号后拆分为多个序列集合，每个集合的长度不超过max_length（单个区间更长时除外）
+
+    用于把大批UID分成几条命令，避免命令行超过服务器的长度限制。
+    """
+    chunks = []
+    current = ''
+    for item in _sequence_ranges(numbers):
+        if current and len(current) + 1 + len(item) > max_length:
+            chunks.append(current)
+            current = item
+        else:
+            current = f'{current},{item}' if current else item
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _sequence_ranges(numbers: Iterable[int]) -> List[str]:
+    """升序的连续区间，例如 [1, 2, 3, 7] -> ['1:3', '7']"""
+    ranges = []
+    start = end = None
+    for number in sorted(set(numbers)):
+        if end is not None and number == end + 1:
+            end = number
+            continue
+        if start is not None:
+            ranges.append(f'{start}:{end}' if end > start else str(start))
+        start = end = number
+    if start is not None:
+        ranges.append(f'{start}:{end}' if end > start else str(start))
+    return ranges
+
+
+def parse_list_response(value: Any) -> Optional[Tuple[List[str], str]]:
+    """
+    解析一条LIST响应（不含 "* LIST "）
+
+    例如 b'(\\HasNoChildren \\Sent) "/" "Sent Items"' -> (['\\HasNoChildren', '\\Sent'], 'Sent Items')
+
+    Returns:
+        Optional[Tuple[List[str], str]]: (文件夹属性, 文件夹名称)，无法解析时返回None
+    """
+    match = _LIST_RESPONSE.match(_as_text(value).strip())
+    if not match:
+        return None
+    return match.group('flags').split(), _mailbox_name(match.group('name'))
+
+
+def parse_status_response(value: Any) -> Optional[Tuple[str, Dict[str, int]]]:
+    """
+    解析一条STATUS响应（不含 "* STATUS "）
+
+    例如 b'"Sent Items" (MESSAGES 12 UNSEEN 3)' -> ('Sent Items', {'MESSAGES': 12, 'UNSEEN': 3})
+
+    Returns:
+        Optional[Tuple[str, Dict[str, int]]]: (文件夹名称, 状态项)，无法解析时返回None
+    """
+    match = _STATUS_RESPONSE.match(_as_text(value).strip())
+    if not match:
+        return None
+    tokens = match.group('items').split()
+    items = {}
+    for name, number in zip(tokens[::2], tokens[1::2]):
+        if number.isdigit():
+            items[name.upper()] = int(number)
+    return _mailbox_name(match.group('name')), items
+
+
+def _mailbox_name(value: str) -> str:
+    """去掉文件夹名称的引号和转义"""
+    name = value.strip()
+    if len(name) >= 2 and name[0] == name[-1] == '"':
+        name = re.sub(r'\\(.)', r'\1', name[1:-1])
+    return name
+
+
+def parse_partial_results(value: Any) -> List[int]:
+    """
+    取出ESEARCH响应中 PARTIAL (<范围> <编号集合>) 的编号（RFC 9394）
+
+    例如 b'(TAG "M0003") UID PARTIAL (1:3 105,103:102)' -> [105, 103, 102]。
+    SORT的结果按排序顺序给出，因此保持原有顺序展开，不排序也不去重。
+
+    Returns:
+        List[int]: 编号列表，没有匹配的邮件（NIL）或无法解析时为空
+    """
+    match = _PARTIAL_RESULT.search(_as_text(value))
+    if not match:
+        return []
+    numbers = []
+    for item in match.group('set').split(','):
+        first, _, last = item.partition(':')
+        start, end = _to_int(first), _to_int(last) if last else _to_int(first)
+        if start is None or end is None:
+            continue
+        step = 1 if end >= start else -1
+        numbers.extend(range(start, end + step, step))
+    return numbers
+
+
+def get_body_section(attributes: Dict[str, Any], section: str) -> Optional[bytes]:
+    """
+    从FETCH数据项中取出 BODY[<section>] 的内容
+
+    服务器返回的section名称不含 .PEEK，可能对字段名加引号，并可能附带 <origin>，
+    因此按前缀匹配，例如 section="HEADER.FIELDS" 可匹配
+    ``BODY[HEADER.FIELDS ("DATE" "FROM")]``，section="2" 可匹配 ``BODY[2]<0>``。
+    """
+    prefix = f"BODY[{section.upper()}"
+    for key, value in attributes.items():
+        # 前缀之后必须是 ']' 或空格，避免 "2" 匹配到 "2.1"
+        if key.startswith(prefix) and key[len(prefix):len(prefix) + 1] in (']', ' '):
+            if isinstance(value, str):
+                return value.encode('utf-8')
+            return value
+    return None
+
+
+def _as_text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def parse_internaldate(value: Any) -> Optional[str]:
+    """将INTERNALDATE（如 "20-Sep-2025 10:00:00 +0800"）转换为ISO格式"""
+    text = _as_text(value).strip()
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text, '%d-%b-%Y %H:%M:%S %z').isoformat()
+    except ValueError:
+        return None
+
+
+def parse_envelope(envelope: Any) -> Dict[str, Any]:
+    """
+    解析ENVELOPE结构
+
+    Returns:
+        Dict: 包含 date、subject、from、sender、reply_to、to、cc、bcc、
+        in_reply_to、message_id 字段，地址字段为 "显示名 <邮箱>" 字符串列表
+    """
+    if not isinstance(envelope, list):
+        envelope = []
+    fields = list(envelope) + [None] * (10 - len(envelope))
+
+    return {
+        'date': _as_text(fields[0]),
+        'subject': decode_email_header(_as_text(fields[1])),
+        'from': _parse_address_list(fields[2]),
+        'sender': _parse_address_list(fields[3]),
+        'reply_to': _parse_address_list(fields[4]),
+        'to': _parse_address_list(fields[5]),
+        'cc': _parse_address_list(fields[6]),
+        'bcc': _parse_address_list(fields[7]),
+        'in_reply_to': _as_text(fields[8]),
+        'message_id': _as_text(fields[9]),
+    }
+
+
+def _parse_address_list(addresses: Any) -> List[str]:
+    result = []
+    if not isinstance(addresses, list):
+        return result
+    for address in addresses:
+        if not isinstance(address, list) or len(address) < 4:
+            continue
+        name = decode_email_header(_as_text(address[0]))
+        mailbox = _as_text(address[2])
+        host = _as_text(address[3])
+        # 组地址语法的起止标记没有host
+        if not host:
+            continue
+        email_address = f"{mailbox}@{host}"
+        result.append(f"{name} <{email_address}>" if name else email_address)
+    return result
+
+
+@dataclass
+class BodyPart:
+    """
+    BODYSTRUCTURE中的单个MIME部分
+
+    Attributes:
+        part: IMAP部分编号，例如 "1"、"2.1"
+        content_type: MIME类型，例如 "application/pdf"
+        params: Content-Type参数
+        encoding: Content-Transfer-Encoding
+        size: 编码后的大小（字节）
+        disposition: Content-Disposition类型（可选）
+        disposition_params: Content-Disposition参数
+        children: 子部分（multipart时）
+    """
+    part: str
+    content_type: str
+    params: Dict[str, str] = field(default_factory=dict)
+    encoding: str = '7bit'
+    size: int = 0
+    disposition: Optional[str] = None
+    disposition_params: Dict[str, str] = field(default_factory=dict)
+    children: List['BodyPart'] = field(default_factory=list)
+
+    @property
+    def is_multipart(self) -> bool:
+        return self.content_type.startswith('multipart/')
+
+    @property
+    def filename(self) -> Optional[str]:
+        """按Content-Disposition、Content-Type的顺序查找文件名"""
+        for params in (self.disposition_params, self.params):
+            for key in ('filename', 'name'):
+                if params.get(key):
+                    return decode_email_header(params[key])
+        return None
+
+    @property
+    def decoded_size(self) -> int:
+        """根据编码估算解码后的大小，无需下载部分内容"""
+        return estimate_decoded_size(self.size, self.encoding)
+
+    def walk(self) -> Iterator['BodyPart']:
+        """深度优先遍历全部部分（含自身）"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def estimate_decoded_size(encoded_size: int, encoding: str) -> int:
+    """
+    根据编码后的大小估算解码后的大小
+
+    base64按每76个字符一行（含CRLF）扣除换行后乘以3/4；
+    quoted-printable等其他编码无法精确估算，直接返回编码大小作为上限。
+    """
+    if encoded_size <= 0:
+        return 0
+    if (encoding or '').lower() == 'base64':
+        line_count = -(-encoded_size // 78)
+        data_chars = max(0, encoded_size - 2 * line_count)
+        return data_chars * 3 // 4
+    return encoded_size
+
+
+def decode_part_payload(data: bytes, encoding: str) -> bytes:
+    """
+    按Content-Transfer-Encoding解码 BODY[<part>] 获取到的部分内容
+
+    也可用于只获取了开头片段的情况（例如 BODY.PEEK[2]<0.700>）：
+    片段可能在编码单元中间截断，base64会丢弃末尾不完整的4字符组。
+    """
+    if not data:
+        return b''
+    encoding = (encoding or '').lower()
+    if encoding == 'base64':
+        compact = b''.join(data.split())
+        compact = compact[:len(compact) - len(compact) % 4]
+        try:
+            return base64.b64decode(compact)
+        except (binascii.Error, ValueError):
+            return b''
+    if encoding == 'quoted-printable':
+        return quopri.decodestring(data)
+    return data
+
+
+class PartDecoder:
+    """
+    增量解码分块获取的部分内容
+
+    每次 feed() 只解码完整的编码单元（base64的4字符组、quoted-printable的整行），
+    剩余部分留到下一块，内存占用与部分大小无关。
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = (encoding or '').lower()
+        self._pending = b''
+
+    def feed(self, data: bytes) -> bytes:
+        if self.encoding == 'base64':
+            compact = self._pending + b''.join(data.split())
+            usable = len(compact) - len(compact) % 4
+            self._pending = compact[usable:]
+            return decode_part_payload(compact[:usable], 'base64')
+        if self.encoding == 'quoted-printable':
+            buffered = self._pending + data
+            cut = buffered.rfind(b'\n') + 1
+            self._pending = buffered[cut:]
+            return quopri.decodestring(buffered[:cut])
+        return data
+
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b''
+        if not pending:
+            return b''
+        if self.encoding == 'base64':
+            # 补齐缺失的填充字符，容忍不规范的结尾
+            return decode_part_payload(pending + b'=' * (-len(pending) % 4), 'base64')
+        return decode_part_payload(pending, self.encoding)
+
+
+def _parse_params(value: Any) -> Dict[str, str]:
+    params: Dict[str, str] = {}
+    if not isinstance(value, list):
+        return params
+    for position in range(0, len(value) - 1, 2):
+        key = _as_text(value[position]).lower()
+        params[key] = _as_text(value[position + 1])
+
+    # RFC 2231 扩展参数（filename*=utf-8''...），只处理单段形式
+    for key in list(params.keys()):
+        if key.endswith('*'):
+            base_key = key[:-1]
+            encoded = params.pop(key)
+            charset, _, rest = encoded.partition("'")
+            _, _, text = rest.partition("'")
+            try:
+                params.setdefault(base_key, unquote(text, encoding=charset or 'utf-8', errors='replace'))
+            except LookupError:
+                params.setdefault(base_key, text)
+    return params
+
+
+def _parse_disposition(value: Any) -> Tuple[Optional[str], Dict[str, str]]:
+    if not isinstance(value, list) or not value:
+        return None, {}
+    disposition = _as_text(value[0]).lower() or None
+    params = _parse_params(value[1]) if len(value) > 1 else {}
+    return disposition, params
+
+
+def parse_bodystructure(structure: Any, part: str = '') -> Optional[BodyPart]:
+    """
+    解析BODYSTRUCTURE结构为BodyPart树
+
+    Args:
+        structure: parse_fetch_response 返回的 BODYSTRUCTURE 值
+        part: 当前部分编号（递归使用）
+
+    Returns:
+        Optional[BodyPart]: 根部分，无法解析时返回None
+    """
+    if not isinstance(structure, list) or not structure:
+        return None
+
+    if isinstance(structure[0], list):
+        # multipart: (子部分)(子部分)... "subtype" [扩展字段]
+        children = []
+        position = 0
+        while position < len(structure) and isinstance(structure[position], list):
+            child_part = f"{part}.{position + 1}" if part else str(position + 1)
+            child = parse_bodystructure(structure[position], child_part)
+            if child:
+                children.append(child)
+            position += 1
+        subtype = _as_text(structure[position]).lower() if position < len(structure) else 'mixed'
+        extension = structure[position + 1:]
+        params = _parse_params(extension[0]) if len(extension) > 0 else {}
+        disposition, disposition_params = (
+            _parse_disposition(extension[1]) if len(extension) > 1 else (None, {})
+        )
+        return BodyPart(
+            part=part,
+            content_type=f"multipart/{subtype}",
+            params=params,
+            disposition=disposition,
+            disposition_params=disposition_params,
+            children=children,
+        )
+
+    fields = list(structure) + [None] * max(0, 7 - len(structure))
+    main_type = _as_text(fields[0]).lower() or 'text'
+    subtype = _as_text(fields[1]).lower() or 'plain'
+    content_type = f"{main_type}/{subtype}"
+
+    # 基本字段之后的扩展字段位置取决于类型
+    if content_type == 'message/rfc822':
+        extension_start = 10
+    elif main_type == 'text':
+        extension_start = 8
+    else:
+        extension_start = 7
+    # 扩展字段顺序: md5 disposition language location
+    disposition_field = structure[extension_start + 1] if len(structure) > extension_start + 1 else None
+    disposition, disposition_params = _parse_disposition(disposition_field)
+
+    return BodyPart(
+        part=part or '1',
+        content_type=content_type,
+        params=_parse_params(fields[2]),
+        encoding=_as_text(fields[5]).lower() or '7bit',
+        size=_to_int(fields[6]) or 0,
+        disposition=disposition,
+        disposition_params=disposition_params,
+    )
+
+
+def find_attachment_parts(root: Optional[BodyPart]) -> List[Tuple[BodyPart, str]]:
+    """
+    从BodyPart树中找出附件部分
+
+    与基于完整邮件解析的附件识别规则保持一致：有文件名或disposition为attachment的
+    非multipart部分视为附件；无文件名的图片附件生成 image.<ext> 文件名；同名附件只保留第一个。
+
+    Returns:
+        List[Tuple[BodyPart, str]]: (部分, 文件名) 列表
+    """
+    attachments: List[Tuple[BodyPart, str]] = []
+    if root is None:
+        return attachments
+
+    seen_filenames = set()
+    for body_part in root.walk():
+        if body_part.is_multipart:
+            continue
+        filename = body_part.filename
+        if not filename and body_part.disposition != 'attachment':
+            continue
+        if not filename and body_part.content_type.startswith('image/'):
+            filename = f"image.{body_part.content_type.split('/')[-1]}"
+        if not filename or filename in seen_filenames:
+            continue
+        seen_filenames.add(filename)
+        attachments.append((body_part, filename))
+    return attachments
+
+
+def find_text_part(root: Optional[BodyPart]) -> Optional[BodyPart]:
+    """
+    从BodyPart树中找出正文部分：优先text/plain，其次text/html，附件不算正文
+
+    Returns:
+        Optional[BodyPart]: 正文部分，没有时返回None
+    """
+    if root is None:
+        return None
+    attachments = {id(body_part) for body_part, _ in find_attachment_parts(root)}
+    candidates = [
+        body_part for body_part in root.walk()
+        if not body_part.is_multipart and id(body_part) not in attachments
+    ]
+    for content_type in ('text/plain', 'text/html'):
+        for body_part in candidates:
+            if body_part.content_type == content_type:
+                return body_part
+    return None
+
+
+def get_message_part(message: Message, part: str) -> Optional[Message]:
+    """
+    按IMAP部分编号（例如 "2"、"1.2"）在已解析的邮件中找到对应的MIME部分
+
+    编号规则与BODYSTRUCTURE相同：非multipart邮件的正文是部分 "1"，
+    message/rfc822 部分的子编号指向被封装邮件的各个部分。
+    """
+    current = message
+    for index in part.split('.'):
+        try:
+            number = int(index)
+        except ValueError:
+            return None
+        if current.get_content_type() == 'message/rfc822' and current.is_multipart():
+            current = current.get_payload(0)
+        if current.is_multipart():
+            children = current.get_payload()
+            if not 1 <= number <= len(children):
+                return None
+            current = children[number - 1]
+        elif number != 1:
+            return None
+    return current
+
+
+def get_part_payload(part: Message) -> bytes:
+    """取出MIME部分解码后的内容，封装的邮件返回其原始字节"""
+    if part.get_content_type() == 'message/rfc822' and part.is_multipart():
+        return part.get_payload(0).as_bytes()
+    return part.get_payload(decode=True) or b''
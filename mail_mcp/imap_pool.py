@@ -0,0 +1,350 @@
+"""
+IMAP connection pool for Mail MCP server
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .errors import NetworkError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MailboxState:
+    """连接上当前选中的邮箱及SELECT/EXAMINE返回的状态"""
+    folder: str
+    readonly: bool = False
+    uidvalidity: Optional[int] = None
+    exists: Optional[int] = None
+    uidnext: Optional[int] = None
+    # 服务器支持CONDSTORE时SELECT返回的HIGHESTMODSEQ
+    highestmodseq: Optional[int] = None
+    # SELECT时UIDNEXT = EXISTS + 1，即序列号n的邮件UID就是n；有邮件删除或新邮件后不再成立
+    uids_contiguous: bool = False
+
+
+@dataclass
+class PooledConnection:
+    """连接池中的一个已认证连接，记录当前选中的邮箱用于亲和分配和避免重复SELECT"""
+    client: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    mailbox: Optional[MailboxState] = None
+    # 最近一次确认连接可用（命令成功或NOOP探测）的时间，None表示未知
+    last_checked: Optional[float] = None
+
+    @property
+    def selected_folder(self) -> Optional[str]:
+        return self.mailbox.folder if self.mailbox else None
+
+
+class IMAPConnectionPool:
+    """
+    有上限的IMAP连接池
+
+    - acquire()/release() 检出和归还连接，优先分配已选中目标文件夹的空闲连接
+    - 空闲超过 idle_timeout 的连接被关闭，存活超过 max_age 的连接在归还或检出时回收
+    - 连接数达到上限时按先来先到排队等待，超过 acquire_timeout 抛出 NetworkError
+    - start_keepalive() 启动后台任务，对空闲超过 health_check_interval 的连接发送探测，
+      提前淘汰失效连接，检出时不再需要探测
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        max_size: int = 4,
+        idle_timeout: float = 300,
+        max_age: float = 3600,
+        acquire_timeout: float = 30,
+        closer: Optional[Callable[[Any], Awaitable[None]]] = None,
+        is_alive: Optional[Callable[[Any], bool]] = None,
+        health_check_interval: float = 60
+    ):
+        self._factory = factory
+        self._closer = closer
+        self._is_alive = is_alive
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._probe: Optional[Callable[[Any], Awaitable[Any]]] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._idle: List[PooledConnection] = []
+        self._size = 0
+        self._condition = asyncio.Condition()
+        self.closed = False
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'affinity_hits': 0,
+            'evicted_idle': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'keepalive_probes': 0
+        }
+
+    @property
+    def size(self) -> int:
+        """当前连接总数（包括正在建立和已检出的连接）"""
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def adopt(self, client: Any):
+        """把已经建立好的连接放入池中"""
+        self._idle.append(PooledConnection(client, last_checked=time.monotonic()))
+        self._size += 1
+
+    async def open_dedicated(self) -> PooledConnection:
+        """
+        建立一个不计入连接池容量、也不会被 acquire() 分配的专用连接
+
+        用于长时间占用连接的任务（例如IDLE监听），使用完毕后调用 close_dedicated()
+        """
+        if self.closed:
+            raise NetworkError("IMAP connection pool is closed")
+        client = await self._factory()
+        self.stats['created'] += 1
+        return PooledConnection(client, last_checked=time.monotonic())
+
+    async def close_dedicated(self, pooled: PooledConnection):
+        """关闭 open_dedicated() 建立的连接"""
+        await self._close(pooled)
+
+    async def acquire(self, folder: Optional[str] = None) -> PooledConnection:
+        """
+        检出一个连接
+
+        Args:
+            folder: 即将操作的文件夹，有已选中该文件夹的空闲连接时优先使用
+
+        Returns:
+            PooledConnection: 检出的连接，使用完毕后必须调用 release()
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.acquire_timeout
+        to_close: List[PooledConnection] = []
+
+        try:
+            async with self._condition:
+                while True:
+                    if self.closed:
+                        raise NetworkError("IMAP connection pool is closed")
+
+                    to_close.extend(self._collect_expired())
+
+                    pooled = self._take_idle(folder)
+                    if pooled is not None:
+                        return pooled
+
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise NetworkError(
+                            "Timed out waiting for an IMAP connection",
+                            details={'pool_size': self.max_size, 'timeout': self.acquire_timeout}
+                        )
+                    self.stats['waits'] += 1
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            for expired in to_close:
+                await self._close(expired)
+
+        # 在锁外建立新连接，避免阻塞其他检出和归还
+        try:
+            client = await self._factory()
+        except BaseException:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self.stats['created'] += 1
+        return PooledConnection(client, last_checked=time.monotonic())
+
+    async def release(self, pooled: PooledConnection, discard: bool = False):
+        """
+        归还连接
+
+        Args:
+            pooled: acquire() 返回的连接
+            discard: 为True时直接关闭连接（例如发生了协议错误）
+        """
+        now = time.monotonic()
+        keep = (
+            not discard
+            and not self.closed
+            and now - pooled.created_at < self.max_age
+            and self._alive(pooled)
+        )
+
+        async with self._condition:
+            if keep:
+                pooled.last_used = now
+                pooled.last_checked = now
+                self._idle.append(pooled)
+            else:
+                self._size -= 1
+                if discard or not self._alive(pooled):
+                    self.stats['discarded'] += 1
+                elif not self.closed:
+                    self.stats['recycled'] += 1
+            self._condition.notify()
+
+        if not keep:
+            await self._close(pooled)
+
+    def start_keepalive(self, probe: Callable[[Any], Awaitable[Any]]):
+        """
+        启动后台保活任务
+
+        Args:
+            probe: 探测函数（例如发送NOOP），抛出异常表示连接失效；
+                返回真值表示探测收到了邮箱变化的通知，连接上记录的邮箱状态已过期
+        """
+        self._probe = probe
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+
+    async def _keepalive_loop(self):
+        while not self.closed:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.keepalive_once()
+            except Exception as e:
+                logger.warning(f"IMAP keepalive failed: {e}")
+
+    async def keepalive_once(self):
+        """
+        探测所有超过 health_check_interval 未确认可用的空闲连接，并关闭过期连接
+
+        探测报告邮箱状态已过期的连接清除记录的邮箱，下次使用时重新SELECT，
+        亲和分配不会再按过期的状态复用它。
+        """
+        now = time.monotonic()
+        async with self._condition:
+            to_close = self._collect_expired()
+            stale = [
+                pooled for pooled in self._idle
+                if pooled.last_checked is None or now - pooled.last_checked >= self.health_check_interval
+            ]
+            # 探测期间从空闲列表取出，避免被同时检出
+            for pooled in stale:
+                self._idle.remove(pooled)
+
+        for pooled in to_close:
+            await self._close(pooled)
+
+        for pooled in stale:
+            self.stats['keepalive_probes'] += 1
+            mailbox_changed = False
+            try:
+                if self._probe is not None:
+                    mailbox_changed = bool(await self._probe(pooled.client))
+                healthy = self._alive(pooled)
+            except Exception:
+                healthy = False
+
+            async with self._condition:
+                if healthy and not self.closed:
+                    pooled.last_checked = time.monotonic()
+                    if mailbox_changed:
+                        pooled.mailbox = None
+                    # 探测不算使用，放在最久未用的一端，不影响空闲回收
+                    self._idle.insert(0, pooled)
+                else:
+                    self._size -= 1
+                    if not healthy:
+                        self.stats['discarded'] += 1
+                self._condition.notify()
+
+            if not healthy or self.closed:
+                await self._close(pooled)
+
+    async def close(self):
+        """关闭连接池和所有空闲连接，已检出的连接在归还时关闭"""
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        async with self._condition:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            await self._close(pooled)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['size'] = self._size
+        stats['idle'] = len(self._idle)
+        stats['in_use'] = self._size - len(self._idle)
+        stats['max_size'] = self.max_size
+        return stats
+
+    def _take_idle(self, folder: Optional[str]) -> Optional[PooledConnection]:
+        if not self._idle:
+            return None
+
+        chosen = None
+        if folder is not None:
+            for pooled in reversed(self._idle):
+                if pooled.selected_folder == folder:
+                    chosen = pooled
+                    self.stats['affinity_hits'] += 1
+                    break
+        if chosen is None:
+            # 最近使用的连接最可能仍然有效，也让其余连接自然空闲过期
+            chosen = self._idle[-1]
+
+        self._idle.remove(chosen)
+        self.stats['reused'] += 1
+        return chosen
+
+    def _collect_expired(self) -> List[PooledConnection]:
+        now = time.monotonic()
+        expired = []
+        for pooled in list(self._idle):
+            if now - pooled.created_at >= self.max_age:
+                self.stats['recycled'] += 1
+            elif now - pooled.last_used >= self.idle_timeout:
+                self.stats['evicted_idle'] += 1
+            elif not self._alive(pooled):
+                self.stats['discarded'] += 1
+            else:
+                continue
+            self._idle.remove(pooled)
+            self._size -= 1
+            expired.append(pooled)
+        return expired
+
+    def _alive(self, pooled: PooledConnection) -> bool:
+        if self._is_alive is None:
+            return True
+        try:
+            return bool(self._is_alive(pooled.client))
+        except Exception:
+            return False
+
+    async def _close(self, pooled: PooledConnection):
+        if self._closer is None:
+            return
+        try:
+            await self._closer(pooled.client)
+        except Exception:
+            pass
@@ -3,16 +3,56 @@ IMAP service implementation for Mail MCP server
 """
 
 import asyncio
+import contextvars
+import functools
+import heapq
+import html
 import imaplib
+import inspect
 import email
+import os
+import re
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
 from datetime import datetime
 from email import policy
-from typing import List, Optional, Dict, Any
+from email.parser import BytesHeaderParser
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Set, Tuple, Union
 import socket
+import sqlite3
 import ssl
 
 from .config import Config
-from .models import EmailMessage, EmailAttachment, EmailSearchCriteria
+from .errors import NetworkError
+from .imap_client import AsyncIMAPClient, new_transfer_stats
+from .imap_idle import IDLE_REISSUE_LIMIT, FolderMirror, parse_notification
+from .imap_pool import IMAPConnectionPool, MailboxState, PooledConnection
+from .mime_stream import ScannedAttachment, find_part, scan_message
+from .memory_cache import DEFAULT_MEMORY_BUDGET, CachedMessage, MessageMemoryCache
+from .message_cache import CACHE_FILENAME, MessageCache
+from .raw_store import DEFAULT_RAW_STORE_BUDGET, RAW_STORE_DIRNAME, RawMessageStore
+from .cursor import UID_LIMIT, PageCursor, query_fingerprint
+from .models import EmailMessage, EmailAttachment, EmailSummary, EmailSearchCriteria, FolderStatus, MessageKey
+from .imap_parser import (
+    BodyPart,
+    PartDecoder,
+    parse_fetch_response,
+    get_body_section,
+    parse_internaldate,
+    parse_bodystructure,
+    parse_sequence_set,
+    split_sequence_set,
+    parse_partial_results,
+    parse_list_response,
+    parse_status_response,
+    find_attachment_parts,
+    find_text_part,
+    get_message_part,
+    get_part_payload,
+    decode_part_payload
+)
 from .utils import (
     decode_email_header,
     parse_email_addresses,
@@ -20,6 +60,82 @@ from .utils import (
 )
 
 
+# 可能是嵌入邮件（回复/转发原文）的.eml附件类型，以及检查时读取的字节数
+EMBEDDED_EMAIL_CONTENT_TYPES = ('message/rfc822', 'text/plain', 'application/octet-stream')
+EMBEDDED_EMAIL_PEEK_BYTES = 700
+
+# 流式下载附件时每次 BODY.PEEK[<part>]<offset.length> 获取的编码字节数
+ATTACHMENT_CHUNK_SIZE = 512 * 1024
+
+# 邮件摘要需要的邮件头字段
+SUMMARY_HEADER_FIELDS = ('DATE', 'FROM', 'TO', 'CC', 'SUBJECT', 'MESSAGE-ID')
+
+# 列表/搜索时一次批量FETCH的数据项，只下载邮件头，不下载正文
+SUMMARY_FETCH_ITEMS = (
+    f"(UID FLAGS RFC822.SIZE INTERNALDATE "
+    f"BODY.PEEK[HEADER.FIELDS ({' '.join(SUMMARY_HEADER_FIELDS)})] BODYSTRUCTURE)"
+)
+
+# 增量同步时最多预取的新邮件摘要数，其余的在列出时按需获取
+SYNC_PREFETCH_LIMIT = 200
+
+# 补齐全文索引时每条 UID FETCH 获取的邮件摘要数
+INDEX_FETCH_BATCH = 500
+
+# 每次补齐索引时最多为多少封邮件获取正文开头写入索引，以及获取的字节数
+INDEX_BODY_BATCH = 200
+INDEX_BODY_PEEK_BYTES = 8192
+
+# 不支持CONDSTORE时，上次对账后多少秒内认为索引中的标志仍然可信
+INDEX_RECONCILE_INTERVAL = 300
+
+# 文件夹概况获取的STATUS项，服务器支持CONDSTORE时再加上HIGHESTMODSEQ
+FOLDER_STATUS_ITEMS = ('MESSAGES', 'UNSEEN', 'UIDNEXT')
+
+# 文件夹概况缓存的最长时间（秒）；IDLE只监听一个文件夹，其他客户端对别的文件夹的修改不会通知
+FOLDER_OVERVIEW_MAX_AGE = 60
+
+# 会改变文件夹邮件数或未读数的命令，执行后文件夹概况缓存失效
+MAILBOX_CHANGING_COMMANDS = frozenset(('STORE', 'COPY', 'MOVE', 'EXPUNGE', 'APPEND', 'CREATE', 'DELETE', 'RENAME'))
+
+# 批量修改标志时单条命令中UID集合的最大长度（RFC 7162建议服务器至少接受8192字节的命令行）
+UID_SET_MAX_LENGTH = 4000
+
+# 可以省略反斜杠的系统标志，其余标志按自定义关键字处理
+SYSTEM_FLAGS = {'seen': '\\Seen', 'flagged': '\\Flagged', 'answered': '\\Answered'}
+
+# 跨文件夹搜索的默认并发数和整体超时（秒）
+DEFAULT_SEARCH_CONCURRENCY = 4
+DEFAULT_SEARCH_TIMEOUT = 30
+
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+# 自定义关键字是IMAP atom，不能包含空白、括号、引号、通配符等字符
+_KEYWORD = re.compile(r'^[^\s(){%*"\\\]\x00-\x1f\x7f]+$')
+
+
+def _uses_connection(method):
+    """
+    装饰器：方法执行期间为当前任务检出一个IMAP连接
+
+    方法的 folder 参数（或 criteria.folder）用于选择已选中该文件夹的连接。
+    嵌套调用复用外层已检出的连接。
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        folder = bound.arguments.get('folder')
+        if folder is None and 'criteria' in bound.arguments:
+            folder = getattr(bound.arguments['criteria'], 'folder', None)
+        async with self._use_connection(folder):
+            return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class IMAPService:
     """
     IMAP服务类，用于邮件收件箱操作
@@ -29,9 +145,18 @@ class IMAPService:
 
     def __init__(self, config: Config):
         self.config = config
-        self.connection: Optional[imaplib.IMAP4_SSL] = None
+        self._connection: Optional[Union[imaplib.IMAP4, AsyncIMAPClient]] = None
+        self._pool: Optional[IMAPConnectionPool] = None
+        self._current_connection: contextvars.ContextVar[Optional[PooledConnection]] = (
+            contextvars.ContextVar(f'imap_connection_{id(self)}', default=None)
+        )
+        self._operation_lock = asyncio.Lock()
+        # 没有连接池时主连接的选中邮箱状态，跨操作保留
+        self._primary_slot = PooledConnection(client=None)
         self.connected = False
         self.connection_timeout = 30
+        # 连接在该时间（秒）内有过成功的命令时视为健康，不再发送NOOP探测
+        self.health_check_interval = 60
         self.max_retries = 3
         self.retry_delay = 1
         self.last_connection_attempt: Optional[datetime] = None
@@ -43,6 +168,214 @@ class IMAPService:
             'connection_uptime': 0
         }
         self._connection_lock = asyncio.Lock()
+        self._cache = self._create_cache()
+        self._messages = MessageMemoryCache(self._memory_cache_budget())
+        self._raw_store = self._create_raw_store()
+        # IDLE监听任务及其维护的文件夹内存镜像
+        self._mirror: Optional[FolderMirror] = None
+        self._idle_task: Optional[asyncio.Task] = None
+        self.idle_stats = {
+            'mode': None,
+            'cycles': 0,
+            'notifications': 0,
+            'restarts': 0
+        }
+        # 所有asyncio连接累计的传输字节数
+        self.transfer_stats = new_transfer_stats()
+        # 后台补齐全文索引的任务，以及不支持CONDSTORE时各文件夹上次对账标志的时间
+        self._index_tasks: Dict[str, asyncio.Task] = {}
+        self._index_reconciled: Dict[str, float] = {}
+        # 文件夹概况缓存 (获取时间, 概况)；版本号在每次失效时增加，避免获取期间的变化被覆盖
+        self._folder_overview: Optional[Tuple[float, List[FolderStatus]]] = None
+        self._folder_overview_version = 0
+
+    def _create_cache(self) -> Optional[MessageCache]:
+        """在配置的缓存目录下打开邮件元数据缓存，未配置或无法打开时不使用缓存"""
+        cache_dir = getattr(self.config, 'cache_dir', None)
+        if not isinstance(cache_dir, str) or not cache_dir:
+            return None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            return MessageCache(os.path.join(cache_dir, CACHE_FILENAME))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Failed to open message cache in {cache_dir}: {e}")
+            return None
+
+    def _create_raw_store(self) -> Optional[RawMessageStore]:
+        """在缓存目录下打开原始邮件存储，未配置缓存目录时不使用"""
+        cache_dir = getattr(self.config, 'cache_dir', None)
+        if not isinstance(cache_dir, str) or not cache_dir:
+            return None
+        budget = getattr(self.config, 'raw_store_bytes', None)
+        try:
+            return RawMessageStore(
+                os.path.join(cache_dir, RAW_STORE_DIRNAME),
+                budget if isinstance(budget, int) else DEFAULT_RAW_STORE_BUDGET
+            )
+        except OSError as e:
+            print(f"Failed to open raw message store in {cache_dir}: {e}")
+            return None
+
+    def _memory_cache_budget(self) -> int:
+        budget = getattr(self.config, 'memory_cache_bytes', None)
+        return budget if isinstance(budget, int) else DEFAULT_MEMORY_BUDGET
+
+    def _account_key(self) -> str:
+        """缓存中区分不同账户的键"""
+        return f"{self.config.imap.username}@{self.config.imap.host}"
+
+    @property
+    def connection(self) -> Optional[Union[imaplib.IMAP4, AsyncIMAPClient]]:
+        """
+        当前任务使用的连接：检出了池中连接时返回该连接，否则返回主连接
+
+        有连接池时主连接已交给连接池管理，可能正被其他任务使用，
+        没有检出连接的代码得到None，而不是与其他任务共用同一个连接。
+        """
+        pooled = self._current_connection.get()
+        if pooled is not None and pooled.client is not None:
+            return pooled.client
+        if self._pool is not None:
+            return None
+        return self._connection
+
+    @connection.setter
+    def connection(self, value: Optional[Union[imaplib.IMAP4, AsyncIMAPClient]]):
+        self._connection = value
+        # 新连接没有选中任何邮箱，健康状态未知
+        self._primary_slot.mailbox = None
+        self._primary_slot.last_checked = None
+
+    @property
+    def mailbox_state(self) -> Optional[MailboxState]:
+        """当前任务所用连接上选中的邮箱状态（UIDVALIDITY/EXISTS/UIDNEXT）"""
+        slot = self._current_connection.get()
+        return slot.mailbox if slot is not None else self._primary_slot.mailbox
+
+    @asynccontextmanager
+    async def _use_connection(self, folder: Optional[str] = None):
+        """
+        为当前操作独占一个连接
+        
+        有连接池时从池中检出（优先已选中 folder 的连接），操作结束后归还；
+        没有连接池时（imaplib后端）用锁串行化对主连接的访问。
+        """
+        if self._current_connection.get() is not None:
+            yield
+            return
+
+        # 先建立连接，asyncio后端在连接成功后才会创建连接池
+        if not self.connected:
+            await self.connect()
+
+        if self._pool is None:
+            async with self._operation_lock:
+                token = self._current_connection.set(self._primary_slot)
+                try:
+                    yield
+                finally:
+                    self._current_connection.reset(token)
+            return
+        
+        pooled = await self._pool.acquire(folder)
+        token = self._current_connection.set(pooled)
+        discard = False
+        try:
+            yield
+        except asyncio.CancelledError:
+            # 命令可能只发送了一半或响应还没读完，连接不能再给其他操作使用
+            discard = True
+            raise
+        finally:
+            self._current_connection.reset(token)
+            await self._pool.release(pooled, discard=discard)
+
+    def _create_pool(self) -> IMAPConnectionPool:
+        """按配置创建连接池"""
+        imap_config = self.config.imap
+        return IMAPConnectionPool(
+            factory=self._open_pooled_connection,
+            max_size=imap_config.pool_size,
+            idle_timeout=imap_config.pool_idle_timeout,
+            max_age=imap_config.pool_max_age,
+            acquire_timeout=imap_config.pool_acquire_timeout,
+            closer=self._close_pooled_connection,
+            is_alive=lambda client: client.is_open,
+            health_check_interval=imap_config.health_check_interval
+        )
+
+    def _create_ssl_context(self) -> ssl.SSLContext:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE  # 兼容自签名证书
+        return context
+
+    async def _create_async_client(self, context: ssl.SSLContext) -> AsyncIMAPClient:
+        """建立asyncio连接（未认证）"""
+        client = AsyncIMAPClient(
+            self.config.imap.host,
+            self.config.imap.port,
+            use_ssl=self.config.imap.use_ssl,
+            ssl_context=context,
+            timeout=self.connection_timeout,
+            stats=self.transfer_stats
+        )
+        await client.connect()
+        
+        if not self.config.imap.use_ssl:
+            try:
+                await client.starttls(ssl_context=context)
+            except Exception:
+                # 某些服务器不支持STARTTLS，继续使用明文连接
+                pass
+        return client
+
+    async def _open_pooled_connection(self) -> AsyncIMAPClient:
+        """连接池工厂：建立并认证一个新连接"""
+        client = await self._create_async_client(self._create_ssl_context())
+        try:
+            await client.login(self.config.imap.username, self.config.imap.password)
+        except Exception:
+            await client.logout()
+            raise
+        await self._enable_extensions(client)
+        self.connection_stats['total_connections'] += 1
+        self.connection_stats['successful_connections'] += 1
+        return client
+
+    async def _enable_extensions(self, client: AsyncIMAPClient):
+        """
+        认证后启用QRESYNC（ENABLE只能在选中邮箱之前发送）和COMPRESS=DEFLATE，不支持时忽略
+        """
+        try:
+            # 很多服务器在认证后才公布CONDSTORE/QRESYNC
+            await client.capability()
+            if 'QRESYNC' in client.capabilities:
+                await client.enable('QRESYNC')
+        except (client.error, OSError) as e:
+            print(f"Failed to enable QRESYNC: {e}")
+
+        if self.config.imap.compress and 'COMPRESS=DEFLATE' in client.capabilities:
+            try:
+                await client.compress()
+            except (client.error, OSError) as e:
+                print(f"Failed to enable COMPRESS=DEFLATE: {e}")
+
+    async def _close_pooled_connection(self, client: AsyncIMAPClient):
+        await client.logout()
+
+    async def _probe_connection(self, client: AsyncIMAPClient) -> bool:
+        """
+        连接池保活探测，返回连接上选中邮箱的状态是否已过期
+
+        探测的NOOP不经过 _imap，带回的EXISTS/EXPUNGE/VANISHED不会更新MailboxState；
+        收到这些通知时由连接池清除该连接记录的邮箱，下次使用时重新SELECT。
+        """
+        status, _ = await client.noop()
+        if status != 'OK':
+            raise client.error(f"NOOP failed: {status}")
+        responses = client.untagged_responses
+        return any(responses.get(name) for name in ('EXISTS', 'EXPUNGE', 'VANISHED'))
 
     async def connect(self) -> bool:
         """
@@ -68,11 +401,12 @@ class IMAPService:
                 await self._cleanup_connection()
 
                 # 创建SSL上下文
-                context = ssl.create_default_context()
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE  # 兼容自签名证书
+                context = self._create_ssl_context()
 
-                if self.config.imap.use_ssl:
+                if self.config.imap.backend == 'asyncio':
+                    # asyncio连接，等待网络时不阻塞事件循环
+                    self.connection = await self._create_async_client(context)
+                elif self.config.imap.use_ssl:
                     # 使用SSL连接
                     self.connection = imaplib.IMAP4_SSL(
                         self.config.imap.host,
@@ -96,11 +430,18 @@ class IMAPService:
                         pass
 
                 # 测试连接
-                self.connection.noop()
+                await self._imap('noop')
 
                 # 认证
                 success = await self._authenticate()
                 if success:
+                    if self.config.imap.backend == 'asyncio':
+                        await self._enable_extensions(self.connection)
+                        # 已认证的主连接作为连接池的第一个连接
+                        self._pool = self._create_pool()
+                        self._pool.adopt(self.connection)
+                        self._pool.start_keepalive(self._probe_connection)
+                        self._start_idle_listener()
                     self.connected = True
                     self.connection_stats['successful_connections'] += 1
                     self.connection_stats['last_error'] = None
@@ -144,6 +485,265 @@ class IMAPService:
         print(f"IMAP连接失败，已尝试 {self.max_retries} 次")
         return False
 
+    async def _imap(self, command: str, *args: Any) -> Any:
+        """
+        在当前连接上执行IMAP命令
+        
+        asyncio连接返回协程，直接await；imaplib连接同步返回结果。
+        两种后端的返回值格式相同，调用方无需区分。
+        """
+        try:
+            result = getattr(self.connection, command)(*args)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            # 连接状态未知，下次操作重新SELECT
+            self._set_mailbox_state(None)
+            if isinstance(e, (imaplib.IMAP4.abort, OSError)):
+                # 连接已断开：池中连接会在归还时被丢弃，主连接在下次操作时重连
+                self._current_slot().last_checked = None
+                if self._pool is None:
+                    self.connected = False
+            raise
+        self._current_slot().last_checked = time.monotonic()
+        if command in ('close', 'logout'):
+            self._set_mailbox_state(None)
+        elif command != 'select':
+            # SELECT的EXISTS和UIDVALIDITY属于新文件夹，由select_folder处理
+            self._track_mailbox_changes(command)
+            if command == 'expunge':
+                self._track_expunged(result)
+        if self._changes_mailboxes(command, args):
+            self._invalidate_folder_overview()
+        return result
+
+    @staticmethod
+    def _changes_mailboxes(command: str, args: Tuple[Any, ...]) -> bool:
+        """命令是否可能改变文件夹的邮件数或未读数"""
+        if command == 'pipeline':
+            return any(IMAPService._changes_mailboxes(name.lower(), tuple(rest)) for name, *rest in args[0])
+        if command in ('uid', 'xatom'):
+            return bool(args) and str(args[0]).upper() in MAILBOX_CHANGING_COMMANDS
+        return command.upper() in MAILBOX_CHANGING_COMMANDS
+
+    def _invalidate_folder_overview(self):
+        self._folder_overview = None
+        self._folder_overview_version += 1
+
+    def _current_slot(self) -> PooledConnection:
+        slot = self._current_connection.get()
+        return slot if slot is not None else self._primary_slot
+
+    def _set_mailbox_state(self, state: Optional[MailboxState]):
+        self._current_slot().mailbox = state
+
+    def _untagged_responses(self) -> Dict[str, List[Any]]:
+        responses = getattr(self.connection, 'untagged_responses', None)
+        return responses if isinstance(responses, dict) else {}
+
+    def _untagged_int(self, name: str) -> Optional[int]:
+        values = self._untagged_responses().get(name) or []
+        try:
+            return int(values[-1])
+        except (IndexError, TypeError, ValueError):
+            return None
+
+    def _track_mailbox_changes(self, command: str):
+        """
+        根据命令附带的未标记响应更新选中邮箱状态（新邮件EXISTS、UIDVALIDITY变化）
+
+        其他客户端删除邮件的EXPUNGE/VANISHED通知与EXISTS的先后顺序无法可靠得知，
+        收到时把EXISTS记为未知；EXPUNGE命令自身的结果由 _track_expunged 处理。
+        imaplib会一直保留未标记响应，处理过的EXISTS/EXPUNGE从中取出，不会被之后的命令再次计入。
+        """
+        state = self._current_slot().mailbox
+        if state is None:
+            return
+        uidvalidity = self._untagged_int('UIDVALIDITY')
+        if uidvalidity is not None and state.uidvalidity is not None and uidvalidity != state.uidvalidity:
+            # 邮箱被重建，UID和缓存的状态全部失效
+            self._set_mailbox_state(None)
+            return
+        exists = self._untagged_int('EXISTS')
+        self._untagged_responses().pop('EXISTS', None)
+        if exists is not None and exists != state.exists:
+            state.exists = exists
+            state.uids_contiguous = False
+            self._invalidate_folder_overview()
+        if command != 'expunge' and self._has_unsolicited_expunge():
+            state.exists = None
+            state.uids_contiguous = False
+            self._invalidate_folder_overview()
+
+    def _has_unsolicited_expunge(self) -> bool:
+        """未标记响应中是否有邮件被删除的通知（VANISHED (EARLIER) 是同步结果，不算）"""
+        responses = self._untagged_responses()
+        if any(responses.pop('EXPUNGE', None) or []):
+            return True
+        return any(
+            isinstance(item, bytes) and not item.upper().startswith(b'(EARLIER)')
+            for item in responses.get('VANISHED') or []
+        )
+
+    def _track_expunged(self, result: Any):
+        """EXPUNGE返回被删除邮件的序列号，相应减少选中邮箱的EXISTS"""
+        state = self._current_slot().mailbox
+        if state is None or state.exists is None:
+            return
+        try:
+            status, data = result
+            expunged = [item for item in data or [] if item] if status == 'OK' else []
+        except (TypeError, ValueError):
+            return
+        if expunged:
+            state.exists = max(0, state.exists - len(expunged))
+            state.uids_contiguous = False
+
+    async def _pipeline(self, commands: List[Tuple[Any, ...]]) -> List[Any]:
+        """
+        在当前连接上执行一组互不依赖的命令，返回与commands顺序相同的 (typ, data)
+
+        asyncio连接一次写入全部命令，整组只等待一次往返；imaplib连接逐条执行。
+
+        Args:
+            commands: 命令列表，每项为 (命令名, *参数)，例如 ('UID', 'STORE', '7', '+FLAGS', '\\Seen')
+        """
+        if isinstance(self.connection, AsyncIMAPClient):
+            return await self._imap('pipeline', commands)
+        return [await self._imap(name.lower(), *args) for name, *args in commands]
+
+    async def _uid(self, command: str, *args: Any) -> Any:
+        """执行UID SEARCH/FETCH/STORE命令，参数和结果中的编号都是UID而不是序列号"""
+        return await self._imap('uid', command, *args)
+
+    def _folder_uidvalidity(self, folder: str) -> Optional[int]:
+        """文件夹已在当前连接上选中时返回其UIDVALIDITY"""
+        state = self.mailbox_state
+        return state.uidvalidity if state is not None and state.folder == folder else None
+
+    def _message_key(self, uid: str, folder: str) -> MessageKey:
+        """为选中文件夹中的UID构建稳定标识"""
+        return MessageKey(folder, self._folder_uidvalidity(folder), uid)
+
+    def _memory_key(self, uid: str) -> Optional[MessageKey]:
+        """当前选中文件夹中邮件的内存缓存键，UIDVALIDITY未知时不缓存"""
+        state = self.mailbox_state
+        if state is None or state.uidvalidity is None:
+            return None
+        return MessageKey(state.folder, state.uidvalidity, uid)
+
+    def _raw_store_key(self, key: MessageKey) -> str:
+        return '\0'.join((self._account_key(), key.folder, str(key.uidvalidity), str(key.uid)))
+
+    def _read_raw(self, key: Optional[MessageKey]) -> Optional[bytes]:
+        """从磁盘存储读取原始邮件"""
+        if key is None or self._raw_store is None:
+            return None
+        return self._raw_store.get(self._raw_store_key(key))
+
+    def _write_raw(self, key: Optional[MessageKey], raw: bytes):
+        if key is not None and self._raw_store is not None:
+            self._raw_store.put(self._raw_store_key(key), raw)
+
+    def _cached_part(self, uid: str, body_part: BodyPart, read_store: bool = True) -> Optional[bytes]:
+        """
+        从缓存取出MIME部分解码后的内容
+
+        依次查找内存中单独获取的部分、内存中的整封邮件和磁盘上的原始邮件。
+        原始邮件只按边界找到该部分的字节范围再解码，不解析整封邮件；
+        从磁盘读取时只复制该部分，解码结果放入内存缓存。
+
+        Args:
+            uid: 邮件UID
+            body_part: 要取出的部分
+            read_store: 是否读取磁盘上的原始邮件（分块写入文件时由调用方直接从磁盘解码）
+        """
+        key = self._memory_key(uid)
+        entry = self._messages.get(key)
+        if entry is not None and body_part.part in entry.parts:
+            return entry.parts[body_part.part]
+        if entry is not None and entry.parsed is not None:
+            mime_part = get_message_part(entry.parsed, body_part.part)
+            return get_part_payload(mime_part) if mime_part is not None else None
+
+        if entry is not None and entry.raw is not None:
+            payload = self._decode_raw_part(entry.raw, body_part.part)
+        elif read_store and key is not None and self._raw_store is not None:
+            with self._raw_store.open(self._raw_store_key(key)) as mapped:
+                payload = self._decode_raw_part(mapped, body_part.part) if mapped is not None else None
+        else:
+            payload = None
+        if payload is None:
+            return None
+        entry = entry or CachedMessage()
+        entry.parts[body_part.part] = payload
+        self._messages.put(key, entry)
+        return payload
+
+    @staticmethod
+    def _decode_raw_part(raw: Any, part: str) -> Optional[bytes]:
+        """
+        从原始邮件（bytes或mmap）中取出并解码一个部分
+
+        找不到边界范围时（例如封装的邮件内部的部分）回退到完整解析
+        """
+        located = find_part(raw, part)
+        if located is not None:
+            encoding, start, end = located
+            return decode_part_payload(raw[start:end], encoding)
+        mime_part = get_message_part(email.message_from_bytes(raw[:], policy=policy.default), part)
+        return get_part_payload(mime_part) if mime_part is not None else None
+
+    def _copy_stored_part(self, uid: str, body_part: BodyPart, file_path: str) -> bool:
+        """
+        把磁盘上原始邮件中的MIME部分分块解码到文件
+
+        通过mmap只读取该部分所在的字节范围，每次一块，不复制整封邮件也不解析其他部分。
+        邮件不在磁盘存储中、找不到该部分或写入失败时返回False。
+        """
+        key = self._memory_key(uid)
+        if key is None or self._raw_store is None:
+            return False
+        with self._raw_store.open(self._raw_store_key(key)) as mapped:
+            located = find_part(mapped, body_part.part) if mapped is not None else None
+            if located is None:
+                return False
+            encoding, start, end = located
+            decoder = PartDecoder(encoding)
+
+            def decoded_chunks() -> Iterator[bytes]:
+                for offset in range(start, end, ATTACHMENT_CHUNK_SIZE):
+                    yield decoder.feed(mapped[offset:min(end, offset + ATTACHMENT_CHUNK_SIZE)])
+                yield decoder.flush()
+
+            return self._write_chunks_atomic(file_path, decoded_chunks())
+
+    def _resolve_uid(self, message_id: str, folder: str) -> Optional[str]:
+        """
+        把对外的邮件ID解析为选中文件夹中的UID
+
+        ID携带的UIDVALIDITY与文件夹当前的值不一致时，UID已经失效，返回None
+        """
+        try:
+            key = MessageKey.parse(message_id, folder)
+        except ValueError as e:
+            print(f"Invalid message id {message_id}: {e}")
+            return None
+        current = self._message_key(key.uid, folder).uidvalidity
+        if key.uidvalidity is not None and current is not None and key.uidvalidity != current:
+            print(f"Message id {message_id} is stale: UIDVALIDITY of {folder} changed to {current}")
+            return None
+        return key.uid
+
+    @staticmethod
+    def _fetched_by_uid(msg_data: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """把UID FETCH的响应按UID索引"""
+        return {
+            str(attributes['UID']): attributes
+            for _, attributes in parse_fetch_response(msg_data)
+            if 'UID' in attributes
+        }
+
     async def _authenticate(self) -> bool:
         """
         执行IMAP认证
@@ -152,7 +752,7 @@ class IMAPService:
             bool: 认证是否成功
         """
         try:
-            self.connection.login(self.config.imap.username, self.config.imap.password)
+            await self._imap('login', self.config.imap.username, self.config.imap.password)
             print("IMAP认证成功")
             return True
 
@@ -176,10 +776,19 @@ class IMAPService:
 
     async def _cleanup_connection(self):
         """清理现有连接"""
+        await self._stop_idle_listener()
+        await self._stop_index_backfill()
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+            # 主连接已由连接池关闭
+            self.connection = None
+            self.connected = False
+
         if self.connection:
             try:
-                self.connection.close()
-                self.connection.logout()
+                await self._imap('close')
+                await self._imap('logout')
             except Exception:
                 pass
             finally:
@@ -201,12 +810,27 @@ class IMAPService:
         Returns:
             bool: 连接是否活跃
         """
+        if self._pool is not None:
+            return self.connected and not self._pool.closed
+
         if not self.connected or not self.connection:
             return False
 
+        if isinstance(self.connection, AsyncIMAPClient):
+            # asyncio连接无法在同步方法中发送NOOP，检查底层连接状态
+            if not self.connection.is_open:
+                self.connected = False
+            return self.connected
+
+        # 最近有成功的命令时直接认为连接健康，只有空闲过久才发送NOOP
+        last_checked = self._primary_slot.last_checked
+        if last_checked is not None and time.monotonic() - last_checked < self.health_check_interval:
+            return True
+
         try:
             # 发送NOOP命令测试连接
             self.connection.noop()
+            self._primary_slot.last_checked = time.monotonic()
             return True
         except Exception:
             self.connected = False
@@ -224,6 +848,25 @@ class IMAPService:
         stats['last_connection_attempt'] = (
             self.last_connection_attempt.isoformat() if self.last_connection_attempt else None
         )
+        if self._pool is not None:
+            stats['pool'] = self._pool.get_stats()
+        if self._cache is not None:
+            stats['cache'] = self._cache.get_stats()
+        stats['memory_cache'] = self._messages.get_stats()
+        if self._raw_store is not None:
+            stats['raw_store'] = self._raw_store.get_stats()
+        if self.transfer_stats['wire_bytes_received']:
+            stats['transfer'] = {
+                **self.transfer_stats,
+                'compression_ratio': self.transfer_stats['bytes_received'] / self.transfer_stats['wire_bytes_received']
+            }
+        if self._mirror is not None:
+            stats['idle'] = {
+                **self.idle_stats,
+                'folder': self._mirror.folder,
+                'ready': self._mirror.ready,
+                'unread': len(self._mirror.unseen)
+            }
         stats['success_rate'] = (
             stats['successful_connections'] / stats['total_connections'] * 100
             if stats['total_connections'] > 0 else 0
@@ -270,200 +913,1131 @@ class IMAPService:
 
         return await self._authenticate()
 
+    @_uses_connection
     async def list_folders(self) -> List[str]:
         """List available folders"""
+        return [name for _, name in await self._list_mailboxes()]
+
+    async def get_folder_overview(self, refresh: bool = False) -> List[FolderStatus]:
+        """
+        所有可选中文件夹的邮件数和未读数
+
+        服务器支持LIST-STATUS时一条LIST命令即可返回全部状态；否则先LIST，
+        再把各文件夹的STATUS命令一次性流水线发送，共两次往返。结果缓存到
+        IDLE通知、本服务修改邮件或超过FOLDER_OVERVIEW_MAX_AGE秒为止。
+
+        Args:
+            refresh: 为True时忽略缓存重新获取
+        """
+        cached = self._folder_overview
+        if not refresh and cached is not None and time.monotonic() - cached[0] < FOLDER_OVERVIEW_MAX_AGE:
+            return cached[1]
+
+        version = self._folder_overview_version
+        folders = await self._load_folder_overview()
+        if folders and version == self._folder_overview_version:
+            self._folder_overview = (time.monotonic(), folders)
+        return folders
+
+    @_uses_connection
+    async def _load_folder_overview(self) -> List[FolderStatus]:
+        if not self.connected:
+            await self.connect()
+
+        items = FOLDER_STATUS_ITEMS + (('HIGHESTMODSEQ',) if self._has_capability('CONDSTORE') else ())
+        names = f"({' '.join(items)})"
+        try:
+            if self._has_capability('LIST-STATUS'):
+                # RFC 5819：每个LIST响应后紧跟该文件夹的STATUS响应
+                status, _ = await self._imap('xatom', 'LIST', '""', '"*"', f'RETURN (STATUS {names})')
+                if status != 'OK':
+                    return []
+                responses = self._untagged_responses()
+                mailboxes = [parse_list_response(data) for data in responses.pop('LIST', [])]
+                mailboxes = [mailbox for mailbox in mailboxes if mailbox is not None]
+                status_data = responses.pop('STATUS', [])
+            else:
+                mailboxes = await self._list_mailboxes()
+                selectable = [name for flags, name in mailboxes if self._is_selectable(flags)]
+                results = await self._pipeline([('STATUS', f'"{name}"', names) for name in selectable])
+                status_data = [data for status, response in results if status == 'OK' for data in response]
+        except Exception as e:
+            print(f"Failed to get folder status: {e}")
+            return []
+
+        statuses = dict(filter(None, (parse_status_response(data) for data in status_data if data)))
+        folders = []
+        for flags, name in mailboxes:
+            if not self._is_selectable(flags):
+                continue
+            values = statuses.get(name, {})
+            folders.append(FolderStatus(
+                name=name,
+                messages=values.get('MESSAGES'),
+                unseen=values.get('UNSEEN'),
+                uidnext=values.get('UIDNEXT'),
+                highestmodseq=values.get('HIGHESTMODSEQ'),
+                attributes=flags
+            ))
+        return folders
+
+    @staticmethod
+    def _is_selectable(flags: List[str]) -> bool:
+        """LIST属性中没有 \\Noselect 或 \\NonExistent 的文件夹可以选中"""
+        return not any(flag.lower() in ('\\noselect', '\\nonexistent') for flag in flags)
+
+    @_uses_connection
+    async def _list_mailboxes(self) -> List[Tuple[List[str], str]]:
+        """LIST返回的 (文件夹属性, 文件夹名称) 列表"""
         if not self.connected:
             await self.connect()
 
         try:
-            status, folder_list = self.connection.list()
+            status, folder_list = await self._imap('list')
             if status == 'OK':
-                folders = []
+                mailboxes = []
                 for folder_data in folder_list:
-                    if isinstance(folder_data, bytes):
-                        folder_data = folder_data.decode('utf-8')
                     # Extract folder name from IMAP response
-                    parts = folder_data.split('"')
-                    if len(parts) >= 3:
-                        folders.append(parts[-2])
-                return folders
+                    parsed = parse_list_response(folder_data)
+                    if parsed is not None:
+                        mailboxes.append(parsed)
+                return mailboxes
         except Exception as e:
             print(f"Failed to list folders: {e}")
         return []
 
-    async def select_folder(self, folder: str = "INBOX") -> bool:
-        """Select folder"""
+    @_uses_connection
+    async def select_folder(self, folder: str = "INBOX", readonly: bool = False) -> bool:
+        """
+        Select folder
+        
+        连接上已经选中该文件夹时不再发送命令；只读操作使用EXAMINE，
+        已经以读写方式选中的文件夹也可以直接用于只读操作。
+        
+        Args:
+            folder: 文件夹名称
+            readonly: 是否只读（EXAMINE）
+        """
         if not self.connected:
             await self.connect()
 
+        state = self._current_slot().mailbox
+        if state is not None and state.folder == folder and (readonly or not state.readonly):
+            return True
+
         try:
-            status, _ = self.connection.select(f'"{folder}"')
-            return status == 'OK'
+            args = (f'"{folder}"', True) if readonly else (f'"{folder}"',)
+            status, data = await self._imap('select', *args)
+            if status != 'OK':
+                self._set_mailbox_state(None)
+                return False
+            
+            try:
+                exists = int(data[0])
+            except (IndexError, TypeError, ValueError):
+                exists = None
+            uidnext = self._untagged_int('UIDNEXT')
+            self._set_mailbox_state(MailboxState(
+                folder=folder,
+                readonly=readonly,
+                uidvalidity=self._untagged_int('UIDVALIDITY'),
+                exists=exists,
+                uidnext=uidnext,
+                highestmodseq=self._untagged_int('HIGHESTMODSEQ'),
+                uids_contiguous=exists is not None and uidnext == exists + 1
+            ))
+            self._check_cache_uidvalidity(folder)
+            return True
         except Exception as e:
             print(f"Failed to select folder {folder}: {e}")
             return False
 
-    async def list_messages(self, folder: str = "INBOX", limit: int = 20, offset: int = 0) -> List[EmailMessage]:
-        """List messages in folder with pagination support"""
-        messages = []
+    def _check_cache_uidvalidity(self, folder: str):
+        """把选中文件夹的UIDVALIDITY记入缓存，变化时清除该文件夹的缓存条目"""
+        state = self.mailbox_state
+        if self._cache is None or state is None or state.uidvalidity is None:
+            return
+        try:
+            self._cache.check_uidvalidity(self._account_key(), folder, state.uidvalidity)
+        except sqlite3.Error as e:
+            print(f"Failed to update message cache for {folder}: {e}")
 
-        if not await self.select_folder(folder):
-            return messages
+    @_uses_connection
+    async def sync_folder(self, folder: str = "INBOX") -> Dict[str, Any]:
+        """
+        把文件夹的变化增量同步到本地元数据缓存
+
+        服务器支持CONDSTORE时用 CHANGEDSINCE 只获取上次同步后变化的标志和新邮件，
+        启用QRESYNC时同时通过 VANISHED 获取被删除的UID；否则根据UIDNEXT的差值获取新邮件。
 
+        Args:
+            folder: 文件夹名称
+
+        Returns:
+            Dict: 同步结果，包含同步方式mode以及changed/new/vanished邮件数
+        """
+        if self._cache is None:
+            return {'success': False, 'error': '未启用邮件元数据缓存'}
+        if not await self.select_folder(folder, readonly=True):
+            return {'success': False, 'error': f'无法选择文件夹: {folder}'}
         try:
-            # Search for all messages
-            status, message_ids = self.connection.search(None, 'ALL')
-            if status != 'OK':
-                return messages
+            result = await self._sync_cached_folder(folder)
+        except Exception as e:
+            print(f"Failed to sync folder {folder}: {e}")
+            return {'success': False, 'error': str(e)}
+        result['success'] = True
+        return result
 
-            # Get message IDs (IMAP returns oldest first, so we reverse for newest first)
-            msg_ids = message_ids[0].split()
-            msg_ids.reverse()  # Now newest first
-            total_count = len(msg_ids)
+    async def _sync_cached_folder(self, folder: str) -> Dict[str, Any]:
+        """
+        同步已选中文件夹的缓存
 
-            # Apply pagination
-            start_idx = offset
-            end_idx = min(offset + limit, total_count)
+        Returns:
+            Dict: 同步结果，flags_current为True表示缓存中的标志已是最新，不需要再按页刷新
+        """
+        state = self.mailbox_state
+        account = self._account_key()
+        uidvalidity = state.uidvalidity
+        known = self._cache.get_folder(account, folder) or {}
+        known_uidnext = known.get('uidnext')
+        qresync = self._qresync_enabled()
+        result = {'mode': 'uidnext', 'changed': 0, 'new': 0, 'vanished': 0, 'flags_current': False}
+
+        if state.highestmodseq is not None and (qresync or self._has_capability('CONDSTORE')):
+            result['mode'] = 'qresync' if qresync else 'condstore'
+            known_modseq = known.get('highestmodseq')
+            if known_modseq is None:
+                # 没有同步基线时无法得知缓存中的标志是否过期，清空后按需重新获取
+                self._cache.clear_messages(account, folder)
+                self._cache.update_sync_state(
+                    account, folder, uidnext=state.uidnext, highestmodseq=state.highestmodseq
+                )
+                result['flags_current'] = True
+                return result
+
+            modifiers = f'CHANGEDSINCE {known_modseq}' + (' VANISHED' if qresync else '')
+            status, msg_data = await self._uid('FETCH', '1:*', f'(UID FLAGS) ({modifiers})')
+            if status != 'OK':
+                return result
+            changed = {
+                int(uid): attributes for uid, attributes in self._fetched_by_uid(msg_data).items()
+            }
+            vanished = self._vanished_uids() if qresync else []
+
+            new_uids = sorted(uid for uid in changed if known_uidnext is not None and uid >= known_uidnext)
+            self._cache.update_flags(account, folder, uidvalidity, {
+                uid: [str(flag) for flag in (attributes.get('FLAGS') or [])]
+                for uid, attributes in changed.items()
+            })
+            if vanished:
+                self._cache.remove_messages(account, folder, uidvalidity, vanished)
+            await self._prefetch_summaries(new_uids, folder, uidvalidity)
+
+            highestmodseq = max([known_modseq] + [attributes.get('MODSEQ') or 0 for attributes in changed.values()])
+            uidnext = max([known_uidnext or 0, state.uidnext or 0] + [uid + 1 for uid in changed])
+            self._cache.update_sync_state(account, folder, uidnext=uidnext, highestmodseq=highestmodseq)
+            result.update(
+                changed=len(changed) - len(new_uids),
+                new=len(new_uids),
+                vanished=len(vanished),
+                flags_current=True
+            )
+            return result
+
+        # 不支持CONDSTORE：根据UIDNEXT的差值获取新邮件，标志仍需按页刷新
+        if known_uidnext is not None and state.uidnext is not None and state.uidnext > known_uidnext:
+            status, data = await self._uid('SEARCH', f'UID {known_uidnext}:*')
+            if status == 'OK' and data and data[0]:
+                # "n:*" 在没有更大UID时仍会匹配最后一封邮件
+                new_uids = [int(uid) for uid in data[0].split() if int(uid) >= known_uidnext]
+                await self._prefetch_summaries(new_uids, folder, uidvalidity)
+                result['new'] = len(new_uids)
+        if state.uidnext is not None:
+            self._cache.update_sync_state(account, folder, uidnext=state.uidnext)
+        return result
+
+    async def _prefetch_summaries(self, uids: List[int], folder: str, uidvalidity: int):
+        """把同步发现的新邮件写入缓存，只预取最新的一部分，其余的在列出时按需获取"""
+        uids = sorted(uids)[-SYNC_PREFETCH_LIMIT:]
+        if uids:
+            await self._fetch_and_cache_summaries([str(uid) for uid in uids], folder, uidvalidity)
+
+    def _vanished_uids(self) -> List[int]:
+        """取出QRESYNC的VANISHED响应中被删除的UID"""
+        vanished: List[int] = []
+        for data in self._untagged_responses().pop('VANISHED', []):
+            vanished.extend(parse_sequence_set(data))
+        return vanished
+
+    def _has_capability(self, name: str) -> bool:
+        capabilities = getattr(self.connection, 'capabilities', None)
+        return isinstance(capabilities, (tuple, list, set, frozenset)) and name in capabilities
+
+    def _qresync_enabled(self) -> bool:
+        enabled = getattr(self.connection, 'enabled', None)
+        return isinstance(enabled, set) and 'QRESYNC' in enabled
+
+    def _start_idle_listener(self):
+        """
+        启动IDLE监听任务
 
-            # Ensure indices are valid
-            if start_idx >= total_count or start_idx < 0:
-                return messages
+        监听任务使用连接池之外的专用连接：IDLE期间连接一直被占用，
+        不能是池中（包括主连接）会分配给其他操作的连接。
+        """
+        folder = self.config.imap.idle_folder
+        if not folder or self._pool is None or self._idle_task is not None:
+            return
+        self._mirror = FolderMirror(folder)
+        self._idle_task = asyncio.create_task(self._idle_loop(self._pool, self._mirror))
+
+    async def _stop_idle_listener(self):
+        task, self._idle_task = self._idle_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._mirror = None
 
-            # Get the requested range of messages
-            msg_ids = msg_ids[start_idx:end_idx]
+    async def _idle_loop(self, pool: IMAPConnectionPool, mirror: FolderMirror):
+        """
+        IDLE监听任务：在专用连接上把服务器推送的变化应用到内存镜像和元数据缓存
 
-            # Fetch messages
-            for msg_id in msg_ids:
-                message = await self._get_message_by_id(msg_id.decode(), folder)
-                if message:
-                    messages.append(message)
+        每次IDLE最长持续 idle_interval 秒（不超过29分钟）后重新发送；
+        服务器不支持IDLE时每 poll_interval 秒发送一次NOOP轮询。
+        连接出错或UIDVALIDITY变化时重新建立连接并重建镜像。
+        """
+        while True:
+            pooled = None
+            healthy = True
+            try:
+                pooled = await pool.open_dedicated()
+                self._current_connection.set(pooled)
+                await self._load_mirror(mirror)
+                while pooled.selected_folder == mirror.folder:
+                    notifications = await self._wait_for_changes()
+                    await self._apply_notifications(mirror, notifications)
+            except asyncio.CancelledError:
+                healthy = False
+                raise
+            except Exception as e:
+                healthy = False
+                print(f"IDLE listener for {mirror.folder} failed: {e}")
+            finally:
+                mirror.ready = False
+                self._current_connection.set(None)
+                if pooled is not None:
+                    await pool.close_dedicated(pooled)
+            self.idle_stats['restarts'] += 1
+            if not healthy:
+                await asyncio.sleep(self.config.imap.poll_interval)
+
+    async def _load_mirror(self, mirror: FolderMirror):
+        """选中文件夹，用 UID SEARCH 重建镜像并预取最新未读邮件的摘要"""
+        folder = mirror.folder
+        if not await self.select_folder(folder, readonly=True):
+            raise imaplib.IMAP4.error(f"cannot select {folder}")
+        uids = []
+        for criteria in ('ALL', 'UNSEEN'):
+            status, data = await self._uid('SEARCH', criteria)
+            if status != 'OK':
+                raise imaplib.IMAP4.error(f"UID SEARCH {criteria} failed in {folder}")
+            uids.append([int(uid) for uid in data[0].split()])
+        mirror.reset(self._folder_uidvalidity(folder), uids[0], uids[1])
+        await self._load_unread_summaries(mirror, mirror.missing_summaries(SYNC_PREFETCH_LIMIT))
+        mirror.ready = True
+
+    async def _load_unread_summaries(self, mirror: FolderMirror, uids: List[int]):
+        if not uids:
+            return
+        summaries = await self._fetch_message_summaries([str(uid) for uid in uids], mirror.folder)
+        for summary in summaries:
+            uid = int(MessageKey.parse(summary.id, mirror.folder).uid)
+            if uid in mirror.unseen and not summary.is_read:
+                mirror.summaries[uid] = summary
+
+    async def _wait_for_changes(self) -> List[bytes]:
+        """在IDLE中等待服务器推送，不支持IDLE时等待轮询间隔后发送NOOP取回积累的通知"""
+        self.idle_stats['cycles'] += 1
+        if self._has_capability('IDLE'):
+            self.idle_stats['mode'] = 'idle'
+            interval = min(self.config.imap.idle_interval, IDLE_REISSUE_LIMIT)
+            status, notifications = await self._imap('idle', interval)
+            if status == 'OK':
+                return notifications
+        self.idle_stats['mode'] = 'poll'
+        await asyncio.sleep(self.config.imap.poll_interval)
+        await self._imap('noop')
+        return list(self.connection.untagged_log)
+
+    def _unsolicited_changes(self) -> List[bytes]:
+        """最近一条命令期间服务器主动发送的新邮件和删除通知"""
+        return [
+            head for head in self.connection.untagged_log
+            if parse_notification(head)[0] in ('EXISTS', 'EXPUNGE', 'VANISHED')
+        ]
+
+    async def _apply_notifications(self, mirror: FolderMirror, notifications: List[bytes]):
+        """把通知应用到镜像，获取新邮件的UID和未读摘要，并同步更新元数据缓存"""
+        self.idle_stats['notifications'] += len(notifications)
+        if notifications:
+            self._invalidate_folder_overview()
+        pending = list(notifications)
+        while pending:
+            flag_changes, removed, new_messages = mirror.apply(pending)
+            pending = []
+            if new_messages:
+                status, data = await self._uid('FETCH', f'{mirror.next_uid}:*', '(UID FLAGS)')
+                if status == 'OK':
+                    fetched = self._fetched_by_uid(data)
+                    for uid in sorted(fetched, key=int):
+                        mirror.append(int(uid), [str(flag) for flag in fetched[uid].get('FLAGS') or []])
+                pending.extend(self._unsolicited_changes())
+            self._update_cache_from_mirror(mirror, flag_changes, removed)
+
+        await self._load_unread_summaries(mirror, mirror.missing_summaries(SYNC_PREFETCH_LIMIT))
+
+    def _update_cache_from_mirror(self, mirror: FolderMirror, flags: Dict[int, List[str]], removed: List[int]):
+        if self._cache is None or mirror.uidvalidity is None:
+            return
+        account = self._account_key()
+        try:
+            self._cache.update_flags(account, mirror.folder, mirror.uidvalidity, flags)
+            if removed:
+                self._cache.remove_messages(account, mirror.folder, mirror.uidvalidity, removed)
+        except sqlite3.Error as e:
+            print(f"Failed to update message cache: {e}")
+
+    def _mirror_for(self, folder: str) -> Optional[FolderMirror]:
+        mirror = self._mirror
+        return mirror if mirror is not None and mirror.ready and mirror.folder == folder else None
+
+    def _note_seen(self, folder: str, uid: str):
+        """本服务标记已读后立即更新镜像，不等待IDLE通知"""
+        mirror = self._mirror_for(folder)
+        if mirror is not None and mirror.uidvalidity == self._folder_uidvalidity(folder):
+            mirror.mark_seen(int(uid))
+
+    async def list_unread_messages(self, folder: str = "INBOX", limit: int = 20) -> List[EmailSummary]:
+        """
+        列出未读邮件（最新优先）
 
-        except Exception as e:
-            print(f"Failed to list messages: {e}")
+        IDLE正在监听该文件夹时直接从内存镜像返回，不访问服务器；否则用 UNSEEN 搜索。
+        """
+        mirror = self._mirror_for(folder)
+        if mirror is not None:
+            summaries = mirror.unread(limit)
+            if summaries is not None:
+                return summaries
+        messages = await self.search_messages_simple(query="", folder=folder, unread_only=True, limit=limit)
+        messages.reverse()
+        return messages
 
+    async def list_messages(self, folder: str = "INBOX", limit: int = 20, offset: int = 0) -> List[EmailSummary]:
+        """List messages in folder with pagination support"""
+        messages, _ = await self.list_messages_page(folder, limit, offset=offset)
         return messages
 
-    async def get_message(self, message_id: str, folder: str = "INBOX") -> Optional[EmailMessage]:
-        """Get specific message by ID"""
-        if not await self.select_folder(folder):
-            return None
+    @_uses_connection
+    async def list_messages_page(
+        self,
+        folder: str = "INBOX",
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        offset: int = 0
+    ) -> Tuple[List[EmailSummary], Optional[str]]:
+        """
+        分页列出文件夹中的邮件（最新优先），同时返回下一页的游标
 
-        return await self._get_message_by_id(message_id, folder)
+        只取出请求页的UID，不获取整个文件夹的UID列表；带游标时从游标中的UID之前继续，
+        翻到后面的页与第一页开销相同。
 
-    async def _get_message_by_id(self, message_id: str, folder: str) -> Optional[EmailMessage]:
-        """Get message by internal ID"""
-        try:
-            status, msg_data = self.connection.fetch(message_id, '(RFC822)')
-            if status != 'OK':
-                return None
+        Args:
+            folder: 文件夹名称
+            limit: 每页邮件数量
+            cursor: 上一页返回的游标，给出时忽略offset
+            offset: 第一页跳过的最新邮件数量
 
-            # Parse email message
-            raw_email = msg_data[0][1]
-            email_message = email.message_from_bytes(raw_email, policy=policy.default)
+        Returns:
+            Tuple: (邮件摘要列表, 下一页的游标；没有更多邮件时为None)
 
-            # Extract basic info
-            subject = decode_email_header(email_message.get('Subject', ''))
-            from_address = decode_email_header(email_message.get('From', ''))
-            to_addresses = parse_email_addresses(email_message.get('To', ''))
-            cc_addresses = parse_email_addresses(email_message.get('CC', ''))
-            date = parse_email_date(email_message.get('Date', ''))
-            message_id_header = email_message.get('Message-ID', '')
+        Raises:
+            ValueError: 游标无效、属于其他文件夹或查询，或文件夹的UIDVALIDITY已变化
+        """
+        fingerprint = query_fingerprint('list')
+        page = PageCursor.decode(cursor) if cursor else None
+        if page is not None:
+            page.check(folder, fingerprint)
+        if limit <= 0 or offset < 0:
+            return [], None
+
+        previous = self.mailbox_state
+        if not await self.select_folder(folder, readonly=True):
+            return [], None
+        # 复用已选中文件夹的连接时没有发送SELECT，EXISTS可能已经过期
+        selected = self.mailbox_state is not previous
+        uidvalidity = self._folder_uidvalidity(folder)
+        if page is not None:
+            page.check(folder, fingerprint, uidvalidity)
 
-            # Get body and attachments
-            body_text = ""
-            body_html = None
-            attachments = []
+        try:
+            if page is None:
+                msg_ids = await self._page_uids(offset, limit, selected)
+            else:
+                msg_ids = await self._page_uids_before(page.last_uid, limit)
+            if not msg_ids:
+                return [], None
+            # Fetch the whole page with a single FETCH command
+            messages = await self._fetch_message_summaries(msg_ids, folder)
+        except Exception as e:
+            print(f"Failed to list messages: {e}")
+            return [], None
 
-            # 首先使用iter_attachments()获取真正的附件
-            try:
-                for attachment_part in email_message.iter_attachments():
-                    filename = attachment_part.get_filename()
-                    if filename:
-                        content_type = attachment_part.get_content_type()
-                        # 严格过滤回复/转发邮件中的嵌入内容
-                        if self._is_embedded_email_content(attachment_part, filename, content_type):
-                            continue
-                        
-                        try:
-                            payload = attachment_part.get_payload(decode=True)
-                            size = len(payload) if payload else 0
-                        except Exception:
-                            size = 0
-                        
-                        attachment = EmailAttachment(
-                            filename=filename,
-                            content_type=content_type,
-                            size=size
-                        )
-                        attachments.append(attachment)
-            except AttributeError:
-                # 如果iter_attachments()不可用，使用改进的传统方法
-                pass
-            
-            # 提取邮件正文内容和处理fallback附件检测
-            for part in email_message.walk():
-                content_type = part.get_content_type()
-                content_disposition = part.get_content_disposition()
-
-                # 提取正文内容（确保不是附件）
-                if content_type == 'text/plain' and content_disposition != 'attachment':
-                    body_text = part.get_content() or ""
-                elif content_type == 'text/html' and content_disposition != 'attachment':
-                    body_html = part.get_content()
-                # 仅在iter_attachments()不可用时处理附件
-                elif not hasattr(email_message, 'iter_attachments') and content_disposition == 'attachment':
-                    filename = part.get_filename()
-                    if filename:
-                        # 使用统一的过滤逻辑排除嵌入的邮件内容
-                        if self._is_embedded_email_content(part, filename, content_type):
-                            continue
-                        
-                        try:
-                            payload = part.get_payload(decode=True)
-                            size = len(payload) if payload else 0
-                        except Exception:
-                            size = 0
-                        
-                        attachment = EmailAttachment(
-                            filename=filename,
-                            content_type=content_type,
-                            size=size
-                        )
-                        attachments.append(attachment)
+        next_cursor = None
+        # 下一页取UID小于本页所有UID的邮件，锚点是本页最小的UID
+        last_uid = min(int(msg_id) for msg_id in msg_ids)
+        if len(msg_ids) == limit and last_uid > 1:
+            next_cursor = PageCursor(folder, uidvalidity, last_uid, fingerprint).encode()
+        return messages, next_cursor
 
-            # Check if message is read
-            flags = self.connection.fetch(message_id, '(FLAGS)')[1][0]
-            is_read = b'\\Seen' in flags
+    async def _page_uids(self, offset: int, limit: int, selected: bool = False) -> Optional[List[str]]:
+        """
+        选中文件夹中按UID倒序的第 offset+1 到 offset+limit 封邮件的UID
 
-            return EmailMessage(
-                id=message_id,
-                subject=subject,
-                from_address=from_address,
-                to_addresses=to_addresses,
-                cc_addresses=cc_addresses,
-                date=date or "",
-                body_text=body_text,
-                body_html=body_html,
-                attachments=attachments,
-                is_read=is_read,
-                message_id=message_id_header,
-                folder=folder
-            )
+        与游标翻页的顺序相同（游标之后的页按UID向前取），各页之间不会重复或遗漏。
 
-        except Exception as e:
-            print(f"Failed to get message {message_id}: {e}")
+        - 服务器支持PARTIAL时用 UID SEARCH RETURN (PARTIAL -(offset+1):-(offset+limit)) ALL
+        - 否则由EXISTS算出该页的序列号范围：UID恰好为1..EXISTS时直接得到UID，
+          其余情况用 UID SEARCH <序列号范围> 换成UID；文件夹不是刚刚SELECT的
+          （selected为False）时先用NOOP刷新EXISTS
+        - 不知道EXISTS时回退到 UID SEARCH ALL 再切片
+        """
+        if self._has_capability('PARTIAL'):
+            uids = await self._partial_search_uids('ALL', limit, offset)
+            if uids is not None:
+                return uids
+
+        state = self.mailbox_state
+        if state is not None and not selected:
+            state = await self._refresh_mailbox_state(state.folder)
+        if state is not None and state.exists is not None:
+            return await self._sequence_page_uids(state, offset, limit)
+
+        # Search for all messages (UIDs are stable across expunges)
+        status, message_ids = await self._uid('SEARCH', 'ALL')
+        if status != 'OK':
             return None
 
-    async def search_messages(self, criteria: EmailSearchCriteria) -> List[EmailMessage]:
-        """Search messages based on criteria"""
-        messages = []
-
-        if not await self.select_folder(criteria.folder):
-            return messages
+        # IMAP returns oldest first, so we reverse for newest first
+        msg_ids = message_ids[0].split()
+        msg_ids.reverse()
+        return [msg_id.decode() for msg_id in msg_ids[offset:offset + limit]]
 
-        try:
-            # Build search criteria
-            search_terms = []
+    async def _page_uids_before(self, before_uid: int, limit: int) -> Optional[List[str]]:
+        """
+        UID小于before_uid的最新limit封邮件的UID（最新优先）
+
+        服务器支持PARTIAL时用 UID SEARCH RETURN (PARTIAL -1:-limit) 直接取出，
+        否则从before_uid向前按UID范围搜索，范围每次加倍，直到凑满一页或到达UID 1。
+        """
+        if before_uid <= 1:
+            return []
+        if self._has_capability('PARTIAL'):
+            uids = await self._partial_search_uids(f'UID 1:{before_uid - 1}', limit)
+            if uids is not None:
+                return uids
+
+        found: List[int] = []
+        high, window = before_uid - 1, limit
+        while high >= 1 and len(found) < limit:
+            low = max(1, high - window + 1)
+            status, data = await self._uid('SEARCH', f'UID {low}:{high}')
+            if status != 'OK' or not data:
+                return None
+            found.extend(sorted((int(uid) for uid in (data[0] or b'').split()), reverse=True))
+            high, window = low - 1, window * 2
+        return [str(uid) for uid in found[:limit]]
+
+    async def _partial_search_uids(self, search_query: Any, limit: int, offset: int = 0) -> Optional[List[str]]:
+        """
+        用 UID SEARCH RETURN (PARTIAL -(offset+1):-(offset+limit)) 取出跳过最新offset个之后的
+        limit个匹配UID（最新优先），失败时返回None
+        """
+        prefix = f'RETURN (PARTIAL -{offset + 1}:-{offset + limit}) '
+        if isinstance(search_query, bytes):
+            status, _ = await self._uid('SEARCH', prefix.encode('ascii') + search_query)
+        else:
+            status, _ = await self._uid('SEARCH', prefix + search_query)
+        if status != 'OK':
+            return None
+        results = self._untagged_responses().pop('ESEARCH', [])
+        uids = parse_partial_results(results[-1]) if results else []
+        return [str(uid) for uid in sorted(uids, reverse=True)]
+
+    async def _refresh_mailbox_state(self, folder: str) -> Optional[MailboxState]:
+        """
+        用NOOP取回选中文件夹积累的通知，返回EXISTS可信的邮箱状态
+
+        复用连接时不重新SELECT，期间到达的新邮件和其他客户端删除的邮件只会在
+        下一条命令的响应中通知（连接池保活的NOOP收到这些通知时清除邮箱状态，见 _probe_connection）。
+        收到EXPUNGE后无法可靠地推算EXISTS，此时重新SELECT。
+        """
+        status, _ = await self._imap('noop')
+        state = self.mailbox_state
+        if status == 'OK' and state is not None and state.folder == folder and state.exists is not None:
+            return state
+        self._set_mailbox_state(None)
+        if not await self.select_folder(folder, readonly=True):
+            return None
+        return self.mailbox_state
+
+    async def _sequence_page_uids(self, state: MailboxState, offset: int, limit: int) -> Optional[List[str]]:
+        """根据EXISTS计算一页的序列号范围并换成UID（序列号顺序与UID顺序一致）"""
+        last = state.exists - offset
+        if last < 1:
+            return []
+        first = max(1, last - limit + 1)
+        if state.uids_contiguous:
+            return [str(uid) for uid in range(last, first - 1, -1)]
+
+        status, data = await self._uid('SEARCH', f'{first}:{last}')
+        if status != 'OK' or not data or data[0] is None:
+            return None
+        return sorted((uid.decode() for uid in data[0].split()), key=int, reverse=True)
+
+    async def _fetch_message_summaries(self, msg_ids: List[str], folder: str) -> List[EmailSummary]:
+        """
+        用一条UID FETCH命令批量获取一组邮件的摘要信息
+
+        只请求标志、大小、指定的邮件头字段和BODYSTRUCTURE，
+        传输量与邮件头大小成正比，不下载正文和附件内容。
+        元数据缓存中已有的邮件只刷新标志，其余邮件获取后写入缓存。
+
+        Args:
+            msg_ids: 邮件UID列表，返回结果保持该顺序
+            folder: 文件夹名称
+
+        Returns:
+            List[EmailSummary]: 邮件摘要列表
+        """
+        if not msg_ids:
+            return []
+
+        uidvalidity = self._folder_uidvalidity(folder)
+        cached = await self._cached_summaries(msg_ids, folder, uidvalidity)
+        missing = [msg_id for msg_id in msg_ids if msg_id not in cached]
+
+        fetched = await self._fetch_and_cache_summaries(missing, folder, uidvalidity)
+        if fetched is None and not cached:
+            return []
+        fetched = fetched or {}
+
+        summaries = []
+        for msg_id in msg_ids:
+            summary = cached.get(msg_id) or fetched.get(msg_id)
+            if summary:
+                summaries.append(summary)
+        return summaries
+
+    async def _fetch_and_cache_summaries(
+        self,
+        msg_ids: List[str],
+        folder: str,
+        uidvalidity: Optional[int]
+    ) -> Optional[Dict[str, EmailSummary]]:
+        """获取一组邮件的摘要并写入缓存，返回 UID -> 摘要，FETCH失败时返回None"""
+        if not msg_ids:
+            return {}
+
+        status, msg_data = await self._uid('FETCH', ','.join(msg_ids), SUMMARY_FETCH_ITEMS)
+        if status != 'OK':
+            return None
+        fetched = self._fetched_by_uid(msg_data)
+
+        summaries: Dict[str, EmailSummary] = {}
+        new_entries = []
+        for msg_id in msg_ids:
+            attributes = fetched.get(msg_id)
+            if attributes is None:
+                continue
+            message_id = self._message_key(msg_id, folder).message_id
+            summary = self._build_message_summary(message_id, attributes, folder)
+            if summary:
+                summaries[msg_id] = summary
+                new_entries.append({
+                    'uid': msg_id,
+                    'summary': summary,
+                    'bodystructure': attributes.get('BODYSTRUCTURE')
+                })
+
+        if new_entries and self._cache is not None and uidvalidity is not None:
+            try:
+                self._cache.put_summaries(self._account_key(), folder, uidvalidity, new_entries)
+            except sqlite3.Error as e:
+                print(f"Failed to cache message summaries: {e}")
+        return summaries
+
+    async def _cached_summaries(
+        self,
+        msg_ids: List[str],
+        folder: str,
+        uidvalidity: Optional[int]
+    ) -> Dict[str, EmailSummary]:
+        """
+        从元数据缓存读取邮件摘要
+
+        先增量同步文件夹。邮件头、大小和结构不会改变，同步后标志已是最新时直接使用缓存；
+        否则命中的邮件只用一条 UID FETCH (FLAGS) 刷新标志，
+        没有出现在响应中的UID已被删除，同时从缓存中移除。
+        """
+        if self._cache is None or uidvalidity is None:
+            return {}
+        account = self._account_key()
+        try:
+            sync = await self._sync_cached_folder(folder)
+        except Exception as e:
+            print(f"Failed to sync folder {folder}: {e}")
+            sync = {'flags_current': False}
+        try:
+            entries = self._cache.get_messages(account, folder, uidvalidity, [int(uid) for uid in msg_ids])
+        except sqlite3.Error as e:
+            print(f"Failed to read message cache: {e}")
+            return {}
+        if not entries:
+            return {}
+        if sync['flags_current']:
+            return {
+                str(uid): self._summary_from_cache(entry, folder, uidvalidity, entry['flags'])
+                for uid, entry in entries.items()
+            }
+
+        status, msg_data = await self._uid('FETCH', ','.join(str(uid) for uid in entries), '(UID FLAGS)')
+        if status != 'OK':
+            return {}
+        flags = {
+            int(uid): [str(flag) for flag in (attributes.get('FLAGS') or [])]
+            for uid, attributes in self._fetched_by_uid(msg_data).items()
+        }
+        try:
+            self._cache.update_flags(account, folder, uidvalidity, flags)
+            vanished = [uid for uid in entries if uid not in flags]
+            if vanished:
+                self._cache.remove_messages(account, folder, uidvalidity, vanished)
+        except sqlite3.Error as e:
+            print(f"Failed to update message cache: {e}")
+
+        return {
+            str(uid): self._summary_from_cache(entry, folder, uidvalidity, flags[uid])
+            for uid, entry in entries.items()
+            if uid in flags
+        }
+
+    def _summary_from_cache(
+        self,
+        entry: Dict[str, Any],
+        folder: str,
+        uidvalidity: int,
+        flags: List[str]
+    ) -> EmailSummary:
+        """根据缓存条目和最新的标志构建邮件摘要"""
+        return EmailSummary(
+            id=MessageKey(folder, uidvalidity, str(entry['uid'])).message_id,
+            subject=entry['subject'],
+            from_address=entry['from_address'],
+            to_addresses=entry['to_addresses'],
+            cc_addresses=entry['cc_addresses'],
+            date=entry['date'],
+            is_read='\\Seen' in flags,
+            folder=folder,
+            message_id=entry['message_id'],
+            flags=flags,
+            size=entry['size'],
+            attachments=self._summary_attachments(entry.get('bodystructure'))
+        )
+
+    @staticmethod
+    def _summary_attachments(bodystructure: Any) -> List[Dict[str, Any]]:
+        """从BODYSTRUCTURE提取摘要中的附件元数据"""
+        attachments = []
+        for body_part, filename in find_attachment_parts(parse_bodystructure(bodystructure)):
+            attachments.append({
+                'filename': filename,
+                'content_type': body_part.content_type,
+                'size': body_part.decoded_size
+            })
+        return attachments
+
+    def _build_message_summary(self, message_id: str, attributes: Dict[str, Any], folder: str) -> Optional[EmailSummary]:
+        """根据FETCH返回的邮件头和BODYSTRUCTURE构建邮件摘要"""
+        try:
+            header_bytes = get_body_section(attributes, 'HEADER.FIELDS') or b''
+            headers = BytesHeaderParser(policy=policy.compat32).parsebytes(header_bytes)
+            flags = [str(flag) for flag in (attributes.get('FLAGS') or [])]
+            attachments = self._summary_attachments(attributes.get('BODYSTRUCTURE'))
+
+            date = (
+                parse_email_date(headers.get('Date', ''))
+                or parse_internaldate(attributes.get('INTERNALDATE'))
+            )
+
+            return EmailSummary(
+                id=message_id,
+                subject=decode_email_header(headers.get('Subject', '')),
+                from_address=decode_email_header(headers.get('From', '')),
+                to_addresses=parse_email_addresses(decode_email_header(headers.get('To', ''))),
+                cc_addresses=parse_email_addresses(decode_email_header(headers.get('CC', ''))),
+                date=date or "",
+                is_read='\\Seen' in flags,
+                folder=folder,
+                message_id=headers.get('Message-ID', '').strip() or None,
+                flags=flags,
+                size=attributes.get('RFC822.SIZE') or 0,
+                attachments=attachments
+            )
+
+        except Exception as e:
+            print(f"Failed to build summary for message {message_id}: {e}")
+            return None
+
+    @_uses_connection
+    async def get_message(self, message_id: str, folder: str = "INBOX") -> Optional[EmailMessage]:
+        """Get specific message by ID"""
+        if not await self.select_folder(folder):
+            return None
+
+        uid = self._resolve_uid(message_id, folder)
+        if uid is None:
+            return None
+        return await self._get_message_by_id(uid, folder)
+
+    async def _get_message_by_id(self, uid: str, folder: str) -> Optional[EmailMessage]:
+        """Get message by UID"""
+        message_id = self._message_key(uid, folder).message_id
+        key = self._memory_key(uid)
+        try:
+            entry = self._messages.get(key) or CachedMessage()
+            if entry.message is not None:
+                # 已解析过的邮件只刷新已读状态
+                flags = (await self._uid('FETCH', uid, '(FLAGS)'))[1][0]
+                return replace(entry.message, is_read=b'\\Seen' in flags)
+
+            if entry.raw is None:
+                entry.raw = self._read_raw(key)
+            if entry.raw is None:
+                status, msg_data = await self._uid('FETCH', uid, '(RFC822)')
+                if status != 'OK' or not msg_data or not isinstance(msg_data[0], tuple):
+                    return None
+                entry.raw = msg_data[0][1]
+                self._write_raw(key, entry.raw)
+
+            # 只扫描邮件头、第一个正文部分和附件元数据，附件内容不解析也不解码
+            scanned = scan_message(entry.raw, peek_bytes=EMBEDDED_EMAIL_PEEK_BYTES)
+            email_message = scanned.headers
+
+            # Extract basic info
+            subject = decode_email_header(email_message.get('Subject', ''))
+            from_address = decode_email_header(email_message.get('From', ''))
+            to_addresses = parse_email_addresses(email_message.get('To', ''))
+            cc_addresses = parse_email_addresses(email_message.get('CC', ''))
+            date = parse_email_date(email_message.get('Date', ''))
+            message_id_header = email_message.get('Message-ID', '')
+
+            body_text = scanned.text or ""
+            body_html = scanned.html
+            attachments = [
+                EmailAttachment(
+                    filename=attachment.filename,
+                    content_type=attachment.content_type,
+                    size=attachment.size
+                )
+                for attachment in scanned.attachments
+                # 严格过滤回复/转发邮件中的嵌入内容
+                if not self._is_embedded_email_peek(attachment)
+            ]
+
+            # Check if message is read
+            flags = (await self._uid('FETCH', uid, '(FLAGS)'))[1][0]
+            is_read = b'\\Seen' in flags
+
+            uidvalidity = self._folder_uidvalidity(folder)
+            text = body_text or self._html_to_text(body_html or '')
+            if self._cache is not None and uidvalidity is not None and text:
+                try:
+                    self._cache.set_body_text(self._account_key(), folder, uidvalidity, int(uid), text)
+                except sqlite3.Error as e:
+                    print(f"Failed to cache snippet for message {message_id}: {e}")
+
+            message = EmailMessage(
+                id=message_id,
+                subject=subject,
+                from_address=from_address,
+                to_addresses=to_addresses,
+                cc_addresses=cc_addresses,
+                date=date or "",
+                body_text=body_text,
+                body_html=body_html,
+                attachments=attachments,
+                is_read=is_read,
+                message_id=message_id_header,
+                folder=folder
+            )
+            entry.message = message
+            self._messages.put(key, entry)
+            return message
+
+        except Exception as e:
+            print(f"Failed to get message {message_id}: {e}")
+            return None
+
+    async def search_messages(self, criteria: EmailSearchCriteria) -> List[EmailSummary]:
+        """
+        Search messages based on criteria
+
+        只有关键词和已读状态条件时在本地全文索引中搜索（按BM25相关度排序，离线可用），
+        其他条件或未启用缓存时由服务器执行SEARCH。
+        """
+        if self._can_search_index(criteria):
+            messages = await self._search_index(criteria)
+            if messages is not None:
+                return messages
+        return await self._search_on_server(criteria)
+
+    def _can_search_index(self, criteria: EmailSearchCriteria) -> bool:
+        if self._cache is None or not self._cache.fts_enabled or not criteria.text:
+            return False
+        return not any([
+            criteria.from_address, criteria.to_address, criteria.subject, criteria.body_text,
+            criteria.date_from, criteria.date_to, criteria.has_attachments is not None,
+            criteria.message_id, criteria.offset
+        ])
+
+    async def _search_index(self, criteria: EmailSearchCriteria) -> Optional[List[EmailSummary]]:
+        """在本地全文索引中搜索，索引不可用时返回None"""
+        found = await self._search_index_page(criteria)
+        return found[0] if found is not None else None
+
+    async def _search_index_page(
+        self,
+        criteria: EmailSearchCriteria,
+        offset: int = 0
+    ) -> Optional[Tuple[List[EmailSummary], int, int]]:
+        """
+        在本地全文索引中搜索，跳过排在前面的offset个结果
+
+        在线时只做增量同步（CONDSTORE或UIDNEXT），索引与服务器一致时才使用；
+        文件夹尚未完整索引或可能过期时返回None交给服务器搜索，并在后台补齐索引。
+        离线或同步失败时使用上次完整索引的结果。
+
+        Returns:
+            Optional[Tuple]: (邮件摘要列表, UIDVALIDITY, 索引的generation)，索引不可用时为None
+        """
+        folder = criteria.folder
+        account = self._account_key()
+        uidvalidity = None
+        if self.connected:
+            try:
+                uidvalidity = await self._sync_index(folder)
+                if uidvalidity is None:
+                    self._schedule_index_backfill(folder)
+                    return None
+            except Exception as e:
+                print(f"Failed to sync search index for {folder}: {e}")
+        try:
+            known = self._cache.get_folder(account, folder)
+            if uidvalidity is None:
+                if known is None or known.get('exists_count') is None:
+                    return None
+                uidvalidity = known['uidvalidity']
+            entries = self._cache.search(
+                account, folder, uidvalidity, criteria.text,
+                is_read=criteria.is_read, limit=criteria.limit, before_uid=criteria.before_uid, offset=offset
+            )
+        except sqlite3.Error as e:
+            print(f"Failed to search message index: {e}")
+            return None
+        messages = [self._summary_from_cache(entry, folder, uidvalidity, entry['flags']) for entry in entries]
+        return messages, uidvalidity, known['index_generation'] if known is not None else 0
+
+    @_uses_connection
+    async def _sync_index(self, folder: str) -> Optional[int]:
+        """
+        增量同步文件夹的索引，索引完整且标志可信时返回UIDVALIDITY，否则返回None
+
+        只发送增量同步的命令，不对整个文件夹对账：新邮件由同步写入索引，
+        列出和搜索获取的摘要也会写入索引，其余的由后台补齐。
+        """
+        if not await self.select_folder(folder, readonly=True):
+            return None
+        uidvalidity = self._folder_uidvalidity(folder)
+        if uidvalidity is None:
+            return None
+        account = self._account_key()
+        sync = await self._sync_cached_folder(folder)
+        known = self._cache.get_folder(account, folder)
+        if known is None or known.get('exists_count') is None:
+            return None
+        if self.mailbox_state.exists != len(self._cache.cached_uids(account, folder, uidvalidity)):
+            return None
+        reconciled = self._index_reconciled.get(folder)
+        if not sync['flags_current'] and (
+            reconciled is None or time.monotonic() - reconciled >= INDEX_RECONCILE_INTERVAL
+        ):
+            return None
+        return uidvalidity
+
+    def _schedule_index_backfill(self, folder: str):
+        """在后台补齐文件夹的索引，同一文件夹同时只有一个补齐任务"""
+        task = self._index_tasks.get(folder)
+        if task is not None and not task.done():
+            return
+        self._index_tasks[folder] = asyncio.create_task(self._backfill_index(folder))
+
+    async def _stop_index_backfill(self):
+        tasks, self._index_tasks = self._index_tasks, {}
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    async def _backfill_index(self, folder: str):
+        """
+        后台任务：与服务器对账后分批获取缺少的邮件摘要
+
+        每批单独检出连接，批次之间不占用连接，前台操作不需要等待整个补齐完成。
+        """
+        try:
+            reconciled = await self._reconcile_index(folder)
+            if reconciled is None:
+                return
+            uidvalidity, missing, exists = reconciled
+            for start in range(0, len(missing), INDEX_FETCH_BATCH):
+                if not await self._index_batch(folder, uidvalidity, missing[start:start + INDEX_FETCH_BATCH]):
+                    return
+            await self._finish_index(folder, uidvalidity, exists)
+        except Exception as e:
+            print(f"Failed to build search index for {folder}: {e}")
+
+    @_uses_connection
+    async def _reconcile_index(self, folder: str) -> Optional[Tuple[int, List[str], int]]:
+        """
+        与服务器对账，返回 (UIDVALIDITY, 缺少摘要的UID, 邮件数)
+
+        标志可能过期时用 UID FETCH 1:* (UID FLAGS) 同时刷新标志，否则用 UID SEARCH ALL；
+        删除已从服务器消失的邮件。
+        """
+        if not await self.select_folder(folder, readonly=True):
+            return None
+        uidvalidity = self._folder_uidvalidity(folder)
+        if uidvalidity is None:
+            return None
+        account = self._account_key()
+        sync = await self._sync_cached_folder(folder)
+        cached = set(self._cache.cached_uids(account, folder, uidvalidity))
+
+        server_uids = None
+        if self.mailbox_state.exists == 0:
+            server_uids = []
+        elif not sync['flags_current']:
+            status, msg_data = await self._uid('FETCH', '1:*', '(UID FLAGS)')
+            if status == 'OK':
+                flags = {
+                    int(uid): [str(flag) for flag in (attributes.get('FLAGS') or [])]
+                    for uid, attributes in self._fetched_by_uid(msg_data).items()
+                }
+                self._cache.update_flags(account, folder, uidvalidity, flags)
+                server_uids = sorted(flags)
+                self._index_reconciled[folder] = time.monotonic()
+        else:
+            status, data = await self._uid('SEARCH', 'ALL')
+            if status == 'OK':
+                server_uids = [int(uid) for uid in data[0].split()]
+        if server_uids is None:
+            return None
+
+        stale = cached.difference(server_uids)
+        if stale:
+            self._cache.remove_messages(account, folder, uidvalidity, sorted(stale))
+        # 最新的邮件先补齐
+        missing = [str(uid) for uid in reversed(server_uids) if uid not in cached]
+        return uidvalidity, missing, len(server_uids)
+
+    @_uses_connection
+    async def _index_batch(self, folder: str, uidvalidity: int, uids: List[str]) -> bool:
+        """获取一批邮件摘要写入索引，文件夹的UIDVALIDITY已变化时返回False"""
+        if not await self.select_folder(folder, readonly=True) or self._folder_uidvalidity(folder) != uidvalidity:
+            return False
+        await self._fetch_and_cache_summaries(sorted(uids, key=int), folder, uidvalidity)
+        return True
+
+    @_uses_connection
+    async def _finish_index(self, folder: str, uidvalidity: int, exists: int):
+        """记录文件夹已完整索引，再为最新的一批邮件获取正文开头"""
+        if not await self.select_folder(folder, readonly=True) or self._folder_uidvalidity(folder) != uidvalidity:
+            return
+        self._cache.update_sync_state(self._account_key(), folder, exists=exists)
+        await self._index_body_previews(folder, uidvalidity)
+
+    async def _index_body_previews(self, folder: str, uidvalidity: int):
+        """获取最新一批尚未索引正文的邮件的正文开头，按正文部分编号分组批量FETCH"""
+        account = self._account_key()
+        pending = self._cache.pending_bodies(account, folder, uidvalidity, INDEX_BODY_BATCH)
+        sections: Dict[str, List[Any]] = {}
+        without_text = []
+        for uid, structure in pending.items():
+            body_part = find_text_part(parse_bodystructure(structure))
+            if body_part is None:
+                without_text.append(uid)
+            else:
+                sections.setdefault(body_part.part, []).append((uid, body_part))
+        if without_text:
+            self._cache.mark_body_indexed(account, folder, uidvalidity, without_text)
+
+        for section, parts in sections.items():
+            status, msg_data = await self._uid(
+                'FETCH',
+                ','.join(str(uid) for uid, _ in parts),
+                f'(UID BODY.PEEK[{section}]<0.{INDEX_BODY_PEEK_BYTES}>)'
+            )
+            if status != 'OK':
+                continue
+            fetched = self._fetched_by_uid(msg_data)
+            for uid, body_part in parts:
+                attributes = fetched.get(str(uid))
+                if attributes is None:
+                    continue
+                data = get_body_section(attributes, section) or b''
+                self._cache.index_body(account, folder, uidvalidity, uid, self._part_text(body_part, data))
+
+    @classmethod
+    def _part_text(cls, body_part: BodyPart, data: bytes) -> str:
+        """把获取到的正文部分（可能只是开头片段）解码为文本"""
+        payload = decode_part_payload(data, body_part.encoding)
+        charset = body_part.params.get('charset') or 'utf-8'
+        try:
+            text = payload.decode(charset, errors='replace')
+        except LookupError:
+            text = payload.decode('utf-8', errors='replace')
+        if body_part.content_type == 'text/html':
+            text = cls._html_to_text(text)
+        return text
+
+    @staticmethod
+    def _html_to_text(value: str) -> str:
+        return html.unescape(_HTML_TAG.sub(' ', value))
+
+    @_uses_connection
+    async def _search_on_server(self, criteria: EmailSearchCriteria) -> List[EmailSummary]:
+        """由服务器执行 UID SEARCH，服务器支持PARTIAL时只返回需要的最新一批UID"""
+        messages = []
+
+        if criteria.before_uid is not None and criteria.before_uid <= 1:
+            return messages
+        if not await self.select_folder(criteria.folder, readonly=True):
+            return messages
+
+        try:
+            # Build search criteria
+            search_terms = []
 
             if criteria.from_address:
                 search_terms.append(f'FROM "{criteria.from_address}"')
@@ -473,24 +2047,34 @@ class IMAPService:
                 search_terms.append(f'SUBJECT "{criteria.subject}"')
             if criteria.body_text:
                 search_terms.append(f'BODY "{criteria.body_text}"')
+            if criteria.text:
+                # TEXT同时匹配邮件头和正文，任意字段包含关键词即可
+                search_terms.append(f'TEXT "{criteria.text}"')
             if criteria.is_read is not None:
                 search_terms.append('SEEN' if criteria.is_read else 'UNSEEN')
+            if criteria.before_uid is not None and criteria.before_uid < UID_LIMIT:
+                search_terms.append(f'UID 1:{criteria.before_uid - 1}')
 
             # Execute search
             search_query = ' '.join(search_terms) if search_terms else 'ALL'
             # 使用UTF-8编码处理中文搜索
-            status, message_ids = self.connection.search(None, search_query.encode('utf-8'))
-
-            if status == 'OK':
-                msg_ids = message_ids[0].split()
-                # Limit results
-                if criteria.limit > 0:
-                    msg_ids = msg_ids[-criteria.limit:]
-
-                for msg_id in msg_ids:
-                    message = await self._get_message_by_id(msg_id.decode(), criteria.folder)
-                    if message:
-                        messages.append(message)
+            msg_ids = None
+            if self._has_capability('PARTIAL'):
+                msg_ids = await self._partial_search_uids(search_query.encode('utf-8'), criteria.limit)
+                if msg_ids is not None and criteria.before_uid is None:
+                    msg_ids.reverse()
+            if msg_ids is None:
+                status, message_ids = await self._uid('SEARCH', search_query.encode('utf-8'))
+                if status == 'OK':
+                    msg_ids = [msg_id.decode() for msg_id in message_ids[0].split()]
+                    # Limit results
+                    if criteria.limit > 0:
+                        msg_ids = msg_ids[-criteria.limit:]
+                    if criteria.before_uid is not None:
+                        msg_ids.reverse()
+
+            if msg_ids:
+                messages = await self._fetch_message_summaries(msg_ids, criteria.folder)
 
         except Exception as e:
             print(f"Failed to search messages: {e}")
@@ -503,7 +2087,7 @@ class IMAPService:
         folder: str = "INBOX",
         unread_only: bool = False,
         limit: int = 20
-    ) -> List[EmailMessage]:
+    ) -> List[EmailSummary]:
         """
         简化的邮件搜索接口
         
@@ -514,31 +2098,184 @@ class IMAPService:
             limit: 返回结果数量限制
             
         Returns:
-            List[EmailMessage]: 匹配的邮件列表
+            List[EmailSummary]: 匹配的邮件摘要列表
         """
         # 导入搜索条件模型
         from .models import EmailSearchCriteria
         
-        # 创建搜索条件
+        # 创建搜索条件：关键词匹配任意字段，而不是要求所有字段同时包含
         criteria = EmailSearchCriteria(
             folder=folder,
-            subject=query if query else None,
-            from_address=query if query else None,
-            to_address=query if query else None,
-            body_text=query if query else None,
+            text=query if query else None,
             is_read=False if unread_only else None,
             limit=limit
         )
         
         return await self.search_messages(criteria)
 
+    async def search_messages_page(
+        self,
+        query: str,
+        folder: str = "INBOX",
+        unread_only: bool = False,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[EmailSummary], Optional[str]]:
+        """
+        按关键词分页搜索，同时返回下一页的游标
+
+        文件夹已完整索引时在本地索引中按BM25相关度排序，游标记录已返回的结果数和索引的generation，
+        索引变化后游标失效；否则由服务器搜索，按UID从新到旧排列，每页只取比游标中的UID更旧的匹配邮件。
+
+        Returns:
+            Tuple: (邮件摘要列表, 下一页的游标；没有更多结果时为None)
+
+        Raises:
+            ValueError: 游标无效、属于其他文件夹或查询，或文件夹的UIDVALIDITY、索引已变化
+        """
+        fingerprint = query_fingerprint('search', query, unread_only)
+        page = PageCursor.decode(cursor) if cursor else None
+        if page is not None:
+            page.check(folder, fingerprint)
+
+        criteria = EmailSearchCriteria(
+            folder=folder,
+            text=query if query else None,
+            is_read=False if unread_only else None,
+            limit=limit
+        )
+        if page is None or page.rank is not None:
+            rank = page.rank if page is not None else 0
+            found = await self._search_index_page(criteria, rank) if self._can_search_index(criteria) else None
+            if found is not None:
+                messages, uidvalidity, generation = found
+                if page is not None:
+                    page.check(folder, fingerprint, uidvalidity, generation)
+                next_cursor = None
+                if len(messages) == limit:
+                    next_cursor = PageCursor(
+                        folder, uidvalidity, None, fingerprint, rank + limit, generation
+                    ).encode()
+                return messages, next_cursor
+            if page is not None:
+                raise ValueError(f"Cursor is stale: search index of {folder} is not available")
+            # 索引不可用，已经尝试过本地搜索，直接由服务器按UID从新到旧搜索
+            criteria.before_uid = UID_LIMIT
+            messages = await self._search_on_server(criteria)
+        else:
+            criteria.before_uid = page.last_uid
+            messages = await self.search_messages(criteria)
+        if not messages:
+            return [], None
+
+        last = MessageKey.parse(messages[-1].id, folder)
+        if page is not None:
+            page.check(folder, fingerprint, last.uidvalidity)
+        next_cursor = None
+        if len(messages) == limit and int(last.uid) > 1:
+            next_cursor = PageCursor(folder, last.uidvalidity, int(last.uid), fingerprint).encode()
+        return messages, next_cursor
+
+    async def search_all_folders(
+        self,
+        query: str,
+        unread_only: bool = False,
+        limit: int = 20,
+        folders: Optional[List[str]] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        在多个文件夹中并行搜索，按日期合并出最新的limit封
+
+        每个文件夹的搜索各自从连接池检出连接，同时进行的搜索数不超过concurrency，
+        总耗时接近最慢的文件夹而不是各文件夹之和。timeout包括列出文件夹的时间，
+        超过timeout仍未完成的文件夹被取消，返回其余文件夹的结果。
+
+        Args:
+            query: 搜索关键词
+            unread_only: 是否只搜索未读邮件
+            limit: 返回结果数量
+            folders: 要搜索的文件夹，默认为全部可选中的文件夹
+            concurrency: 同时搜索的文件夹数，默认使用配置
+            timeout: 整体超时（秒），默认使用配置
+
+        Returns:
+            Dict: messages（最新优先，摘要的folder字段为所在文件夹）、searched（完成的文件夹）、
+            timed_out（超时的文件夹）、failed（出错的文件夹）
+
+        Raises:
+            NetworkError: 在timeout内没能列出文件夹
+        """
+        if concurrency is None:
+            configured = getattr(self.config.imap, 'search_concurrency', None)
+            concurrency = configured if isinstance(configured, int) else DEFAULT_SEARCH_CONCURRENCY
+        if timeout is None:
+            configured = getattr(self.config.imap, 'search_timeout', None)
+            timeout = configured if isinstance(configured, (int, float)) else DEFAULT_SEARCH_TIMEOUT
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        if folders is None:
+            try:
+                mailboxes = await asyncio.wait_for(self._list_mailboxes(), timeout)
+            except asyncio.TimeoutError:
+                raise NetworkError("Timed out listing folders to search", details={'timeout': timeout})
+            folders = [name for flags, name in mailboxes if self._is_selectable(flags)]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def search_folder(folder: str) -> List[EmailSummary]:
+            async with semaphore:
+                return await self.search_messages(EmailSearchCriteria(
+                    folder=folder,
+                    text=query if query else None,
+                    is_read=False if unread_only else None,
+                    limit=limit
+                ))
+
+        tasks = {asyncio.ensure_future(search_folder(folder)): folder for folder in folders}
+        result: Dict[str, Any] = {'messages': [], 'searched': [], 'timed_out': [], 'failed': []}
+        if not tasks:
+            return result
+        done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - loop.time()))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        found: List[EmailSummary] = []
+        for task, folder in tasks.items():
+            if task in pending:
+                result['timed_out'].append(folder)
+            elif task.exception() is not None:
+                print(f"Failed to search folder {folder}: {task.exception()}")
+                result['failed'].append(folder)
+            else:
+                result['searched'].append(folder)
+                found.extend(task.result())
+        result['messages'] = heapq.nlargest(limit, found, key=self._summary_timestamp)
+        return result
+
+    @staticmethod
+    def _summary_timestamp(summary: EmailSummary) -> float:
+        """用于按日期排序的时间戳，没有日期或无法解析时排在最后"""
+        try:
+            return datetime.fromisoformat(summary.date.replace('Z', '+00:00')).timestamp() if summary.date else 0.0
+        except (TypeError, ValueError):
+            return 0.0
+
+    @_uses_connection
     async def mark_as_read(self, message_id: str, folder: str = "INBOX") -> bool:
         """Mark message as read"""
         if not await self.select_folder(folder):
             return False
 
+        uid = self._resolve_uid(message_id, folder)
+        if uid is None:
+            return False
+
         try:
-            status, _ = self.connection.store(message_id, '+FLAGS', '\\Seen')
+            status, _ = await self._uid('STORE', uid, '+FLAGS', '\\Seen')
+            if status == 'OK':
+                self._note_seen(folder, uid)
             return status == 'OK'
         except Exception as e:
             print(f"Failed to mark message {message_id} as read: {e}")
@@ -555,11 +2292,41 @@ class IMAPService:
         Returns:
             Dict: 操作结果
         """
+        return await self.store_flags(message_ids, ['\\Seen'], folder=folder)
+
+    @_uses_connection
+    async def store_flags(
+        self,
+        message_ids: List[str],
+        flags: List[str],
+        add: bool = True,
+        folder: str = "INBOX"
+    ) -> Dict[str, Any]:
+        """
+        批量添加或移除邮件标志
+
+        UID压缩为 "1:40,52,60:99" 形式的集合，每段集合只发送一条 UID STORE +FLAGS.SILENT；
+        各段STORE和确认邮件仍然存在的 UID SEARCH 作为一组流水线发送，整批只需一次往返。
+        STORE对已被删除的UID不报错，因此不存在的邮件根据SEARCH的结果报告为失败。
+
+        Args:
+            message_ids: 邮件ID列表
+            flags: 标志列表，\\Seen、\\Flagged、\\Answered（可省略反斜杠）或自定义关键字
+            add: True为添加标志，False为移除标志
+            folder: 文件夹名称
+
+        Returns:
+            Dict: 操作结果，包含成功和失败的邮件ID
+
+        Raises:
+            ValueError: 标志名称无效
+        """
         if not message_ids:
             return {
                 'success': False,
                 'error': '必须提供至少一个邮件ID'
             }
+        flag_list = self._normalize_flags(flags)
 
         if not await self.select_folder(folder):
             return {
@@ -567,177 +2334,442 @@ class IMAPService:
                 'error': f'无法选择文件夹: {folder}'
             }
 
-        successful_ids = []
+        try:
+            resolved, failed_ids = self._resolve_uids(message_ids, folder)
+            chunks = split_sequence_set((uid for _, uid in resolved), UID_SET_MAX_LENGTH)
+            item = '+FLAGS.SILENT' if add else '-FLAGS.SILENT'
+            flag_text = f"({' '.join(flag_list)})"
+            commands = [('UID', 'STORE', chunk, item, flag_text) for chunk in chunks]
+            commands += [('UID', 'SEARCH', f'UID {chunk}') for chunk in chunks]
+            results = await self._pipeline(commands) if chunks else []
+
+            stored = set()
+            for chunk, (status, _), searched in zip(chunks, results, results[len(chunks):]):
+                if status == 'OK':
+                    stored.update(self._existing_uids(chunk, searched))
+
+            if add and '\\Seen' in flag_list:
+                for _, uid in resolved:
+                    if uid in stored:
+                        self._note_seen(folder, str(uid))
+            return self._bulk_result(message_ids, resolved, failed_ids, stored)
+
+        except Exception as e:
+            return self._bulk_error(message_ids, f"批量修改邮件标志时发生错误: {str(e)}")
+
+    def _resolve_uids(self, message_ids: List[str], folder: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+        """把邮件ID解析为UID，返回 ([(邮件ID, UID)], 无法解析或已失效的邮件ID)"""
+        resolved = []
         failed_ids = []
+        for message_id in message_ids:
+            uid = self._resolve_uid(message_id, folder)
+            if uid is None:
+                failed_ids.append(message_id)
+            else:
+                resolved.append((message_id, int(uid)))
+        return resolved, failed_ids
+
+    @staticmethod
+    def _existing_uids(uid_set: str, searched: Tuple[str, Any]) -> List[int]:
+        """UID集合中 UID SEARCH UID <集合> 确认存在的UID，SEARCH失败时按全部存在处理"""
+        uids = parse_sequence_set(uid_set)
+        status, data = searched
+        if status != 'OK' or not data:
+            return uids
+        existing = {int(uid) for uid in (data[0] or b'').split()}
+        return [uid for uid in uids if uid in existing]
+
+    @staticmethod
+    def _bulk_result(
+        message_ids: List[str],
+        resolved: List[Tuple[str, int]],
+        failed_ids: List[str],
+        done: Set[int]
+    ) -> Dict[str, Any]:
+        """批量操作的结果，按输入顺序列出成功和失败的邮件ID"""
+        successful_ids = [message_id for message_id, uid in resolved if uid in done]
+        failed_ids = failed_ids + [message_id for message_id, uid in resolved if uid not in done]
+        return {
+            'success': len(failed_ids) == 0,
+            'successful_count': len(successful_ids),
+            'failed_count': len(failed_ids),
+            'successful_ids': successful_ids,
+            'failed_ids': failed_ids,
+            'total_count': len(message_ids)
+        }
 
-        try:
-            for message_id in message_ids:
-                try:
-                    status, _ = self.connection.store(message_id, '+FLAGS', '\\Seen')
-                    if status == 'OK':
-                        successful_ids.append(message_id)
-                    else:
-                        failed_ids.append(message_id)
-                except Exception as e:
-                    print(f"Failed to mark message {message_id} as read: {e}")
-                    failed_ids.append(message_id)
+    @staticmethod
+    def _bulk_error(message_ids: List[str], error_msg: str) -> Dict[str, Any]:
+        print(error_msg)
+        return {
+            'success': False,
+            'error': error_msg,
+            'successful_count': 0,
+            'failed_count': len(message_ids),
+            'successful_ids': [],
+            'failed_ids': message_ids,
+            'total_count': len(message_ids)
+        }
+
+    @staticmethod
+    def _normalize_flags(flags: List[str]) -> List[str]:
+        """把标志名称规范为IMAP标志，例如 "seen" -> \\Seen，其余名称作为自定义关键字"""
+        normalized = []
+        for flag in flags:
+            text = str(flag).strip()
+            name = SYSTEM_FLAGS.get(text.lstrip('\\').lower())
+            if name is None:
+                if text.startswith('\\') or not _KEYWORD.match(text):
+                    raise ValueError(f"Unsupported flag: {flag!r}")
+                name = text
+            if name not in normalized:
+                normalized.append(name)
+        if not normalized:
+            raise ValueError("At least one flag is required")
+        return normalized
+
+    async def delete_message(self, message_id: str, folder: str = "INBOX") -> bool:
+        """Delete message"""
+        result = await self.delete_messages([message_id], folder)
+        return result['success']
+
+    @_uses_connection
+    async def delete_messages(self, message_ids: List[str], folder: str = "INBOX") -> Dict[str, Any]:
+        """
+        批量永久删除邮件
+
+        只删除指定的邮件：文件夹中其他客户端标记了 \\Deleted 但尚未清除的邮件不受影响。
+        服务器支持UIDPLUS时，确认 STORE \\Deleted 成功后再发送 UID EXPUNGE，共两次往返。
+
+        Args:
+            message_ids: 邮件ID列表
+            folder: 文件夹名称
 
+        Returns:
+            Dict: 操作结果，格式同store_flags
+        """
+        if not message_ids:
             return {
-                'success': len(failed_ids) == 0,
-                'successful_count': len(successful_ids),
-                'failed_count': len(failed_ids),
-                'successful_ids': successful_ids,
-                'failed_ids': failed_ids,
-                'total_count': len(message_ids)
+                'success': False,
+                'error': '必须提供至少一个邮件ID'
             }
+        if not await self.select_folder(folder):
+            return {
+                'success': False,
+                'error': f'无法选择文件夹: {folder}'
+            }
+
+        try:
+            resolved, failed_ids = self._resolve_uids(message_ids, folder)
+            chunks = split_sequence_set((uid for _, uid in resolved), UID_SET_MAX_LENGTH)
+            searched = await self._pipeline([('UID', 'SEARCH', f'UID {chunk}') for chunk in chunks])
+            existing = [uid for chunk, result in zip(chunks, searched) for uid in self._existing_uids(chunk, result)]
+            removed = await self._remove_uids(existing, folder)
+            return self._bulk_result(message_ids, resolved, failed_ids, removed)
 
         except Exception as e:
-            error_msg = f"批量标记已读时发生错误: {str(e)}"
-            print(error_msg)
+            return self._bulk_error(message_ids, f"批量删除邮件时发生错误: {str(e)}")
+
+    @_uses_connection
+    async def move_messages(self, message_ids: List[str], target_folder: str, folder: str = "INBOX") -> Dict[str, Any]:
+        """
+        批量移动邮件到另一个文件夹
+
+        服务器支持MOVE（RFC 6851）时每段UID集合发送一条 UID MOVE，整批一次往返；
+        否则先 UID COPY，再只删除复制成功的邮件（见 delete_messages）。
+
+        Args:
+            message_ids: 邮件ID列表
+            target_folder: 目标文件夹
+            folder: 源文件夹
+
+        Returns:
+            Dict: 操作结果，格式同store_flags
+        """
+        return await self._transfer_messages(message_ids, target_folder, folder, move=True)
+
+    @_uses_connection
+    async def copy_messages(self, message_ids: List[str], target_folder: str, folder: str = "INBOX") -> Dict[str, Any]:
+        """
+        批量复制邮件到另一个文件夹，每段UID集合发送一条 UID COPY，整批一次往返
+
+        Args:
+            message_ids: 邮件ID列表
+            target_folder: 目标文件夹
+            folder: 源文件夹
+
+        Returns:
+            Dict: 操作结果，格式同store_flags
+        """
+        return await self._transfer_messages(message_ids, target_folder, folder, move=False)
+
+    async def _transfer_messages(
+        self,
+        message_ids: List[str],
+        target_folder: str,
+        folder: str,
+        move: bool
+    ) -> Dict[str, Any]:
+        if not message_ids:
             return {
                 'success': False,
-                'error': error_msg,
-                'successful_count': 0,
-                'failed_count': len(message_ids),
-                'successful_ids': [],
-                'failed_ids': message_ids,
-                'total_count': len(message_ids)
+                'error': '必须提供至少一个邮件ID'
+            }
+        if target_folder == folder:
+            return {
+                'success': False,
+                'error': '目标文件夹与源文件夹相同'
             }
-
-    async def delete_message(self, message_id: str, folder: str = "INBOX") -> bool:
-        """Delete message"""
         if not await self.select_folder(folder):
-            return False
+            return {
+                'success': False,
+                'error': f'无法选择文件夹: {folder}'
+            }
 
         try:
-            # Mark as deleted
-            status, _ = self.connection.store(message_id, '+FLAGS', '\\Deleted')
-            if status == 'OK':
-                # Expunge to permanently delete
-                self.connection.expunge()
-                return True
+            resolved, failed_ids = self._resolve_uids(message_ids, folder)
+            chunks = split_sequence_set((uid for _, uid in resolved), UID_SET_MAX_LENGTH)
+            command = 'MOVE' if move and self._has_capability('MOVE') else 'COPY'
+            # SEARCH在同一组流水线中排在前面，确认各段中的邮件在移动前确实存在
+            commands = [('UID', 'SEARCH', f'UID {chunk}') for chunk in chunks]
+            commands += [('UID', command, chunk, f'"{target_folder}"') for chunk in chunks]
+            results = await self._pipeline(commands) if chunks else []
+
+            done = set()
+            for chunk, searched, (status, _) in zip(chunks, results, results[len(chunks):]):
+                if status == 'OK':
+                    done.update(self._existing_uids(chunk, searched))
+
+            if command == 'MOVE':
+                self._forget_removed(folder, sorted(done))
+            elif move:
+                done = await self._remove_uids(sorted(done), folder)
+            return self._bulk_result(message_ids, resolved, failed_ids, done)
+
         except Exception as e:
-            print(f"Failed to delete message {message_id}: {e}")
+            action = "移动" if move else "复制"
+            return self._bulk_error(message_ids, f"批量{action}邮件时发生错误: {str(e)}")
 
-        return False
+    async def _remove_uids(self, uids: List[int], folder: str) -> Set[int]:
+        """
+        给选中文件夹中的UID加上 \\Deleted 并只清除这些邮件，返回已清除的UID
 
+        EXPUNGE的结果依赖前面的STORE，因此不与STORE放在同一组流水线中（RFC 3501 5.5），
+        确认STORE成功后才发送。支持UIDPLUS时用 UID EXPUNGE 只清除这些UID，
+        否则见 _expunge_preserving_others。
+        """
+        chunks = split_sequence_set(uids, UID_SET_MAX_LENGTH)
+        if not chunks:
+            return set()
+
+        if self._has_capability('UIDPLUS'):
+            results = await self._pipeline(self._deleted_flag_commands(chunks, add=True))
+            stored = [chunk for chunk, (status, _) in zip(chunks, results) if status == 'OK']
+            removed = set()
+            if stored:
+                results = await self._pipeline([('UID', 'EXPUNGE', chunk) for chunk in stored])
+                for chunk, (status, _) in zip(stored, results):
+                    if status == 'OK':
+                        removed.update(parse_sequence_set(chunk))
+        else:
+            removed = await self._expunge_preserving_others(chunks, folder)
+
+        self._forget_removed(folder, sorted(removed))
+        return removed
+
+    async def _expunge_preserving_others(self, chunks: List[str], folder: str) -> Set[int]:
+        """
+        不支持UIDPLUS时只清除指定的邮件（RFC 4315）
+
+        先暂时去掉其他邮件的 \\Deleted、给指定邮件加上，其他邮件的STORE全部成功后才EXPUNGE，
+        最后恢复其他邮件的标志。去掉标志失败时撤销已做的修改，不执行EXPUNGE，
+        否则其他客户端标记删除的邮件会被一起清除。
+        """
+        status, data = await self._uid('SEARCH', 'DELETED')
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"UID SEARCH DELETED failed in {folder}")
+        targets = {uid for chunk in chunks for uid in parse_sequence_set(chunk)}
+        others = split_sequence_set(
+            (uid for uid in (int(item) for item in (data[0] or b'').split()) if uid not in targets),
+            UID_SET_MAX_LENGTH
+        )
+
+        # 两组STORE作用于不相交的UID，互不依赖，可以一起发送
+        results = await self._pipeline(
+            self._deleted_flag_commands(others, add=False) + self._deleted_flag_commands(chunks, add=True)
+        )
+        cleared = [chunk for chunk, (status, _) in zip(others, results) if status == 'OK']
+        stored = [chunk for chunk, (status, _) in zip(chunks, results[len(others):]) if status == 'OK']
+        try:
+            if len(cleared) < len(others):
+                await self._pipeline(self._deleted_flag_commands(stored, add=False))
+                raise imaplib.IMAP4.error(f"Failed to clear \\Deleted on other messages in {folder}, nothing expunged")
+            if not stored:
+                return set()
+            status, _ = await self._imap('expunge')
+            if status != 'OK':
+                return set()
+            return {uid for chunk in stored for uid in parse_sequence_set(chunk)}
+        finally:
+            await self._restore_deleted_flags(cleared, folder)
+
+    async def _restore_deleted_flags(self, chunks: List[str], folder: str):
+        """恢复暂时去掉的 \\Deleted，无法恢复时报告受影响的UID"""
+        if not chunks:
+            return
+        try:
+            results = await self._pipeline(self._deleted_flag_commands(chunks, add=True))
+            failed = [chunk for chunk, (status, _) in zip(chunks, results) if status != 'OK']
+        except Exception as e:
+            print(f"Failed to restore \\Deleted flags in {folder}: {e}")
+            failed = chunks
+        if failed:
+            print(f"\\Deleted flags not restored on UIDs {','.join(failed)} in {folder}")
+
+    @staticmethod
+    def _deleted_flag_commands(chunks: List[str], add: bool) -> List[Tuple[str, ...]]:
+        action = '+FLAGS.SILENT' if add else '-FLAGS.SILENT'
+        return [('UID', 'STORE', chunk, action, '(\\Deleted)') for chunk in chunks]
+
+    def _forget_removed(self, folder: str, uids: List[int]):
+        """邮件已从文件夹中移除：清除各级缓存，下次操作重新SELECT以获得准确的EXISTS"""
+        if not uids:
+            return
+        uidvalidity = self._folder_uidvalidity(folder)
+        for uid in uids:
+            key = self._memory_key(str(uid))
+            self._messages.discard(key)
+            if key is not None and self._raw_store is not None:
+                self._raw_store.discard(self._raw_store_key(key))
+        if self._cache is not None and uidvalidity is not None:
+            try:
+                self._cache.remove_messages(self._account_key(), folder, uidvalidity, uids)
+            except sqlite3.Error as e:
+                print(f"Failed to update message cache: {e}")
+        self._set_mailbox_state(None)
+
+    @_uses_connection
     async def get_message_attachments(self, message_id: str, folder: str = "INBOX") -> List[Dict[str, Any]]:
         """
-        获取邮件的附件列表，使用Python email模块的iter_attachments()方法来正确识别真正的文件附件
+        获取邮件的附件列表，只获取BODYSTRUCTURE，不传输任何附件内容
         
         Args:
             message_id: 邮件ID
             folder: 文件夹名称
             
         Returns:
-            List[Dict]: 附件元数据列表，包含filename、content_type、size等信息
+            List[Dict]: 附件元数据列表，包含filename、content_type、size（解码后估算大小）、
+            encoded_size、encoding、part_id（IMAP部分编号）等信息
         """
-        if not await self.select_folder(folder):
+        if not await self.select_folder(folder, readonly=True):
+            return []
+        
+        uid = self._resolve_uid(message_id, folder)
+        if uid is None:
             return []
         
         try:
-            # 获取完整的邮件MIME结构
-            status, msg_data = self.connection.fetch(message_id, '(RFC822)')
-            if status != 'OK':
+            body_root = await self._fetch_body_structure(uid)
+            if body_root is None:
                 return []
             
-            # 解析邮件
-            raw_email = msg_data[0][1]
-            email_message = email.message_from_bytes(raw_email, policy=policy.default)
-            
             attachments = []
-            part_id = 0
-            
-            # 统一遍历所有parts来查找附件，避免重复检测
-            processed_filenames = set()  # 防止重复处理同一个文件
-            
-            for part in email_message.walk():
-                content_type = part.get_content_type()
-                content_disposition = part.get_content_disposition()
-                filename = part.get_filename()
-                part_id += 1
-                
-                # 跳过非附件的部分
-                if not filename and content_disposition != 'attachment':
-                    continue
-                
-                # 如果没有文件名但是attachment类型，为图片生成文件名
-                if not filename and content_disposition == 'attachment' and content_type.startswith('image/'):
-                    extension = content_type.split('/')[-1]
-                    filename = f"image.{extension}"
-                
-                # 必须有文件名才处理
-                if not filename:
-                    continue
-                
-                # 防止重复处理同一个文件名
-                if filename in processed_filenames:
-                    continue
-                processed_filenames.add(filename)
-                
+            for body_part, filename in find_attachment_parts(body_root):
                 # 检查是否是真正的附件（not embedded email content）
-                if self._is_embedded_email_content(part, filename, content_type):
+                if await self._is_embedded_email_part(uid, body_part, filename):
                     continue
                 
-                # 获取附件大小
-                try:
-                    payload = part.get_payload(decode=True)
-                    size = len(payload) if payload else 0
-                except Exception:
-                    size = 0
-                
-                attachment_info = {
+                attachments.append({
                     'filename': filename,
-                    'content_type': content_type,
-                    'size': size,
-                    'part_id': part_id,
-                    'content_disposition': str(part.get('Content-Disposition', ''))
-                }
-                attachments.append(attachment_info)
+                    'content_type': body_part.content_type,
+                    'size': body_part.decoded_size,
+                    'encoded_size': body_part.size,
+                    'encoding': body_part.encoding,
+                    'part_id': body_part.part,
+                    'content_disposition': body_part.disposition or ''
+                })
             
             return attachments
             
         except Exception as e:
             print(f"Failed to get attachments for message {message_id}: {e}")
             return []
-    
-    def _is_embedded_email_content(self, part, filename: str, content_type: str) -> bool:
+
+    async def _fetch_body_structure(self, uid: str) -> Optional[BodyPart]:
+        """获取并解析邮件的BODYSTRUCTURE，结果保存在内存缓存中"""
+        key = self._memory_key(uid)
+        entry = self._messages.get(key) or CachedMessage()
+        if entry.body_root is not None:
+            return entry.body_root
+
+        status, msg_data = await self._uid('FETCH', uid, '(BODYSTRUCTURE)')
+        if status != 'OK':
+            return None
+        
+        fetched = parse_fetch_response(msg_data)
+        if not fetched:
+            return None
+        entry.body_root = parse_bodystructure(fetched[0][1].get('BODYSTRUCTURE'))
+        if entry.body_root is not None:
+            self._messages.put(key, entry)
+        return entry.body_root
+
+    async def _is_embedded_email_part(self, uid: str, body_part: BodyPart, filename: str) -> bool:
+        """
+        基于BODYSTRUCTURE判断附件是否为嵌入的邮件内容
+        
+        只有疑似的.eml附件才会通过 BODY.PEEK[<part>]<0.N> 读取开头的少量字节做检查
         """
-        判断附件是否为嵌入的邮件内容（如回复/转发邮件中的原邮件）
+        if not filename.lower().endswith('.eml'):
+            return False
+        
+        if body_part.content_type not in EMBEDDED_EMAIL_CONTENT_TYPES:
+            return False
         
+        try:
+            cached = self._cached_part(uid, body_part)
+            if cached is not None:
+                content_str = cached[:EMBEDDED_EMAIL_PEEK_BYTES].decode('utf-8', errors='ignore')
+                return self._looks_like_email_headers(content_str[:500])
+
+            status, msg_data = await self._uid(
+                'FETCH', uid, f'(BODY.PEEK[{body_part.part}]<0.{EMBEDDED_EMAIL_PEEK_BYTES}>)'
+            )
+            if status != 'OK':
+                return False
+            fetched = parse_fetch_response(msg_data)
+            if not fetched:
+                return False
+            prefix = get_body_section(fetched[0][1], body_part.part) or b''
+            content_str = decode_part_payload(prefix, body_part.encoding).decode('utf-8', errors='ignore')
+            return self._looks_like_email_headers(content_str[:500])
+        except Exception:
+            return False
+    
+    def _is_embedded_email_peek(self, attachment: ScannedAttachment) -> bool:
+        """
+        根据附件开头的片段判断是否为嵌入的邮件内容（如回复/转发邮件中的原邮件）
+
         Args:
-            part: 邮件部分对象
-            filename: 文件名
-            content_type: 内容类型
-            
+            attachment: 扫描得到的附件元数据，peek为解码后的开头片段
+
         Returns:
             bool: True表示是嵌入邮件内容，应该过滤掉
         """
-        # 检查文件名是否为.eml
-        if not filename.lower().endswith('.eml'):
+        if not attachment.filename.lower().endswith('.eml'):
             return False
+        if attachment.content_type not in EMBEDDED_EMAIL_CONTENT_TYPES:
+            return False
+        content_str = attachment.peek.decode('utf-8', errors='ignore')[:500]
+        return self._looks_like_email_headers(content_str)
+
+    def _looks_like_email_headers(self, content_str: str) -> bool:
+        """检查文本开头是否包含典型的邮件头"""
+        email_headers = ['Received:', 'Message-ID:', 'From:', 'To:', 'Subject:', 'Date:', 'X-QQ-']
+        header_count = sum(1 for header in email_headers if header in content_str)
         
-        # 检查content-type
-        if content_type in ['message/rfc822', 'text/plain', 'application/octet-stream']:
-            try:
-                # 获取内容的前几行来检查是否包含邮件头
-                payload = part.get_payload(decode=True)
-                if payload:
-                    content_str = payload.decode('utf-8', errors='ignore')[:500]  # 只检查前500个字符
-                    
-                    # 检查是否包含典型的邮件头
-                    email_headers = ['Received:', 'Message-ID:', 'From:', 'To:', 'Subject:', 'Date:', 'X-QQ-']
-                    header_count = sum(1 for header in email_headers if header in content_str)
-                    
-                    # 如果包含2个或以上的邮件头，很可能是嵌入的邮件内容
-                    if header_count >= 2:
-                        return True
-                        
-            except Exception:
-                # 如果无法解码内容，检查其他特征
-                pass
-        
-        return False
+        # 如果包含2个或以上的邮件头，很可能是嵌入的邮件内容
+        return header_count >= 2
 
     async def download_attachment_payload(self, message_id: str, filename: str, folder: str = "INBOX") -> Optional[bytes]:
         """
@@ -751,47 +2783,233 @@ class IMAPService:
         Returns:
             Optional[bytes]: 附件内容的字节流，如果失败返回None
         """
-        if not await self.select_folder(folder):
-            return None
+        payloads = await self.download_attachment_payloads(message_id, [filename], folder)
+        return payloads.get(filename)
+
+    @_uses_connection
+    async def download_attachment_payloads(
+        self,
+        message_id: str,
+        filenames: List[str],
+        folder: str = "INBOX"
+    ) -> Dict[str, Optional[bytes]]:
+        """
+        按MIME部分编号批量下载同一封邮件的多个附件
+        
+        先获取BODYSTRUCTURE定位附件所在的部分，再用一条FETCH命令
+        只获取所需的 BODY.PEEK[<part>]，不会重复传输整封邮件。
+        
+        Args:
+            message_id: 邮件ID
+            filenames: 附件文件名列表
+            folder: 文件夹名称
+            
+        Returns:
+            Dict[str, Optional[bytes]]: 文件名到附件内容的映射，未找到或失败的为None
+        """
+        payloads: Dict[str, Optional[bytes]] = {filename: None for filename in filenames}
+        if not filenames:
+            return payloads
+        
+        if not await self.select_folder(folder, readonly=True):
+            return payloads
+        
+        uid = self._resolve_uid(message_id, folder)
+        if uid is None:
+            return payloads
         
         try:
-            # 重新获取邮件并解析，直接查找附件
-            status, msg_data = self.connection.fetch(message_id, '(RFC822)')
+            parts = await self._locate_attachment_parts(uid, filenames)
+            for filename in filenames:
+                if filename not in parts:
+                    print(f"Attachment '{filename}' not found in message {message_id}")
+            missing = {}
+            for filename, body_part in parts.items():
+                cached = self._cached_part(uid, body_part)
+                if cached is None:
+                    missing[filename] = body_part
+                else:
+                    payloads[filename] = cached
+            if not missing:
+                return payloads
+            
+            sections = ' '.join(f'BODY.PEEK[{body_part.part}]' for body_part in missing.values())
+            status, msg_data = await self._uid('FETCH', uid, f'({sections})')
             if status != 'OK':
-                return None
+                return payloads
             
-            # 解析邮件
-            raw_email = msg_data[0][1]
-            email_message = email.message_from_bytes(raw_email, policy=policy.default)
+            fetched = parse_fetch_response(msg_data)
+            if not fetched:
+                return payloads
+            attributes = fetched[0][1]
             
-            # 遍历所有parts找到匹配的附件
-            for part in email_message.walk():
-                content_disposition = part.get_content_disposition()
-                part_filename = part.get_filename()
-                content_type = part.get_content_type()
-                
-                # 生成与get_message_attachments相同的文件名逻辑
-                if not part_filename and content_disposition == 'attachment' and content_type.startswith('image/'):
-                    extension = content_type.split('/')[-1]
-                    part_filename = f"image.{extension}"
-                
-                # 找到匹配的文件名
-                if part_filename == filename:
-                    # 确保不是嵌入的邮件内容
-                    if self._is_embedded_email_content(part, part_filename, content_type):
-                        continue
-                    
-                    # 获取并解码附件内容
-                    try:
-                        payload = part.get_payload(decode=True)
-                        return payload
-                    except Exception as e:
-                        print(f"Failed to decode attachment '{filename}': {e}")
-                        return None
+            key = self._memory_key(uid)
+            entry = self._messages.get(key) or CachedMessage()
+            for filename, body_part in missing.items():
+                data = get_body_section(attributes, body_part.part)
+                if data is None:
+                    continue
+                try:
+                    payloads[filename] = decode_part_payload(data, body_part.encoding)
+                    entry.parts[body_part.part] = payloads[filename]
+                except Exception as e:
+                    print(f"Failed to decode attachment '{filename}': {e}")
+            if entry.parts:
+                self._messages.put(key, entry)
             
-            print(f"Attachment '{filename}' not found in message {message_id}")
-            return None
+            return payloads
             
         except Exception as e:
-            print(f"Failed to download attachment '{filename}' from message {message_id}: {e}")
-            return None
+            print(f"Failed to download attachments {filenames} from message {message_id}: {e}")
+            return payloads
+
+    @_uses_connection
+    async def download_attachments_to_dir(
+        self,
+        message_id: str,
+        filenames: List[str],
+        save_path: str,
+        folder: str = "INBOX"
+    ) -> Dict[str, Optional[str]]:
+        """
+        流式下载附件并保存到本地目录
+        
+        按 BODY.PEEK[<part>]<offset.length> 分块获取附件部分，边获取边解码写入临时文件，
+        完成后原子重命名为目标文件。内存占用与附件大小无关。
+        
+        Args:
+            message_id: 邮件ID
+            filenames: 附件文件名列表
+            save_path: 保存目录
+            folder: 文件夹名称
+            
+        Returns:
+            Dict[str, Optional[str]]: 文件名到保存路径的映射，未找到或失败的为None
+        """
+        saved: Dict[str, Optional[str]] = {filename: None for filename in filenames}
+        if not filenames:
+            return saved
+        
+        if not await self.select_folder(folder, readonly=True):
+            return saved
+        
+        uid = self._resolve_uid(message_id, folder)
+        if uid is None:
+            return saved
+        
+        try:
+            parts = await self._locate_attachment_parts(uid, filenames)
+        except Exception as e:
+            print(f"Failed to locate attachments {filenames} in message {message_id}: {e}")
+            return saved
+        
+        for filename in filenames:
+            body_part = parts.get(filename)
+            if body_part is None:
+                print(f"Attachment '{filename}' not found in message {message_id}")
+                continue
+            file_path = os.path.join(save_path, filename)
+            # 磁盘上的原始邮件分块解码到文件，不整块读入内存
+            cached = self._cached_part(uid, body_part, read_store=False)
+            if cached is not None:
+                if self._write_file_atomic(file_path, cached):
+                    saved[filename] = file_path
+            elif self._copy_stored_part(uid, body_part, file_path):
+                saved[filename] = file_path
+            elif await self._stream_part_to_file(uid, body_part, file_path):
+                saved[filename] = file_path
+        
+        return saved
+
+    async def _stream_part_to_file(
+        self,
+        uid: str,
+        body_part: BodyPart,
+        file_path: str
+    ) -> bool:
+        """分块获取MIME部分并增量解码到文件，失败时不会留下不完整的目标文件"""
+        chunk_size = ATTACHMENT_CHUNK_SIZE
+        directory = os.path.dirname(os.path.abspath(file_path))
+        temp_path = None
+        try:
+            # 保存目录不存在或不可写时在这里失败，只影响这一个附件
+            fd, temp_path = tempfile.mkstemp(
+                prefix=f".{os.path.basename(file_path)}.", suffix=".part", dir=directory
+            )
+            decoder = PartDecoder(body_part.encoding)
+            with os.fdopen(fd, 'wb') as f:
+                offset = 0
+                while True:
+                    status, msg_data = await self._uid(
+                        'FETCH', uid, f'(BODY.PEEK[{body_part.part}]<{offset}.{chunk_size}>)'
+                    )
+                    if status != 'OK':
+                        raise RuntimeError(f"FETCH failed with status {status}")
+                    fetched = parse_fetch_response(msg_data)
+                    chunk = get_body_section(fetched[0][1], body_part.part) if fetched else None
+                    if chunk is None:
+                        # 第一次FETCH就没有这个部分说明响应有问题；长度为0的附件是合法的空内容
+                        if offset == 0:
+                            raise RuntimeError(f"FETCH response has no BODY[{body_part.part}]")
+                        break
+                    if not chunk:
+                        break
+                    f.write(decoder.feed(chunk))
+                    offset += len(chunk)
+                    if len(chunk) < chunk_size:
+                        break
+                f.write(decoder.flush())
+            
+            os.replace(temp_path, file_path)
+            return True
+            
+        except Exception as e:
+            print(f"Failed to download attachment part {body_part.part} of message UID {uid}: {e}")
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+            return False
+
+    @staticmethod
+    def _write_file_atomic(file_path: str, data: bytes) -> bool:
+        """把内存中的附件内容写入临时文件后原子重命名"""
+        return IMAPService._write_chunks_atomic(file_path, (data,))
+
+    @staticmethod
+    def _write_chunks_atomic(file_path: str, chunks: Iterable[bytes]) -> bool:
+        """逐块写入临时文件后原子重命名，失败时不会留下不完整的目标文件"""
+        directory = os.path.dirname(os.path.abspath(file_path))
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                prefix=f".{os.path.basename(file_path)}.", suffix=".part", dir=directory
+            )
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temp_path, file_path)
+            return True
+        except OSError as e:
+            print(f"Failed to write attachment to {file_path}: {e}")
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+            return False
+
+    async def _locate_attachment_parts(self, uid: str, filenames: List[str]) -> Dict[str, BodyPart]:
+        """根据BODYSTRUCTURE查找文件名对应的MIME部分，规则与get_message_attachments一致"""
+        body_root = await self._fetch_body_structure(uid)
+        wanted = set(filenames)
+        parts: Dict[str, BodyPart] = {}
+        for body_part, part_filename in find_attachment_parts(body_root):
+            if part_filename not in wanted or part_filename in parts:
+                continue
+            # 确保不是嵌入的邮件内容
+            if await self._is_embedded_email_part(uid, body_part, part_filename):
+                continue
+            parts[part_filename] = body_part
+        return parts
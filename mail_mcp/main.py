@@ -5,7 +5,7 @@ Main entry point for the Mail MCP server
 import asyncio
 import logging
 import sys
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from fastmcp import FastMCP
 from dotenv import load_dotenv
@@ -56,20 +56,31 @@ class MailMCPServer:
         """Register MCP tools"""
 
         @self.mcp.tool()
-        async def list_messages(folder: str = "INBOX", limit: int = 20) -> str:
-            """List messages in specified folder (newest first)"""
+        async def list_messages(folder: str = "INBOX", limit: int = 20, offset: int = 0, cursor: str = "") -> str:
+            """
+            List messages in specified folder (newest first)
+
+            Pass the cursor returned by the previous call to get the next page; offset only applies to the first page.
+            """
             if not self.imap_service:
                 return "IMAP service not initialized"
 
             try:
-                messages = await self.imap_service.list_messages(folder, limit)
+                messages, next_cursor = await self.imap_service.list_messages_page(
+                    folder, limit, cursor=cursor or None, offset=offset
+                )
                 
                 if not messages:
                     return f"文件夹 {folder} 中没有邮件"
                 
-                result_lines = [f"📬 文件夹 {folder} 中的最新 {len(messages)} 封邮件 (最新优先):"]
+                if offset:
+                    result_lines = [
+                        f"📬 文件夹 {folder} 中的第 {offset + 1}-{offset + len(messages)} 封邮件 (最新优先):"
+                    ]
+                else:
+                    result_lines = [f"📬 文件夹 {folder} 中的最新 {len(messages)} 封邮件 (最新优先):"]
                 
-                for i, msg in enumerate(messages, 1):
+                for i, msg in enumerate(messages, offset + 1):
                     # 格式化日期 - msg.date 已经是字符串格式
                     if msg.date:
                         try:
@@ -110,6 +121,8 @@ class MailMCPServer:
                     
                     result_lines.append(f"{i:2d}. {status_icon} {date_str} | {from_name} | {subject}{attachment_icon}")
                 
+                if next_cursor:
+                    result_lines.append(f"\n下一页游标: {next_cursor}")
                 return "\n".join(result_lines)
                     
             except Exception as e:
@@ -218,18 +231,38 @@ class MailMCPServer:
             query: str,
             folder: str = "INBOX", 
             unread_only: bool = False,
-            limit: int = 20
+            limit: int = 20,
+            cursor: str = "",
+            all_folders: bool = False
         ) -> str:
-            """搜索邮件"""
+            """搜索邮件（最新优先），传入上次返回的游标获取下一页；all_folders为True时并行搜索所有文件夹"""
             if not self.imap_service:
                 return "IMAP service not initialized"
 
             try:
-                messages = await self.imap_service.search_messages_simple(
+                if all_folders:
+                    result = await self.imap_service.search_all_folders(
+                        query=query,
+                        unread_only=unread_only,
+                        limit=limit
+                    )
+                    messages = result['messages']
+                    result_lines = [f"在 {len(result['searched'])} 个文件夹中找到 {len(messages)} 封匹配的邮件:"]
+                    for msg in messages:
+                        status = "已读" if msg.is_read else "未读"
+                        result_lines.append(f"  📧 [{msg.folder}] {msg.subject} - {msg.from_address} ({status})")
+                    if result['timed_out']:
+                        result_lines.append(f"\n搜索超时的文件夹（结果不完整）: {', '.join(result['timed_out'])}")
+                    if result['failed']:
+                        result_lines.append(f"\n搜索失败的文件夹: {', '.join(result['failed'])}")
+                    return "\n".join(result_lines)
+
+                messages, next_cursor = await self.imap_service.search_messages_page(
                     query=query,
                     folder=folder,
                     unread_only=unread_only,
-                    limit=limit
+                    limit=limit,
+                    cursor=cursor or None
                 )
                 
                 if messages:
@@ -237,6 +270,8 @@ class MailMCPServer:
                     for msg in messages:
                         status = "已读" if msg.is_read else "未读"
                         result_lines.append(f"  📧 {msg.subject} - {msg.from_address} ({status})")
+                    if next_cursor:
+                        result_lines.append(f"\n下一页游标: {next_cursor}")
                     return "\n".join(result_lines)
                 else:
                     return f"在文件夹 {folder} 中未找到匹配 '{query}' 的邮件"
@@ -245,33 +280,114 @@ class MailMCPServer:
                 return f"搜索邮件时发生错误: {str(e)}"
 
         @self.mcp.tool()
-        async def mark_as_read(message_ids: list[str]) -> str:
-            """标记邮件为已读（支持批量操作）"""
+        async def mark_as_read(message_ids: list[str], folder: str = "INBOX", unread: bool = False) -> str:
+            """标记邮件为已读或未读（支持批量操作）"""
             if not self.imap_service:
                 return "IMAP service not initialized"
 
             if not message_ids:
                 return "必须提供至少一个邮件ID"
 
+            state = "未读" if unread else "已读"
             try:
-                if len(message_ids) == 1:
+                if len(message_ids) == 1 and not unread:
                     # 单邮件标记
-                    success = await self.imap_service.mark_as_read(message_ids[0])
+                    success = await self.imap_service.mark_as_read(message_ids[0], folder)
                     if success:
                         return f"邮件 {message_ids[0]} 已标记为已读"
                     else:
                         return f"标记邮件 {message_ids[0]} 为已读失败"
                 else:
-                    # 批量标记
-                    result = await self.imap_service.mark_messages_as_read(message_ids)
+                    # 批量标记：UID压缩为集合，一次往返完成
+                    result = await self.imap_service.store_flags(
+                        message_ids, ['\\Seen'], add=not unread, folder=folder
+                    )
+                    if 'error' in result:
+                        return f"标记邮件时发生错误: {result['error']}"
                     if result['success']:
-                        return f"成功标记 {result['successful_count']} 封邮件为已读"
+                        return f"成功标记 {result['successful_count']} 封邮件为{state}"
                     else:
-                        return f"批量标记完成：成功 {result['successful_count']} 封，失败 {result['failed_count']} 封"
+                        return (
+                            f"批量标记完成：成功 {result['successful_count']} 封，失败 {result['failed_count']} 封"
+                            f"（{', '.join(result['failed_ids'])}）"
+                        )
                         
             except Exception as e:
                 return f"标记邮件时发生错误: {str(e)}"
 
+        @self.mcp.tool()
+        async def set_flags(
+            message_ids: list[str],
+            flags: list[str],
+            remove: bool = False,
+            folder: str = "INBOX"
+        ) -> str:
+            """批量添加或移除邮件标志：seen、flagged、answered 或自定义关键字（如 $Important）"""
+            if not self.imap_service:
+                return "IMAP service not initialized"
+
+            if not message_ids:
+                return "必须提供至少一个邮件ID"
+
+            try:
+                result = await self.imap_service.store_flags(message_ids, flags, add=not remove, folder=folder)
+                if 'error' in result:
+                    return f"修改邮件标志时发生错误: {result['error']}"
+                action = "移除" if remove else "添加"
+                lines = [f"已为 {result['successful_count']} 封邮件{action}标志 {', '.join(flags)}"]
+                if result['failed_ids']:
+                    lines.append(f"失败 {result['failed_count']} 封: {', '.join(result['failed_ids'])}")
+                return "\n".join(lines)
+
+            except ValueError as e:
+                return f"无效的标志: {str(e)}"
+            except Exception as e:
+                return f"修改邮件标志时发生错误: {str(e)}"
+
+        def format_bulk_result(result: Dict[str, Any], action: str) -> str:
+            if 'error' in result:
+                return f"{action}邮件时发生错误: {result['error']}"
+            lines = [f"成功{action} {result['successful_count']} 封邮件"]
+            if result['failed_ids']:
+                lines.append(f"失败 {result['failed_count']} 封: {', '.join(result['failed_ids'])}")
+            return "\n".join(lines)
+
+        @self.mcp.tool()
+        async def delete_messages(message_ids: list[str], folder: str = "INBOX") -> str:
+            """永久删除邮件（支持批量操作），文件夹中其他已标记删除的邮件不受影响"""
+            if not self.imap_service:
+                return "IMAP service not initialized"
+
+            try:
+                result = await self.imap_service.delete_messages(message_ids, folder)
+                return format_bulk_result(result, "删除")
+            except Exception as e:
+                return f"删除邮件时发生错误: {str(e)}"
+
+        @self.mcp.tool()
+        async def move_messages(message_ids: list[str], target_folder: str, folder: str = "INBOX") -> str:
+            """把邮件移动到另一个文件夹（支持批量操作）"""
+            if not self.imap_service:
+                return "IMAP service not initialized"
+
+            try:
+                result = await self.imap_service.move_messages(message_ids, target_folder, folder)
+                return format_bulk_result(result, "移动")
+            except Exception as e:
+                return f"移动邮件时发生错误: {str(e)}"
+
+        @self.mcp.tool()
+        async def copy_messages(message_ids: list[str], target_folder: str, folder: str = "INBOX") -> str:
+            """把邮件复制到另一个文件夹（支持批量操作）"""
+            if not self.imap_service:
+                return "IMAP service not initialized"
+
+            try:
+                result = await self.imap_service.copy_messages(message_ids, target_folder, folder)
+                return format_bulk_result(result, "复制")
+            except Exception as e:
+                return f"复制邮件时发生错误: {str(e)}"
+
         @self.mcp.tool()
         async def list_unread_messages(folder: str = "INBOX", limit: int = 20) -> str:
             """获取未读邮件列表（最新优先）"""
@@ -279,13 +395,8 @@ class MailMCPServer:
                 return "IMAP service not initialized"
 
             try:
-                # 使用search_messages搜索未读邮件
-                messages = await self.imap_service.search_messages_simple(
-                    query="",
-                    folder=folder,
-                    unread_only=True,
-                    limit=limit
-                )
+                # IDLE监听该文件夹时直接从内存返回，否则搜索未读邮件
+                messages = await self.imap_service.list_unread_messages(folder=folder, limit=limit)
                 
                 if not messages:
                     return f"📭 文件夹 {folder} 中没有未读邮件"
@@ -329,6 +440,28 @@ class MailMCPServer:
             except Exception as e:
                 return f"获取未读邮件时发生错误: {str(e)}"
 
+        @self.mcp.tool()
+        async def folder_overview(refresh: bool = False) -> str:
+            """列出所有文件夹的邮件数和未读数"""
+            if not self.imap_service:
+                return "IMAP service not initialized"
+
+            try:
+                folders = await self.imap_service.get_folder_overview(refresh=refresh)
+                if not folders:
+                    return "没有获取到文件夹信息"
+
+                result_lines = [f"📁 共 {len(folders)} 个文件夹:"]
+                for folder in folders:
+                    total = "?" if folder.messages is None else folder.messages
+                    unseen = "?" if folder.unseen is None else folder.unseen
+                    icon = "📭" if folder.unseen else "📬"
+                    result_lines.append(f"  {icon} {folder.name}: {unseen} 封未读 / 共 {total} 封")
+                return "\n".join(result_lines)
+
+            except Exception as e:
+                return f"获取文件夹概况时发生错误: {str(e)}"
+
         @self.mcp.tool()
         async def list_attachments(message_id: str, folder: str = "INBOX") -> str:
             """列出指定邮件的所有附件"""
@@ -389,27 +522,19 @@ class MailMCPServer:
                 downloaded = []
                 failed = []
                 
+                # 分块流式下载，边解码边写入文件
+                try:
+                    saved = await self.imap_service.download_attachments_to_dir(
+                        message_id, filenames, save_path, folder
+                    )
+                except Exception as e:
+                    print(f"Failed to download attachments {filenames}: {e}")
+                    saved = {}
+                
                 for filename in filenames:
-                    try:
-                        # 下载附件内容
-                        payload = await self.imap_service.download_attachment_payload(
-                            message_id, filename, folder
-                        )
-                        
-                        if payload:
-                            # 构建文件路径
-                            file_path = os.path.join(save_path, filename)
-                            
-                            # 写入文件
-                            with open(file_path, 'wb') as f:
-                                f.write(payload)
-                            
-                            downloaded.append(filename)
-                        else:
-                            failed.append(filename)
-                            
-                    except Exception as e:
-                        print(f"Failed to download attachment '{filename}': {e}")
+                    if saved.get(filename):
+                        downloaded.append(filename)
+                    else:
                         failed.append(filename)
                 
                 # 构建结果消息
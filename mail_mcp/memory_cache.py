@@ -0,0 +1,113 @@
+"""
+Byte-budgeted in-memory cache of fetched messages for Mail MCP server
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.message import Message
+from typing import Any, Dict, Hashable, Optional
+
+from .imap_parser import BodyPart
+from .models import EmailMessage
+
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# 每个条目除内容外的估算开销（BODYSTRUCTURE、EmailMessage等小对象）
+ENTRY_OVERHEAD = 1024
+
+
+@dataclass
+class CachedMessage:
+    """
+    内存缓存中的一封邮件
+
+    Attributes:
+        raw: 完整的RFC822原始字节
+        parsed: 由raw解析得到的邮件对象，附件可以直接从中取出
+        message: get_message返回的EmailMessage
+        body_root: 解析后的BODYSTRUCTURE
+        parts: 单独获取并解码的MIME部分内容，键为IMAP部分编号
+    """
+    raw: Optional[bytes] = None
+    parsed: Optional[Message] = None
+    message: Optional[EmailMessage] = None
+    body_root: Optional[BodyPart] = None
+    parts: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        """估算占用的内存：解析后的邮件对象按与原始字节同样大小计算"""
+        raw_size = len(self.raw) if self.raw is not None else 0
+        if self.parsed is not None:
+            raw_size *= 2
+        return raw_size + sum(len(data) for data in self.parts.values()) + ENTRY_OVERHEAD
+
+
+class MessageMemoryCache:
+    """
+    按总字节数而不是条目数淘汰的LRU缓存
+
+    get_message、list_attachments、download_attachments 连续访问同一封邮件时，
+    原始字节和解析结果只需获取和解析一次。条目内容变化后需要再次put以重新计算大小。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MEMORY_BUDGET):
+        self.max_bytes = max(0, max_bytes)
+        self._entries: 'OrderedDict[Hashable, CachedMessage]' = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self.total_bytes = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Optional[Hashable]) -> Optional[CachedMessage]:
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return entry
+
+    def put(self, key: Optional[Hashable], entry: CachedMessage):
+        """写入或更新条目，超出预算时从最久未使用的条目开始淘汰；单个条目超过预算时不缓存"""
+        if key is None:
+            return
+        self.discard(key)
+        size = entry.size
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self.discard(oldest)
+            self.stats['evictions'] += 1
+
+    def discard(self, key: Optional[Hashable]):
+        if key in self._entries:
+            del self._entries[key]
+            self.total_bytes -= self._sizes.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['entries'] = len(self._entries)
+        stats['bytes'] = self.total_bytes
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups * 100 if lookups else 0
+        return stats
@@ -0,0 +1,471 @@
+"""
+Persistent message metadata cache for Mail MCP server
+"""
+
+import json
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .models import EmailSummary
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uidnext INTEGER,
+    exists_count INTEGER,
+    highestmodseq INTEGER,
+    index_generation INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account, folder)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    subject TEXT NOT NULL DEFAULT '',
+    from_address TEXT NOT NULL DEFAULT '',
+    to_addresses TEXT NOT NULL DEFAULT '[]',
+    cc_addresses TEXT NOT NULL DEFAULT '[]',
+    date TEXT NOT NULL DEFAULT '',
+    message_id TEXT,
+    flags TEXT NOT NULL DEFAULT '[]',
+    size INTEGER NOT NULL DEFAULT 0,
+    bodystructure TEXT,
+    snippet TEXT,
+    body_indexed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (account, folder, uidvalidity, uid)
+);
+"""
+
+# 全文索引，行号与messages表的rowid相同（messages表不会VACUUM，rowid保持稳定）
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS message_index USING fts5(
+    subject, addresses, body, attachments,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+SCHEMA_VERSION = 3
+
+CACHE_FILENAME = 'messages.sqlite3'
+
+# 单条SQL中IN列表的最大参数个数，低于SQLite默认的变量上限
+MAX_SQL_VARIABLES = 500
+
+SNIPPET_LENGTH = 200
+
+# 写入全文索引的正文最大字符数
+INDEXED_BODY_LENGTH = 64 * 1024
+
+# BM25权重：主题、地址、正文、附件文件名
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 3.0)
+
+# unicode61分词器把连续的中日韩文字当作一个词，索引和查询时在每个字之间加空格，按短语匹配
+_CJK_CHAR = re.compile(r'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])')
+
+
+def _index_text(text: str) -> str:
+    return _CJK_CHAR.sub(r' \1 ', text or '')
+
+
+def build_match_query(query: str) -> str:
+    """
+    把用户输入的关键词转换为FTS5查询
+
+    每个空白分隔的词作为前缀短语匹配任意字段，多个词之间为AND。
+    """
+    terms = []
+    for term in query.split():
+        tokens = _index_text(term).split()
+        if tokens:
+            phrase = ' '.join(tokens).replace('"', '""')
+            terms.append(f'"{phrase}"*')
+    return ' AND '.join(terms)
+
+
+def _chunks(values: List[Any], size: int = MAX_SQL_VARIABLES) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class MessageCache:
+    """
+    基于SQLite的邮件元数据缓存，重启后仍然有效
+
+    以 (账户, 文件夹, UIDVALIDITY, UID) 为键保存邮件头、标志、大小、BODYSTRUCTURE和正文摘要。
+    文件夹的UIDVALIDITY变化时，该文件夹下的所有缓存条目一起失效。
+    主题、地址、附件文件名和正文同时写入FTS5全文索引，离线时也可以按BM25相关度搜索。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+        try:
+            self._db.executescript(FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            # SQLite编译时未启用FTS5，搜索交给服务器
+            self.fts_enabled = False
+        self._db.commit()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0
+        }
+
+    def close(self):
+        self._db.close()
+
+    def _migrate(self):
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        columns = {row['name'] for row in self._db.execute("PRAGMA table_info(messages)")}
+        if 'body_indexed' not in columns:
+            self._db.execute("ALTER TABLE messages ADD COLUMN body_indexed INTEGER NOT NULL DEFAULT 0")
+        columns = {row['name'] for row in self._db.execute("PRAGMA table_info(folders)")}
+        if 'index_generation' not in columns:
+            self._db.execute("ALTER TABLE folders ADD COLUMN index_generation INTEGER NOT NULL DEFAULT 0")
+        self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def get_folder(self, account: str, folder: str) -> Optional[Dict[str, Any]]:
+        """
+        获取文件夹的同步状态（UIDVALIDITY/UIDNEXT/EXISTS/HIGHESTMODSEQ）
+
+        index_generation 在文件夹的索引内容（邮件、标志、正文）变化时加一，
+        按相关度翻页的游标用它判断排序是否仍然有效。
+        """
+        row = self._db.execute(
+            "SELECT uidvalidity, uidnext, exists_count, highestmodseq, index_generation, updated_at "
+            "FROM folders WHERE account = ? AND folder = ?",
+            (account, folder)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def check_uidvalidity(self, account: str, folder: str, uidvalidity: int) -> bool:
+        """
+        记录SELECT/EXAMINE得到的UIDVALIDITY
+
+        Returns:
+            bool: UIDVALIDITY发生变化、旧的缓存条目和同步状态被清除时返回True
+        """
+        known = self.get_folder(account, folder)
+        if known is not None and known['uidvalidity'] == uidvalidity:
+            return False
+        with self._db:
+            if known is not None:
+                self._delete_folder(account, folder)
+                self.stats['invalidations'] += 1
+            self._db.execute(
+                "INSERT INTO folders (account, folder, uidvalidity, updated_at) VALUES (?, ?, ?, ?)",
+                (account, folder, uidvalidity, time.time())
+            )
+        return known is not None
+
+    def update_sync_state(
+        self,
+        account: str,
+        folder: str,
+        uidnext: Optional[int] = None,
+        highestmodseq: Optional[int] = None,
+        exists: Optional[int] = None
+    ):
+        """记录文件夹已同步到的UIDNEXT和HIGHESTMODSEQ，None表示保持不变"""
+        with self._db:
+            self._db.execute(
+                "UPDATE folders SET uidnext = COALESCE(?, uidnext), "
+                "highestmodseq = COALESCE(?, highestmodseq), "
+                "exists_count = COALESCE(?, exists_count), updated_at = ? "
+                "WHERE account = ? AND folder = ?",
+                (uidnext, highestmodseq, exists, time.time(), account, folder)
+            )
+
+    def clear_messages(self, account: str, folder: str):
+        """删除文件夹的全部缓存条目，保留UIDVALIDITY"""
+        with self._db:
+            self._delete_messages("account = ? AND folder = ?", (account, folder))
+            self._bump_generation(account, folder)
+
+    def invalidate_folder(self, account: str, folder: str):
+        """删除文件夹的状态和全部缓存条目"""
+        with self._db:
+            self._delete_folder(account, folder)
+
+    def get_messages(
+        self,
+        account: str,
+        folder: str,
+        uidvalidity: int,
+        uids: List[int]
+    ) -> Dict[int, Dict[str, Any]]:
+        """按UID批量读取缓存条目，返回 UID -> 条目 的映射"""
+        found: Dict[int, Dict[str, Any]] = {}
+        for chunk in _chunks(list(uids)):
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._db.execute(
+                f"SELECT * FROM messages WHERE account = ? AND folder = ? AND uidvalidity = ? "
+                f"AND uid IN ({placeholders})",
+                (account, folder, uidvalidity, *chunk)
+            ).fetchall()
+            for row in rows:
+                found[row['uid']] = self._decode_row(row)
+        self.stats['hits'] += len(found)
+        self.stats['misses'] += len(set(uids)) - len(found)
+        return found
+
+    def put_summaries(
+        self,
+        account: str,
+        folder: str,
+        uidvalidity: int,
+        entries: List[Dict[str, Any]]
+    ):
+        """
+        写入一批邮件摘要
+
+        Args:
+            entries: 每项包含 uid、summary (EmailSummary) 和 bodystructure（解析后的BODYSTRUCTURE）
+        """
+        rows = []
+        for entry in entries:
+            summary: EmailSummary = entry['summary']
+            rows.append((
+                account, folder, uidvalidity, int(entry['uid']),
+                summary.subject, summary.from_address,
+                json.dumps(summary.to_addresses, ensure_ascii=False),
+                json.dumps(summary.cc_addresses, ensure_ascii=False),
+                summary.date, summary.message_id,
+                json.dumps(summary.flags, ensure_ascii=False),
+                summary.size,
+                json.dumps(entry.get('bodystructure'), ensure_ascii=False)
+            ))
+        if not rows:
+            return
+        with self._db:
+            added = any(self._rowid(account, folder, uidvalidity, int(entry['uid'])) is None for entry in entries)
+            # 保留已有的正文摘要和正文索引
+            self._db.executemany(
+                "INSERT INTO messages (account, folder, uidvalidity, uid, subject, from_address, "
+                "to_addresses, cc_addresses, date, message_id, flags, size, bodystructure) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (account, folder, uidvalidity, uid) DO UPDATE SET "
+                "subject = excluded.subject, from_address = excluded.from_address, "
+                "to_addresses = excluded.to_addresses, cc_addresses = excluded.cc_addresses, "
+                "date = excluded.date, message_id = excluded.message_id, flags = excluded.flags, "
+                "size = excluded.size, bodystructure = excluded.bodystructure",
+                rows
+            )
+            if self.fts_enabled:
+                for entry in entries:
+                    self._index_summary(account, folder, uidvalidity, int(entry['uid']), entry['summary'])
+            if added:
+                self._bump_generation(account, folder)
+
+    def _index_summary(self, account: str, folder: str, uidvalidity: int, uid: int, summary: EmailSummary):
+        rowid = self._rowid(account, folder, uidvalidity, uid)
+        if rowid is None:
+            return
+        existing = self._db.execute("SELECT body FROM message_index WHERE rowid = ?", (rowid,)).fetchone()
+        addresses = ' '.join([summary.from_address, *summary.to_addresses, *summary.cc_addresses])
+        filenames = ' '.join(attachment.get('filename') or '' for attachment in summary.attachments)
+        self._db.execute("DELETE FROM message_index WHERE rowid = ?", (rowid,))
+        self._db.execute(
+            "INSERT INTO message_index (rowid, subject, addresses, body, attachments) VALUES (?, ?, ?, ?, ?)",
+            (
+                rowid,
+                _index_text(summary.subject),
+                _index_text(addresses),
+                existing['body'] if existing else '',
+                _index_text(filenames)
+            )
+        )
+
+    def _rowid(self, account: str, folder: str, uidvalidity: int, uid: int) -> Optional[int]:
+        row = self._db.execute(
+            "SELECT rowid FROM messages WHERE account = ? AND folder = ? AND uidvalidity = ? AND uid = ?",
+            (account, folder, uidvalidity, uid)
+        ).fetchone()
+        return row[0] if row else None
+
+    def update_flags(self, account: str, folder: str, uidvalidity: int, flags: Dict[int, List[str]]):
+        """更新一批邮件的标志"""
+        if not flags:
+            return
+        rows = []
+        for uid, values in flags.items():
+            encoded = json.dumps(list(values), ensure_ascii=False)
+            rows.append((encoded, account, folder, uidvalidity, int(uid), encoded))
+        with self._db:
+            # 只有标志确实变化时才改变索引的generation
+            cursor = self._db.executemany(
+                "UPDATE messages SET flags = ? "
+                "WHERE account = ? AND folder = ? AND uidvalidity = ? AND uid = ? AND flags != ?",
+                rows
+            )
+            if cursor.rowcount:
+                self._bump_generation(account, folder)
+
+    def set_snippet(self, account: str, folder: str, uidvalidity: int, uid: int, text: str):
+        """保存正文开头的摘要文本（仅更新已缓存的条目）"""
+        snippet = ' '.join(text.split())[:SNIPPET_LENGTH]
+        with self._db:
+            self._db.execute(
+                "UPDATE messages SET snippet = ? "
+                "WHERE account = ? AND folder = ? AND uidvalidity = ? AND uid = ?",
+                (snippet, account, folder, uidvalidity, int(uid))
+            )
+
+    def set_body_text(self, account: str, folder: str, uidvalidity: int, uid: int, text: str):
+        """保存正文摘要，并把正文写入全文索引"""
+        self.set_snippet(account, folder, uidvalidity, uid, text)
+        self.index_body(account, folder, uidvalidity, uid, text)
+
+    def index_body(self, account: str, folder: str, uidvalidity: int, uid: int, text: str):
+        """把解码后的正文（或开头片段）写入全文索引（仅更新已缓存的条目）"""
+        if not self.fts_enabled:
+            return
+        with self._db:
+            rowid = self._rowid(account, folder, uidvalidity, int(uid))
+            if rowid is None:
+                return
+            row = self._db.execute(
+                "SELECT subject, addresses, attachments FROM message_index WHERE rowid = ?", (rowid,)
+            ).fetchone()
+            if row is None:
+                return
+            self._db.execute("DELETE FROM message_index WHERE rowid = ?", (rowid,))
+            self._db.execute(
+                "INSERT INTO message_index (rowid, subject, addresses, body, attachments) VALUES (?, ?, ?, ?, ?)",
+                (rowid, row['subject'], row['addresses'], _index_text(text[:INDEXED_BODY_LENGTH]), row['attachments'])
+            )
+            self._db.execute("UPDATE messages SET body_indexed = 1 WHERE rowid = ?", (rowid,))
+            self._bump_generation(account, folder)
+
+    def pending_bodies(self, account: str, folder: str, uidvalidity: int, limit: int) -> Dict[int, Any]:
+        """最新的limit封正文尚未索引的邮件，返回 UID -> BODYSTRUCTURE"""
+        rows = self._db.execute(
+            "SELECT uid, bodystructure FROM messages "
+            "WHERE account = ? AND folder = ? AND uidvalidity = ? AND body_indexed = 0 "
+            "ORDER BY uid DESC LIMIT ?",
+            (account, folder, uidvalidity, limit)
+        ).fetchall()
+        return {row['uid']: json.loads(row['bodystructure'] or 'null') for row in rows}
+
+    def mark_body_indexed(self, account: str, folder: str, uidvalidity: int, uids: List[int]):
+        """记录没有可索引正文的邮件，避免重复获取"""
+        with self._db:
+            for chunk in _chunks([int(uid) for uid in uids]):
+                placeholders = ','.join('?' * len(chunk))
+                self._db.execute(
+                    f"UPDATE messages SET body_indexed = 1 WHERE account = ? AND folder = ? "
+                    f"AND uidvalidity = ? AND uid IN ({placeholders})",
+                    (account, folder, uidvalidity, *chunk)
+                )
+
+    def cached_uids(self, account: str, folder: str, uidvalidity: int) -> List[int]:
+        rows = self._db.execute(
+            "SELECT uid FROM messages WHERE account = ? AND folder = ? AND uidvalidity = ? ORDER BY uid",
+            (account, folder, uidvalidity)
+        ).fetchall()
+        return [row['uid'] for row in rows]
+
+    def search(
+        self,
+        account: str,
+        folder: str,
+        uidvalidity: int,
+        query: str,
+        is_read: Optional[bool] = None,
+        limit: int = 20,
+        before_uid: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        在全文索引中搜索，按BM25相关度排序
+
+        Args:
+            query: 关键词，匹配主题、地址、正文或附件文件名
+            is_read: 只返回已读（True）或未读（False）的邮件
+            before_uid: 只返回UID小于该值的邮件，按UID从新到旧排列（游标翻页）
+            offset: 跳过排在前面的结果数（按相关度翻页）
+
+        Returns:
+            List[Dict[str, Any]]: 缓存条目列表，相关度最高（或最新）的在前
+        """
+        match = build_match_query(query)
+        if not self.fts_enabled or not match:
+            return []
+        conditions = ''
+        params: List[Any] = [match, account, folder, uidvalidity]
+        if is_read is not None:
+            seen = "EXISTS (SELECT 1 FROM json_each(m.flags) WHERE value = '\\Seen')"
+            conditions = f" AND {seen}" if is_read else f" AND NOT {seen}"
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        order = f"bm25(message_index, {weights}), m.uid DESC"
+        if before_uid is not None:
+            conditions += " AND m.uid < ?"
+            params.append(before_uid)
+            order = "m.uid DESC"
+        rows = self._db.execute(
+            f"SELECT m.* FROM message_index JOIN messages m ON m.rowid = message_index.rowid "
+            f"WHERE message_index MATCH ? AND m.account = ? AND m.folder = ? AND m.uidvalidity = ?{conditions} "
+            f"ORDER BY {order} LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+        return [self._decode_row(row) for row in rows]
+
+    def remove_messages(self, account: str, folder: str, uidvalidity: int, uids: List[int]):
+        """删除已从服务器上消失的邮件"""
+        with self._db:
+            changes = self._db.total_changes
+            for chunk in _chunks([int(uid) for uid in uids]):
+                placeholders = ','.join('?' * len(chunk))
+                self._delete_messages(
+                    f"account = ? AND folder = ? AND uidvalidity = ? AND uid IN ({placeholders})",
+                    (account, folder, uidvalidity, *chunk)
+                )
+            if self._db.total_changes != changes:
+                self._bump_generation(account, folder)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['path'] = self.path
+        return stats
+
+    def _bump_generation(self, account: str, folder: str):
+        self._db.execute(
+            "UPDATE folders SET index_generation = index_generation + 1 WHERE account = ? AND folder = ?",
+            (account, folder)
+        )
+
+    def _delete_folder(self, account: str, folder: str):
+        self._delete_messages("account = ? AND folder = ?", (account, folder))
+        self._db.execute("DELETE FROM folders WHERE account = ? AND folder = ?", (account, folder))
+
+    def _delete_messages(self, where: str, params: tuple):
+        """删除满足条件的缓存条目及其全文索引"""
+        if self.fts_enabled:
+            self._db.execute(
+                f"DELETE FROM message_index WHERE rowid IN (SELECT rowid FROM messages WHERE {where})", params
+            )
+        self._db.execute(f"DELETE FROM messages WHERE {where}", params)
+
+    @staticmethod
+    def _decode_row(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        entry.pop('body_indexed', None)
+        for key in ('to_addresses', 'cc_addresses', 'flags', 'bodystructure'):
+            if entry.get(key) is not None:
+                entry[key] = json.loads(entry[key])
+        return entry
@@ -0,0 +1,267 @@
+"""
+Streaming MIME scanner that parses only the requested parts of a message for Mail MCP server
+"""
+
+import re
+from dataclasses import dataclass, field
+from email import policy
+from email.message import Message
+from email.parser import BytesHeaderParser, BytesParser
+from typing import AbstractSet, Any, Iterator, List, Optional, Tuple
+
+from .imap_parser import decode_part_payload, estimate_decoded_size
+
+
+# 可以请求的邮件组成部分
+HEADERS = 'headers'
+TEXT = 'text'
+HTML = 'html'
+ATTACHMENTS = 'attachments'
+ALL_COMPONENTS = frozenset((HEADERS, TEXT, HTML, ATTACHMENTS))
+
+# multipart嵌套的最大深度，更深的部分按普通部分处理
+MAX_MULTIPART_DEPTH = 20
+
+_HEADER_END = re.compile(rb'\r?\n\r?\n')
+
+
+@dataclass
+class ScannedAttachment:
+    """
+    扫描得到的附件元数据，不包含附件内容
+
+    Attributes:
+        filename: 文件名
+        content_type: 内容类型
+        size: 解码后的大小（base64和未编码内容是精确值，quoted-printable为上限）
+        encoding: Content-Transfer-Encoding
+        peek: 解码后的开头片段，长度由 scan_message 的 peek_bytes 决定
+    """
+    filename: str
+    content_type: str
+    size: int
+    encoding: str = '7bit'
+    peek: bytes = b''
+
+
+@dataclass
+class ScannedMessage:
+    """
+    scan_message 的结果，未请求的组成部分保持默认值
+
+    Attributes:
+        headers: 只包含邮件头的Message对象
+        text: 第一个不是附件的 text/plain 部分
+        html: 第一个不是附件的 text/html 部分
+        attachments: 附件元数据列表
+        complete: 是否扫描了整封邮件（False表示所需内容找到后提前停止）
+    """
+    headers: Optional[Message] = None
+    text: Optional[str] = None
+    html: Optional[str] = None
+    attachments: List[ScannedAttachment] = field(default_factory=list)
+    complete: bool = False
+
+
+def scan_message(
+    raw: bytes,
+    components: AbstractSet[str] = ALL_COMPONENTS,
+    peek_bytes: int = 0
+) -> ScannedMessage:
+    """
+    只解析需要的组成部分，不构建完整的邮件对象
+
+    邮件头用 BytesHeaderParser 解析；multipart正文按边界用 bytes.find 切分，
+    只有被选中的正文部分才交给 BytesParser 解码，附件内容既不逐行解析也不解码，
+    大小根据编码后的长度计算。请求的组成部分都找到后立即停止扫描。
+
+    Args:
+        raw: 完整的RFC822原始字节
+        components: 需要的组成部分（HEADERS、TEXT、HTML、ATTACHMENTS）
+        peek_bytes: 附件需要解码的开头字节数（例如用于识别嵌入的邮件），0表示不解码
+
+    Returns:
+        ScannedMessage: 扫描结果
+    """
+    headers, body_start = _parse_headers(raw, 0, len(raw))
+    result = ScannedMessage(headers=headers if HEADERS in components else None)
+    wanted = set(components) - {HEADERS}
+    if not wanted:
+        return result
+
+    for part_headers, part_start, start, end in _iter_leaves(raw, headers, 0, body_start, len(raw), 0):
+        content_type = part_headers.get_content_type()
+        is_body = part_headers.get_content_disposition() != 'attachment'
+        if is_body and content_type == 'text/plain' and result.text is None and TEXT in wanted:
+            result.text = _decode_text(raw[part_start:end])
+            wanted.discard(TEXT)
+        elif is_body and content_type == 'text/html' and result.html is None and HTML in wanted:
+            result.html = _decode_text(raw[part_start:end])
+            wanted.discard(HTML)
+        elif ATTACHMENTS in wanted:
+            filename = part_headers.get_filename()
+            if filename:
+                encoding = str(part_headers.get('Content-Transfer-Encoding', '7bit')).strip().lower()
+                result.attachments.append(ScannedAttachment(
+                    filename=filename,
+                    content_type=content_type,
+                    size=_decoded_size(raw, start, end, encoding),
+                    encoding=encoding,
+                    peek=decode_part_payload(raw[start:min(end, start + peek_bytes)], encoding) if peek_bytes else b''
+                ))
+        if not wanted:
+            return result
+
+    result.complete = True
+    return result
+
+
+def find_part(raw: Any, part: str) -> Optional[Tuple[str, int, int]]:
+    """
+    按IMAP部分编号（例如 "2"、"1.2"）找到非multipart部分的正文字节范围
+
+    只沿编号经过的multipart按边界查找，不解析其他部分。raw可以是bytes或mmap，
+    只对各级头部切片，部分内容由调用方按需读取。
+
+    Args:
+        raw: 完整的RFC822原始字节
+        part: 部分编号，编号规则与BODYSTRUCTURE相同，非multipart邮件的正文是部分 "1"
+
+    Returns:
+        Optional[Tuple[str, int, int]]: (Content-Transfer-Encoding, 正文开始, 正文结束)；
+        找不到该部分，或部分位于封装的邮件（message/rfc822）内部时为None
+    """
+    headers, start = _parse_headers(raw, 0, len(raw))
+    end = len(raw)
+    numbers = part.split('.')
+    for depth, number in enumerate(numbers):
+        boundary = _multipart_boundary(headers, depth)
+        if boundary is None:
+            if numbers != ['1']:
+                return None
+            break
+        if not number.isdigit():
+            return None
+        for position, child in enumerate(_iter_children(raw, boundary, start, end), 1):
+            if position == int(number):
+                headers, _, start, end = child
+                break
+        else:
+            return None
+    if _multipart_boundary(headers, len(numbers)) is not None:
+        return None
+    encoding = str(headers.get('Content-Transfer-Encoding', '7bit')).strip().lower()
+    return encoding, start, end
+
+
+def _parse_headers(data: bytes, start: int, end: int) -> Tuple[Message, int]:
+    """解析从start开始的头部，返回 (只含头部的Message, 正文开始位置)"""
+    if data[start:start + 2] == b'\r\n':
+        return Message(policy=policy.default), start + 2
+    if data[start:start + 1] == b'\n':
+        return Message(policy=policy.default), start + 1
+    match = _HEADER_END.search(data, start, end)
+    header_end = match.end() if match else end
+    headers = BytesHeaderParser(policy=policy.default).parsebytes(data[start:header_end])
+    return headers, header_end
+
+
+def _iter_leaves(
+    data: bytes,
+    headers: Message,
+    part_start: int,
+    body_start: int,
+    body_end: int,
+    depth: int
+) -> Iterator[Tuple[Message, int, int, int]]:
+    """按顺序逐个产生非multipart部分的 (头部, 部分开始, 正文开始, 正文结束)，需要时才查找下一个边界"""
+    boundary = _multipart_boundary(headers, depth)
+    if boundary is None:
+        yield headers, part_start, body_start, body_end
+        return
+
+    for child_headers, child_start, child_body, end in _iter_children(data, boundary, body_start, body_end):
+        yield from _iter_leaves(data, child_headers, child_start, child_body, end, depth + 1)
+
+
+def _multipart_boundary(headers: Message, depth: int) -> Optional[str]:
+    """multipart部分的边界，不是multipart或超过最大嵌套深度时为None"""
+    if headers.get_content_maintype() != 'multipart' or depth >= MAX_MULTIPART_DEPTH:
+        return None
+    return headers.get_boundary() or None
+
+
+def _iter_children(
+    data: bytes,
+    boundary: str,
+    body_start: int,
+    body_end: int
+) -> Iterator[Tuple[Message, int, int, int]]:
+    """按顺序逐个产生multipart的直接子部分 (头部, 部分开始, 正文开始, 正文结束)"""
+    delimiter = b'--' + boundary.encode('ascii', errors='surrogateescape')
+    found = _find_delimiter(data, delimiter, body_start, body_start, body_end)
+    while found is not None:
+        _, next_part, closed = found
+        if closed:
+            return
+        found = _find_delimiter(data, delimiter, next_part, body_start, body_end)
+        end = _content_end(data, found[0] if found is not None else body_end, next_part)
+        child_headers, child_body = _parse_headers(data, next_part, end)
+        yield child_headers, next_part, min(child_body, end), end
+
+
+def _find_delimiter(
+    data: bytes,
+    delimiter: bytes,
+    pos: int,
+    body_start: int,
+    body_end: int
+) -> Optional[Tuple[int, int, bool]]:
+    """查找下一个位于行首的边界行，返回 (边界行开始, 下一行开始, 是否为结束边界)"""
+    index = data.find(delimiter, pos, body_end)
+    while index != -1:
+        after = index + len(delimiter)
+        at_line_start = index == body_start or data[index - 1:index] == b'\n'
+        # 边界之后只能是结束标记 "--"、空白或换行，避免 "abc" 匹配到 "abc-def"
+        follows = data[after:after + 2]
+        if at_line_start and (after >= body_end or follows == b'--' or follows[:1] in (b'\r', b'\n', b' ', b'\t')):
+            line_end = data.find(b'\n', after, body_end)
+            next_line = body_end if line_end == -1 else line_end + 1
+            return index, next_line, data[after:after + 2] == b'--'
+        index = data.find(delimiter, index + 1, body_end)
+    return None
+
+
+def _content_end(data: bytes, delimiter_start: int, content_start: int) -> int:
+    """边界前的换行属于边界，不属于部分内容"""
+    end = delimiter_start
+    if end - 2 >= content_start and data[end - 2:end] == b'\r\n':
+        return end - 2
+    if end - 1 >= content_start and data[end - 1:end] == b'\n':
+        return end - 1
+    return end
+
+
+def _decode_text(part: bytes) -> str:
+    """只解析这一个文本部分，按传输编码和字符集解码"""
+    try:
+        return BytesParser(policy=policy.default).parsebytes(part).get_content() or ''
+    except (LookupError, ValueError, KeyError):
+        return ''
+
+
+def _decoded_size(data: bytes, start: int, end: int, encoding: str) -> int:
+    """不解码内容计算解码后的大小"""
+    if end <= start:
+        return 0
+    if encoding == 'base64':
+        # 按第一行判断换行是CRLF还是LF，只需统计一次换行数
+        first_newline = data.find(b'\n', start, end)
+        newline_size = 2 if first_newline > start and data[first_newline - 1:first_newline] == b'\r' else 1
+        chars = (end - start) - data.count(b'\n', start, end) * newline_size
+        tail = data[max(start, end - 8):end].rstrip()
+        padding = len(tail) - len(tail.rstrip(b'='))
+        return max(0, chars // 4 * 3 - min(padding, 2))
+    if encoding == 'quoted-printable':
+        return estimate_decoded_size(end - start, encoding)
+    return end - start
@@ -257,6 +257,105 @@ class EmailMessage:
         return msg
 
 
+@dataclass
+class EmailSummary:
+    """
+    邮件摘要数据模型（仅包含邮件头和结构信息，不含正文）
+
+    用于邮件列表和搜索结果，数据来自 BODY.PEEK[HEADER.FIELDS] 和 BODYSTRUCTURE，
+    因此与 EmailMessage 不同，不要求主题、发件人或收件人非空。
+
+    Attributes:
+        id: 邮件唯一标识符
+        subject: 邮件主题
+        from_address: 发件人地址
+        to_addresses: 收件人地址列表
+        date: 邮件日期
+        is_read: 是否已读
+        folder: 邮件文件夹名称
+        cc_addresses: 抄送地址列表
+        message_id: 邮件消息ID（可选）
+        flags: 邮件标志列表
+        size: 邮件大小（字节）
+        attachments: 附件元数据列表，每项包含filename、content_type、size
+    """
+    id: str
+    subject: str = ""
+    from_address: str = ""
+    to_addresses: List[str] = field(default_factory=list)
+    date: str = ""
+    is_read: bool = False
+    folder: str = "INBOX"
+    cc_addresses: List[str] = field(default_factory=list)
+    message_id: Optional[str] = None
+    flags: List[str] = field(default_factory=list)
+    size: int = 0
+    attachments: List[Dict[str, Any]] = field(default_factory=list)
+
+    def __post_init__(self):
+        """初始化后验证"""
+        if not self.id:
+            raise ValueError("Email ID cannot be empty")
+        if self.size < 0:
+            raise ValueError("Email size cannot be negative")
+
+    @property
+    def has_attachments(self) -> bool:
+        """是否包含附件"""
+        return len(self.attachments) > 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式，支持JSON序列化"""
+        result = {
+            'id': self.id,
+            'subject': self.subject,
+            'from_address': self.from_address,
+            'to_addresses': self.to_addresses,
+            'cc_addresses': self.cc_addresses,
+            'date': self.date,
+            'is_read': self.is_read,
+            'folder': self.folder,
+            'flags': self.flags,
+            'size': self.size,
+            'attachments': self.attachments,
+            'has_attachments': self.has_attachments,
+            'attachment_count': len(self.attachments)
+        }
+
+        if self.message_id:
+            result['message_id'] = self.message_id
+
+        return result
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'EmailSummary':
+        """从字典创建邮件摘要对象"""
+        return cls(
+            id=data['id'],
+            subject=data.get('subject', ''),
+            from_address=data.get('from_address', ''),
+            to_addresses=data.get('to_addresses', []),
+            cc_addresses=data.get('cc_addresses', []),
+            date=data.get('date', ''),
+            is_read=data.get('is_read', False),
+            folder=data.get('folder', 'INBOX'),
+            message_id=data.get('message_id'),
+            flags=data.get('flags', []),
+            size=data.get('size', 0),
+            attachments=data.get('attachments', [])
+        )
+
+    def to_json(self) -> str:
+        """转换为JSON字符串"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2, default=str)
+
+    @classmethod
+    def from_json(cls, json_str: str) -> 'EmailSummary':
+        """从JSON字符串创建邮件摘要对象"""
+        data = json.loads(json_str)
+        return cls.from_dict(data)
+
+
 @dataclass
 class EmailSearchCriteria:
     """
@@ -268,6 +367,7 @@ class EmailSearchCriteria:
         to_address: 收件人地址过滤
         subject: 主题过滤
         body_text: 正文内容过滤
+        text: 关键词，匹配主题、地址、正文或附件文件名中的任意一项
         date_from: 开始日期过滤
         date_to: 结束日期过滤
         is_read: 已读状态过滤
@@ -275,12 +375,14 @@ class EmailSearchCriteria:
         offset: 结果偏移量
         has_attachments: 是否有附件过滤
         message_id: 消息ID过滤
+        before_uid: 只匹配UID小于该值的邮件，设置后结果按UID从新到旧排列（游标翻页）
     """
     folder: str = "INBOX"
     from_address: Optional[str] = None
     to_address: Optional[str] = None
     subject: Optional[str] = None
     body_text: Optional[str] = None
+    text: Optional[str] = None
     date_from: Optional[str] = None
     date_to: Optional[str] = None
     is_read: Optional[bool] = None
@@ -288,6 +390,7 @@ class EmailSearchCriteria:
     offset: int = 0
     has_attachments: Optional[bool] = None
     message_id: Optional[str] = None
+    before_uid: Optional[int] = None
 
     def __post_init__(self):
         """初始化后验证"""
@@ -297,6 +400,8 @@ class EmailSearchCriteria:
             raise ValueError("Limit cannot exceed 100")
         if self.offset < 0:
             raise ValueError("Offset cannot be negative")
+        if self.before_uid is not None and self.before_uid < 1:
+            raise ValueError("before_uid must be positive")
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -316,9 +421,77 @@ class EmailSearchCriteria:
             self.to_address,
             self.subject,
             self.body_text,
+            self.text,
             self.date_from,
             self.date_to,
             self.is_read is not None,
             self.has_attachments is not None,
             self.message_id
         ])
+
+
+@dataclass
+class FolderStatus:
+    """
+    文件夹概况，数据来自 LIST-STATUS 或 STATUS
+
+    Attributes:
+        name: 文件夹名称
+        messages: 邮件总数
+        unseen: 未读邮件数
+        uidnext: 下一封新邮件的UID
+        highestmodseq: 文件夹的最高MODSEQ（服务器支持CONDSTORE时）
+        attributes: LIST返回的文件夹属性，例如 \\Sent、\\HasChildren
+    """
+    name: str
+    messages: Optional[int] = None
+    unseen: Optional[int] = None
+    uidnext: Optional[int] = None
+    highestmodseq: Optional[int] = None
+    attributes: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式，支持JSON序列化"""
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class MessageKey:
+    """
+    邮件的稳定标识 (文件夹, UIDVALIDITY, UID)
+
+    序列号会随其他客户端删除邮件而变化，UID在同一UIDVALIDITY下保持不变且不会复用。
+    对外的邮件ID格式为 "<UIDVALIDITY>:<UID>"，UIDVALIDITY未知时只有UID；
+    文件夹作为单独的参数传递。
+
+    Attributes:
+        folder: 文件夹名称
+        uidvalidity: 文件夹的UIDVALIDITY，未知时为None
+        uid: 邮件UID
+    """
+    folder: str
+    uidvalidity: Optional[int]
+    uid: str
+
+    def __post_init__(self):
+        """初始化后验证"""
+        if not self.uid.isdigit():
+            raise ValueError(f"Invalid message UID: {self.uid!r}")
+
+    @property
+    def message_id(self) -> str:
+        """对外暴露的邮件ID"""
+        if self.uidvalidity is None:
+            return self.uid
+        return f"{self.uidvalidity}:{self.uid}"
+
+    @classmethod
+    def parse(cls, message_id: str, folder: str = "INBOX") -> 'MessageKey':
+        """从 "<UIDVALIDITY>:<UID>" 或纯UID格式的邮件ID解析"""
+        text = str(message_id).strip()
+        uidvalidity, sep, uid = text.rpartition(':')
+        if not sep:
+            return cls(folder, None, text)
+        if not uidvalidity.isdigit():
+            raise ValueError(f"Invalid message id: {message_id!r}")
+        return cls(folder, int(uidvalidity), uid)
@@ -0,0 +1,157 @@
+"""
+On-disk store of raw RFC822 messages for Mail MCP server
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+RAW_STORE_DIRNAME = 'raw'
+
+DEFAULT_RAW_STORE_BUDGET = 1024 * 1024 * 1024
+
+# 清理时删除到预算的这个比例以下，避免每次写入都触发清理
+SWEEP_TARGET_RATIO = 0.9
+
+
+class RawMessageStore:
+    """
+    按邮件稳定标识的哈希保存原始邮件字节的磁盘缓存
+
+    文件路径为 <目录>/<哈希前两位>/<哈希>.eml。写入先写临时文件再原子重命名，
+    读取使用mmap，可以只读取需要的字节范围；读取时更新文件的修改时间，
+    总大小超过上限时按修改时间从旧到新删除。
+    同一标识对应的邮件内容不会改变，因此文件写入后不需要更新。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_RAW_STORE_BUDGET):
+        self.directory = directory
+        self.max_bytes = max(0, max_bytes)
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._scan())
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0
+        }
+
+    def path_for(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.eml")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取原始邮件，不存在时返回None"""
+        with self.open(key) as mapped:
+            return mapped[:] if mapped is not None else None
+
+    @contextmanager
+    def open(self, key: str) -> Iterator[Optional[mmap.mmap]]:
+        """
+        只读映射原始邮件，不存在时产生None
+
+        调用方只切片需要的字节范围，不复制整封邮件；映射在退出时关闭，
+        不能在with块之外保留对它的引用。
+        """
+        path = self.path_for(key)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            f = None
+        if f is None:
+            self.stats['misses'] += 1
+            yield None
+            return
+        with f:
+            try:
+                if os.fstat(f.fileno()).st_size == 0:
+                    raise FileNotFoundError(path)
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                os.utime(path)
+            except OSError:
+                self.stats['misses'] += 1
+                yield None
+                return
+            self.stats['hits'] += 1
+            with mapped:
+                yield mapped
+
+    def put(self, key: str, data: bytes) -> bool:
+        """原子写入原始邮件，超过上限的邮件不保存"""
+        if not data or len(data) > self.max_bytes:
+            return False
+        path = self.path_for(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            fd, temp_path = tempfile.mkstemp(prefix='.', suffix='.part', dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except OSError:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"Failed to store raw message: {e}")
+            return False
+
+        self.stats['writes'] += 1
+        self.total_bytes += len(data) - previous
+        if self.total_bytes > self.max_bytes:
+            self.sweep()
+        return True
+
+    def discard(self, key: str):
+        path = self.path_for(key)
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+            self.total_bytes -= size
+        except OSError:
+            pass
+
+    def sweep(self):
+        """删除最久未使用的文件，直到总大小低于上限"""
+        files = sorted(self._scan(), key=lambda item: item[2])
+        self.total_bytes = sum(size for _, size, _ in files)
+        target = self.max_bytes * SWEEP_TARGET_RATIO
+        for path, size, _ in files:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+            self.stats['evictions'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['bytes'] = self.total_bytes
+        stats['max_bytes'] = self.max_bytes
+        stats['path'] = self.directory
+        return stats
+
+    def _scan(self) -> List[Tuple[str, int, float]]:
+        """列出 (路径, 大小, 修改时间)，忽略未完成的临时文件"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.eml'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((path, stat.st_size, stat.st_mtime))
+        return files
@@ -24,6 +24,21 @@ class TestAttachmentTools:
                 return tool
         return None
     
+    def fake_download(self, payloads):
+        """模拟流式下载：把内容写入保存目录并返回保存路径"""
+        async def download(message_id, filenames, save_path, folder="INBOX"):
+            saved = {}
+            for filename in filenames:
+                payload = payloads.get(filename)
+                saved[filename] = None
+                if payload:
+                    file_path = os.path.join(save_path, filename)
+                    with open(file_path, 'wb') as f:
+                        f.write(payload)
+                    saved[filename] = file_path
+            return saved
+        return download
+    
     @pytest.fixture
     def mock_config(self):
         """创建模拟配置"""
@@ -135,10 +150,10 @@ class TestAttachmentTools:
     async def test_download_attachments_success(self, mail_server, mock_imap_service):
         """测试成功下载附件"""
         # 模拟附件内容
-        mock_imap_service.download_attachment_payload.side_effect = [
-            b"PDF content here",  # test.pdf
-            b"JPEG content here"  # image.jpg
-        ]
+        mock_imap_service.download_attachments_to_dir.side_effect = self.fake_download({
+            "test.pdf": b"PDF content here",
+            "image.jpg": b"JPEG content here"
+        })
         
         download_attachments_tool = await self.get_tool(mail_server, 'download_attachments')
         assert download_attachments_tool is not None
@@ -169,17 +184,19 @@ class TestAttachmentTools:
             with open(os.path.join(temp_dir, "image.jpg"), "rb") as f:
                 assert f.read() == b"JPEG content here"
             
-            # 验证调用次数
-            assert mock_imap_service.download_attachment_payload.call_count == 2
+            # 验证所有附件通过一次调用获取
+            mock_imap_service.download_attachments_to_dir.assert_called_once_with(
+                "123", ["test.pdf", "image.jpg"], temp_dir, "INBOX"
+            )
     
     @pytest.mark.asyncio
     async def test_download_attachments_partial_failure(self, mail_server, mock_imap_service):
         """测试部分附件下载失败"""
         # 第一个附件成功，第二个失败
-        mock_imap_service.download_attachment_payload.side_effect = [
-            b"PDF content here",  # test.pdf 成功
-            None                  # image.jpg 失败
-        ]
+        mock_imap_service.download_attachments_to_dir.side_effect = self.fake_download({
+            "test.pdf": b"PDF content here",  # test.pdf 成功
+            "image.jpg": None                  # image.jpg 失败
+        })
         
         download_attachments_tool = await self.get_tool(mail_server, 'download_attachments')
         assert download_attachments_tool is not None
@@ -234,7 +251,7 @@ class TestAttachmentTools:
     @pytest.mark.asyncio
     async def test_download_attachments_directory_creation(self, mail_server, mock_imap_service):
         """测试下载附件时自动创建目录"""
-        mock_imap_service.download_attachment_payload.return_value = b"PDF content"
+        mock_imap_service.download_attachments_to_dir.side_effect = self.fake_download({"test.pdf": b"PDF content"})
         
         download_attachments_tool = await self.get_tool(mail_server, 'download_attachments')
         assert download_attachments_tool is not None
@@ -259,7 +276,7 @@ class TestAttachmentTools:
     @pytest.mark.asyncio
     async def test_download_attachments_exception_handling(self, mail_server, mock_imap_service):
         """测试下载附件时的异常处理"""
-        mock_imap_service.download_attachment_payload.side_effect = Exception("Network error")
+        mock_imap_service.download_attachments_to_dir.side_effect = Exception("Network error")
         
         download_attachments_tool = await self.get_tool(mail_server, 'download_attachments')
         assert download_attachments_tool is not None
@@ -277,7 +294,7 @@ class TestAttachmentTools:
     @pytest.mark.asyncio
     async def test_download_attachments_file_write_error(self, mail_server, mock_imap_service):
         """测试文件写入错误的处理"""
-        mock_imap_service.download_attachment_payload.return_value = b"PDF content"
+        mock_imap_service.download_attachments_to_dir.side_effect = self.fake_download({"test.pdf": b"PDF content"})
         
         download_attachments_tool = await self.get_tool(mail_server, 'download_attachments')
         assert download_attachments_tool is not None
@@ -0,0 +1,205 @@
+"""
+测试批量删除、移动和复制邮件
+"""
+
+from unittest.mock import AsyncMock, Mock
+
+from mail_mcp.imap_client import AsyncIMAPClient
+from mail_mcp.imap_service import IMAPService
+
+
+class RecordingConnection:
+    """按UID集合应答的假imaplib连接，记录所有命令"""
+
+    def __init__(self, capabilities, uids, deleted_by_others=()):
+        self.capabilities = capabilities
+        self.untagged_responses = {}
+        self.uids = set(uids)
+        self.deleted = set(deleted_by_others)
+        self.commands = []
+        self.fail = set()
+
+    def select(self, mailbox, readonly=False):
+        self.commands.append(('SELECT', mailbox))
+        return 'OK', [str(len(self.uids)).encode()]
+
+    def expunge(self):
+        self.commands.append(('EXPUNGE',))
+        self.uids -= self.deleted
+        self.deleted = set()
+        return 'OK', [None]
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        # fail 中可以是命令名，也可以是 (命令名, UID集合)，例如 ('STORE', '7:8')
+        if command in self.fail or (command,) + args[:1] in self.fail:
+            return 'NO', [b'failed']
+        if command == 'SEARCH':
+            if args[0] == 'DELETED':
+                found = self.deleted
+            else:
+                found = self.uids & set(self.parse(args[0][len('UID '):]))
+            return 'OK', [' '.join(str(uid) for uid in sorted(found)).encode()]
+        uids = set(self.parse(args[0])) & self.uids
+        if command == 'STORE':
+            if args[1].startswith('+'):
+                self.deleted |= uids
+            else:
+                self.deleted -= uids
+        elif command in ('EXPUNGE', 'MOVE'):
+            self.uids -= uids
+            self.deleted -= uids
+        return 'OK', [None]
+
+    @staticmethod
+    def parse(uid_set):
+        uids = []
+        for item in uid_set.split(','):
+            first, _, last = item.partition(':')
+            uids.extend(range(int(first), int(last or first) + 1))
+        return uids
+
+
+def make_service(connection):
+    service = IMAPService(Mock())
+    service.connected = True
+    service.connection = connection
+    return service
+
+
+async def test_delete_uses_uid_expunge():
+    """测试支持UIDPLUS时只清除指定的邮件，不存在的邮件报告为失败"""
+    connection = RecordingConnection(('IMAP4rev1', 'UIDPLUS'), uids=[3, 4, 7, 9], deleted_by_others=[7])
+    service = make_service(connection)
+
+    result = await service.delete_messages(['3', '4', '5', '9'], folder='INBOX')
+
+    assert connection.commands[1:] == [
+        ('SEARCH', 'UID 3:5,9'),
+        ('STORE', '3:4,9', '+FLAGS.SILENT', '(\\Deleted)'),
+        ('EXPUNGE', '3:4,9'),
+    ]
+    assert result['successful_ids'] == ['3', '4', '9']
+    assert result['failed_ids'] == ['5']
+    # 其他客户端标记删除的邮件保持原样
+    assert connection.uids == {7} and connection.deleted == {7}
+    assert service.mailbox_state is None
+
+
+async def test_delete_without_uidplus_preserves_other_deletes():
+    """测试不支持UIDPLUS时暂时去掉其他邮件的 \\Deleted，EXPUNGE后恢复"""
+    connection = RecordingConnection(('IMAP4rev1',), uids=[3, 4, 7, 8], deleted_by_others=[7, 8])
+    service = make_service(connection)
+
+    assert await service.delete_message('4', folder='INBOX') is True
+
+    assert connection.commands[1:] == [
+        ('SEARCH', 'UID 4'),
+        ('SEARCH', 'DELETED'),
+        ('STORE', '7:8', '-FLAGS.SILENT', '(\\Deleted)'),
+        ('STORE', '4', '+FLAGS.SILENT', '(\\Deleted)'),
+        ('EXPUNGE',),
+        ('STORE', '7:8', '+FLAGS.SILENT', '(\\Deleted)'),
+    ]
+    assert connection.uids == {3, 7, 8}
+    assert connection.deleted == {7, 8}
+
+
+async def test_delete_without_uidplus_aborts_when_flags_not_cleared():
+    """测试去掉其他邮件的 \\Deleted 失败时撤销修改，不执行EXPUNGE"""
+    connection = RecordingConnection(('IMAP4rev1',), uids=[3, 4, 7, 8], deleted_by_others=[7, 8])
+    connection.fail.add(('STORE', '7:8'))
+    service = make_service(connection)
+
+    result = await service.delete_messages(['4'], folder='INBOX')
+
+    assert result['success'] is False
+    assert ('EXPUNGE',) not in connection.commands
+    assert connection.uids == {3, 4, 7, 8}
+    assert connection.deleted == {7, 8}
+
+
+async def test_move_falls_back_to_copy_and_expunge():
+    """测试不支持MOVE时先复制，只删除复制成功的邮件"""
+    connection = RecordingConnection(('IMAP4rev1', 'UIDPLUS'), uids=[1, 2, 3])
+    service = make_service(connection)
+
+    result = await service.move_messages(['1', '2', '3'], 'Archive', folder='INBOX')
+
+    assert [command[0] for command in connection.commands[1:]] == ['SEARCH', 'COPY', 'STORE', 'EXPUNGE']
+    assert connection.commands[2] == ('COPY', '1:3', '"Archive"')
+    assert result['successful_count'] == 3
+    assert connection.uids == set()
+
+    connection = RecordingConnection(('IMAP4rev1', 'UIDPLUS'), uids=[1, 2, 3])
+    connection.fail.add('COPY')
+    service = make_service(connection)
+
+    result = await service.move_messages(['1', '2'], 'Archive', folder='INBOX')
+
+    assert [command[0] for command in connection.commands[1:]] == ['SEARCH', 'COPY']
+    assert result['failed_ids'] == ['1', '2']
+    assert connection.uids == {1, 2, 3}
+
+
+async def test_uid_expunge_waits_for_store():
+    """测试 UID EXPUNGE 不与 STORE 放在同一组流水线中，只清除STORE成功的段"""
+    connection = Mock(spec=AsyncIMAPClient)
+    connection.capabilities = ('IMAP4rev1', 'UIDPLUS')
+    connection.untagged_responses = {}
+    connection.select = AsyncMock(return_value=('OK', [b'5']))
+    connection.pipeline = AsyncMock(side_effect=[
+        [('OK', [b'10 12'])],
+        [('OK', [None])],
+        [('OK', [None])],
+    ])
+    service = make_service(connection)
+
+    result = await service.delete_messages(['10', '12'], folder='INBOX')
+
+    assert [call.args[0] for call in connection.pipeline.await_args_list] == [
+        [('UID', 'SEARCH', 'UID 10,12')],
+        [('UID', 'STORE', '10,12', '+FLAGS.SILENT', '(\\Deleted)')],
+        [('UID', 'EXPUNGE', '10,12')],
+    ]
+    assert result['successful_ids'] == ['10', '12']
+
+    connection.pipeline = AsyncMock(side_effect=[[('OK', [b'10'])], [('NO', [b'read-only'])]])
+    result = await service.delete_messages(['10'], folder='INBOX')
+
+    assert connection.pipeline.await_count == 2
+    assert result['failed_ids'] == ['10']
+
+
+async def test_move_and_copy_pipeline_in_one_round_trip():
+    """测试支持MOVE时SEARCH和UID MOVE作为一组流水线发送"""
+    connection = Mock(spec=AsyncIMAPClient)
+    connection.capabilities = ('IMAP4rev1', 'MOVE')
+    connection.untagged_responses = {}
+    connection.select = AsyncMock(return_value=('OK', [b'5']))
+    connection.pipeline = AsyncMock(return_value=[('OK', [b'10 12']), ('OK', [None])])
+    service = make_service(connection)
+
+    result = await service.move_messages(['10', '11', '12'], 'Archive', folder='INBOX')
+
+    connection.pipeline.assert_awaited_once_with([
+        ('UID', 'SEARCH', 'UID 10:12'),
+        ('UID', 'MOVE', '10:12', '"Archive"'),
+    ])
+    assert result['successful_ids'] == ['10', '12']
+    assert result['failed_ids'] == ['11']
+
+    connection.pipeline.reset_mock()
+    result = await service.copy_messages(['10', '12'], 'Archive', folder='INBOX')
+    assert connection.pipeline.await_args.args[0][1] == ('UID', 'COPY', '10,12', '"Archive"')
+    assert result['success'] is True
+
+
+async def test_rejects_same_target_folder():
+    """测试目标文件夹与源文件夹相同时不发送命令"""
+    service = make_service(Mock())
+
+    result = await service.move_messages(['1'], 'INBOX', folder='INBOX')
+
+    assert result['success'] is False
+    service.connection.select.assert_not_called()
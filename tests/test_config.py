@@ -244,4 +244,21 @@ class TestConfig:
             config = Config()
             errors = config.validate_all()
             
-            assert 'server' not in errors or len(errors['server']) == 0
\ No newline at end of file
+            assert 'server' not in errors or len(errors['server']) == 0
+    def test_cache_dir_defaults_to_home(self, tmp_path, monkeypatch):
+        """Test cache dir defaults to ~/.mail-mcp/cache regardless of cwd"""
+        monkeypatch.delenv('MAIL_MCP_CACHE_DIR', raising=False)
+        monkeypatch.chdir(tmp_path)
+
+        with patch('mail_mcp.config.Path.home', return_value=tmp_path / 'home'):
+            config = Config()
+
+        assert config.cache_dir == str(tmp_path / 'home' / '.mail-mcp' / 'cache')
+
+    def test_cache_dir_env_override(self, tmp_path):
+        """Test MAIL_MCP_CACHE_DIR overrides the default cache dir"""
+        with patch.dict(os.environ, {'MAIL_MCP_CACHE_DIR': str(tmp_path)}):
+            assert Config().cache_dir == str(tmp_path)
+
+        with patch.dict(os.environ, {'MAIL_MCP_CACHE_DIR': ''}):
+            assert Config().cache_dir == ''
@@ -0,0 +1,182 @@
+"""
+测试列表和搜索结果的翻页游标
+"""
+
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from mail_mcp.cursor import PageCursor, query_fingerprint
+from mail_mcp.imap_service import IMAPService
+from mail_mcp.models import EmailSummary
+
+
+class TestPageCursor:
+    """测试游标的编码和校验"""
+
+    def test_round_trip(self):
+        """测试编码后是不含填充的URL安全字符串，解码得到相同的游标"""
+        cursor = PageCursor("收件箱", 42, 1007, query_fingerprint('list'))
+        token = cursor.encode()
+
+        assert '=' not in token and '/' not in token
+        assert PageCursor.decode(token) == cursor
+
+    @pytest.mark.parametrize("token", ["", "not a cursor", PageCursor("INBOX", 42, 1, "x").encode()[:-3]])
+    def test_invalid_tokens(self, token):
+        """测试无法解析的游标抛出ValueError"""
+        with pytest.raises(ValueError):
+            PageCursor.decode(token)
+
+    def test_check(self):
+        """测试游标只能继续同一文件夹、同一查询，且UIDVALIDITY未变化"""
+        fingerprint = query_fingerprint('search', 'budget', False)
+        cursor = PageCursor("INBOX", 42, 100, fingerprint)
+
+        cursor.check("INBOX", fingerprint, 42)
+        cursor.check("INBOX", fingerprint)
+        with pytest.raises(ValueError):
+            cursor.check("Archive", fingerprint)
+        with pytest.raises(ValueError):
+            cursor.check("INBOX", query_fingerprint('search', 'budget', True))
+        with pytest.raises(ValueError):
+            cursor.check("INBOX", fingerprint, 43)
+
+
+class TestIMAPServicePaging:
+    """测试用游标逐页列出和搜索邮件"""
+
+    UIDS = [3, 5, 6, 9, 10, 11, 40, 41]
+
+    @pytest.fixture
+    def connection(self):
+        connection = Mock()
+        connection.untagged_responses = {}
+
+        def select(mailbox, readonly=False):
+            connection.untagged_responses = {'UIDVALIDITY': [b'42'], 'UIDNEXT': [b'42']}
+            return ('OK', [str(len(self.UIDS)).encode()])
+
+        def uid(command, *args):
+            assert command == 'SEARCH'
+            query = args[-1]
+            if query.startswith('RETURN (PARTIAL'):
+                # RETURN (PARTIAL -a:-b) ALL 或 RETURN (PARTIAL -a:-b) UID 1:m
+                partial, criteria = query[len('RETURN (PARTIAL '):].split(') ', 1)
+                first, last = (int(n) for n in partial.lstrip('-').split(':-'))
+                high = int(criteria.rsplit(':', 1)[1]) if criteria != 'ALL' else max(self.UIDS)
+                matched = [uid for uid in self.UIDS if uid <= high]
+                found = matched[max(0, len(matched) - last):len(matched) - first + 1]
+                connection.untagged_responses['ESEARCH'] = [
+                    ('(TAG "M0001") UID PARTIAL (%s %s)' % (partial, ','.join(map(str, found)) or 'NIL')).encode()
+                ]
+                return ('OK', [None])
+            if query.startswith('UID '):
+                low, high = map(int, query[4:].split(':'))
+                found = [uid for uid in self.UIDS if low <= uid <= high]
+            else:
+                first, last = map(int, query.split(':'))
+                found = self.UIDS[first - 1:last]
+            return ('OK', [' '.join(map(str, found)).encode()])
+
+        connection.select.side_effect = select
+        connection.uid.side_effect = uid
+        return connection
+
+    @pytest.fixture
+    def service(self, connection):
+        service = IMAPService(Mock())
+        service.connection = connection
+        service.connected = True
+
+        async def summaries(msg_ids, folder):
+            return [EmailSummary(id=f"42:{uid}", folder=folder) for uid in msg_ids]
+
+        service._fetch_message_summaries = AsyncMock(side_effect=summaries)
+        return service
+
+    async def walk(self, service, limit):
+        pages, cursor = [], None
+        while True:
+            messages, cursor = await service.list_messages_page("INBOX", limit, cursor=cursor)
+            pages.append([int(message.id.split(':')[1]) for message in messages])
+            if cursor is None:
+                return pages
+
+    async def test_walk_folder_with_uid_windows(self, service, connection):
+        """测试游标翻页连续覆盖整个文件夹，每次只搜索游标之前的UID范围"""
+        pages = await self.walk(service, 3)
+
+        assert pages == [[41, 40, 11], [10, 9, 6], [5, 3]]
+        queries = [c[0][1] for c in connection.uid.call_args_list]
+        assert queries[0] == '6:8'
+        # 第二页从UID 10开始向前搜索，范围不够时加倍
+        assert queries[1:3] == ['UID 8:10', 'UID 2:7']
+
+    async def test_walk_folder_with_partial(self, service, connection):
+        """测试服务器支持PARTIAL时每页只发送一条SEARCH"""
+        connection.capabilities = ('IMAP4REV1', 'ESEARCH', 'PARTIAL')
+
+        pages = await self.walk(service, 3)
+
+        assert pages == [[41, 40, 11], [10, 9, 6], [5, 3]]
+        queries = [c[0][1] for c in connection.uid.call_args_list]
+        assert queries == [
+            'RETURN (PARTIAL -1:-3) ALL', 'RETURN (PARTIAL -1:-3) UID 1:10', 'RETURN (PARTIAL -1:-3) UID 1:5'
+        ]
+
+    async def test_rejects_foreign_or_stale_cursor(self, service, connection):
+        """测试其他查询的游标和UIDVALIDITY变化后的游标被拒绝"""
+        _, cursor = await service.list_messages_page("INBOX", 3)
+
+        with pytest.raises(ValueError):
+            await service.list_messages_page("Archive", 3, cursor=cursor)
+        with pytest.raises(ValueError):
+            await service.search_messages_page("budget", cursor=cursor)
+
+        stale = PageCursor("INBOX", 41, 11, query_fingerprint('list')).encode()
+        with pytest.raises(ValueError):
+            await service.list_messages_page("INBOX", 3, cursor=stale)
+
+    async def test_first_page_refreshes_exists_on_reused_connection(self, service, connection):
+        """测试复用已选中的连接时先用NOOP取回新邮件，有邮件被删除时重新SELECT"""
+        await service.list_messages_page("INBOX", 3)
+        connection.noop.assert_not_called()
+
+        def noop():
+            connection.untagged_responses['EXISTS'] = [b'10']
+            return ('OK', [None])
+
+        self.UIDS = self.UIDS + [42, 43]
+        connection.noop.side_effect = noop
+        messages, _ = await service.list_messages_page("INBOX", 3)
+
+        assert [message.id for message in messages] == ['42:43', '42:42', '42:41']
+        assert connection.select.call_count == 1
+
+        def noop_expunge():
+            connection.untagged_responses['EXPUNGE'] = [b'10']
+            return ('OK', [None])
+
+        self.UIDS = self.UIDS[:-1]
+        connection.noop.side_effect = noop_expunge
+        messages, _ = await service.list_messages_page("INBOX", 3)
+
+        assert [message.id for message in messages] == ['42:42', '42:41', '42:40']
+        assert connection.select.call_count == 2
+
+    async def test_search_pages_resume_after_cursor(self, service):
+        """测试没有本地索引时搜索翻页按UID从新到旧，下一页只搜索游标之前的邮件"""
+        first = [EmailSummary(id="42:41"), EmailSummary(id="42:11")]
+        second = [EmailSummary(id="42:5")]
+        service._search_on_server = AsyncMock(return_value=first)
+        service.search_messages = AsyncMock(return_value=second)
+
+        messages, cursor = await service.search_messages_page("budget", limit=2)
+        assert messages == first
+        assert service._search_on_server.call_args[0][0].before_uid == 2 ** 32
+
+        messages, cursor = await service.search_messages_page("budget", limit=2, cursor=cursor)
+        assert messages == second and cursor is None
+        criteria = service.search_messages.call_args[0][0]
+        assert (criteria.text, criteria.before_uid) == ("budget", 11)
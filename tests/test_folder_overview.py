@@ -0,0 +1,93 @@
+"""
+测试文件夹概况（LIST-STATUS / STATUS）
+"""
+
+from unittest.mock import Mock
+
+from mail_mcp.imap_parser import parse_status_response
+from mail_mcp.imap_service import IMAPService
+
+
+LIST_DATA = [
+    b'(\\HasNoChildren) "/" "INBOX"',
+    b'(\\Noselect \\HasChildren) "/" "[Gmail]"',
+    b'(\\HasNoChildren \\Sent) "/" "Sent Items"',
+]
+
+
+def make_service(capabilities):
+    service = IMAPService(Mock())
+    service.connected = True
+    service.connection = Mock()
+    service.connection.capabilities = capabilities
+    service.connection.untagged_responses = {}
+    return service
+
+
+def test_parse_status_response():
+    """测试解析STATUS响应"""
+    assert parse_status_response(b'"Sent Items" (MESSAGES 12 UNSEEN 3 HIGHESTMODSEQ 77)') == (
+        'Sent Items', {'MESSAGES': 12, 'UNSEEN': 3, 'HIGHESTMODSEQ': 77}
+    )
+    assert parse_status_response(b'INBOX (UIDNEXT 9)') == ('INBOX', {'UIDNEXT': 9})
+    assert parse_status_response(b'INBOX') is None
+
+
+async def test_list_status_in_one_command():
+    """测试支持LIST-STATUS时一条LIST命令获取全部状态，结果缓存到有修改为止"""
+    service = make_service(('IMAP4rev1', 'LIST-STATUS', 'CONDSTORE'))
+
+    def xatom(name, *args):
+        service.connection.untagged_responses = {
+            'LIST': list(LIST_DATA),
+            'STATUS': [
+                b'"INBOX" (MESSAGES 120 UNSEEN 3 UIDNEXT 200 HIGHESTMODSEQ 900)',
+                b'"Sent Items" (MESSAGES 40 UNSEEN 0 UIDNEXT 41 HIGHESTMODSEQ 12)',
+            ],
+        }
+        return 'OK', [b'LIST completed']
+
+    service.connection.xatom.side_effect = xatom
+    service.connection.uid.return_value = ('OK', [])
+
+    folders = await service.get_folder_overview()
+
+    service.connection.xatom.assert_called_once_with(
+        'LIST', '""', '"*"', 'RETURN (STATUS (MESSAGES UNSEEN UIDNEXT HIGHESTMODSEQ))'
+    )
+    assert [(f.name, f.messages, f.unseen, f.uidnext, f.highestmodseq) for f in folders] == [
+        ('INBOX', 120, 3, 200, 900),
+        ('Sent Items', 40, 0, 41, 12),
+    ]
+    assert folders[1].attributes == ['\\HasNoChildren', '\\Sent']
+
+    assert await service.get_folder_overview() is folders
+    assert service.connection.xatom.call_count == 1
+
+    # 修改邮件标志后缓存失效
+    await service._uid('STORE', '7', '+FLAGS', '(\\Seen)')
+    await service.get_folder_overview()
+    assert service.connection.xatom.call_count == 2
+
+
+async def test_status_per_folder_without_list_status():
+    """测试不支持LIST-STATUS时对每个可选中的文件夹发送STATUS"""
+    service = make_service(('IMAP4rev1',))
+    service.connection.list.return_value = ('OK', list(LIST_DATA))
+    counts = {'"INBOX"': b'"INBOX" (MESSAGES 5 UNSEEN 2 UIDNEXT 6)'}
+    service.connection.status.side_effect = lambda mailbox, names: (
+        ('OK', [counts[mailbox]]) if mailbox in counts else ('NO', [b'no such mailbox'])
+    )
+
+    folders = await service.get_folder_overview()
+
+    assert [c.args for c in service.connection.status.call_args_list] == [
+        ('"INBOX"', '(MESSAGES UNSEEN UIDNEXT)'),
+        ('"Sent Items"', '(MESSAGES UNSEEN UIDNEXT)'),
+    ]
+    assert [(f.name, f.messages, f.unseen) for f in folders] == [('INBOX', 5, 2), ('Sent Items', None, None)]
+
+    # 缓存失效后重新获取
+    service._invalidate_folder_overview()
+    await service.get_folder_overview()
+    assert service.connection.list.call_count == 2
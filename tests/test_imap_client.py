@@ -0,0 +1,428 @@
+"""
+测试asyncio IMAP客户端
+"""
+
+import asyncio
+import imaplib
+import zlib
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from mail_mcp.config import IMAPConfig
+from mail_mcp.imap_client import AsyncIMAPClient
+from mail_mcp.imap_parser import parse_fetch_response, get_body_section
+from mail_mcp.imap_service import IMAPService
+
+
+class FakeIMAPServer:
+    """按命令名返回预设响应的本地IMAP服务器"""
+
+    def __init__(self, responses, delays=None, statuses=None):
+        self.responses = responses
+        self.delays = delays or {}
+        self.statuses = statuses or {}
+        self.commands = []
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        # COMPRESS DEFLATE成功后双向数据都经过raw DEFLATE
+        inflate = deflate = None
+        pending = b''
+
+        async def readline():
+            nonlocal pending
+            if inflate is None:
+                return await reader.readline()
+            while b'\n' not in pending:
+                chunk = await reader.read(4096)
+                if not chunk:
+                    return b''
+                pending += inflate.decompress(chunk)
+            line, _, pending = pending.partition(b'\n')
+            return line + b'\n'
+
+        def write(data):
+            if deflate is not None:
+                data = deflate.compress(data) + deflate.flush(zlib.Z_SYNC_FLUSH)
+            writer.write(data)
+
+        writer.write(b'* OK fake server ready\r\n')
+        while True:
+            line = await readline()
+            if not line:
+                break
+            tag, command = line.rstrip(b'\r\n').split(b' ', 2)[:2]
+            command = command.decode()
+            self.commands.append(line.rstrip(b'\r\n').decode())
+            if command in self.delays:
+                await asyncio.sleep(self.delays[command])
+            body = self.responses.get(command, b'')
+            if command == 'IDLE':
+                # 推送通知后等待客户端发送DONE
+                write(b'+ idling\r\n' + body)
+                await writer.drain()
+                self.commands.append((await readline()).rstrip(b'\r\n').decode())
+                body = b''
+            status = self.statuses.get(command, b'OK')
+            write(body + tag + b' ' + status + b' ' + command.encode() + b' completed\r\n')
+            await writer.drain()
+            if command == 'COMPRESS' and status == b'OK':
+                inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+                deflate = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            if command == 'LOGOUT':
+                break
+        writer.close()
+
+
+DEFAULT_RESPONSES = {
+    'CAPABILITY': b'* CAPABILITY IMAP4rev1 UIDPLUS MOVE\r\n',
+    'LOGIN': b'',
+    'SELECT': b'* 3 EXISTS\r\n* OK [UIDVALIDITY 42] UIDs valid\r\n* OK [UIDNEXT 104] Predicted next UID\r\n',
+    'SEARCH': b'* SEARCH 1 2 3\r\n',
+    'FETCH': (
+        b'* 2 FETCH (UID 102 BODY[2] {24}\r\nUERGIGNvbnRlbnQgaGVyZQ== FLAGS (\\Seen))\r\n'
+    ),
+    'NOOP': b'',
+    'ENABLE': b'* ENABLED QRESYNC\r\n',
+    'LOGOUT': b'* BYE logging out\r\n',
+}
+
+
+def make_service_config(port, **imap_options):
+    """连接到本地假服务器的配置（明文连接，不使用缓存）"""
+    config = Mock()
+    config.imap = IMAPConfig(
+        host='127.0.0.1', port=port, username='user@test.com', password='secret', use_ssl=False, **imap_options
+    )
+    config.cache_dir = None
+    return config
+
+
+async def wait_for_command(server, name, timeout=2):
+    """等待服务器收到指定命令"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not any(command.split(' ')[1:2] == [name] for command in server.commands):
+        assert loop.time() < deadline, f"server did not receive {name}"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def fake_server():
+    servers = []
+
+    async def start(responses=None, delays=None, statuses=None):
+        server = FakeIMAPServer({**DEFAULT_RESPONSES, **(responses or {})}, delays, statuses)
+        port = await server.start()
+        servers.append(server)
+        return server, port
+
+    yield start
+    for server in servers:
+        await server.stop()
+
+
+class TestAsyncIMAPClient:
+    """测试asyncio IMAP客户端"""
+
+    async def test_connect_login_and_capabilities(self, fake_server):
+        """测试连接、认证和能力列表"""
+        server, port = await fake_server()
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+
+        await client.connect()
+        typ, _ = await client.login('user@test.com', 'pa"ss')
+
+        assert typ == 'OK'
+        assert client.state == 'AUTH'
+        assert 'UIDPLUS' in client.capabilities
+        assert server.commands[-1].endswith('LOGIN "user@test.com" "pa\\"ss"')
+
+        await client.logout()
+        assert not client.is_open
+
+    async def test_select_and_search_match_imaplib_format(self, fake_server):
+        """测试SELECT和SEARCH返回与imaplib相同的数据格式"""
+        _, port = await fake_server()
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        assert await client.select('"INBOX"') == ('OK', [b'3'])
+        assert client.untagged_responses['UIDVALIDITY'] == [b'42']
+        assert await client.search(None, 'ALL') == ('OK', [b'1 2 3'])
+
+        await client.logout()
+
+    async def test_enable_records_enabled_extensions(self, fake_server):
+        """测试ENABLE记录服务器确认启用的扩展"""
+        server, port = await fake_server()
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        typ, data = await client.enable('QRESYNC')
+
+        assert (typ, data) == ('OK', [b'QRESYNC'])
+        assert client.enabled == {'QRESYNC'}
+        assert server.commands[-1].endswith('ENABLE QRESYNC')
+
+        await client.logout()
+
+    async def test_fetch_with_literal(self, fake_server):
+        """测试包含literal的FETCH响应"""
+        _, port = await fake_server()
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        typ, data = await client.fetch('2', '(UID BODY.PEEK[2] FLAGS)')
+
+        assert typ == 'OK'
+        assert data[0] == (b'2 (UID 102 BODY[2] {24}', b'UERGIGNvbnRlbnQgaGVyZQ==')
+        attributes = parse_fetch_response(data)[0][1]
+        assert attributes['UID'] == 102
+        assert attributes['FLAGS'] == ['\\Seen']
+        assert get_body_section(attributes, '2') == b'UERGIGNvbnRlbnQgaGVyZQ=='
+
+        await client.logout()
+
+    async def test_idle_returns_notifications_in_order(self, fake_server):
+        """测试IDLE收到通知后发送DONE，按到达顺序返回未标记响应"""
+        server, port = await fake_server(responses={
+            'IDLE': b'* 2 EXPUNGE\r\n* 4 EXISTS\r\n* 1 FETCH (FLAGS (\\Seen))\r\n'
+        })
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        typ, notifications = await client.idle(timeout=5)
+
+        assert typ == 'OK'
+        assert notifications == [b'2 EXPUNGE', b'4 EXISTS', b'1 FETCH (FLAGS (\\Seen))']
+        assert client.untagged_responses['EXISTS'] == [b'4']
+        assert server.commands[-2].endswith(' IDLE')
+        assert server.commands[-1] == 'DONE'
+
+        await client.logout()
+
+    async def test_idle_ends_after_timeout(self, fake_server):
+        """测试没有通知时IDLE在超时后结束，连接仍可继续使用"""
+        server, port = await fake_server()
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        assert await client.idle(timeout=0.05) == ('OK', [])
+        assert server.commands[-1] == 'DONE'
+        assert await client.search(None, 'ALL') == ('OK', [b'1 2 3'])
+
+        await client.logout()
+
+    async def test_error_statuses(self, fake_server):
+        """测试NO返回状态，BAD抛出imaplib兼容的异常"""
+        _, port = await fake_server(statuses={'STORE': b'NO', 'FETCH': b'BAD'})
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        typ, data = await client.store('1', '+FLAGS', '\\Seen')
+        assert typ == 'NO'
+        assert data == [b'STORE completed']
+
+        with pytest.raises(imaplib.IMAP4.error):
+            await client.fetch('1', '(UID)')
+
+        # 出错后连接仍可继续使用
+        assert await client.search(None, 'ALL') == ('OK', [b'1 2 3'])
+
+        await client.logout()
+
+    async def test_long_response_line(self, fake_server, monkeypatch):
+        """测试超过64 KiB的单行响应可以读取，超过上限时中止连接"""
+        uids = b' '.join(str(uid).encode() for uid in range(1, 20001))
+        _, port = await fake_server({'SEARCH': b'* SEARCH ' + uids + b'\r\n'})
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        assert len(uids) > 64 * 1024
+        assert await client.search(None, 'ALL') == ('OK', [uids])
+        await client.logout()
+
+        monkeypatch.setattr('mail_mcp.imap_client.MAX_LINE_LENGTH', 1024)
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        with pytest.raises(imaplib.IMAP4.abort):
+            await client.search(None, 'ALL')
+        assert not client.is_open
+
+    async def test_pipeline_writes_all_commands_before_reading(self):
+        """测试流水线一次写入全部命令，按标签对应响应，未标记响应归入当时未完成的命令"""
+        client = AsyncIMAPClient('127.0.0.1', use_ssl=False, timeout=5)
+        client.reader = asyncio.StreamReader()
+        client.writer = Mock(is_closing=Mock(return_value=False), drain=AsyncMock())
+        client.reader.feed_data(
+            b'* STATUS INBOX (MESSAGES 3 UNSEEN 1)\r\n'
+            b'M0001 OK STATUS completed\r\n'
+            b'* STATUS Archive (MESSAGES 9 UNSEEN 0)\r\n'
+            b'M0002 OK STATUS completed\r\n'
+            b'* 4 FETCH (UID 7 FLAGS (\\Seen))\r\n'
+            b'* 5 EXISTS\r\n'
+            b'M0003 OK STORE completed\r\n'
+            b'M0004 NO [READ-ONLY] mailbox is read-only\r\n'
+        )
+
+        results = await client.pipeline([
+            ('STATUS', '"INBOX"', '(MESSAGES UNSEEN)'),
+            ('STATUS', '"Archive"', '(MESSAGES UNSEEN)'),
+            ('UID', 'STORE', '7', '+FLAGS', '(\\Seen)'),
+            ('UID', 'STORE', '8', '+FLAGS', '(\\Seen)'),
+        ])
+
+        client.writer.write.assert_called_once()
+        assert client.writer.write.call_args[0][0].split(b'\r\n')[:4] == [
+            b'M0001 STATUS "INBOX" (MESSAGES UNSEEN)',
+            b'M0002 STATUS "Archive" (MESSAGES UNSEEN)',
+            b'M0003 UID STORE 7 +FLAGS (\\Seen)',
+            b'M0004 UID STORE 8 +FLAGS (\\Seen)',
+        ]
+        assert results == [
+            ('OK', [b'INBOX (MESSAGES 3 UNSEEN 1)']),
+            ('OK', [b'Archive (MESSAGES 9 UNSEEN 0)']),
+            ('OK', [b'4 (UID 7 FLAGS (\\Seen))']),
+            ('NO', [b'[READ-ONLY] mailbox is read-only']),
+        ]
+        assert client.untagged_responses == {'EXISTS': [b'5']}
+
+    async def test_pipeline_over_connection(self, fake_server):
+        """测试流水线读完全部响应后才报告BAD，连接仍可继续使用"""
+        _, port = await fake_server(statuses={'FETCH': b'BAD'})
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        results = await client.pipeline([('SEARCH', 'ALL'), ('NOOP',)])
+        assert results == [('OK', [b'1 2 3']), ('OK', [b'NOOP completed'])]
+
+        with pytest.raises(imaplib.IMAP4.error):
+            await client.pipeline([('FETCH', '1', '(UID)'), ('SEARCH', 'ALL')])
+        assert await client.search(None, 'ALL') == ('OK', [b'1 2 3'])
+
+        await client.logout()
+
+    async def test_compress_deflate(self, fake_server):
+        """测试启用COMPRESS=DEFLATE后命令和literal正常收发，传输字节数小于协议数据量"""
+        headers = b'Subject: weekly report\r\nFrom: reports@example.com\r\n' * 100
+        server, port = await fake_server({
+            'CAPABILITY': b'* CAPABILITY IMAP4rev1 COMPRESS=DEFLATE\r\n',
+            'FETCH': b'* 1 FETCH (UID 7 BODY[HEADER] {%d}\r\n%s)\r\n' % (len(headers), headers),
+        })
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        assert await client.compress() == ('OK', [b'COMPRESS completed'])
+        assert client.compression == 'DEFLATE'
+        typ, data = await client.fetch('1', '(BODY[HEADER])')
+        assert typ == 'OK' and data[0][1] == headers
+        assert await client.search(None, 'ALL') == ('OK', [b'1 2 3'])
+        assert server.commands[-1].endswith('SEARCH ALL')
+
+        stats = client.stats
+        assert stats['bytes_received'] > len(headers)
+        assert stats['wire_bytes_received'] * 3 < stats['bytes_received']
+        assert stats['wire_bytes_sent'] < stats['bytes_sent'] + 64
+
+        await client.logout()
+
+    async def test_concurrent_commands_do_not_block_event_loop(self, fake_server):
+        """测试等待慢命令时事件循环仍可处理其他任务"""
+        _, port = await fake_server(delays={'FETCH': 0.2})
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        results = await asyncio.gather(
+            client.fetch('2', '(UID)'),
+            client.search(None, 'ALL'),
+        )
+        ticker_task.cancel()
+
+        assert results[0][0] == 'OK'
+        assert results[1] == ('OK', [b'1 2 3'])
+        assert ticks >= 5
+
+        await client.logout()
+
+    async def test_service_uses_async_backend(self, fake_server):
+        """测试IMAPService使用asyncio后端执行命令"""
+        server, port = await fake_server()
+        config = Mock()
+        config.imap.host = '127.0.0.1'
+        config.imap.port = port
+        config.imap.username = 'user@test.com'
+        config.imap.password = 'secret'
+        config.imap.use_ssl = True
+        config.imap.backend = 'asyncio'
+        service = IMAPService(config)
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5)
+        await client.connect()
+        service.connection = client
+        service.connected = True
+
+        assert service.is_connected()
+        assert await service.select_folder('INBOX')
+        status, data = await service._imap('search', None, 'ALL')
+
+        assert (status, data) == ('OK', [b'1 2 3'])
+        assert 'SELECT "INBOX"' in server.commands[-2]
+
+        await client.logout()
+        assert not service.is_connected()
+
+    async def test_idle_listener_uses_dedicated_connection(self, fake_server):
+        """测试IDLE监听使用连接池之外的专用连接，主连接和池中连接不会被IDLE占用"""
+        server, port = await fake_server({
+            'CAPABILITY': b'* CAPABILITY IMAP4rev1 IDLE\r\n',
+            'UID': b'* SEARCH 1 2 3\r\n',
+        }, statuses={'STARTTLS': b'NO'})
+        service = IMAPService(make_service_config(port))
+
+        assert await service.connect()
+        await wait_for_command(server, 'IDLE')
+
+        assert not service._connection._lock.locked()
+        # 有连接池时没有检出连接的代码拿不到主连接
+        assert service.connection is None
+        assert await asyncio.wait_for(service.select_folder('Archive'), 2)
+
+        await service.disconnect()
+
+    async def test_service_enables_compression(self, fake_server):
+        """测试服务器公布COMPRESS=DEFLATE时认证后自动启用，统计中显示压缩比"""
+        server, port = await fake_server({'CAPABILITY': b'* CAPABILITY IMAP4rev1 COMPRESS=DEFLATE\r\n'})
+        config = Mock()
+        config.imap.compress = True
+        service = IMAPService(config)
+        client = AsyncIMAPClient('127.0.0.1', port, use_ssl=False, timeout=5, stats=service.transfer_stats)
+        await client.connect()
+        await client.login('user@test.com', 'secret')
+
+        await service._enable_extensions(client)
+
+        assert client.compression == 'DEFLATE'
+        assert any(command.endswith('COMPRESS DEFLATE') for command in server.commands)
+        assert await client.search(None, 'ALL') == ('OK', [b'1 2 3'])
+        assert 'compression_ratio' in service.get_connection_stats()['transfer']
+
+        await client.logout()
@@ -0,0 +1,235 @@
+"""
+测试IDLE监听和文件夹内存镜像
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from mail_mcp.imap_idle import FolderMirror, parse_notification
+from mail_mcp.imap_pool import IMAPConnectionPool
+from mail_mcp.imap_service import IMAPService
+from mail_mcp.models import EmailSummary
+
+
+class TestFolderMirror:
+    """测试按通知更新内存镜像"""
+
+    def make_mirror(self):
+        mirror = FolderMirror('INBOX')
+        mirror.reset(42, [3, 5, 7, 9], [5, 9])
+        return mirror
+
+    def test_parse_notification(self):
+        """测试拆分未标记响应"""
+        assert parse_notification(b'3 EXPUNGE') == ('EXPUNGE', 3, b'')
+        assert parse_notification(b'4 FETCH (FLAGS ())') == ('FETCH', 4, b'(FLAGS ())')
+        assert parse_notification(b'VANISHED 7:9') == ('VANISHED', None, b'7:9')
+
+    def test_expunge_applied_in_sequence_order(self):
+        """测试连续的EXPUNGE按到达顺序解释序列号"""
+        mirror = self.make_mirror()
+
+        # 删除序号2（UID 5）后，原来的序号4（UID 9）变为3
+        flags, removed, new_messages = mirror.apply([b'2 EXPUNGE', b'3 EXPUNGE'])
+
+        assert removed == [5, 9]
+        assert mirror.uids == [3, 7]
+        assert mirror.unseen == set()
+        assert flags == {} and not new_messages
+
+    def test_flags_exists_and_vanished(self):
+        """测试标志变化、新邮件和VANISHED通知"""
+        mirror = self.make_mirror()
+        mirror.summaries[9] = EmailSummary(id='42:9')
+
+        flags, _, new_messages = mirror.apply([
+            b'2 FETCH (FLAGS (\\Seen))',
+            b'1 FETCH (FLAGS (\\Flagged))',
+            b'4 FETCH (UID 9 FLAGS (\\Flagged))',
+            b'5 EXISTS',
+        ])
+
+        assert flags == {5: ['\\Seen'], 3: ['\\Flagged'], 9: ['\\Flagged']}
+        assert mirror.unseen == {3, 9}
+        assert mirror.summaries[9].flags == ['\\Flagged']
+        assert new_messages
+
+        _, removed, _ = mirror.apply([b'VANISHED 3:7'])
+        assert removed == [3, 5, 7]
+        assert mirror.uids == [9]
+
+    def test_unread_needs_all_summaries(self):
+        """测试未读列表只在摘要都在内存中时返回"""
+        mirror = self.make_mirror()
+
+        assert mirror.unread(5) is None
+        assert mirror.missing_summaries(1) == [9]
+
+        mirror.summaries[9] = EmailSummary(id='42:9')
+        assert [summary.id for summary in mirror.unread(1)] == ['42:9']
+        mirror.summaries[5] = EmailSummary(id='42:5')
+        assert [summary.id for summary in mirror.unread(5)] == ['42:9', '42:5']
+
+
+class FakeIdleClient:
+    """按预设事件推送通知的假IMAP连接，事件用完后IDLE一直等待"""
+
+    HEADERS = b"Subject: hi\r\nFrom: a@test.com\r\n\r\n"
+
+    def __init__(self, capabilities=('IMAP4rev1', 'IDLE')):
+        self.capabilities = capabilities
+        self.is_open = True
+        self.untagged_responses = {}
+        self.untagged_log = []
+        self.uids = [3, 5]
+        self.unseen = {5}
+        self.events = []
+        self.commands = []
+        self.waiting = asyncio.Event()
+
+    def deliver(self, uid):
+        self.uids.append(uid)
+        self.unseen.add(uid)
+        return [b'%d EXISTS' % len(self.uids)]
+
+    def expunge(self, uid):
+        seq = self.uids.index(uid) + 1
+        self.uids.remove(uid)
+        self.unseen.discard(uid)
+        return [b'%d EXPUNGE' % seq]
+
+    def read(self, uid):
+        self.unseen.discard(uid)
+        return [b'%d FETCH (FLAGS (\\Seen))' % (self.uids.index(uid) + 1)]
+
+    async def select(self, mailbox, readonly=False):
+        self.commands.append('SELECT')
+        self.untagged_responses = {'UIDVALIDITY': [b'42']}
+        return 'OK', [str(len(self.uids)).encode()]
+
+    async def uid(self, command, *args):
+        self.commands.append(command)
+        self.untagged_responses = {}
+        self.untagged_log = []
+        if command == 'SEARCH':
+            found = self.uids if args[0] == 'ALL' else sorted(self.unseen)
+            return 'OK', [' '.join(str(uid) for uid in found).encode()]
+        uid_set, items = args
+        if uid_set.endswith(':*'):
+            start = int(uid_set[:-2])
+            uids = [uid for uid in self.uids if uid >= start] or self.uids[-1:]
+        else:
+            uids = [int(uid) for uid in uid_set.split(',')]
+        data = []
+        for uid in uids:
+            flags = b'' if uid in self.unseen else b'\\Seen'
+            if items == '(UID FLAGS)':
+                data.append(b'1 (UID %d FLAGS (%s))' % (uid, flags))
+            else:
+                data.append((
+                    b'1 (UID %d FLAGS (%s) BODY[HEADER.FIELDS (SUBJECT FROM)] {%d}'
+                    % (uid, flags, len(self.HEADERS)),
+                    self.HEADERS
+                ))
+                data.append(b' BODYSTRUCTURE ("text" "plain" NIL NIL NIL "7bit" 10 1 NIL NIL NIL NIL))')
+        return 'OK', data
+
+    async def idle(self, timeout):
+        self.commands.append('IDLE')
+        self.untagged_responses = {}
+        if self.events:
+            self.untagged_log = self.events.pop(0)()
+            return 'OK', self.untagged_log
+        self.waiting.set()
+        await asyncio.sleep(timeout)
+        return 'OK', []
+
+    async def noop(self):
+        self.commands.append('NOOP')
+        self.untagged_responses = {}
+        self.untagged_log = self.events.pop(0)() if self.events else []
+        if not self.events:
+            self.waiting.set()
+        return 'OK', [b'']
+
+    async def logout(self):
+        self.is_open = False
+
+
+class TestIdleListener:
+    """测试IMAPService的IDLE监听任务"""
+
+    def make_service(self, client):
+        config = Mock()
+        config.imap.idle_folder = 'INBOX'
+        config.imap.idle_interval = 3600
+        config.imap.poll_interval = 0.01
+        service = IMAPService(config)
+
+        async def factory():
+            return client
+
+        service._pool = IMAPConnectionPool(
+            factory=factory,
+            max_size=2,
+            closer=service._close_pooled_connection,
+            is_alive=lambda connection: connection.is_open
+        )
+        service.connected = True
+        return service
+
+    async def test_notifications_update_mirror(self):
+        """测试IDLE通知更新镜像，未读列表直接从内存返回"""
+        client = FakeIdleClient()
+        client.events = [lambda: client.deliver(8), lambda: client.expunge(5)]
+        service = self.make_service(client)
+
+        service._start_idle_listener()
+        await asyncio.wait_for(client.waiting.wait(), 1)
+
+        mirror = service._mirror
+        assert mirror.ready
+        assert mirror.uids == [3, 8]
+        assert mirror.unseen == {8}
+        assert service.idle_stats['mode'] == 'idle'
+        # 新邮件只获取了一次UID和标志，再获取一次摘要
+        assert client.commands.count('FETCH') == 3
+
+        commands = len(client.commands)
+        unread = await service.list_unread_messages('INBOX')
+
+        assert [summary.id for summary in unread] == ['42:8']
+        assert len(client.commands) == commands
+
+        await service._stop_idle_listener()
+        assert service._mirror is None
+        assert not client.is_open
+
+    async def test_polling_without_idle_capability(self):
+        """测试服务器不支持IDLE时定时发送NOOP轮询"""
+        client = FakeIdleClient(capabilities=('IMAP4rev1',))
+        client.events = [lambda: client.read(5)]
+        service = self.make_service(client)
+
+        service._start_idle_listener()
+        await asyncio.wait_for(client.waiting.wait(), 1)
+        await asyncio.sleep(0)
+
+        assert 'IDLE' not in client.commands
+        assert 'NOOP' in client.commands
+        assert service.idle_stats['mode'] == 'poll'
+        assert service._mirror.unseen == set()
+        assert await service.list_unread_messages('INBOX') == []
+
+        await service._stop_idle_listener()
+
+    async def test_unread_falls_back_to_search(self):
+        """测试没有监听该文件夹时搜索未读邮件，最新的排在前面"""
+        service = IMAPService(Mock())
+        older, newer = EmailSummary(id='42:3'), EmailSummary(id='42:5')
+        service.search_messages_simple = AsyncMock(return_value=[older, newer])
+
+        assert await service.list_unread_messages('Archive', limit=5) == [newer, older]
+        service.search_messages_simple.assert_called_once_with(
+            query="", folder='Archive', unread_only=True, limit=5
+        )
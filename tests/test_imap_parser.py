@@ -0,0 +1,252 @@
+"""
+测试IMAP响应解析
+"""
+
+import base64
+
+import pytest
+
+from mail_mcp.imap_parser import (
+    parse_fetch_response,
+    parse_sequence_set,
+    format_sequence_set,
+    split_sequence_set,
+    parse_partial_results,
+    get_body_section,
+    parse_envelope,
+    parse_internaldate,
+    parse_bodystructure,
+    find_attachment_parts,
+    find_text_part,
+    estimate_decoded_size,
+    decode_part_payload,
+    PartDecoder
+)
+
+
+class TestFetchResponseParsing:
+    """测试批量FETCH响应解析"""
+
+    def test_parse_multiple_messages(self):
+        """测试解析多封邮件的响应"""
+        data = [
+            b'1 (UID 101 FLAGS (\\Seen \\Flagged) RFC822.SIZE 2048)',
+            b'2 (UID 102 FLAGS () RFC822.SIZE 512)',
+        ]
+
+        result = parse_fetch_response(data)
+
+        assert [seq for seq, _ in result] == ['1', '2']
+        assert result[0][1]['UID'] == 101
+        assert result[0][1]['FLAGS'] == ['\\Seen', '\\Flagged']
+        assert result[0][1]['RFC822.SIZE'] == 2048
+        assert result[1][1]['FLAGS'] == []
+
+    def test_parse_literal_inside_envelope(self):
+        """测试ENVELOPE中包含literal时的解析"""
+        data = [
+            (b'5 (UID 9 ENVELOPE (NIL {11}', b'Hi "there"!'),
+            b' NIL NIL NIL NIL NIL NIL NIL NIL) FLAGS (\\Seen))',
+        ]
+
+        result = parse_fetch_response(data)
+
+        assert len(result) == 1
+        attributes = result[0][1]
+        assert parse_envelope(attributes['ENVELOPE'])['subject'] == 'Hi "there"!'
+        assert attributes['FLAGS'] == ['\\Seen']
+
+    def test_parse_section_with_spaces(self):
+        """测试带空格的section名称作为单个数据项"""
+        data = [
+            (b'3 (UID 7 BODY[HEADER.FIELDS (SUBJECT FROM)] {17}', b'Subject: hello\r\n\r\n'),
+            b')',
+        ]
+
+        attributes = parse_fetch_response(data)[0][1]
+
+        assert attributes['BODY[HEADER.FIELDS (SUBJECT FROM)]'] == b'Subject: hello\r\n\r\n'
+        assert attributes['UID'] == 7
+        assert get_body_section(attributes, 'HEADER.FIELDS') == b'Subject: hello\r\n\r\n'
+        assert get_body_section(attributes, 'TEXT') is None
+
+    def test_parse_empty_response(self):
+        """测试空响应"""
+        assert parse_fetch_response([]) == []
+        assert parse_fetch_response([None]) == []
+
+    def test_parse_modseq(self):
+        """测试CHANGEDSINCE响应中的MODSEQ"""
+        attributes = parse_fetch_response([b'3 (UID 9 FLAGS (\\Seen) MODSEQ (12345))'])[0][1]
+
+        assert attributes['MODSEQ'] == 12345
+        assert attributes['FLAGS'] == ['\\Seen']
+
+    def test_parse_sequence_set(self):
+        """测试解析VANISHED响应中的UID集合"""
+        assert parse_sequence_set(b'(EARLIER) 41,43:45,50') == [41, 43, 44, 45, 50]
+        assert parse_sequence_set('7') == [7]
+        assert parse_sequence_set('9:7') == [7, 8, 9]
+        assert parse_sequence_set(None) == []
+
+    def test_format_sequence_set(self):
+        """测试把UID压缩为序列集合并按长度拆分"""
+        uids = list(range(1, 41)) + [52] + list(range(60, 100)) + [52]
+        assert format_sequence_set(uids) == '1:40,52,60:99'
+        assert parse_sequence_set(format_sequence_set(uids)) == sorted(set(uids))
+        assert format_sequence_set([]) == ''
+        assert split_sequence_set(uids, 8) == ['1:40,52', '60:99']
+        assert split_sequence_set([1, 3, 5, 7], 3) == ['1,3', '5,7']
+
+    def test_parse_partial_results(self):
+        """测试按排序顺序展开ESEARCH PARTIAL结果"""
+        data = b'(TAG "M0003") UID PARTIAL (1:4 105,103:101)'
+        assert parse_partial_results(data) == [105, 103, 102, 101]
+        assert parse_partial_results(b'(TAG "M0003") UID PARTIAL (21:40 NIL)') == []
+        assert parse_partial_results(b'(TAG "M0003") UID COUNT 3') == []
+
+
+class TestEnvelopeParsing:
+    """测试ENVELOPE解析"""
+
+    def test_parse_envelope_addresses(self):
+        """测试地址和编码主题解析"""
+        envelope = [
+            'Sat, 20 Sep 2025 10:00:00 +0800',
+            '=?utf-8?b?5rWL6K+V?=',
+            [['Alice', None, 'alice', 'example.com']],
+            None, None,
+            [[None, None, 'bob', 'test.com'], [None, None, 'carol', 'test.com']],
+            None, None, None,
+            '<id@example.com>',
+        ]
+
+        result = parse_envelope(envelope)
+
+        assert result['subject'] == '测试'
+        assert result['from'] == ['Alice <alice@example.com>']
+        assert result['to'] == ['bob@test.com', 'carol@test.com']
+        assert result['message_id'] == '<id@example.com>'
+
+    def test_parse_internaldate(self):
+        """测试INTERNALDATE转换"""
+        assert parse_internaldate('20-Sep-2025 10:00:00 +0800') == '2025-09-20T10:00:00+08:00'
+        assert parse_internaldate(None) is None
+        assert parse_internaldate('invalid') is None
+
+
+class TestBodyStructureParsing:
+    """测试BODYSTRUCTURE解析"""
+
+    @pytest.fixture
+    def multipart_structure(self):
+        data = [
+            b'1 (BODYSTRUCTURE ((("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 20 1 NIL NIL NIL NIL)'
+            b'("text" "html" ("charset" "utf-8") NIL NIL "quoted-printable" 80 2 NIL NIL NIL NIL) '
+            b'"alternative" ("boundary" "alt") NIL NIL NIL)'
+            b'("application" "pdf" ("name" "report.pdf") NIL NIL "base64" 4096 NIL '
+            b'("attachment" ("filename" "report.pdf")) NIL NIL)'
+            b'("image" "png" NIL NIL NIL "base64" 1024 NIL ("attachment" NIL) NIL NIL) '
+            b'"mixed" ("boundary" "mix") NIL NIL NIL))'
+        ]
+        return parse_fetch_response(data)[0][1]['BODYSTRUCTURE']
+
+    def test_part_numbering(self, multipart_structure):
+        """测试部分编号"""
+        root = parse_bodystructure(multipart_structure)
+
+        parts = [(part.part, part.content_type) for part in root.walk()]
+        assert parts == [
+            ('', 'multipart/mixed'),
+            ('1', 'multipart/alternative'),
+            ('1.1', 'text/plain'),
+            ('1.2', 'text/html'),
+            ('2', 'application/pdf'),
+            ('3', 'image/png'),
+        ]
+
+    def test_find_attachments(self, multipart_structure):
+        """测试附件识别"""
+        root = parse_bodystructure(multipart_structure)
+
+        attachments = find_attachment_parts(root)
+
+        assert [(part.part, filename) for part, filename in attachments] == [
+            ('2', 'report.pdf'),
+            ('3', 'image.png'),
+        ]
+        assert attachments[0][0].size == 4096
+        assert attachments[0][0].encoding == 'base64'
+
+    def test_find_text_part(self, multipart_structure):
+        """测试正文部分优先选择text/plain"""
+        root = parse_bodystructure(multipart_structure)
+
+        assert find_text_part(root).part == '1.1'
+        html_only = parse_bodystructure(['text', 'html', None, None, None, 'base64', '10', '1'])
+        assert find_text_part(html_only).content_type == 'text/html'
+        assert find_text_part(None) is None
+
+    def test_single_part_message(self):
+        """测试非multipart邮件"""
+        root = parse_bodystructure(['text', 'plain', ['charset', 'utf-8'], None, None, '7bit', '10', '1'])
+
+        assert root.part == '1'
+        assert root.content_type == 'text/plain'
+        assert find_attachment_parts(root) == []
+
+    def test_rfc2231_filename(self):
+        """测试RFC 2231编码的文件名"""
+        root = parse_bodystructure([
+            'application', 'octet-stream', None, None, None, 'base64', '100', None,
+            ['attachment', ["filename*", "utf-8''%E6%8A%A5%E5%91%8A.pdf"]], None, None,
+        ])
+
+        assert root.filename == '报告.pdf'
+
+    def test_invalid_structure(self):
+        """测试无效结构"""
+        assert parse_bodystructure(None) is None
+        assert find_attachment_parts(None) == []
+
+
+class TestPartDecodingHelpers:
+    """测试部分大小估算和片段解码"""
+
+    def test_estimate_decoded_size_base64(self):
+        """测试base64解码大小估算"""
+        payload = bytes(range(256)) * 40
+        encoded = base64.encodebytes(payload).replace(b'\n', b'\r\n')
+
+        estimate = estimate_decoded_size(len(encoded), 'base64')
+
+        assert abs(estimate - len(payload)) <= 3
+
+    def test_estimate_decoded_size_other_encodings(self):
+        """测试其他编码直接返回编码大小"""
+        assert estimate_decoded_size(1000, '7bit') == 1000
+        assert estimate_decoded_size(1000, 'quoted-printable') == 1000
+        assert estimate_decoded_size(0, 'base64') == 0
+
+    def test_decode_truncated_base64_prefix(self):
+        """测试截断的base64片段解码"""
+        encoded = base64.b64encode(b'From: a@test.com\r\nTo: b@test.com')
+
+        assert decode_part_payload(encoded[:10], 'base64') == b'From: '
+        assert decode_part_payload(b'a=3Db', 'quoted-printable') == b'a=b'
+        assert decode_part_payload(b'plain', '7bit') == b'plain'
+
+    def test_part_decoder_incremental(self):
+        """测试分块增量解码与整体解码结果一致"""
+        payload = bytes(range(256)) * 5
+        encoded = base64.encodebytes(payload).replace(b'\n', b'\r\n')
+        qp_encoded = b'caf=C3=A9 line one\r\nsoft =\r\nbreak=3D\r\nend'
+
+        for data, encoding, expected in [
+            (encoded, 'base64', payload),
+            (qp_encoded, 'quoted-printable', decode_part_payload(qp_encoded, 'quoted-printable')),
+            (b'plain text', '7bit', b'plain text'),
+        ]:
+            decoder = PartDecoder(encoding)
+            output = b''.join(decoder.feed(data[i:i + 7]) for i in range(0, len(data), 7))
+            assert output + decoder.flush() == expected
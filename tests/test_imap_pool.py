@@ -0,0 +1,330 @@
+"""
+测试IMAP连接池
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from mail_mcp.errors import NetworkError
+from mail_mcp.imap_pool import IMAPConnectionPool, MailboxState
+from mail_mcp.imap_service import IMAPService
+
+
+class FakeClient:
+    """记录关闭状态的假连接"""
+
+    def __init__(self, number):
+        self.number = number
+        self.is_open = True
+
+    async def logout(self):
+        self.is_open = False
+
+
+def make_pool(**kwargs):
+    created = []
+
+    async def factory():
+        client = FakeClient(len(created) + 1)
+        created.append(client)
+        return client
+
+    async def closer(client):
+        await client.logout()
+
+    pool = IMAPConnectionPool(
+        factory=factory,
+        closer=closer,
+        is_alive=lambda client: client.is_open,
+        **kwargs
+    )
+    return pool, created
+
+
+class TestIMAPConnectionPool:
+    """测试连接池的检出、归还和回收"""
+
+    async def test_reuse_released_connection(self):
+        """测试归还的连接被复用"""
+        pool, created = make_pool(max_size=2)
+
+        first = await pool.acquire()
+        await pool.release(first)
+        second = await pool.acquire()
+
+        assert second is first
+        assert len(created) == 1
+        assert pool.get_stats()['reused'] == 1
+
+    async def test_folder_affinity(self):
+        """测试优先分配已选中目标文件夹的连接"""
+        pool, _ = make_pool(max_size=2)
+        inbox = await pool.acquire('INBOX')
+        archive = await pool.acquire('Archive')
+        inbox.mailbox = MailboxState('INBOX')
+        archive.mailbox = MailboxState('Archive')
+        await pool.release(inbox)
+        await pool.release(archive)
+
+        assert await pool.acquire('INBOX') is inbox
+        assert await pool.acquire('Archive') is archive
+        assert pool.get_stats()['affinity_hits'] == 2
+
+    async def test_wait_queue_and_timeout(self):
+        """测试连接数达到上限时排队等待，超时抛出NetworkError"""
+        pool, created = make_pool(max_size=1, acquire_timeout=0.05)
+        held = await pool.acquire()
+
+        with pytest.raises(NetworkError):
+            await pool.acquire()
+        assert pool.get_stats()['timeouts'] == 1
+
+        pool.acquire_timeout = 1
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await pool.release(held)
+
+        assert await waiter is held
+        assert len(created) == 1
+
+    async def test_idle_eviction(self):
+        """测试空闲超时的连接被关闭"""
+        pool, created = make_pool(max_size=2, idle_timeout=0.01)
+        pooled = await pool.acquire()
+        await pool.release(pooled)
+        await asyncio.sleep(0.02)
+
+        fresh = await pool.acquire()
+
+        assert fresh is not pooled
+        assert not created[0].is_open
+        assert pool.get_stats()['evicted_idle'] == 1
+        assert pool.size == 1
+
+    async def test_max_age_recycling(self):
+        """测试超过最大存活时间的连接在归还时回收"""
+        pool, created = make_pool(max_size=2, max_age=0.01)
+        pooled = await pool.acquire()
+        await asyncio.sleep(0.02)
+
+        await pool.release(pooled)
+
+        assert not created[0].is_open
+        assert pool.size == 0
+        assert pool.get_stats()['recycled'] == 1
+
+    async def test_dead_connection_discarded(self):
+        """测试已断开的连接不会放回池中"""
+        pool, created = make_pool(max_size=2)
+        pooled = await pool.acquire()
+        pooled.client.is_open = False
+
+        await pool.release(pooled)
+
+        assert pool.idle_count == 0
+        assert pool.get_stats()['discarded'] == 1
+
+    async def test_factory_failure_frees_slot(self):
+        """测试建立连接失败时释放占用的名额"""
+        pool, _ = make_pool(max_size=1)
+        with patch.object(pool, '_factory', AsyncMock(side_effect=OSError("refused"))):
+            with pytest.raises(OSError):
+                await pool.acquire()
+
+        assert pool.size == 0
+        assert await pool.acquire() is not None
+
+    async def test_keepalive_probes_stale_idle_connections(self):
+        """测试保活只探测长时间未确认的空闲连接，并丢弃探测失败的连接"""
+        pool, created = make_pool(max_size=3, health_check_interval=10)
+        first = await pool.acquire()
+        second = await pool.acquire()
+        third = await pool.acquire()
+        for pooled in (first, second, third):
+            await pool.release(pooled)
+        first.last_checked -= 20
+        second.last_checked -= 20
+
+        async def probe(client):
+            if client is second.client:
+                raise OSError("connection reset")
+
+        pool._probe = probe
+        await pool.keepalive_once()
+
+        stats = pool.get_stats()
+        assert stats['keepalive_probes'] == 2
+        assert stats['discarded'] == 1
+        assert pool.size == 2
+        assert not second.client.is_open
+        assert first.client.is_open and third.client.is_open
+
+    async def test_keepalive_resets_changed_mailbox(self):
+        """测试探测报告邮箱有变化时清除连接记录的邮箱状态，亲和分配不再按它选择连接"""
+        pool, _ = make_pool(max_size=2, health_check_interval=0)
+        changed = await pool.acquire()
+        unchanged = await pool.acquire()
+        changed.mailbox = MailboxState('INBOX', exists=5)
+        unchanged.mailbox = MailboxState('Archive', exists=3)
+        await pool.release(changed)
+        await pool.release(unchanged)
+
+        async def probe(client):
+            return client is changed.client
+
+        pool._probe = probe
+        await pool.keepalive_once()
+
+        assert changed.mailbox is None
+        assert unchanged.mailbox == MailboxState('Archive', exists=3)
+        assert pool.size == 2
+
+    async def test_keepalive_task_runs_in_background(self):
+        """测试后台保活任务定期探测，关闭连接池时停止"""
+        pool, _ = make_pool(max_size=1, health_check_interval=0.01)
+        pooled = await pool.acquire()
+        await pool.release(pooled)
+        probes = []
+
+        async def probe(client):
+            probes.append(client)
+
+        pool.start_keepalive(probe)
+        await asyncio.sleep(0.05)
+        await pool.close()
+
+        assert probes
+        assert pool._keepalive_task is None
+
+    async def test_close(self):
+        """测试关闭连接池"""
+        pool, created = make_pool(max_size=2)
+        pooled = await pool.acquire()
+        await pool.release(pooled)
+
+        await pool.close()
+
+        assert not created[0].is_open
+        with pytest.raises(NetworkError):
+            await pool.acquire()
+
+
+class TestIMAPServicePooling:
+    """测试IMAPService通过连接池并发访问不同文件夹"""
+
+    def make_client(self, number):
+        client = Mock()
+        client.number = number
+        client.is_open = True
+        client.select = AsyncMock(return_value=('OK', [b'1']))
+        client.search = AsyncMock(return_value=('OK', [b'']))
+        client.logout = AsyncMock(return_value=('BYE', [b'']))
+        return client
+
+    @pytest.fixture
+    def pooled_service(self):
+        service = IMAPService(Mock())
+        clients = []
+
+        async def factory():
+            client = self.make_client(len(clients) + 1)
+            clients.append(client)
+            await asyncio.sleep(0.01)
+            return client
+
+        service._pool = IMAPConnectionPool(
+            factory=factory,
+            max_size=2,
+            closer=service._close_pooled_connection,
+            is_alive=lambda client: client.is_open
+        )
+        service.connected = True
+        return service, clients
+
+    async def test_parallel_folders_use_separate_connections(self, pooled_service):
+        """测试不同文件夹的并发操作使用不同连接且不会重复SELECT"""
+        service, clients = pooled_service
+
+        await asyncio.gather(
+            service.list_messages('INBOX'),
+            service.list_messages('Archive'),
+        )
+        assert len(clients) == 2
+
+        await service.list_messages('Archive')
+        await service.list_messages('INBOX')
+
+        selected = sorted(
+            (client.select.call_args[0][0], client.select.call_count) for client in clients
+        )
+        assert selected == [('"Archive"', 1), ('"INBOX"', 1)]
+        assert service.get_connection_stats()['pool']['affinity_hits'] == 2
+
+    async def test_nested_calls_reuse_checked_out_connection(self, pooled_service):
+        """测试嵌套调用复用外层检出的连接"""
+        service, clients = pooled_service
+
+        await service.search_messages_simple(query="test", folder="INBOX")
+
+        assert len(clients) == 1
+        assert service._pool.idle_count == 1
+
+    async def test_keepalive_expunge_forces_reselect(self):
+        """测试保活NOOP收到EXPUNGE后，下一页按重新SELECT得到的EXISTS计算"""
+        uids = [3, 5, 6, 9, 10]
+        client = Mock()
+        client.is_open = True
+        client.untagged_responses = {}
+        notifications = [{'EXPUNGE': [b'5']}]
+
+        def select(mailbox, readonly=False):
+            client.untagged_responses = {'UIDVALIDITY': [b'42'], 'UIDNEXT': [b'11']}
+            return ('OK', [str(len(uids)).encode()])
+
+        def uid(command, query):
+            client.untagged_responses = {}
+            first, last = map(int, query.split(':'))
+            return ('OK', [' '.join(map(str, uids[first - 1:last])).encode()])
+
+        async def noop():
+            # 与真实连接一样，每条命令只保留本次收到的未标记响应
+            client.untagged_responses = notifications.pop(0) if notifications else {}
+            return ('OK', [None])
+
+        client.select.side_effect = select
+        client.uid.side_effect = uid
+        client.noop = AsyncMock(side_effect=noop)
+
+        async def factory():
+            return client
+
+        service = IMAPService(Mock())
+        service._pool = IMAPConnectionPool(
+            factory=factory, max_size=1, closer=AsyncMock(), is_alive=lambda c: True, health_check_interval=0
+        )
+        service._pool._probe = service._probe_connection
+        service.connected = True
+        service._fetch_message_summaries = AsyncMock(side_effect=lambda msg_ids, folder: msg_ids)
+
+        assert (await service.list_messages_page('INBOX', 2))[0] == ['10', '9']
+
+        # 其他客户端删除了UID 10，只有保活的NOOP收到了 * 5 EXPUNGE
+        uids.remove(10)
+        await service._pool.keepalive_once()
+
+        assert (await service.list_messages_page('INBOX', 2))[0] == ['9', '6']
+        assert client.select.call_count == 2
+
+    async def test_disconnect_closes_pool(self, pooled_service):
+        """测试断开连接时关闭连接池"""
+        service, clients = pooled_service
+        await service.list_messages('INBOX')
+
+        await service.disconnect()
+
+        assert service._pool is None
+        assert not service.is_connected()
+        clients[0].logout.assert_called_once()
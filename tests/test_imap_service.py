@@ -4,14 +4,19 @@
 
 import pytest
 import asyncio
+import contextlib
 from unittest.mock import Mock, patch, AsyncMock
 import imaplib
 import socket
 import ssl
 import email
+import base64
+import os
+import tempfile
 from email import policy
 
 from mail_mcp.config import Config
+from mail_mcp.cursor import PageCursor
 from mail_mcp.imap_service import IMAPService
 
 
@@ -243,6 +248,36 @@ class TestIMAPService:
         assert result is False
         assert imap_service.connected is False
     
+    @pytest.mark.asyncio
+    async def test_is_connected_skips_noop_after_recent_command(self, imap_service):
+        """测试最近有成功命令时不发送NOOP，空闲超过阈值后才探测"""
+        mock_connection = Mock()
+        mock_connection.noop.return_value = ('OK', [b''])
+        mock_connection.search.return_value = ('OK', [b''])
+        imap_service.connection = mock_connection
+        imap_service.connected = True
+        
+        await imap_service._imap('search', None, 'ALL')
+        assert imap_service.is_connected() is True
+        mock_connection.noop.assert_not_called()
+        
+        imap_service.health_check_interval = 0
+        assert imap_service.is_connected() is True
+        mock_connection.noop.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_socket_error_marks_disconnected(self, imap_service):
+        """测试命令遇到连接错误后标记为未连接"""
+        mock_connection = Mock()
+        mock_connection.search.side_effect = imaplib.IMAP4.abort("socket error")
+        imap_service.connection = mock_connection
+        imap_service.connected = True
+        
+        with pytest.raises(imaplib.IMAP4.abort):
+            await imap_service._imap('search', None, 'ALL')
+        
+        assert imap_service.connected is False
+    
     def test_get_connection_stats(self, imap_service):
         """测试获取连接统计"""
         imap_service.connection_stats = {
@@ -357,37 +392,167 @@ class TestIMAPService:
                 # 第一次连接后，后续的连接应该直接返回True而不调用_connect_with_retry
                 assert call_count == 1, f"Expected 1 call, got {call_count}"
 
+    @pytest.fixture
+    def selecting_connection(self):
+        """记录SELECT/EXAMINE响应中UIDVALIDITY等状态的模拟连接"""
+        connection = Mock()
+        connection.untagged_responses = {}
+
+        def select(mailbox, readonly=False):
+            connection.untagged_responses = {
+                'EXISTS': [b'3'], 'UIDVALIDITY': [b'42'], 'UIDNEXT': [b'104']
+            }
+            return ('OK', [b'3'])
+
+        connection.select.side_effect = select
+        connection.uid.return_value = ('OK', [b''])
+        connection.noop.return_value = ('OK', [b''])
+        return connection
+
     @pytest.mark.asyncio
-    async def test_get_message_attachments_with_attachments(self, imap_service):
-        """测试获取包含附件的邮件附件列表"""
-        # 创建一个包含附件的模拟邮件
-        mock_email = """Subject: Test Email with Attachments
-From: test@example.com
-To: recipient@example.com
-MIME-Version: 1.0
-Content-Type: multipart/mixed; boundary="boundary123"
+    async def test_select_folder_skips_redundant_select(self, imap_service, selecting_connection):
+        """测试同一文件夹不重复SELECT，只读操作使用EXAMINE"""
+        imap_service.connection = selecting_connection
+        imap_service.connected = True
 
---boundary123
-Content-Type: text/plain
+        await imap_service.list_messages("INBOX")
+        await imap_service.list_messages("INBOX")
 
-This is a test email with attachments.
+        selecting_connection.select.assert_called_once_with('"INBOX"', True)
+        state = imap_service.mailbox_state
+        assert (state.folder, state.readonly) == ("INBOX", True)
+        assert (state.uidvalidity, state.exists, state.uidnext) == (42, 3, 104)
 
---boundary123
-Content-Type: application/pdf
-Content-Disposition: attachment; filename="test.pdf"
+    @pytest.mark.asyncio
+    async def test_select_folder_upgrades_to_read_write(self, imap_service, selecting_connection):
+        """测试写操作从EXAMINE切换为SELECT，之后的只读操作复用读写状态"""
+        imap_service.connection = selecting_connection
+        imap_service.connected = True
 
-PDF content here
---boundary123
-Content-Type: image/jpeg
-Content-Disposition: attachment; filename="image.jpg"
+        await imap_service.list_messages("INBOX")
+        await imap_service.mark_as_read("1", "INBOX")
+        await imap_service.list_messages("INBOX")
+        await imap_service.list_messages("Archive")
 
-JPEG content here
---boundary123--
-"""
-        
+        assert [c[0] for c in selecting_connection.select.call_args_list] == [
+            ('"INBOX"', True), ('"INBOX"',), ('"Archive"', True)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_select_folder_after_uidvalidity_change(self, imap_service, selecting_connection):
+        """测试服务器报告UIDVALIDITY变化后重新SELECT"""
+        imap_service.connection = selecting_connection
+        imap_service.connected = True
+        await imap_service.list_messages("INBOX")
+
+        def search(*args):
+            selecting_connection.untagged_responses['UIDVALIDITY'] = [b'43']
+            return ('OK', [b''])
+
+        selecting_connection.uid.side_effect = search
+        await imap_service.list_messages("INBOX")
+        assert imap_service.mailbox_state is None
+
+        await imap_service.list_messages("INBOX")
+        assert selecting_connection.select.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_message_ids_are_stable_uids(self, imap_service, selecting_connection):
+        """测试邮件ID由UIDVALIDITY和UID组成，UIDVALIDITY不一致的ID被拒绝"""
+        headers = b"Subject: hi\r\nFrom: a@test.com\r\n\r\n"
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return ('OK', [b'7'])
+            if command == 'FETCH':
+                return ('OK', [
+                    (b'1 (UID 7 FLAGS () BODY[HEADER.FIELDS (SUBJECT FROM)] {%d}' % len(headers), headers),
+                    b')'
+                ])
+            return ('OK', [b''])
+
+        selecting_connection.uid.side_effect = uid
+        imap_service.connection = selecting_connection
+        imap_service.connected = True
+
+        messages = await imap_service.list_messages("INBOX")
+        assert [message.id for message in messages] == ["42:7"]
+        # 按EXISTS算出的序列号范围换成UID，不获取整个文件夹的UID列表
+        assert selecting_connection.uid.call_args_list[0][0] == ('SEARCH', '1:3')
+
+        assert await imap_service.mark_as_read("41:7", "INBOX") is False
+        assert await imap_service.mark_as_read("42:7", "INBOX") is True
+        assert selecting_connection.uid.call_args[0] == ('STORE', '7', '+FLAGS', '\\Seen')
+
+    @pytest.mark.asyncio
+    async def test_list_messages_pages_by_sequence_range(self, imap_service, selecting_connection):
+        """测试由EXISTS计算页的序列号范围，删除邮件后EXISTS相应减少"""
+        selecting_connection.uid.return_value = ('OK', [b'101 102'])
+        selecting_connection.expunge.return_value = ('OK', [b'1'])
+        imap_service.connection = selecting_connection
+        imap_service.connected = True
+
+        with patch.object(imap_service, '_fetch_message_summaries', AsyncMock(return_value=[])) as fetch:
+            await imap_service.list_messages("INBOX", limit=2, offset=1)
+            assert selecting_connection.uid.call_args[0] == ('SEARCH', '1:2')
+            assert fetch.call_args[0][0] == ['102', '101']
+
+            await imap_service._imap('expunge')
+            assert imap_service.mailbox_state.exists == 2
+            await imap_service.list_messages("INBOX", limit=2, offset=1)
+            assert selecting_connection.uid.call_args[0] == ('SEARCH', '1:1')
+
+            assert await imap_service.list_messages("INBOX", limit=2, offset=5) == []
+
+    @pytest.mark.asyncio
+    async def test_list_messages_contiguous_uids(self, imap_service, selecting_connection):
+        """测试UIDNEXT = EXISTS + 1 时直接由序列号得到UID，不发送SEARCH"""
+        selecting_connection.select.side_effect = None
+        selecting_connection.select.return_value = ('OK', [b'3'])
+        selecting_connection.untagged_responses = {'UIDVALIDITY': [b'42'], 'UIDNEXT': [b'4']}
+        imap_service.connection = selecting_connection
+        imap_service.connected = True
+
+        with patch.object(imap_service, '_fetch_message_summaries', AsyncMock(return_value=[])) as fetch:
+            await imap_service.list_messages("INBOX", limit=2, offset=1)
+
+        assert fetch.call_args[0][0] == ['2', '1']
+        selecting_connection.uid.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_list_messages_uses_partial_search(self, imap_service, selecting_connection):
+        """测试服务器支持PARTIAL时按UID倒序只取出一页，游标从本页最小的UID继续"""
+        selecting_connection.capabilities = ('IMAP4REV1', 'ESEARCH', 'PARTIAL')
+
+        def search(command, *args):
+            selecting_connection.untagged_responses['ESEARCH'] = [
+                b'(TAG "M0004") UID PARTIAL (-41:-42 75,77)'
+            ]
+            return ('OK', [None])
+
+        selecting_connection.uid.side_effect = search
+        imap_service.connection = selecting_connection
+        imap_service.connected = True
+
+        with patch.object(imap_service, '_fetch_message_summaries', AsyncMock(return_value=[])) as fetch:
+            _, cursor = await imap_service.list_messages_page("INBOX", limit=2, offset=40)
+
+        assert selecting_connection.uid.call_args[0] == ('SEARCH', 'RETURN (PARTIAL -41:-42) ALL')
+        assert fetch.call_args[0][0] == ['77', '75']
+        assert PageCursor.decode(cursor).last_uid == 75
+
+    @pytest.mark.asyncio
+    async def test_get_message_attachments_with_attachments(self, imap_service):
+        """测试获取包含附件的邮件附件列表"""
         mock_connection = Mock()
         mock_connection.select.return_value = ('OK', [])
-        mock_connection.fetch.return_value = ('OK', [(None, mock_email.encode())])
+        mock_connection.uid.return_value = ('OK', [
+            b'1 (BODYSTRUCTURE (("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 40 1 NIL NIL NIL NIL)'
+            b'("application" "pdf" ("name" "test.pdf") NIL NIL "base64" 1404 NIL '
+            b'("attachment" ("filename" "test.pdf")) NIL NIL)'
+            b'("image" "jpeg" NIL NIL NIL "base64" 780 NIL ("attachment" ("filename" "image.jpg")) NIL NIL) '
+            b'"mixed" ("boundary" "boundary123") NIL NIL NIL))'
+        ])
         imap_service.connection = mock_connection
         imap_service.connected = True
         
@@ -396,34 +561,32 @@ JPEG content here
             
             assert len(attachments) == 2
             
+            # 只请求BODYSTRUCTURE，不下载邮件内容
+            mock_connection.uid.assert_called_once_with('FETCH', "123", '(BODYSTRUCTURE)')
+            
             # 检查第一个附件
             pdf_attachment = next(att for att in attachments if att['filename'] == 'test.pdf')
             assert pdf_attachment['content_type'] == 'application/pdf'
-            assert pdf_attachment['size'] > 0
-            assert 'part_id' in pdf_attachment
+            assert pdf_attachment['part_id'] == '2'
+            assert pdf_attachment['encoded_size'] == 1404
+            assert pdf_attachment['encoding'] == 'base64'
+            # base64: 1404字节 = 18行 * 78字节，解码后约 18 * 76 * 3 / 4
+            assert pdf_attachment['size'] == 1026
             
             # 检查第二个附件
             jpg_attachment = next(att for att in attachments if att['filename'] == 'image.jpg')
             assert jpg_attachment['content_type'] == 'image/jpeg'
+            assert jpg_attachment['part_id'] == '3'
             assert jpg_attachment['size'] > 0
-            assert 'part_id' in jpg_attachment
 
     @pytest.mark.asyncio
     async def test_get_message_attachments_no_attachments(self, imap_service):
         """测试获取不含附件的邮件附件列表"""
-        # 创建一个不含附件的模拟邮件
-        mock_email = """Subject: Test Email without Attachments
-From: test@example.com
-To: recipient@example.com
-MIME-Version: 1.0
-Content-Type: text/plain
-
-This is a test email without attachments.
-"""
-        
         mock_connection = Mock()
         mock_connection.select.return_value = ('OK', [])
-        mock_connection.fetch.return_value = ('OK', [(None, mock_email.encode())])
+        mock_connection.uid.return_value = ('OK', [
+            b'1 (BODYSTRUCTURE ("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 42 1 NIL NIL NIL NIL))'
+        ])
         imap_service.connection = mock_connection
         imap_service.connected = True
         
@@ -432,6 +595,30 @@ This is a test email without attachments.
             
             assert len(attachments) == 0
 
+    @pytest.mark.asyncio
+    async def test_get_message_attachments_filters_embedded_email(self, imap_service):
+        """测试通过读取开头片段过滤嵌入的邮件内容"""
+        embedded = base64.b64encode(b"From: a@test.com\r\nTo: b@test.com\r\nSubject: hi\r\n\r\nbody")
+        mock_connection = Mock()
+        mock_connection.uid.side_effect = [
+            ('OK', [
+                b'1 (BODYSTRUCTURE (("text" "plain" NIL NIL NIL "7bit" 10 1 NIL NIL NIL NIL)'
+                b'("application" "octet-stream" NIL NIL NIL "base64" 200 NIL '
+                b'("attachment" ("filename" "original.eml")) NIL NIL)'
+                b'("application" "pdf" NIL NIL NIL "base64" 100 NIL '
+                b'("attachment" ("filename" "real.pdf")) NIL NIL) "mixed" NIL NIL NIL NIL))'
+            ]),
+            ('OK', [(b'1 (BODY[2]<0> {%d}' % len(embedded), embedded), b')']),
+        ]
+        imap_service.connection = mock_connection
+        imap_service.connected = True
+        
+        with patch.object(imap_service, 'select_folder', return_value=True):
+            attachments = await imap_service.get_message_attachments("123")
+            
+            assert [att['filename'] for att in attachments] == ['real.pdf']
+            assert mock_connection.uid.call_args_list[1][0] == ('FETCH', "123", '(BODY.PEEK[2]<0.700>)')
+
     @pytest.mark.asyncio
     async def test_get_message_attachments_folder_selection_failed(self, imap_service):
         """测试获取附件时文件夹选择失败"""
@@ -444,7 +631,7 @@ This is a test email without attachments.
     async def test_get_message_attachments_fetch_failed(self, imap_service):
         """测试获取附件时fetch失败"""
         mock_connection = Mock()
-        mock_connection.fetch.return_value = ('NO', [])
+        mock_connection.uid.return_value = ('NO', [])
         imap_service.connection = mock_connection
         imap_service.connected = True
         
@@ -453,33 +640,25 @@ This is a test email without attachments.
             
             assert attachments == []
 
+    @pytest.fixture
+    def attachment_structure_response(self):
+        """包含两个附件的BODYSTRUCTURE响应"""
+        return ('OK', [
+            b'1 (BODYSTRUCTURE (("text" "plain" NIL NIL NIL "7bit" 40 1 NIL NIL NIL NIL)'
+            b'("application" "pdf" NIL NIL NIL "base64" 24 NIL ("attachment" ("filename" "test.pdf")) NIL NIL)'
+            b'("text" "csv" NIL NIL NIL "quoted-printable" 7 1 NIL ("attachment" ("filename" "data.csv")) NIL NIL) '
+            b'"mixed" ("boundary" "boundary123") NIL NIL NIL))'
+        ])
+
     @pytest.mark.asyncio
-    async def test_download_attachment_payload_success(self, imap_service):
+    async def test_download_attachment_payload_success(self, imap_service, attachment_structure_response):
         """测试成功下载附件内容"""
-        # 创建包含附件的模拟邮件
-        mock_email = """Subject: Test Email with Attachments
-From: test@example.com
-To: recipient@example.com
-MIME-Version: 1.0
-Content-Type: multipart/mixed; boundary="boundary123"
-
---boundary123
-Content-Type: text/plain
-
-This is a test email with attachments.
-
---boundary123
-Content-Type: application/pdf
-Content-Disposition: attachment; filename="test.pdf"
-Content-Transfer-Encoding: base64
-
-UERGIGNvbnRlbnQgaGVyZQ==
---boundary123--
-"""
-        
         mock_connection = Mock()
         mock_connection.select.return_value = ('OK', [])
-        mock_connection.fetch.return_value = ('OK', [(None, mock_email.encode())])
+        mock_connection.uid.side_effect = [
+            attachment_structure_response,
+            ('OK', [(b'1 (BODY[2] {24}', b'UERGIGNvbnRlbnQgaGVyZQ=='), b')']),
+        ]
         imap_service.connection = mock_connection
         imap_service.connected = True
         
@@ -490,40 +669,158 @@ UERGIGNvbnRlbnQgaGVyZQ==
             assert isinstance(payload, bytes)
             # 解码base64后的内容应该是 "PDF content here"
             assert b"PDF content here" == payload
+            # 只获取附件所在的MIME部分
+            assert mock_connection.uid.call_args_list[1][0] == ('FETCH', "123", '(BODY.PEEK[2])')
 
     @pytest.mark.asyncio
-    async def test_download_attachment_payload_file_not_found(self, imap_service):
-        """测试下载不存在的附件"""
-        # 创建包含不同附件的模拟邮件
-        mock_email = """Subject: Test Email with Attachments
-From: test@example.com
-To: recipient@example.com
-MIME-Version: 1.0
-Content-Type: multipart/mixed; boundary="boundary123"
+    async def test_download_attachment_payloads_single_fetch(self, imap_service, attachment_structure_response):
+        """测试同一封邮件的多个附件只发送一条FETCH"""
+        mock_connection = Mock()
+        mock_connection.uid.side_effect = [
+            attachment_structure_response,
+            ('OK', [
+                (b'1 (BODY[2] {24}', b'UERGIGNvbnRlbnQgaGVyZQ=='),
+                (b' BODY[3] {7}', b'a,b=3Dc'),
+                b')',
+            ]),
+        ]
+        imap_service.connection = mock_connection
+        imap_service.connected = True
+        
+        with patch.object(imap_service, 'select_folder', return_value=True):
+            payloads = await imap_service.download_attachment_payloads(
+                "123", ["test.pdf", "data.csv", "missing.doc"]
+            )
+            
+            assert payloads == {
+                "test.pdf": b"PDF content here",
+                "data.csv": b"a,b=c",
+                "missing.doc": None,
+            }
+            assert mock_connection.uid.call_count == 2
+            assert mock_connection.uid.call_args_list[1][0] == ('FETCH', "123", '(BODY.PEEK[2] BODY.PEEK[3])')
+
+    @pytest.mark.asyncio
+    async def test_download_attachments_to_dir_streams_chunks(self, imap_service, attachment_structure_response):
+        """测试分块流式下载附件到文件"""
+        payload = bytes(range(256)) * 8
+        encoded = base64.encodebytes(payload).replace(b'\n', b'\r\n')
+        chunk_size = 1000
+        
+        def fetch(command, uid, items):
+            if items == '(BODYSTRUCTURE)':
+                return attachment_structure_response
+            offset = int(items.split('<')[1].split('.')[0])
+            chunk = encoded[offset:offset + chunk_size]
+            head = f'1 (BODY[2]<{offset}> {{{len(chunk)}}}'.encode()
+            return ('OK', [(head, chunk), b')'])
+        
+        mock_connection = Mock()
+        mock_connection.uid.side_effect = fetch
+        imap_service.connection = mock_connection
+        imap_service.connected = True
+        
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch.object(imap_service, 'select_folder', return_value=True), \
+                patch('mail_mcp.imap_service.ATTACHMENT_CHUNK_SIZE', chunk_size):
+            saved = await imap_service.download_attachments_to_dir(
+                "123", ["test.pdf", "missing.doc"], temp_dir
+            )
+            
+            file_path = os.path.join(temp_dir, "test.pdf")
+            assert saved == {"test.pdf": file_path, "missing.doc": None}
+            with open(file_path, 'rb') as f:
+                assert f.read() == payload
+            # 不留下临时文件
+            assert os.listdir(temp_dir) == ["test.pdf"]
+            
+            part_fetches = [c[0][2] for c in mock_connection.uid.call_args_list if c[0][2] != '(BODYSTRUCTURE)']
+            assert part_fetches[0] == '(BODY.PEEK[2]<0.1000>)'
+            assert len(part_fetches) == len(encoded) // chunk_size + 1
 
---boundary123
-Content-Type: text/plain
+    @pytest.mark.asyncio
+    async def test_download_attachments_to_dir_empty_part(self, imap_service, attachment_structure_response):
+        """测试长度为0的附件保存为空文件，响应中没有该部分时下载失败"""
+        mock_connection = Mock()
+        imap_service.connection = mock_connection
+        imap_service.connected = True
 
-This is a test email with attachments.
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch.object(imap_service, 'select_folder', return_value=True):
+            mock_connection.uid.side_effect = [
+                attachment_structure_response,
+                ('OK', [(b'1 (BODY[2]<0> {0}', b''), b')']),
+            ]
+            saved = await imap_service.download_attachments_to_dir("123", ["test.pdf"], temp_dir)
 
---boundary123
-Content-Type: application/pdf
-Content-Disposition: attachment; filename="different.pdf"
+            file_path = os.path.join(temp_dir, "test.pdf")
+            assert saved == {"test.pdf": file_path}
+            assert os.path.getsize(file_path) == 0
 
-PDF content here
---boundary123--
-"""
+            os.unlink(file_path)
+            mock_connection.uid.side_effect = [attachment_structure_response, ('OK', [b'1 (UID 123)'])]
+            saved = await imap_service.download_attachments_to_dir("123", ["test.pdf"], temp_dir)
+
+            assert saved == {"test.pdf": None}
+            assert os.listdir(temp_dir) == []
+
+    @pytest.mark.asyncio
+    async def test_download_attachments_to_dir_readonly_directory(self, imap_service, attachment_structure_response):
+        """测试保存目录不可写时报告该附件下载失败，而不是抛出异常"""
+        mock_connection = Mock()
+        mock_connection.uid.side_effect = [attachment_structure_response]
+        imap_service.connection = mock_connection
+        imap_service.connected = True
+
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch.object(imap_service, 'select_folder', return_value=True):
+            readonly_dir = os.path.join(temp_dir, "readonly")
+            os.makedirs(readonly_dir)
+            os.chmod(readonly_dir, 0o555)
+            try:
+                with contextlib.ExitStack() as stack:
+                    if os.access(readonly_dir, os.W_OK):
+                        # 以root运行时权限位不生效，模拟创建临时文件被拒绝
+                        stack.enter_context(patch(
+                            'mail_mcp.imap_service.tempfile.mkstemp', side_effect=PermissionError(13, 'Permission denied')
+                        ))
+                    saved = await imap_service.download_attachments_to_dir("123", ["test.pdf"], readonly_dir)
+
+                assert saved == {"test.pdf": None}
+                assert os.listdir(readonly_dir) == []
+            finally:
+                os.chmod(readonly_dir, 0o755)
+
+    @pytest.mark.asyncio
+    async def test_download_attachments_to_dir_failure_leaves_no_file(self, imap_service, attachment_structure_response):
+        """测试获取失败时不留下不完整的文件"""
+        mock_connection = Mock()
+        mock_connection.uid.side_effect = [attachment_structure_response, ('NO', [b'error'])]
+        imap_service.connection = mock_connection
+        imap_service.connected = True
         
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch.object(imap_service, 'select_folder', return_value=True):
+            saved = await imap_service.download_attachments_to_dir("123", ["test.pdf"], temp_dir)
+            
+            assert saved == {"test.pdf": None}
+            assert os.listdir(temp_dir) == []
+
+    @pytest.mark.asyncio
+    async def test_download_attachment_payload_file_not_found(self, imap_service, attachment_structure_response):
+        """测试下载不存在的附件"""
         mock_connection = Mock()
         mock_connection.select.return_value = ('OK', [])
-        mock_connection.fetch.return_value = ('OK', [(None, mock_email.encode())])
+        mock_connection.uid.return_value = attachment_structure_response
         imap_service.connection = mock_connection
         imap_service.connected = True
         
         with patch.object(imap_service, 'select_folder', return_value=True):
-            payload = await imap_service.download_attachment_payload("123", "test.pdf")
+            payload = await imap_service.download_attachment_payload("123", "other.pdf")
             
             assert payload is None
+            # 找不到附件时不会再发送获取内容的FETCH
+            mock_connection.uid.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_download_attachment_payload_folder_selection_failed(self, imap_service):
@@ -537,7 +834,7 @@ PDF content here
     async def test_download_attachment_payload_exception_handling(self, imap_service):
         """测试下载附件时的异常处理"""
         mock_connection = Mock()
-        mock_connection.fetch.side_effect = Exception("Network error")
+        mock_connection.uid.side_effect = Exception("Network error")
         imap_service.connection = mock_connection
         imap_service.connected = True
         
@@ -9,7 +9,29 @@ from datetime import datetime
 
 from mail_mcp.config import Config
 from mail_mcp.imap_service import IMAPService
-from mail_mcp.models import EmailMessage
+from mail_mcp.models import EmailMessage, EmailSummary
+
+
+def build_summary_fetch_response(messages):
+    """根据EmailMessage列表构造批量FETCH的模拟响应（邮件头以literal返回）"""
+    data = []
+    for message in messages:
+        flags = '(\\Seen)' if message.is_read else '()'
+        headers = (
+            f"Date: Sat, 20 Sep 2025 10:00:00 +0800\r\n"
+            f"From: {message.from_address}\r\n"
+            f"To: {', '.join(message.to_addresses)}\r\n"
+            f"Subject: {message.subject}\r\n"
+            f"Message-ID: <{message.message_id}>\r\n\r\n"
+        ).encode('utf-8')
+        data.append((
+            f'{message.id} (UID {message.id} FLAGS {flags} RFC822.SIZE 1024 '
+            f'INTERNALDATE "20-Sep-2025 10:00:00 +0800" '
+            f'BODY[HEADER.FIELDS (DATE FROM TO CC SUBJECT MESSAGE-ID)] {{{len(headers)}}}'.encode(),
+            headers
+        ))
+        data.append(b' BODYSTRUCTURE ("text" "plain" ("charset" "utf-8") NIL NIL "8bit" 100 3 NIL NIL NIL NIL))')
+    return ('OK', data)
 
 
 class TestListMessages:
@@ -77,71 +99,72 @@ class TestListMessages:
             )
         ]
     
+    @pytest.fixture
+    def mock_connection(self, imap_service, sample_messages):
+        """创建返回批量FETCH响应的模拟连接"""
+        connection = Mock()
+        # UID SEARCH/UID FETCH 分别转发到 search/fetch 模拟方法
+        connection.uid.side_effect = lambda command, *args: getattr(connection, command.lower())(*args)
+        connection.search.return_value = ('OK', [b'1 2 3'])  # IMAP返回最旧邮件在前
+        connection.fetch.return_value = build_summary_fetch_response(sample_messages)
+        imap_service.connection = connection
+        imap_service.connected = True
+        return connection
+    
     @pytest.mark.asyncio
-    async def test_list_messages_success(self, imap_service, sample_messages):
+    async def test_list_messages_success(self, imap_service, mock_connection):
         """测试成功获取邮件列表"""
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch('imaplib.IMAP4_SSL') as mock_ssl:
-                mock_connection = Mock()
-                mock_connection.search.return_value = ('OK', [b'1 2 3'])
-                mock_ssl.return_value = mock_connection
-                imap_service.connection = mock_connection
-                imap_service.connected = True
-                
-                with patch.object(imap_service, '_get_message_by_id') as mock_get:
-                    # 设置模拟返回值
-                    mock_get.side_effect = sample_messages
-                    
-                    result = await imap_service.list_messages("INBOX", 3, 0)
-                    
-                    assert len(result) == 3
-                    assert result[0].id == "1"
-                    assert result[0].subject == "测试邮件1"
-                    assert result[1].id == "2"
-                    assert result[1].subject == "测试邮件2"
-                    assert result[2].id == "3"
-                    assert result[2].subject == "测试邮件3"
+            result = await imap_service.list_messages("INBOX", 3, 0)
+            
+            assert len(result) == 3
+            assert result[0].id == "3"
+            assert result[0].subject == "测试邮件3"
+            assert result[0].from_address == "sender3@test.com"
+            assert result[0].to_addresses == ["test@test.com"]
+            assert result[0].is_read is False
+            assert result[1].id == "2"
+            assert result[1].is_read is True
+            assert result[2].id == "1"
+            assert result[2].subject == "测试邮件1"
+    
+    @pytest.mark.asyncio
+    async def test_list_messages_single_fetch_round_trip(self, imap_service, mock_connection):
+        """测试整页邮件只发送一条FETCH命令且不下载正文"""
+        with patch.object(imap_service, 'select_folder', return_value=True):
+            result = await imap_service.list_messages("INBOX", 3, 0)
+            
+            assert len(result) == 3
+            mock_connection.fetch.assert_called_once()
+            message_set, items = mock_connection.fetch.call_args[0]
+            assert message_set == "3,2,1"
+            mock_connection.uid.assert_any_call('FETCH', message_set, items)
+            assert "BODYSTRUCTURE" in items
+            assert "BODY.PEEK[HEADER.FIELDS" in items
+            assert "RFC822)" not in items
+            assert all(isinstance(message, EmailSummary) for message in result)
     
     @pytest.mark.asyncio
-    async def test_list_messages_with_limit(self, imap_service, sample_messages):
+    async def test_list_messages_with_limit(self, imap_service, mock_connection):
         """测试限制邮件数量"""
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch('imaplib.IMAP4_SSL') as mock_ssl:
-                mock_connection = Mock()
-                mock_connection.search.return_value = ('OK', [b'1 2 3'])
-                mock_ssl.return_value = mock_connection
-                imap_service.connection = mock_connection
-                imap_service.connected = True
-                
-                with patch.object(imap_service, '_get_message_by_id') as mock_get:
-                    mock_get.side_effect = sample_messages
-                    
-                    result = await imap_service.list_messages("INBOX", 2, 0)
-                    
-                    assert len(result) == 2
-                    assert result[0].id == "1"
-                    assert result[1].id == "2"
+            result = await imap_service.list_messages("INBOX", 2, 0)
+            
+            assert len(result) == 2
+            assert result[0].id == "3"
+            assert result[1].id == "2"
+            assert mock_connection.fetch.call_args[0][0] == "3,2"
     
     @pytest.mark.asyncio
-    async def test_list_messages_with_offset(self, imap_service, sample_messages):
+    async def test_list_messages_with_offset(self, imap_service, mock_connection):
         """测试分页偏移"""
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch('imaplib.IMAP4_SSL') as mock_ssl:
-                mock_connection = Mock()
-                mock_connection.search.return_value = ('OK', [b'3 2 1'])  # IMAP返回最旧邮件在前
-                mock_ssl.return_value = mock_connection
-                imap_service.connection = mock_connection
-                imap_service.connected = True
-                
-                with patch.object(imap_service, '_get_message_by_id') as mock_get:
-                    # 反转顺序后，应该返回邮件2和3（对应索引1和2）
-                    mock_get.side_effect = [sample_messages[2], sample_messages[1]]  # 邮件3, 邮件2
-                    
-                    result = await imap_service.list_messages("INBOX", 2, 1)
-                    
-                    assert len(result) == 2
-                    assert result[0].id == "3"  # 邮件3（最新）
-                    assert result[1].id == "2"  # 邮件2（次新）
+            result = await imap_service.list_messages("INBOX", 2, 1)
+            
+            assert len(result) == 2
+            assert result[0].id == "2"
+            assert result[1].id == "1"
+            assert mock_connection.fetch.call_args[0][0] == "2,1"
     
     @pytest.mark.asyncio
     async def test_list_messages_folder_selection_failure(self, imap_service):
@@ -152,106 +175,94 @@ class TestListMessages:
             assert len(result) == 0
     
     @pytest.mark.asyncio
-    async def test_list_messages_empty_folder(self, imap_service):
+    async def test_list_messages_empty_folder(self, imap_service, mock_connection):
         """测试空文件夹"""
+        mock_connection.search.return_value = ('OK', [b''])
+        
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch.object(imap_service, '_get_message_by_id') as mock_get:
-                mock_get.return_value = None
-                
-                result = await imap_service.list_messages("INBOX", 10, 0)
-                
-                assert len(result) == 0
+            result = await imap_service.list_messages("INBOX", 10, 0)
+            
+            assert len(result) == 0
+            mock_connection.fetch.assert_not_called()
     
     @pytest.mark.asyncio
-    async def test_list_messages_invalid_pagination(self, imap_service):
+    async def test_list_messages_invalid_pagination(self, imap_service, mock_connection):
         """测试无效分页参数"""
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch('imaplib.IMAP4_SSL') as mock_ssl:
-                mock_connection = Mock()
-                mock_connection.search.return_value = ('OK', [b'1 2 3'])
-                mock_ssl.return_value = mock_connection
-                imap_service.connection = mock_connection
-                imap_service.connected = True
-                
-                # 测试无效的偏移量 - 应该返回空列表而不是错误
-                result = await imap_service.list_messages("INBOX", 10, 10)
-                assert len(result) == 0
-                
-                # 测试零限制 - 应该返回空列表
-                result = await imap_service.list_messages("INBOX", 0, 0)
-                assert len(result) == 0
+            # 测试无效的偏移量 - 应该返回空列表而不是错误
+            result = await imap_service.list_messages("INBOX", 10, 10)
+            assert len(result) == 0
+            
+            # 测试零限制 - 应该返回空列表
+            result = await imap_service.list_messages("INBOX", 0, 0)
+            assert len(result) == 0
     
     @pytest.mark.asyncio
-    async def test_list_messages_connection_error(self, imap_service):
+    async def test_list_messages_connection_error(self, imap_service, mock_connection):
         """测试连接错误处理"""
+        mock_connection.search.side_effect = Exception("Connection error")
+        
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch('imaplib.IMAP4_SSL') as mock_ssl:
-                mock_connection = Mock()
-                mock_connection.search.side_effect = Exception("Connection error")
-                mock_ssl.return_value = mock_connection
-                imap_service.connection = mock_connection
-                imap_service.connected = True
-                
-                result = await imap_service.list_messages("INBOX", 10, 0)
-                
-                assert len(result) == 0
+            result = await imap_service.list_messages("INBOX", 10, 0)
+            
+            assert len(result) == 0
     
     @pytest.mark.asyncio
-    async def test_list_messages_different_folders(self, imap_service, sample_messages):
+    async def test_list_messages_fetch_failure(self, imap_service, mock_connection):
+        """测试批量FETCH失败"""
+        mock_connection.fetch.return_value = ('NO', [b'Fetch failed'])
+        
+        with patch.object(imap_service, 'select_folder', return_value=True):
+            result = await imap_service.list_messages("INBOX", 10, 0)
+            
+            assert len(result) == 0
+    
+    @pytest.mark.asyncio
+    async def test_list_messages_different_folders(self, imap_service, mock_connection):
         """测试不同文件夹"""
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch('imaplib.IMAP4_SSL') as mock_ssl:
-                mock_connection = Mock()
-                mock_connection.search.return_value = ('OK', [b'3 2 1'])  # IMAP返回最旧邮件在前
-                mock_ssl.return_value = mock_connection
-                imap_service.connection = mock_connection
-                imap_service.connected = True
-                
-                # 测试INBOX
-                with patch.object(imap_service, '_get_message_by_id') as mock_get:
-                    mock_get.side_effect = sample_messages
-                    
-                    result = await imap_service.list_messages("INBOX", 2, 0)
-                    assert len(result) == 2
-                
-                # 测试Sent文件夹 (使用新的mock)
-                with patch.object(imap_service, '_get_message_by_id') as mock_get2:
-                    mock_get2.side_effect = sample_messages
-                    
-                    result = await imap_service.list_messages("Sent", 2, 0)
-                    assert len(result) == 2
+            # 测试INBOX
+            result = await imap_service.list_messages("INBOX", 2, 0)
+            assert len(result) == 2
+            assert all(message.folder == "INBOX" for message in result)
+            
+            # 测试Sent文件夹
+            result = await imap_service.list_messages("Sent", 2, 0)
+            assert len(result) == 2
+            assert all(message.folder == "Sent" for message in result)
     
     @pytest.mark.asyncio
-    async def test_list_messages_reverse_order(self, imap_service, sample_messages):
-        """测试邮件按倒序排列（最新在前）"""
+    async def test_list_messages_with_attachments(self, imap_service, mock_connection):
+        """测试根据BODYSTRUCTURE识别附件"""
+        headers = b"Subject: =?utf-8?b?5oql5ZGK?=\r\nFrom: a@test.com\r\n\r\n"
+        mock_connection.search.return_value = ('OK', [b'7'])
+        mock_connection.fetch.return_value = ('OK', [
+            (b'7 (UID 7 FLAGS () RFC822.SIZE 4096 INTERNALDATE "20-Sep-2025 10:00:00 +0800" '
+             b'BODY[HEADER.FIELDS (DATE FROM TO CC SUBJECT MESSAGE-ID)] {%d}' % len(headers), headers),
+            b' BODYSTRUCTURE (("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 20 1 NIL NIL NIL NIL)'
+            b'("application" "pdf" ("name" "report.pdf") NIL NIL "base64" 2048 NIL '
+            b'("attachment" ("filename" "report.pdf")) NIL NIL) "mixed" ("boundary" "b") NIL NIL NIL))'
+        ])
+        
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch('imaplib.IMAP4_SSL') as mock_ssl:
-                mock_connection = Mock()
-                mock_connection.search.return_value = ('OK', [b'1 2 3'])  # IMAP返回最旧邮件在前
-                mock_ssl.return_value = mock_connection
-                imap_service.connection = mock_connection
-                imap_service.connected = True
-                
-                with patch.object(imap_service, '_get_message_by_id') as mock_get:
-                    # 反转后应该返回邮件3, 2, 1
-                    mock_get.side_effect = [sample_messages[2], sample_messages[1], sample_messages[0]]
-                    
-                    result = await imap_service.list_messages("INBOX", 3, 0)
-                    
-                    # 验证结果是按最新在前排列的
-                    assert result[0].id == "3"  # 最新邮件
-                    assert result[1].id == "2"  # 中间邮件
-                    assert result[2].id == "1"  # 最旧邮件
+            result = await imap_service.list_messages("INBOX", 10, 0)
+            
+            assert len(result) == 1
+            # 没有收件人和日期头的邮件也应保留在列表中
+            assert result[0].subject == "报告"
+            assert result[0].to_addresses == []
+            assert result[0].date == "2025-09-20T10:00:00+08:00"
+            assert result[0].size == 4096
+            assert len(result[0].attachments) == 1
+            assert result[0].attachments[0]['filename'] == "report.pdf"
+            assert result[0].attachments[0]['content_type'] == "application/pdf"
     
     @pytest.mark.asyncio
-    async def test_list_messages_large_offset(self, imap_service, sample_messages):
+    async def test_list_messages_large_offset(self, imap_service, mock_connection):
         """测试大偏移量（超出范围）"""
         with patch.object(imap_service, 'select_folder', return_value=True):
-            with patch.object(imap_service, '_get_message_by_id') as mock_get:
-                mock_get.side_effect = sample_messages
-                
-                # 请求超出范围的偏移量
-                result = await imap_service.list_messages("INBOX", 10, 10)
-                
-                # 应该返回空列表
-                assert len(result) == 0
\ No newline at end of file
+            # 请求超出范围的偏移量
+            result = await imap_service.list_messages("INBOX", 10, 10)
+            
+            # 应该返回空列表
+            assert len(result) == 0
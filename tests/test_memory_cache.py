@@ -0,0 +1,122 @@
+"""
+测试已获取邮件的内存缓存
+"""
+
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from unittest.mock import Mock
+
+import pytest
+
+from mail_mcp.imap_service import IMAPService
+from mail_mcp.memory_cache import ENTRY_OVERHEAD, CachedMessage, MessageMemoryCache
+
+
+def make_raw_message():
+    message = MIMEMultipart()
+    message['Subject'] = 'report'
+    message['From'] = 'a@test.com'
+    message['To'] = 'b@test.com'
+    message.attach(MIMEText('see attached'))
+    message.attach(MIMEApplication(b'%PDF-1.4 data', Name='report.pdf'))
+    message.get_payload()[1]['Content-Disposition'] = 'attachment; filename="report.pdf"'
+    return message.as_bytes()
+
+
+def make_connection(raw_message):
+    """只包含一封带附件邮件（UIDVALIDITY 42, UID 7）的假IMAP连接"""
+    connection = Mock()
+    connection.untagged_responses = {}
+
+    def select(mailbox, readonly=False):
+        connection.untagged_responses = {'EXISTS': [b'1'], 'UIDVALIDITY': [b'42']}
+        return ('OK', [b'1'])
+
+    def uid(command, *args):
+        items = args[1]
+        if items == '(RFC822)':
+            return ('OK', [(b'1 (UID 7 RFC822 {%d}' % len(raw_message), raw_message), b')'])
+        if items == '(FLAGS)':
+            return ('OK', [b'1 (FLAGS (\\Seen))'])
+        if items == '(BODYSTRUCTURE)':
+            return ('OK', [
+                b'1 (BODYSTRUCTURE (("text" "plain" ("charset" "us-ascii") NIL NIL "7bit" 12 1 NIL NIL NIL NIL)'
+                b'("application" "octet-stream" ("name" "report.pdf") NIL NIL "base64" 20 NIL '
+                b'("attachment" ("filename" "report.pdf")) NIL NIL) "mixed" ("boundary" "b") NIL NIL NIL))'
+            ])
+        raise AssertionError(f"unexpected FETCH {items}")
+
+    connection.select.side_effect = select
+    connection.uid.side_effect = uid
+    return connection
+
+
+def fetch_items(service):
+    return [c[0][2] for c in service.connection.uid.call_args_list]
+
+
+class TestMessageMemoryCache:
+    """测试按字节预算淘汰的LRU缓存"""
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """测试超出字节预算时淘汰最久未使用的条目"""
+        cache = MessageMemoryCache(max_bytes=3 * (100 + ENTRY_OVERHEAD))
+        for key in ('a', 'b', 'c'):
+            cache.put(key, CachedMessage(raw=b'x' * 100))
+
+        assert cache.get('a') is not None
+        cache.put('d', CachedMessage(raw=b'x' * 100))
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None and cache.get('d') is not None
+        stats = cache.get_stats()
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 1, 1)
+        assert stats['bytes'] == 3 * (100 + ENTRY_OVERHEAD)
+
+    def test_resize_and_oversized_entries(self):
+        """测试条目变大后重新计算大小，超过预算的条目不缓存"""
+        cache = MessageMemoryCache(max_bytes=2 * ENTRY_OVERHEAD + 500)
+        entry = CachedMessage(raw=b'x' * 100)
+        cache.put('a', entry)
+        cache.put('b', CachedMessage())
+
+        entry.parts['2'] = b'y' * 400
+        cache.put('a', entry)
+        assert cache.total_bytes == 2 * ENTRY_OVERHEAD + 500
+
+        cache.put('c', CachedMessage(raw=b'z' * 10000))
+        assert cache.get('c') is None
+        assert len(cache) == 2
+
+
+class TestIMAPServiceMemoryCache:
+    """测试 get_message → list_attachments → download_attachments 只获取和解析一次"""
+
+    @pytest.fixture
+    def service(self):
+        service = IMAPService(Mock())
+        service.connected = True
+        service.connection = make_connection(make_raw_message())
+        return service
+
+    async def test_workflow_fetches_message_once(self, service, tmp_path):
+        """测试读取邮件后列出和下载附件不再获取邮件内容"""
+        message = await service.get_message("42:7")
+        attachments = await service.get_message_attachments("42:7")
+        payload = await service.download_attachment_payload("42:7", "report.pdf")
+        saved = await service.download_attachments_to_dir("42:7", ["report.pdf"], str(tmp_path))
+
+        assert message.subject == 'report' and message.is_read
+        assert [attachment['filename'] for attachment in attachments] == ['report.pdf']
+        assert payload == b'%PDF-1.4 data'
+        assert (tmp_path / "report.pdf").read_bytes() == b'%PDF-1.4 data'
+        assert saved == {"report.pdf": str(tmp_path / "report.pdf")}
+        assert fetch_items(service) == ['(RFC822)', '(FLAGS)', '(BODYSTRUCTURE)']
+
+        # 再次读取只刷新已读状态
+        again = await service.get_message("42:7")
+        assert again.subject == 'report'
+        assert fetch_items(service)[-1] == '(FLAGS)'
+        stats = service.get_connection_stats()['memory_cache']
+        assert stats['entries'] == 1 and stats['hits'] > 0
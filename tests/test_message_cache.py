@@ -0,0 +1,393 @@
+"""
+测试邮件元数据缓存
+"""
+
+import os
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from mail_mcp.imap_service import IMAPService
+from mail_mcp.message_cache import MessageCache
+from mail_mcp.models import EmailSummary
+
+
+def make_summary(uid, flags=()):
+    return EmailSummary(
+        id=f"42:{uid}",
+        subject=f"邮件{uid}",
+        from_address="a@test.com",
+        to_addresses=["b@test.com"],
+        flags=list(flags),
+        size=100
+    )
+
+
+class TestMessageCache:
+    """测试SQLite缓存的读写和失效"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        cache = MessageCache(str(tmp_path / "messages.sqlite3"))
+        yield cache
+        cache.close()
+
+    def test_put_and_get(self, cache):
+        """测试写入摘要后按UID读取"""
+        cache.check_uidvalidity("acct", "INBOX", 42)
+        cache.put_summaries("acct", "INBOX", 42, [
+            {'uid': '7', 'summary': make_summary(7, ['\\Seen']), 'bodystructure': ['text', 'plain']},
+            {'uid': '8', 'summary': make_summary(8), 'bodystructure': None},
+        ])
+
+        entries = cache.get_messages("acct", "INBOX", 42, [7, 8, 9])
+
+        assert sorted(entries) == [7, 8]
+        assert entries[7]['subject'] == "邮件7"
+        assert entries[7]['flags'] == ['\\Seen']
+        assert entries[7]['to_addresses'] == ["b@test.com"]
+        assert entries[7]['bodystructure'] == ['text', 'plain']
+        assert cache.stats['hits'] == 2 and cache.stats['misses'] == 1
+        # 其他账户和UIDVALIDITY不会命中
+        assert cache.get_messages("other", "INBOX", 42, [7]) == {}
+        assert cache.get_messages("acct", "INBOX", 41, [7]) == {}
+
+    def test_flags_snippet_and_removal(self, cache):
+        """测试更新标志、保存正文摘要和删除条目"""
+        cache.put_summaries("acct", "INBOX", 42, [{'uid': 7, 'summary': make_summary(7)}])
+
+        cache.update_flags("acct", "INBOX", 42, {7: ['\\Flagged']})
+        cache.set_snippet("acct", "INBOX", 42, 7, "  第一行\n  第二行 ")
+        entry = cache.get_messages("acct", "INBOX", 42, [7])[7]
+        assert entry['flags'] == ['\\Flagged']
+        assert entry['snippet'] == "第一行 第二行"
+
+        # 重新写入摘要时保留正文摘要
+        cache.put_summaries("acct", "INBOX", 42, [{'uid': 7, 'summary': make_summary(7)}])
+        assert cache.get_messages("acct", "INBOX", 42, [7])[7]['snippet'] == "第一行 第二行"
+
+        cache.remove_messages("acct", "INBOX", 42, [7])
+        assert cache.get_messages("acct", "INBOX", 42, [7]) == {}
+
+    def test_uidvalidity_change_invalidates_folder(self, cache):
+        """测试UIDVALIDITY变化时清除整个文件夹"""
+        assert cache.check_uidvalidity("acct", "INBOX", 42) is False
+        cache.put_summaries("acct", "INBOX", 42, [{'uid': 7, 'summary': make_summary(7)}])
+        cache.put_summaries("acct", "Archive", 42, [{'uid': 7, 'summary': make_summary(7)}])
+
+        assert cache.check_uidvalidity("acct", "INBOX", 42) is False
+        cache.update_sync_state("acct", "INBOX", uidnext=20, highestmodseq=500)
+        assert cache.get_folder("acct", "INBOX")['uidnext'] == 20
+        assert cache.check_uidvalidity("acct", "INBOX", 43) is True
+
+        assert cache.get_messages("acct", "INBOX", 42, [7]) == {}
+        folder = cache.get_folder("acct", "INBOX")
+        assert (folder['uidvalidity'], folder['uidnext'], folder['highestmodseq']) == (43, None, None)
+        assert cache.get_messages("acct", "Archive", 42, [7]) != {}
+
+    def test_full_text_search(self, cache):
+        """测试全文索引的BM25排序、中文短语匹配、已读过滤和删除"""
+        in_subject = make_summary(7, ['\\Seen'])
+        in_subject.subject = "季度报告"
+        in_body = make_summary(8)
+        in_body.attachments = [{'filename': 'budget.xlsx', 'content_type': 'application/vnd.ms-excel', 'size': 10}]
+        cache.put_summaries("acct", "INBOX", 42, [
+            {'uid': 7, 'summary': in_subject},
+            {'uid': 8, 'summary': in_body},
+        ])
+        cache.set_body_text("acct", "INBOX", 42, 8, "请查看附件中的季度报告和预算")
+
+        def uids(query, **kwargs):
+            return [entry['uid'] for entry in cache.search("acct", "INBOX", 42, query, **kwargs)]
+
+        # 主题命中的权重高于正文命中
+        assert uids("季度报告") == [7, 8]
+        assert uids("季度报告", offset=1) == [8]
+        # 游标翻页时按UID从新到旧，只返回更旧的邮件
+        assert uids("季度报告", before_uid=2 ** 32) == [8, 7]
+        assert uids("季度报告", before_uid=8) == [7]
+        assert uids("报告", is_read=False) == [8]
+        assert uids("budg") == [8]
+        assert uids("季度 预算") == [8]
+        assert uids("报表") == []
+        assert sorted(uids("b@test.com")) == [7, 8]
+        assert cache.search("acct", "INBOX", 42, "季度报告")[0]['subject'] == "季度报告"
+
+        # 重新写入摘要时保留正文索引，删除邮件时同时删除索引
+        cache.put_summaries("acct", "INBOX", 42, [{'uid': 8, 'summary': in_body}])
+        assert uids("预算") == [8]
+        cache.remove_messages("acct", "INBOX", 42, [8])
+        assert uids("报告") == [7]
+
+    def test_persists_across_instances(self, tmp_path):
+        """测试缓存在重新打开后仍然存在"""
+        path = str(tmp_path / "messages.sqlite3")
+        cache = MessageCache(path)
+        cache.put_summaries("acct", "INBOX", 42, [{'uid': 7, 'summary': make_summary(7)}])
+        cache.close()
+
+        reopened = MessageCache(path)
+        assert 7 in reopened.get_messages("acct", "INBOX", 42, [7])
+        reopened.close()
+
+
+class TestIMAPServiceCache:
+    """测试IMAPService使用缓存减少FETCH"""
+
+    HEADERS = b"Subject: hi\r\nFrom: a@test.com\r\n\r\n"
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        config = Mock()
+        config.cache_dir = str(tmp_path / "cache")
+        config.imap.username = "user@test.com"
+        config.imap.host = "imap.test.com"
+        service = IMAPService(config)
+        service.connected = True
+        yield service
+        service._cache.close()
+
+    @pytest.fixture
+    def connection(self, service):
+        connection = Mock()
+        connection.untagged_responses = {}
+        uidvalidity = {'value': b'42'}
+
+        def select(mailbox, readonly=False):
+            connection.untagged_responses = {
+                'EXISTS': [b'2'], 'UIDVALIDITY': [uidvalidity['value']], 'UIDNEXT': [b'9']
+            }
+            return ('OK', [b'2'])
+
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return ('OK', [b'7 8'])
+            uids, items = args
+            data = []
+            for number in uids.split(','):
+                if items == '(UID FLAGS)':
+                    data.append(b'1 (UID %s FLAGS (\\Seen))' % number.encode())
+                else:
+                    data.append((
+                        b'1 (UID %s FLAGS () BODY[HEADER.FIELDS (SUBJECT FROM)] {%d}'
+                        % (number.encode(), len(self.HEADERS)),
+                        self.HEADERS
+                    ))
+                    data.append(b' BODYSTRUCTURE ("text" "plain" NIL NIL NIL "7bit" 10 1 NIL NIL NIL NIL))')
+            return ('OK', data)
+
+        connection.select.side_effect = select
+        connection.uid.side_effect = uid
+        connection.noop.return_value = ('OK', [b''])
+        connection.uidvalidity = uidvalidity
+        service.connection = connection
+        return connection
+
+    def fetch_items(self, connection):
+        return [c[0][2] for c in connection.uid.call_args_list if c[0][0] == 'FETCH']
+
+    async def test_cache_created_in_config_dir(self, service, tmp_path):
+        """测试缓存文件位于配置的缓存目录下"""
+        assert service._cache is not None
+        assert os.path.dirname(service._cache.path) == str(tmp_path / "cache")
+        assert 'cache' in service.get_connection_stats()
+
+    async def test_cached_messages_only_refresh_flags(self, service, connection):
+        """测试已缓存的邮件只刷新标志，不再获取邮件头和结构"""
+        first = await service.list_messages("INBOX")
+        assert [message.id for message in first] == ["42:8", "42:7"]
+        assert all(not message.is_read for message in first)
+
+        # 模拟重启：新的连接需要重新SELECT，缓存仍然有效
+        service.connection = connection
+        connection.uid.reset_mock()
+        second = await service.list_messages("INBOX")
+
+        assert self.fetch_items(connection) == ['(UID FLAGS)']
+        assert [message.subject for message in second] == ["hi", "hi"]
+        assert all(message.is_read for message in second)
+
+    async def test_uidvalidity_change_refetches(self, service, connection):
+        """测试UIDVALIDITY变化后缓存失效并重新获取"""
+        await service.list_messages("INBOX")
+
+        connection.uidvalidity['value'] = b'43'
+        service.connection = connection
+        connection.uid.reset_mock()
+        messages = await service.list_messages("INBOX")
+
+        assert len(self.fetch_items(connection)) == 1
+        assert self.fetch_items(connection)[0] != '(UID FLAGS)'
+        assert [message.id for message in messages] == ["43:8", "43:7"]
+        assert service._cache.stats['invalidations'] == 1
+
+    async def test_search_uses_local_index(self, service, connection):
+        """测试未完整索引时由服务器搜索并在后台补齐索引，之后按相关度在本地搜索，离线时仍可搜索"""
+        body = b'quarterly budget attached'
+        plain_uid = connection.uid.side_effect
+
+        def uid(command, *args):
+            if command == 'FETCH' and args[0] == '1:*':
+                return plain_uid(command, '7,8', *args[1:])
+            if command == 'FETCH' and 'BODY.PEEK[1]' in args[1]:
+                data = []
+                for number in args[0].split(','):
+                    data.append((b'1 (UID %s BODY[1]<0> {%d}' % (number.encode(), len(body)), body))
+                    data.append(b')')
+                return ('OK', data)
+            return plain_uid(command, *args)
+
+        connection.uid.side_effect = uid
+        await service.search_messages_simple("budget")
+
+        assert connection.uid.call_args_list[0][0][:2] == ('SEARCH', b'TEXT "budget"')
+        await service._index_tasks["INBOX"]
+        assert service._cache.get_folder(service._account_key(), "INBOX")['exists_count'] == 2
+
+        # 索引完整后搜索不再访问服务器，也不再对整个文件夹对账
+        connection.uid.reset_mock()
+        results = await service.search_messages_simple("budget")
+
+        assert [message.id for message in results] == ["42:8", "42:7"]
+        connection.uid.assert_not_called()
+
+        # 不支持CONDSTORE时标志超过对账间隔后由服务器搜索，对账在后台进行
+        with patch('mail_mcp.imap_service.INDEX_RECONCILE_INTERVAL', 0):
+            await service.search_messages_simple("budget")
+            assert connection.uid.call_args_list[0][0][0] == 'SEARCH'
+            await service._index_tasks["INBOX"]
+            assert ('FETCH', '1:*', '(UID FLAGS)') in [c[0] for c in connection.uid.call_args_list]
+
+        service.connected = False
+        connection.uid.reset_mock()
+        assert len(await service.search_messages_simple("hi", unread_only=False)) == 2
+        assert await service.search_messages_simple("missing") == []
+        connection.uid.assert_not_called()
+
+    async def test_search_pages_ranked_by_relevance(self, service, connection):
+        """测试索引完整时第一页按BM25相关度而不是UID排序，游标按名次继续，索引变化后游标失效"""
+        account = service._account_key()
+        cache = service._cache
+        in_subject = make_summary(7)
+        in_subject.subject = "budget report"
+        cache.check_uidvalidity(account, "INBOX", 42)
+        cache.put_summaries(account, "INBOX", 42, [
+            {'uid': 7, 'summary': in_subject},
+            {'uid': 8, 'summary': make_summary(8)},
+        ])
+        cache.index_body(account, "INBOX", 42, 8, "budget attached")
+        cache.update_sync_state(account, "INBOX", uidnext=9, exists=2)
+        service._index_reconciled["INBOX"] = time.monotonic()
+
+        messages, cursor = await service.search_messages_page("budget", limit=1)
+        assert [message.id for message in messages] == ["42:7"]
+        assert not [c for c in connection.uid.call_args_list if c[0][0] == 'SEARCH']
+
+        messages, next_cursor = await service.search_messages_page("budget", limit=1, cursor=cursor)
+        assert [message.id for message in messages] == ["42:8"]
+        assert await service.search_messages_page("budget", limit=1, cursor=next_cursor) == ([], None)
+
+        cache.index_body(account, "INBOX", 42, 8, "budget attached again")
+        with pytest.raises(ValueError):
+            await service.search_messages_page("budget", limit=1, cursor=cursor)
+
+    @pytest.fixture
+    def condstore_connection(self, connection):
+        """支持CONDSTORE的模拟连接，CHANGEDSINCE返回预设的变化"""
+        connection.capabilities = ('IMAP4REV1', 'CONDSTORE')
+        connection.enabled = set()
+        connection.changes = {'modseq': b'100', 'uidnext': b'9', 'fetch': [], 'vanished': []}
+        plain_select = connection.select.side_effect
+        plain_uid = connection.uid.side_effect
+
+        def select(mailbox, readonly=False):
+            result = plain_select(mailbox, readonly)
+            connection.untagged_responses['HIGHESTMODSEQ'] = [connection.changes['modseq']]
+            connection.untagged_responses['UIDNEXT'] = [connection.changes['uidnext']]
+            return result
+
+        def uid(command, *args):
+            if command == 'FETCH' and 'CHANGEDSINCE' in args[1]:
+                if connection.changes['vanished']:
+                    connection.untagged_responses['VANISHED'] = connection.changes['vanished']
+                return ('OK', connection.changes['fetch'] or [None])
+            return plain_uid(command, *args)
+
+        connection.select.side_effect = select
+        connection.uid.side_effect = uid
+        return connection
+
+    async def test_condstore_sync_fetches_only_changes(self, service, condstore_connection):
+        """测试CONDSTORE增量同步只获取变化的标志和新邮件"""
+        connection = condstore_connection
+        await service.list_messages("INBOX")
+        assert service._cache.get_folder(service._account_key(), "INBOX")['highestmodseq'] == 100
+
+        connection.changes.update(
+            modseq=b'105',
+            uidnext=b'10',
+            fetch=[b'1 (UID 7 FLAGS (\\Flagged) MODSEQ (103))', b'3 (UID 9 FLAGS () MODSEQ (105))'],
+        )
+        service.connection = connection
+        connection.uid.reset_mock()
+        result = await service.sync_folder("INBOX")
+
+        assert result == {
+            'mode': 'condstore', 'changed': 1, 'new': 1, 'vanished': 0,
+            'flags_current': True, 'success': True
+        }
+        fetches = self.fetch_items(connection)
+        assert fetches[0] == '(UID FLAGS) (CHANGEDSINCE 100)'
+        # 只为新邮件获取摘要
+        assert [c[0][1] for c in connection.uid.call_args_list][1:] == ['9']
+        folder_state = service._cache.get_folder(service._account_key(), "INBOX")
+        assert (folder_state['highestmodseq'], folder_state['uidnext']) == (105, 10)
+
+        # 标志已同步，列出时不再按页刷新
+        connection.changes['fetch'] = []
+        connection.uid.reset_mock()
+        messages = await service.list_messages("INBOX")
+        assert self.fetch_items(connection) == ['(UID FLAGS) (CHANGEDSINCE 105)']
+        assert {message.id: message.flags for message in messages} == {
+            "42:8": [], "42:7": ['\\Flagged']
+        }
+
+    async def test_qresync_sync_removes_vanished(self, service, condstore_connection):
+        """测试QRESYNC的VANISHED响应从缓存中移除被删除的邮件"""
+        connection = condstore_connection
+        connection.enabled = {'QRESYNC'}
+        await service.list_messages("INBOX")
+
+        connection.changes.update(modseq=b'101', vanished=[b'(EARLIER) 8'])
+        result = await service.sync_folder("INBOX")
+
+        assert (result['mode'], result['vanished']) == ('qresync', 1)
+        assert connection.uid.call_args[0][2] == '(UID FLAGS) (CHANGEDSINCE 100 VANISHED)'
+        assert sorted(service._cache.get_messages(service._account_key(), "INBOX", 42, [7, 8])) == [7]
+
+    async def test_uidnext_fallback_prefetches_new_messages(self, service, connection):
+        """测试不支持CONDSTORE时根据UIDNEXT差值获取新邮件"""
+        await service.list_messages("INBOX")
+        state = service._cache.get_folder(service._account_key(), "INBOX")
+        assert state['uidnext'] == 9
+
+        def select(mailbox, readonly=False):
+            connection.untagged_responses = {
+                'EXISTS': [b'3'], 'UIDVALIDITY': [b'42'], 'UIDNEXT': [b'11']
+            }
+            return ('OK', [b'3'])
+
+        connection.select.side_effect = select
+        plain_uid = connection.uid.side_effect
+        connection.uid.side_effect = lambda command, *args: (
+            ('OK', [b'10']) if command == 'SEARCH' else plain_uid(command, *args)
+        )
+        service.connection = connection
+        connection.uid.reset_mock()
+        result = await service.sync_folder("INBOX")
+
+        assert (result['mode'], result['new'], result['flags_current']) == ('uidnext', 1, False)
+        assert connection.uid.call_args_list[0][0] == ('SEARCH', 'UID 9:*')
+        assert 10 in service._cache.get_messages(service._account_key(), "INBOX", 42, [10])
+        assert service._cache.get_folder(service._account_key(), "INBOX")['uidnext'] == 11
@@ -0,0 +1,115 @@
+"""
+测试只解析所需部分的MIME扫描
+"""
+
+import email
+from email import policy
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from unittest.mock import Mock
+
+from mail_mcp.imap_service import IMAPService
+from mail_mcp.imap_parser import decode_part_payload, get_message_part, get_part_payload
+from mail_mcp.mime_stream import ATTACHMENTS, HEADERS, TEXT, find_part, scan_message
+from tests.test_memory_cache import make_connection
+
+
+def make_message():
+    """mixed(alternative(text, html), pdf附件, 转发的eml附件)"""
+    message = MIMEMultipart('mixed', boundary='outer')
+    message['Subject'] = '=?utf-8?b?5rWL6K+V?='
+    message['From'] = 'a@test.com'
+    message['To'] = 'b@test.com'
+    alternative = MIMEMultipart('alternative', boundary='outer-inner')
+    alternative.attach(MIMEText('纯文本 正文', 'plain', 'utf-8'))
+    alternative.attach(MIMEText('<p>HTML 正文</p>', 'html', 'utf-8'))
+    message.attach(alternative)
+
+    pdf = MIMEApplication(bytes(range(256)) * 300, Name='report.pdf')
+    pdf['Content-Disposition'] = 'attachment; filename="report.pdf"'
+    message.attach(pdf)
+
+    forwarded = MIMEApplication(b'From: c@test.com\r\nSubject: old\r\nDate: today\r\n\r\nhello', Name='old.eml')
+    forwarded['Content-Disposition'] = 'attachment; filename="old.eml"'
+    message.attach(forwarded)
+    return message
+
+
+class TestScanMessage:
+    """测试按边界切分、附件大小计算和提前停止"""
+
+    def test_matches_full_parse(self):
+        """测试扫描结果与完整解析一致，附件大小不解码即可精确得到"""
+        for raw in (make_message().as_bytes(), make_message().as_bytes(policy=policy.SMTP)):
+            scanned = scan_message(raw, peek_bytes=64)
+            parsed = email.message_from_bytes(raw, policy=policy.default)
+
+            assert scanned.complete
+            assert scanned.headers['Subject'] == '测试'
+            assert scanned.text == parsed.get_body(('plain',)).get_content() == '纯文本 正文'
+            assert scanned.html == parsed.get_body(('html',)).get_content() == '<p>HTML 正文</p>'
+            assert [(a.filename, a.content_type, a.size) for a in scanned.attachments] == [
+                (part.get_filename(), part.get_content_type(), len(part.get_payload(decode=True)))
+                for part in parsed.iter_attachments()
+            ]
+            assert scanned.attachments[1].peek.startswith(b'From: c@test.com')
+
+    def test_stops_after_requested_parts(self):
+        """测试只要邮件头和正文时找到第一个正文部分后停止，不处理后面的部分"""
+        raw = make_message().as_bytes()
+        # 截断在附件中间：提前停止时不会读到这里
+        truncated = raw[:raw.index(b'filename="report.pdf"') + 100]
+
+        scanned = scan_message(truncated, {HEADERS, TEXT})
+
+        assert scanned.text == '纯文本 正文'
+        assert scanned.html is None and scanned.attachments == []
+        assert not scanned.complete
+
+        headers_only = scan_message(raw, {HEADERS})
+        assert headers_only.headers['From'] == 'a@test.com' and headers_only.text is None
+
+    def test_boundary_prefix_and_single_part(self):
+        """测试边界 "outer" 不会匹配内层的 "outer-inner"，非multipart邮件的正文是唯一部分"""
+        scanned = scan_message(make_message().as_bytes(), {ATTACHMENTS})
+        assert [a.filename for a in scanned.attachments] == ['report.pdf', 'old.eml']
+
+        message = MIMEMultipart('mixed', boundary='b')
+        message.attach(MIMEText('first line\n--b-side is not a boundary\nlast line', 'plain'))
+        assert scan_message(message.as_bytes()).text.endswith('last line')
+
+        plain = MIMEText('只有正文', 'plain', 'utf-8').as_bytes()
+        assert scan_message(plain).text == '只有正文'
+
+
+def test_find_part_matches_full_parse():
+    """测试按部分编号找到的字节范围解码后与完整解析得到的内容一致"""
+    for raw in (make_message().as_bytes(), make_message().as_bytes(policy=policy.SMTP)):
+        parsed = email.message_from_bytes(raw, policy=policy.default)
+        for part in ('1.1', '1.2', '2'):
+            encoding, start, end = find_part(raw, part)
+            assert decode_part_payload(raw[start:end], encoding) == get_part_payload(get_message_part(parsed, part))
+
+        # multipart本身、不存在的部分和非multipart部分的子编号都找不到
+        assert find_part(raw, '1') is None
+        assert find_part(raw, '4') is None
+        assert find_part(raw, '2.1') is None
+
+    plain = MIMEText('只有正文', 'plain', 'utf-8').as_bytes()
+    encoding, start, end = find_part(plain, '1')
+    assert decode_part_payload(plain[start:end], encoding).decode('utf-8') == '只有正文'
+
+
+async def test_get_message_skips_embedded_email():
+    """测试get_message按附件开头片段过滤嵌入的邮件，其他附件按编码长度计算大小"""
+    service = IMAPService(Mock())
+    service.connected = True
+    service.connection = make_connection(make_message().as_bytes())
+
+    message = await service.get_message("42:7")
+
+    assert message.subject == '测试'
+    assert message.body_text == '纯文本 正文'
+    assert message.body_html == '<p>HTML 正文</p>'
+    assert [(a.filename, a.size) for a in message.attachments] == [('report.pdf', 256 * 300)]
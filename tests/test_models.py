@@ -8,7 +8,9 @@ from datetime import datetime
 from mail_mcp.models import (
     EmailAttachment, 
     EmailMessage, 
+    EmailSummary,
     EmailSearchCriteria,
+    MessageKey,
     MAX_EMAIL_SIZE,
     MAX_ATTACHMENTS,
     MAX_ATTACHMENT_SIZE
@@ -311,6 +313,47 @@ class TestEmailMessage:
         assert rebuilt.from_address == email.from_address
 
 
+class TestEmailSummary:
+    """测试EmailSummary模型"""
+
+    def test_summary_creation_allows_missing_headers(self):
+        """测试摘要允许缺少主题和收件人"""
+        summary = EmailSummary(id="1")
+
+        assert summary.subject == ""
+        assert summary.to_addresses == []
+        assert summary.has_attachments is False
+
+    def test_summary_validation(self):
+        """测试摘要验证"""
+        with pytest.raises(ValueError, match="Email ID cannot be empty"):
+            EmailSummary(id="")
+
+        with pytest.raises(ValueError, match="Email size cannot be negative"):
+            EmailSummary(id="1", size=-1)
+
+    def test_summary_serialization(self):
+        """测试摘要序列化往返"""
+        summary = EmailSummary(
+            id="42",
+            subject="周报",
+            from_address="张三 <zhangsan@example.com>",
+            to_addresses=["lisi@example.com"],
+            date="2025-09-20T10:00:00+08:00",
+            is_read=True,
+            flags=["\\Seen"],
+            size=2048,
+            attachments=[{'filename': 'report.pdf', 'content_type': 'application/pdf', 'size': 1024}]
+        )
+
+        data = summary.to_dict()
+        assert data['attachment_count'] == 1
+        assert data['has_attachments'] is True
+
+        restored = EmailSummary.from_json(summary.to_json())
+        assert restored == summary
+
+
 class TestEmailSearchCriteria:
     """测试EmailSearchCriteria模型"""
     
@@ -395,6 +438,29 @@ class TestEmailSearchCriteria:
         assert criteria.offset == 10
 
 
+class TestMessageKey:
+    """测试MessageKey模型"""
+    
+    def test_message_key_round_trip(self):
+        """测试邮件ID的格式化和解析"""
+        key = MessageKey("INBOX", 42, "7")
+        assert key.message_id == "42:7"
+        assert MessageKey.parse("42:7", "INBOX") == key
+        
+        plain = MessageKey.parse("7", "Sent")
+        assert plain == MessageKey("Sent", None, "7")
+        assert plain.message_id == "7"
+    
+    def test_message_key_validation(self):
+        """测试无效的邮件ID"""
+        with pytest.raises(ValueError):
+            MessageKey.parse("abc")
+        with pytest.raises(ValueError):
+            MessageKey.parse("x:7")
+        with pytest.raises(ValueError):
+            MessageKey("INBOX", 42, "")
+
+
 class TestConstants:
     """测试常量定义"""
     
@@ -0,0 +1,171 @@
+"""
+测试跨文件夹并行搜索
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from mail_mcp.errors import NetworkError
+from mail_mcp.imap_parser import parse_list_response
+from mail_mcp.imap_pool import IMAPConnectionPool
+from mail_mcp.imap_service import IMAPService
+from mail_mcp.models import EmailSummary
+from tests.test_imap_client import DEFAULT_RESPONSES, FakeIMAPServer, make_service_config, wait_for_command
+
+
+def test_parse_list_response():
+    """测试解析带引号和不带引号的文件夹名称"""
+    assert parse_list_response(b'(\\HasNoChildren) "/" "Sent Items"') == (['\\HasNoChildren'], 'Sent Items')
+    assert parse_list_response(b'() "." INBOX') == ([], 'INBOX')
+    assert parse_list_response(b'(\\Noselect \\HasChildren) NIL "a \\"b\\""') == (
+        ['\\Noselect', '\\HasChildren'], 'a "b"'
+    )
+    assert parse_list_response(b'garbage') is None
+
+
+class TestSearchAllFolders:
+    """测试 search_all_folders 的并发限制、按日期合并和超时"""
+
+    @pytest.fixture
+    def service(self):
+        service = IMAPService(Mock())
+        service.connected = True
+        service.connection = Mock()
+        service.connection.list.return_value = ('OK', [
+            b'(\\HasNoChildren) "/" "INBOX"',
+            b'(\\Noselect \\HasChildren) "/" "[Gmail]"',
+            b'(\\HasNoChildren) "/" "Archive"',
+            b'(\\HasNoChildren) "/" "Sent"',
+        ])
+        return service
+
+    def fake_search(self, service, results, delays):
+        """按文件夹返回预设结果的搜索，记录同时进行的搜索数"""
+        state = {'running': 0, 'peak': 0, 'folders': []}
+
+        async def search_messages(criteria):
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+            state['folders'].append(criteria.folder)
+            # 不限制UID范围，本地索引按相关度排序
+            assert criteria.before_uid is None
+            try:
+                await asyncio.sleep(delays.get(criteria.folder, 0))
+                return results.get(criteria.folder, [])
+            finally:
+                state['running'] -= 1
+
+        service.search_messages = search_messages
+        return state
+
+    async def test_merges_newest_across_folders(self, service):
+        """测试跳过不可选中的文件夹，并发数不超过限制，结果按日期合并"""
+        results = {
+            'INBOX': [EmailSummary(id='1:5', date='2024-03-01T10:00:00', folder='INBOX'),
+                      EmailSummary(id='1:4', date='2024-01-01T10:00:00', folder='INBOX')],
+            'Archive': [EmailSummary(id='2:9', date='2024-02-01T10:00:00', folder='Archive'),
+                        EmailSummary(id='2:8', date=None, folder='Archive')],
+            'Sent': [EmailSummary(id='3:1', date='2024-04-01T10:00:00Z', folder='Sent')],
+        }
+        state = self.fake_search(service, results, {'INBOX': 0.02, 'Archive': 0.02, 'Sent': 0.02})
+
+        result = await service.search_all_folders('report', limit=3, concurrency=2)
+
+        assert sorted(state['folders']) == ['Archive', 'INBOX', 'Sent']
+        assert state['peak'] == 2
+        assert [summary.id for summary in result['messages']] == ['3:1', '1:5', '2:9']
+        assert sorted(result['searched']) == ['Archive', 'INBOX', 'Sent']
+        assert result['timed_out'] == [] and result['failed'] == []
+
+    async def test_timeout_returns_partial_results(self, service):
+        """测试超时的文件夹被取消，出错的文件夹单独列出"""
+        results = {'INBOX': [EmailSummary(id='1:5', date='2024-03-01T10:00:00', folder='INBOX')]}
+        state = self.fake_search(service, results, {'Archive': 10})
+        search = service.search_messages
+
+        async def failing_search(criteria):
+            if criteria.folder == 'Sent':
+                raise RuntimeError('connection reset')
+            return await search(criteria)
+
+        service.search_messages = failing_search
+
+        result = await service.search_all_folders('report', timeout=0.05)
+
+        assert [summary.id for summary in result['messages']] == ['1:5']
+        assert result['searched'] == ['INBOX']
+        assert result['timed_out'] == ['Archive']
+        assert result['failed'] == ['Sent']
+        assert state['running'] == 0
+
+
+async def test_cancelled_operation_discards_pooled_connection():
+    """测试操作被取消时连接不归还到池中复用"""
+    clients = []
+
+    async def factory():
+        client = Mock()
+        client.is_open = True
+        clients.append(client)
+        return client
+
+    service = IMAPService(Mock())
+    service._pool = IMAPConnectionPool(
+        factory=factory, max_size=2, closer=AsyncMock(), is_alive=lambda connection: True
+    )
+    service.connected = True
+    started = asyncio.Event()
+
+    async def operation():
+        async with service._use_connection('INBOX'):
+            started.set()
+            await asyncio.sleep(10)
+
+    task = asyncio.ensure_future(operation())
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    stats = service._pool.get_stats()
+    assert stats['discarded'] == 1
+    assert service._pool.idle_count == 0 and service._pool.size == 0
+
+
+async def test_search_all_folders_while_idle_listener_runs():
+    """测试IDLE监听任务运行时列出文件夹和搜索都不会等待监听连接"""
+    server = FakeIMAPServer({
+        **DEFAULT_RESPONSES,
+        'CAPABILITY': b'* CAPABILITY IMAP4rev1 IDLE\r\n',
+        'LIST': b'* LIST (\\HasNoChildren) "/" "INBOX"\r\n* LIST (\\HasNoChildren) "/" "Archive"\r\n',
+        'UID': b'* SEARCH\r\n',
+    }, statuses={'STARTTLS': b'NO'})
+    port = await server.start()
+    service = IMAPService(make_service_config(port, search_timeout=2))
+    try:
+        assert await service.connect()
+        await wait_for_command(server, 'IDLE')
+
+        result = await asyncio.wait_for(service.search_all_folders('report'), 5)
+
+        assert sorted(result['searched']) == ['Archive', 'INBOX']
+        assert result['timed_out'] == [] and result['failed'] == []
+    finally:
+        await service.disconnect()
+        await server.stop()
+
+
+async def test_folder_listing_counts_toward_timeout():
+    """测试列出文件夹也受整体超时限制"""
+    service = IMAPService(Mock())
+    service.connected = True
+
+    async def slow_list():
+        await asyncio.sleep(10)
+
+    service._list_mailboxes = slow_list
+
+    with pytest.raises(NetworkError):
+        await asyncio.wait_for(service.search_all_folders('report', timeout=0.05), 1)
@@ -0,0 +1,107 @@
+"""
+测试原始邮件的磁盘存储
+"""
+
+import os
+from unittest.mock import Mock, patch
+
+from mail_mcp.imap_service import IMAPService
+from mail_mcp.raw_store import RawMessageStore
+from tests.test_memory_cache import fetch_items, make_connection, make_raw_message
+
+
+class TestRawMessageStore:
+    """测试按哈希存储、原子写入和按修改时间清理"""
+
+    def test_round_trip(self, tmp_path):
+        """测试写入后可以读取，同一键重复写入不重复计算大小"""
+        store = RawMessageStore(str(tmp_path), max_bytes=1000)
+
+        assert store.get('a') is None
+        assert store.put('a', b'x' * 100)
+        assert store.put('a', b'x' * 100)
+        assert store.get('a') == b'x' * 100
+        assert store.total_bytes == 100
+
+        path = store.path_for('a')
+        assert os.path.basename(os.path.dirname(path)) == os.path.basename(path)[:2]
+        assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.part')]
+
+        store.discard('a')
+        assert store.get('a') is None and store.total_bytes == 0
+        stats = store.get_stats()
+        assert (stats['hits'], stats['misses'], stats['writes']) == (1, 2, 2)
+
+    def test_sweep_removes_least_recently_used(self, tmp_path):
+        """测试超过上限时删除最久未读取的文件"""
+        store = RawMessageStore(str(tmp_path), max_bytes=300)
+        for age, key in enumerate(('a', 'b', 'c')):
+            store.put(key, b'x' * 100)
+            os.utime(store.path_for(key), (1000 + age, 1000 + age))
+        store.get('a')
+
+        store.put('d', b'x' * 100)
+
+        # 清理到上限的90%以下：删除b和c，刚读取过的a保留
+        assert store.get('b') is None and store.get('c') is None
+        assert store.get('a') is not None and store.get('d') is not None
+        assert store.total_bytes == 200
+        assert store.get_stats()['evictions'] == 2
+
+    def test_reopen_counts_existing_files(self, tmp_path):
+        """测试重新打开时统计已有文件，忽略未完成的临时文件"""
+        store = RawMessageStore(str(tmp_path))
+        store.put('a', b'x' * 100)
+        (tmp_path / '.leftover.part').write_bytes(b'y' * 50)
+
+        reopened = RawMessageStore(str(tmp_path))
+
+        assert reopened.total_bytes == 100
+        assert reopened.get('a') == b'x' * 100
+
+
+class TestIMAPServiceRawStore:
+    """测试重启后从磁盘读取邮件，不再从服务器获取原始内容"""
+
+    def make_service(self, cache_dir):
+        config = Mock()
+        config.imap.username = 'user'
+        config.imap.host = 'imap.test.com'
+        config.cache_dir = str(cache_dir)
+        config.raw_store_bytes = 1024 * 1024
+        service = IMAPService(config)
+        service.connected = True
+        service.connection = make_connection(make_raw_message())
+        return service
+
+    async def test_restart_reads_raw_message_from_disk(self, tmp_path):
+        """测试新的服务实例读取邮件和附件时使用磁盘上的原始邮件"""
+        first = self.make_service(tmp_path)
+        await first.get_message("42:7")
+        assert fetch_items(first) == ['(RFC822)', '(FLAGS)']
+
+        second = self.make_service(tmp_path)
+        payload = await second.download_attachment_payload("42:7", "report.pdf")
+        message = await second.get_message("42:7")
+
+        assert payload == b'%PDF-1.4 data'
+        assert message.subject == 'report'
+        assert '(RFC822)' not in fetch_items(second)
+        # 附件只从磁盘取出该部分，get_message再读取整封邮件
+        assert second.get_connection_stats()['raw_store']['hits'] == 2
+
+    async def test_download_decodes_stored_part_without_copying_message(self, tmp_path):
+        """测试下载到目录时从mmap按部分的字节范围分块解码，不复制整封邮件也不完整解析"""
+        first = self.make_service(tmp_path)
+        await first.get_message("42:7")
+
+        second = self.make_service(tmp_path)
+        save_path = tmp_path / 'out'
+        save_path.mkdir()
+        with patch.object(RawMessageStore, 'get', side_effect=AssertionError('whole message copied')), \
+                patch('mail_mcp.imap_service.email.message_from_bytes', side_effect=AssertionError('parsed')):
+            saved = await second.download_attachments_to_dir("42:7", ["report.pdf"], str(save_path))
+
+        assert (save_path / 'report.pdf').read_bytes() == b'%PDF-1.4 data'
+        assert saved == {'report.pdf': str(save_path / 'report.pdf')}
+        assert fetch_items(second) == ['(BODYSTRUCTURE)']
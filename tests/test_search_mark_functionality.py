@@ -5,6 +5,8 @@
 import pytest
 import asyncio
 from unittest.mock import Mock, patch, AsyncMock
+from mail_mcp.imap_client import AsyncIMAPClient
+from mail_mcp.imap_parser import parse_sequence_set
 from mail_mcp.imap_service import IMAPService
 from mail_mcp.config import Config
 from mail_mcp.models import EmailMessage, EmailSearchCriteria
@@ -31,15 +33,14 @@ class TestSearchAndMarkFunctionality:
         """测试简单搜索功能成功"""
         # 模拟连接和文件夹选择
         imap_service.connection.select.return_value = ('OK', [b'1'])
-        imap_service.connection.search.return_value = ('OK', [b'1 2 3'])
+        imap_service.connection.uid.return_value = ('OK', [b'1 2 3'])
         
-        # 模拟邮件获取
-        with patch.object(imap_service, '_get_message_by_id', new_callable=AsyncMock) as mock_get:
-            mock_get.return_value = Mock(
-                subject="测试邮件",
-                from_address="sender@example.com",
-                is_read=False
-            )
+        # 模拟批量获取邮件摘要
+        with patch.object(imap_service, '_fetch_message_summaries', new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.return_value = [
+                Mock(subject="测试邮件", from_address="sender@example.com", is_read=False)
+                for _ in range(3)
+            ]
             
             results = await imap_service.search_messages_simple(
                 query="测试",
@@ -48,13 +49,16 @@ class TestSearchAndMarkFunctionality:
             )
             
             assert len(results) == 3  # 搜索返回3封邮件
-            mock_get.assert_called()
+            # 所有匹配邮件通过一次批量调用获取
+            mock_fetch.assert_called_once_with(['1', '2', '3'], "INBOX")
+            # 关键词匹配任意字段，而不是要求主题、发件人、收件人和正文同时包含
+            imap_service.connection.uid.assert_any_call('SEARCH', 'TEXT "测试"'.encode('utf-8'))
 
     @pytest.mark.asyncio
     async def test_search_messages_simple_no_results(self, imap_service):
         """测试搜索无结果的情况"""
         imap_service.connection.select.return_value = ('OK', [b'1'])
-        imap_service.connection.search.return_value = ('OK', [b''])
+        imap_service.connection.uid.return_value = ('OK', [b''])
         
         results = await imap_service.search_messages_simple(
             query="不存在的关键词",
@@ -83,10 +87,9 @@ class TestSearchAndMarkFunctionality:
         imap_service.connection.select.return_value = ('OK', [b'1'])
         
         # 模拟成功的标记操作
-        imap_service.connection.store.side_effect = [
-            ('OK', [b'1']),  # 第一封邮件成功
-            ('OK', [b'2']),  # 第二封邮件成功
-            ('OK', [b'3'])   # 第三封邮件成功
+        imap_service.connection.uid.side_effect = [
+            ('OK', [None]),      # 一条STORE标记全部邮件
+            ('OK', [b'1 2 3'])   # 三封邮件都存在
         ]
         
         result = await imap_service.mark_messages_as_read(
@@ -100,8 +103,11 @@ class TestSearchAndMarkFunctionality:
         assert result['total_count'] == 3
         assert len(result['successful_ids']) == 3
         
-        # 验证调用了3次标记操作
-        assert imap_service.connection.store.call_count == 3
+        # 验证UID压缩为一个集合，只发送一条STORE
+        assert [c[0] for c in imap_service.connection.uid.call_args_list] == [
+            ('STORE', '1:3', '+FLAGS.SILENT', '(\\Seen)'),
+            ('SEARCH', 'UID 1:3')
+        ]
 
     @pytest.mark.asyncio
     async def test_mark_messages_as_read_partial_failure(self, imap_service):
@@ -109,10 +115,9 @@ class TestSearchAndMarkFunctionality:
         imap_service.connection.select.return_value = ('OK', [b'1'])
         
         # 模拟部分成功的标记操作
-        imap_service.connection.store.side_effect = [
-            ('OK', [b'1']),      # 第一封邮件成功
-            ('NO', [b'Error']),  # 第二封邮件失败
-            ('OK', [b'3'])       # 第三封邮件成功
+        imap_service.connection.uid.side_effect = [
+            ('OK', [None]),      # STORE对不存在的UID不报错
+            ('OK', [b'1 3'])     # 第二封邮件已被删除
         ]
         
         result = await imap_service.mark_messages_as_read(
@@ -127,6 +132,60 @@ class TestSearchAndMarkFunctionality:
         assert result['successful_ids'] == ['1', '3']
         assert result['failed_ids'] == ['2']
 
+    @pytest.mark.asyncio
+    async def test_mark_messages_as_read_pipelines_stores(self, imap_service):
+        """测试asyncio连接上STORE和确认邮件存在的SEARCH作为一组流水线发送"""
+        connection = Mock(spec=AsyncIMAPClient)
+        connection.untagged_responses = {}
+        connection.select = AsyncMock(return_value=('OK', [b'3']))
+        connection.pipeline = AsyncMock(return_value=[('OK', [None]), ('OK', [b'1'])])
+        imap_service.connection = connection
+
+        result = await imap_service.mark_messages_as_read(['1', '2'], folder="INBOX")
+
+        connection.pipeline.assert_awaited_once_with([
+            ('UID', 'STORE', '1:2', '+FLAGS.SILENT', '(\\Seen)'),
+            ('UID', 'SEARCH', 'UID 1:2'),
+        ])
+        assert result['successful_ids'] == ['1']
+        assert result['failed_ids'] == ['2']
+
+    @pytest.mark.asyncio
+    async def test_store_flags_chunks_and_reports_failed_chunks(self, imap_service):
+        """测试移除标志和自定义关键字，UID集合过长时分段，STORE失败的分段整段报告失败"""
+        imap_service.connection.select.return_value = ('OK', [b'1'])
+        ids = [str(uid) for uid in range(1, 2001, 2)]
+        responses = {}
+
+        def uid(command, *args):
+            if command == 'STORE':
+                responses.setdefault('stores', []).append(args)
+                return ('NO', [b'Error']) if len(responses['stores']) == 2 else ('OK', [None])
+            return ('OK', [' '.join(ids).encode()])
+
+        imap_service.connection.uid.side_effect = uid
+
+        result = await imap_service.store_flags(ids, ['flagged', '$Important'], add=False, folder="INBOX")
+
+        stores = responses['stores']
+        assert len(stores) > 1
+        assert all(len(uid_set) <= 4000 for uid_set, _, _ in stores)
+        assert {(item, flags) for _, item, flags in stores} == {('-FLAGS.SILENT', '(\\Flagged $Important)')}
+        failed = [str(uid) for uid in parse_sequence_set(stores[1][0])]
+        assert result['failed_ids'] == failed
+        assert result['successful_count'] == len(ids) - len(failed)
+
+    def test_normalize_flags(self):
+        """测试标志名称规范化"""
+        assert IMAPService._normalize_flags(['seen', '\\Answered', 'Flagged', '$Label1', 'seen']) == [
+            '\\Seen', '\\Answered', '\\Flagged', '$Label1'
+        ]
+        for flag in ('\\Deleted', 'two words', 'a(b'):
+            with pytest.raises(ValueError):
+                IMAPService._normalize_flags([flag])
+        with pytest.raises(ValueError):
+            IMAPService._normalize_flags([])
+
     @pytest.mark.asyncio
     async def test_mark_messages_as_read_empty_list(self, imap_service):
         """测试空邮件ID列表的情况"""
@@ -152,7 +211,7 @@ class TestSearchAndMarkFunctionality:
     async def test_mark_messages_as_read_exception_handling(self, imap_service):
         """测试异常处理"""
         imap_service.connection.select.return_value = ('OK', [b'1'])
-        imap_service.connection.store.side_effect = Exception("IMAP error")
+        imap_service.connection.uid.side_effect = Exception("IMAP error")
         
         result = await imap_service.mark_messages_as_read(
             ['1', '2'],
@@ -168,18 +227,18 @@ class TestSearchAndMarkFunctionality:
     async def test_mark_as_read_single_message_success(self, imap_service):
         """测试单邮件标记成功"""
         imap_service.connection.select.return_value = ('OK', [b'1'])
-        imap_service.connection.store.return_value = ('OK', [b'1'])
+        imap_service.connection.uid.return_value = ('OK', [b'1'])
         
         result = await imap_service.mark_as_read('123', folder="INBOX")
         
         assert result is True
-        imap_service.connection.store.assert_called_once_with('123', '+FLAGS', '\\Seen')
+        imap_service.connection.uid.assert_called_once_with('STORE', '123', '+FLAGS', '\\Seen')
 
     @pytest.mark.asyncio
     async def test_mark_as_read_single_message_failure(self, imap_service):
         """测试单邮件标记失败的情况"""
         imap_service.connection.select.return_value = ('OK', [b'1'])
-        imap_service.connection.store.return_value = ('NO', [b'Error'])
+        imap_service.connection.uid.return_value = ('NO', [b'Error'])
         
         result = await imap_service.mark_as_read('123', folder="INBOX")
         
@@ -216,7 +275,7 @@ class TestSearchAndMarkFunctionality:
     async def test_search_messages_with_criteria_success(self, imap_service):
         """测试使用完整搜索条件的搜索成功"""
         imap_service.connection.select.return_value = ('OK', [b'1'])
-        imap_service.connection.search.return_value = ('OK', [b'1'])
+        imap_service.connection.uid.return_value = ('OK', [b'1'])
         
         criteria = EmailSearchCriteria(
             folder="INBOX",
@@ -228,15 +287,15 @@ class TestSearchAndMarkFunctionality:
             limit=5
         )
         
-        with patch.object(imap_service, '_get_message_by_id', new_callable=AsyncMock) as mock_get:
-            mock_get.return_value = Mock(
+        with patch.object(imap_service, '_fetch_message_summaries', new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.return_value = [Mock(
                 subject="重要通知",
                 from_address="admin@example.com",
                 is_read=False
-            )
+            )]
             
             results = await imap_service.search_messages(criteria)
             
             assert len(results) == 1
             # 验证搜索调用了正确的参数
-            imap_service.connection.search.assert_called_once()
\ No newline at end of file
+            imap_service.connection.uid.assert_called_once()
\ No newline at end of file